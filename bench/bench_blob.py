@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.node import Node
+from core.transport import Logger
+
+
+PORT = 47000
+SIZE = 32 * 1024 * 1024
+SOURCES = (1, 4, 16)
+
+
+def seeder(port, path, ready, stop):
+    Logger.configure(packet_log="off")
+    node = Node("127.0.0.1", port, metrics=False)
+    node.start()
+    node.blobs.share(path)
+    ready.set()
+    stop.wait()
+    node.stop()
+
+
+def run(path, key, sources, workdir):
+    ports = [PORT + 100 * sources + i for i in range(sources)]
+    stop = multiprocessing.Event()
+    procs = []
+    for port in ports:
+        ready = multiprocessing.Event()
+        p = multiprocessing.Process(target=seeder, args=(port, path, ready, stop), daemon=True)
+        p.start()
+        ready.wait(30)
+        procs.append(p)
+
+    node = Node("127.0.0.1", PORT + 100 * sources + 99, metrics=False)
+    node.start()
+    for port in ports:
+        node.send_hello(("127.0.0.1", port))
+    time.sleep(0.3)
+
+    dest = os.path.join(workdir, f"out-{sources}.bin")
+    t0 = time.perf_counter()
+    result = node.fetch_file(key, dest, providers=[("127.0.0.1", port) for port in ports])
+    elapsed = time.perf_counter() - t0
+
+    node.stop()
+    stop.set()
+    for p in procs:
+        p.join(5)
+
+    ok = result is not None
+    if ok:
+        with open(path, "rb") as a, open(dest, "rb") as b:
+            ok = a.read() == b.read()
+        os.remove(dest)
+    return SIZE / elapsed / 1e6, elapsed, ok
+
+
+def main():
+    Logger.configure(packet_log="off")
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "blob.bin")
+        with open(path, "wb") as f:
+            f.write(os.urandom(SIZE))
+
+        from core.blob import Manifest
+        t0 = time.perf_counter()
+        manifest = Manifest.from_file(path)
+        print(f"Манифест {SIZE // (1024 * 1024)} МБ: {time.perf_counter() - t0:.3f} с, "
+              f"{manifest.pieces} кусков")
+        key = f"{manifest.blob_id:040x}"
+
+        print(f"{'источников':>10} {'МБ/с':>8} {'время, с':>9} {'целостность':>12}")
+        for sources in SOURCES:
+            rate, elapsed, ok = run(path, key, sources, workdir)
+            print(f"{sources:>10} {rate:>8.1f} {elapsed:>9.2f} {'да' if ok else 'НЕТ':>12}")
+
+
+if __name__ == "__main__":
+    main()
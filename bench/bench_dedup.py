@@ -0,0 +1,127 @@
+import logging
+import os
+import random
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.dedup import ReplayFilter, REPLAY_CAPACITY
+from core.node import Node
+from core.protocol import PacketType, encode_packet, stamp_packet_id
+from core.transport import Logger
+
+
+SOURCES = 64                # отправителей; ответы уходят на их настоящие сокеты
+PACKETS_PER_SOURCE = 40
+REPEATS = 10                # каждая датаграмма приходит столько раз: 90% потока — повторы
+FILTER_KEYS = 200_000
+FP_RATES = (1e-2, 1e-3, 1e-4)
+PORT = 47600
+SEED = 11
+
+
+class NoFilter:
+    duplicates = 0
+    rotations = 0
+
+    def seen(self, key, now=None):
+        return False
+
+
+def bench_filter():
+    print(f"{'ложных, цель':>13} {'измерено':>9} {'хешей':>6} {'память':>9} {'новых, /с':>10} {'повторов, /с':>13}")
+    rng = random.Random(SEED)
+    for fp in FP_RATES:
+        f = ReplayFilter(REPLAY_CAPACITY, fp, window=3600)
+        keys = [rng.getrandbits(64) for _ in range(REPLAY_CAPACITY)]
+        t0 = time.perf_counter()
+        for key in keys:
+            f.seen(key)
+        fresh = len(keys) / (time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        for key in keys:
+            f.seen(key)
+        dup = len(keys) / (time.perf_counter() - t0)
+
+        # ложные срабатывания — на ключах, которых не было, при заполненном поколении
+        false = sum(1 for _ in range(FILTER_KEYS) if rng.getrandbits(64) in f)
+        print(f"{fp:>13.0e} {false / FILTER_KEYS:>9.2e} {f.hashes:>6} {f.nbytes // 1024:>7} КБ "
+              f"{fresh:>10,.0f} {dup:>13,.0f}")
+
+
+def make_stream(node, sinks):
+    # датаграммы, которые разбирает узел: HELLO новичка, NODE_LIST с пирами, поиски и пинги
+    rng = random.Random(SEED)
+    distinct = []
+    for sink in sinks:
+        addr = sink.getsockname()
+        sender = f"{rng.getrandbits(160):040x}"
+        pid = rng.getrandbits(63)
+        for i in range(PACKETS_PER_SOURCE):
+            kind = i % 4
+            if kind == 0:
+                packet = {"type": PacketType.HELLO.value, "id": sender, "wire": 1,
+                          "external": list(addr), "local": list(addr)}
+            elif kind == 1:
+                packet = {"type": PacketType.NODE_LIST.value, "id": sender, "wire": 1,
+                          "peers": [[f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+                                     5000, f"{rng.getrandbits(160):040x}"] for _ in range(20)]}
+            elif kind == 2:
+                packet = {"type": PacketType.FIND_NODE.value, "id": sender, "rid": f"{rng.getrandbits(48):012x}",
+                          "target": f"{rng.getrandbits(160):040x}"}
+            else:
+                packet = {"type": PacketType.PING.value, "nonce": rng.getrandbits(32), "ts": i}
+            pid += 1
+            distinct.append((stamp_packet_id(encode_packet(packet, binary=kind != 0), pid), addr))
+    stream = [item for item in distinct for _ in range(REPEATS)]
+    rng.shuffle(stream)
+    return distinct, stream
+
+
+def run(node, stream, replay):
+    node.replay = replay
+    for peer in node.dht.all_peers():
+        node.dht.remove_peer(peer.addr)
+    # NODE_LIST с новыми пирами запустил бы поиск своего ID — здесь меряется только приём
+    node._bootstrapping = True
+    sent = node.transport.m_tx_packets.value
+    handled = sum(c.value for c in node._type_counters.values())
+    t0 = time.process_time()
+    for data, addr in stream:
+        node._on_packet(data, addr)
+    cpu = time.process_time() - t0
+    return (cpu, node.transport.m_tx_packets.value - sent,
+            sum(c.value for c in node._type_counters.values()) - handled)
+
+
+def main():
+    logging.getLogger().setLevel(logging.WARNING)
+    Logger.configure(packet_log="off")
+
+    bench_filter()
+
+    sinks = []
+    for _ in range(SOURCES):
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.bind(("127.0.0.1", 0))
+        sinks.append(s)
+    node = Node("127.0.0.1", PORT)
+    distinct, stream = make_stream(node, sinks)
+    print(f"\nпоток: {len(stream)} датаграмм, различных {len(distinct)} ({1 - 1 / REPEATS:.0%} повторов)")
+    print(f"{'':>12} {'CPU, мс':>8} {'мкс/пакет':>10} {'обработано':>11} {'ответов':>8}")
+    results = {}
+    for name, replay in (("без отсева", NoFilter()), ("с отсевом", ReplayFilter())):
+        cpu, sent, handled = run(node, stream, replay)
+        results[name] = cpu
+        print(f"{name:>12} {cpu * 1000:>8.0f} {cpu / len(stream) * 1e6:>10.1f} {handled:>11} {sent:>8}")
+    print(f"экономия CPU: {1 - results['с отсевом'] / results['без отсева']:.0%}")
+
+    node.transport.stop()
+    for s in sinks:
+        s.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.dht import DHT
+from core.peer import random_node_id
+
+
+N_PEERS = 100_000
+N_LOOKUPS = 10_000
+
+
+def synthetic_addr(i):
+    return (f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}", 5000 + i % 1000)
+
+
+def main():
+    random.seed(1)
+    dht = DHT(random_node_id())
+
+    # ---------------- вставка ----------------
+    ids = [random_node_id() for _ in range(N_PEERS)]
+    t0 = time.perf_counter()
+    for i, node_id in enumerate(ids):
+        dht.add_peer(synthetic_addr(i), node_id)
+    t_insert = time.perf_counter() - t0
+
+    print(f"вставка:   {N_PEERS} пиров за {t_insert:.3f} c "
+          f"({t_insert / N_PEERS * 1e6:.2f} мкс/пир)")
+    print(f"в таблице: {len(dht)} пиров "
+          f"(непустых бакетов: {sum(1 for b in dht.buckets if b)})")
+
+    # ---------------- поиск ----------------
+    targets = [random_node_id() for _ in range(N_LOOKUPS)]
+    t0 = time.perf_counter()
+    for target in targets:
+        dht.find_closest(target, dht.k)
+    t_lookup = time.perf_counter() - t0
+
+    print(f"поиск:     {N_LOOKUPS} find_closest за {t_lookup:.3f} c "
+          f"({t_lookup / N_LOOKUPS * 1e6:.2f} мкс/запрос)")
+
+    # ---------------- вытеснение ----------------
+    # состариваем все записи, затем новые пиры вытесняют LRU-головы бакетов
+    for peer in list(dht._by_addr.values()):
+        peer.last_seen -= dht.stale_timeout + 1
+
+    t0 = time.perf_counter()
+    evicted = 0
+    for i in range(N_PEERS):
+        before = len(dht)
+        if dht.add_peer(synthetic_addr(N_PEERS + i), random_node_id()) and len(dht) == before:
+            evicted += 1
+    t_evict = time.perf_counter() - t0
+
+    print(f"вытеснение: {N_PEERS} вставок ({evicted} с вытеснением) за {t_evict:.3f} c "
+          f"({t_evict / N_PEERS * 1e6:.2f} мкс/вставка)")
+
+    t0 = time.perf_counter()
+    dht.cleanup(timeout=dht.stale_timeout)
+    t_cleanup = time.perf_counter() - t0
+    print(f"cleanup:   {t_cleanup * 1e3:.2f} мс, осталось {len(dht)} пиров")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.node import Node
+from core.protocol import PacketType, encode_packet, stamp_packet_id
+from core.transport import Logger
+
+
+# узел под флудом HELLO: задержка запросов честного клиента, доля ответов
+# флудеру и рост таблицы — без допуска и с допуском до разбора
+PORT = 47800
+CLIENT_IP = "127.0.0.1"
+FLOOD_IP = "127.0.0.3"
+PEERS = 8                   # честные узлы в таблице жертвы
+SPRAY_SOURCES = 256         # «подменённых» адресов во втором сценарии
+DURATION = 5.0
+QUERY_INTERVAL = 0.01       # честный клиент: FIND_NODE каждые 10 мс
+QUERY_TIMEOUT = 1.0
+SEED = 3
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))] if ordered else float("nan")
+
+
+def flood(target, sources, duration, result):
+    # отдельный процесс: флудер не делит GIL с жертвой
+    rng = random.Random(SEED)
+    socks = []
+    for _ in range(sources):
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+        s.bind((FLOOD_IP, 0))
+        s.setblocking(False)
+        socks.append(s)
+
+    sent = sent_bytes = got_bytes = 0
+    deadline = time.time() + duration
+    pid = rng.getrandbits(62)
+    while time.time() < deadline:
+        for _ in range(256):
+            s = socks[sent % len(socks)]
+            # каждый HELLO — новый ID и новые «внешние» адреса, чтобы не отсеялся как повтор
+            packet = {"type": PacketType.HELLO.value, "id": f"{rng.getrandbits(160):040x}", "wire": 1,
+                      "external": [f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}", 5000],
+                      "local": [f"192.168.{rng.randrange(256)}.{rng.randrange(1, 255)}", 5000]}
+            pid += 1
+            data = stamp_packet_id(encode_packet(packet), pid)
+            try:
+                s.sendto(data, target)
+                sent += 1
+                sent_bytes += len(data)
+            except (BlockingIOError, ConnectionRefusedError):
+                pass
+        for s in socks:
+            while True:
+                try:
+                    got_bytes += len(s.recv(65535))
+                except (BlockingIOError, ConnectionRefusedError):
+                    break
+    time.sleep(0.2)
+    for s in socks:
+        while True:
+            try:
+                got_bytes += len(s.recv(65535))
+            except (BlockingIOError, ConnectionRefusedError):
+                break
+        s.close()
+    result.update(sent=sent, sent_bytes=sent_bytes, got_bytes=got_bytes)
+
+
+def client(target, port, duration, latencies, lost):
+    # честный пир: FIND_NODE -> NODE_LIST, жертва писала ему первой
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind((CLIENT_IP, port))
+    s.settimeout(QUERY_TIMEOUT)
+    rng = random.Random(SEED)
+    pid = rng.getrandbits(62)
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        rid = f"{rng.getrandbits(48):012x}"
+        packet = {"type": PacketType.FIND_NODE.value, "id": f"{rng.getrandbits(160):040x}",
+                  "rid": rid, "target": f"{rng.getrandbits(160):040x}"}
+        pid += 1
+        t0 = time.perf_counter()
+        s.sendto(stamp_packet_id(encode_packet(packet, binary=True), pid), target)
+        try:
+            while True:
+                data = s.recv(65535)
+                if rid.encode() in data or bytes.fromhex(rid) in data:
+                    latencies.append(time.perf_counter() - t0)
+                    break
+        except socket.timeout:
+            lost.append(rid)
+        time.sleep(QUERY_INTERVAL)
+    s.close()
+
+
+def run(admission, sources, port):
+    # у каждого прогона свои порты: закрытые сокеты прошлого ещё могут быть заняты
+    victim = Node("127.0.0.1", port, metrics=False, admission=admission)
+    peers = [Node("127.0.0.1", port + 1 + i, metrics=False, admission=admission) for i in range(PEERS)]
+    victim.start()
+    for peer in peers:
+        peer.start()
+        peer.connect(f"127.0.0.1:{port}")
+    time.sleep(1.0)
+    # жертва пишет клиенту первой — для неё это проверенный адрес, как пир из таблицы
+    client_port = port + PEERS + 1
+    victim.send_ping((CLIENT_IP, client_port))
+    table_before = len(victim.dht)
+
+    with multiprocessing.Manager() as manager:
+        result = manager.dict()
+        proc = None
+        if sources:
+            proc = multiprocessing.Process(target=flood, args=((victim.host, port), sources, DURATION, result))
+            proc.start()
+            time.sleep(0.3)
+        latencies, lost = [], []
+        client((victim.host, port), client_port, DURATION - 0.5, latencies, lost)
+        if proc is not None:
+            proc.join()
+        flood_result = dict(result)
+
+    handled = victim.transport.m_rx_packets.value
+    dropped = dict(victim.transport.admission.dropped) if victim.transport.admission else {}
+    table_after = len(victim.dht)
+    for node in [victim] + peers:
+        node.stop()
+    time.sleep(0.5)
+    return {
+        "p50": percentile(latencies, 0.5), "p99": percentile(latencies, 0.99),
+        "answered": len(latencies) / max(1, len(latencies) + len(lost)),
+        "flood": flood_result, "received": handled, "dropped": dropped,
+        "table": (table_before, table_after),
+    }
+
+
+def main():
+    logging.getLogger().setLevel(logging.CRITICAL)
+    Logger.configure(packet_log="off")
+
+    print(f"{'сценарий':>26} {'допуск':>7} {'p50, мс':>8} {'p99, мс':>8} {'ответов':>8} "
+          f"{'флуд, пак/с':>12} {'усиление':>9} {'таблица':>10} {'отброшено':>10}")
+    port = PORT
+    for name, sources in (("без флуда", 0), ("флуд с одного адреса", 1),
+                          (f"флуд с {SPRAY_SOURCES} адресов", SPRAY_SOURCES)):
+        for admission in (False, True):
+            r = run(admission, sources, port)
+            port += PEERS + 2
+            f = r["flood"]
+            rate = f.get("sent", 0) / DURATION
+            gain = f.get("got_bytes", 0) / f["sent_bytes"] if f.get("sent_bytes") else 0.0
+            print(f"{name:>26} {'да' if admission else 'нет':>7} {r['p50'] * 1000:>8.2f} {r['p99'] * 1000:>8.2f} "
+                  f"{r['answered']:>8.1%} {rate:>12,.0f} {gain:>9.2f} "
+                  f"{r['table'][0]:>4} → {r['table'][1]:<4} {sum(r['dropped'].values()):>10,}")
+
+
+if __name__ == "__main__":
+    main()
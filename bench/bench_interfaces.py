@@ -0,0 +1,110 @@
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.interfaces import InterfaceMonitor
+from core.multipath import PathTable
+from core.node import Node
+from core.transport import Logger
+
+
+# сетевой статус для панели: опрос интерфейсов в вызывающем потоке против
+# снимка из кэша монитора; цена выбора пути на горячем пути; время, за которое
+# узел подтверждает запасные адреса пира и переводит трафик на быстрейший
+STATUS_CALLS = 200
+ROUTE_CALLS = 1_000_000
+PATH_PEERS = 1000
+PORT = 47900
+ALT_IPS = ("127.0.0.2", "127.0.0.3")
+
+
+class PanelStub:
+    def safe_update_status(self, *status):
+        pass
+
+
+def bench_status():
+    monitor = InterfaceMonitor(PORT)
+    t0 = time.perf_counter()
+    for _ in range(STATUS_CALLS):
+        monitor.refresh()
+    polled = (time.perf_counter() - t0) / STATUS_CALLS
+
+    node = Node("127.0.0.1", PORT, metrics=False)
+    node.transport.panel = PanelStub()
+    node.transport.monitor.start()
+    while node.transport.monitor.state is None:
+        time.sleep(0.01)
+    t0 = time.perf_counter()
+    for _ in range(STATUS_CALLS):
+        node.transport.update_panel_status()
+    cached = (time.perf_counter() - t0) / STATUS_CALLS
+    node.transport.stop()
+
+    print(f"{'статус панели':>20} {'мкс/вызов':>10}")
+    print(f"{'опрос на месте':>20} {polled * 1e6:>10.0f}")
+    netlink = "да" if node.transport.monitor.netlink else "нет"
+    print(f"{'снимок монитора':>20} {cached * 1e6:>10.1f}   (netlink: {netlink})")
+
+
+def bench_route():
+    table = PathTable()
+    now = time.time()
+    ids = {}
+    for i in range(PATH_PEERS):
+        primary, alt = (f"10.0.{i // 256}.{i % 256}", 5000), (f"192.168.{i // 256}.{i % 256}", 5000)
+        ids[primary] = ids[alt] = i + 1
+        table.advertise(primary, i + 1, [list(alt)], now)
+    for addr, nonce in table.due(now):
+        table.on_pong(nonce, ids[addr], now + 0.01)
+    known = ("10.0.1.1", 5000)
+    other = ("172.16.0.1", 5000)
+    print(f"\n{'выбор пути':>20} {'нс/пакет':>10}")
+    for name, addr in (("пир с путями", known), ("обычный пир", other)):
+        t0 = time.perf_counter()
+        for _ in range(ROUTE_CALLS):
+            table.route(addr)
+            table.primary(addr)
+        print(f"{name:>20} {(time.perf_counter() - t0) / ROUTE_CALLS * 1e9:>10.0f}")
+
+
+def bench_convergence():
+    a = Node("127.0.0.1", PORT + 1, metrics=False)
+    b = Node("127.0.0.1", PORT + 2, metrics=False)
+    # у b «ещё два интерфейса»: на loopback до любого адреса 127/8 доходит тот же сокет
+    b._advertised_addrs = lambda: [[ip, b.port] for ip in ALT_IPS]
+    a.start()
+    b.start()
+    t0 = time.perf_counter()
+    b.send_hello((a.host, a.port))
+    primary = (b.host, b.port)
+    confirmed = None
+    deadline = t0 + 5.0
+    while time.perf_counter() < deadline:
+        snap = {p: paths for p, _, paths in a.paths.snapshot()}
+        if primary in snap and all(srtt is not None for _, srtt in snap[primary]):
+            confirmed = time.perf_counter() - t0
+            break
+        time.sleep(0.005)
+    print(f"\nпути к пиру подтверждены за {confirmed * 1000:.0f} мс" if confirmed is not None
+          else "\nпути к пиру не подтверждены за 5 с")
+    for primary, current, paths in a.paths.snapshot():
+        rtts = ", ".join(f"{ip}:{port} {srtt * 1000:.2f} мс" for (ip, port), srtt in paths if srtt is not None)
+        print(f"  {primary[0]}:{primary[1]} -> {current[0]}:{current[1]}  [{rtts}]")
+    a.stop()
+    b.stop()
+
+
+def main():
+    logging.getLogger().setLevel(logging.WARNING)
+    Logger.configure(packet_log="off")
+    bench_status()
+    bench_route()
+    bench_convergence()
+
+
+if __name__ == "__main__":
+    main()
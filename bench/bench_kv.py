@@ -0,0 +1,149 @@
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.kv import LogStore
+from core.node import Node
+from core.transport import Logger
+
+
+NODES = 64
+BASE_PORT = 47300
+KEYS = 300
+VALUE_SIZE = 256
+CLIENTS = 8                 # одновременных запросов к сети
+ENGINE_KEYS = 100_000
+CHURN = 0.25                # доля узлов, останавливаемых перед повторным чтением
+SEED = 5
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def report(name, latencies, elapsed, ok):
+    print(f"{name:<22} {len(latencies) / elapsed:>8,.0f} оп/с  "
+          f"p50 {percentile(latencies, 0.5) * 1000:>6.2f} мс  p99 {percentile(latencies, 0.99) * 1000:>6.2f} мс  "
+          f"успешно {ok}/{len(latencies)}")
+
+
+def bench_engine():
+    # журнал сам по себе: запись, чтение из кэша и с диска, восстановление индекса
+    rng = random.Random(SEED)
+    value = os.urandom(VALUE_SIZE)
+    expires = time.time() + 3600
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.kv")
+        store = LogStore(path, cache_bytes=ENGINE_KEYS * VALUE_SIZE // 10)
+        keys = [rng.getrandbits(160) for _ in range(ENGINE_KEYS)]
+
+        t0 = time.perf_counter()
+        for i, key in enumerate(keys):
+            store.put(key, value, i + 1, expires)
+        put_rate = ENGINE_KEYS / (time.perf_counter() - t0)
+
+        hot = keys[:1000]
+        t0 = time.perf_counter()
+        for _ in range(20):
+            for key in hot:
+                store.get(key)
+        hot_rate = 20 * len(hot) / (time.perf_counter() - t0)
+
+        sample = rng.sample(keys, 20_000)
+        store.cache.hits = store.cache.misses = 0
+        t0 = time.perf_counter()
+        for key in sample:
+            store.get(key)
+        cold_rate = len(sample) / (time.perf_counter() - t0)
+        hit_ratio = store.cache.hits / max(1, store.cache.hits + store.cache.misses)
+        store.close()
+
+        size = os.path.getsize(path)
+        t0 = time.perf_counter()
+        store = LogStore(path)
+        reopen = time.perf_counter() - t0
+        assert len(store) == ENGINE_KEYS
+        store.close()
+
+    print(f"журнал: {ENGINE_KEYS:,} ключей по {VALUE_SIZE} байт, {size / ENGINE_KEYS:.0f} байт/ключ на диске")
+    print(f"  запись {put_rate:,.0f}/с, чтение горячих {hot_rate:,.0f}/с, "
+          f"случайное чтение {cold_rate:,.0f}/с (попаданий в кэш {hit_ratio:.0%}), "
+          f"открытие {reopen * 1000:.0f} мс")
+
+
+def start_network():
+    nodes = [Node("127.0.0.1", BASE_PORT + i, metrics=False) for i in range(NODES)]
+    for node in nodes:
+        node.start()
+    for node in nodes[1:]:
+        node.connect(f"127.0.0.1:{BASE_PORT}")
+        time.sleep(0.05)
+    # таблицы сходятся поиском своего ID после ответа на HELLO
+    deadline = time.time() + 15
+    while time.time() < deadline and min(len(n.dht) for n in nodes) < NODES - 1:
+        time.sleep(0.2)
+    print(f"сеть: {NODES} узлов, пиров в таблице мин. {min(len(n.dht) for n in nodes)}")
+    return nodes
+
+
+def run_ops(name, nodes, op, keys):
+    rng = random.Random(SEED)
+
+    def one(key):
+        node = rng.choice(nodes)
+        t0 = time.perf_counter()
+        ok = op(node, key)
+        return time.perf_counter() - t0, ok
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(CLIENTS) as pool:
+        results = list(pool.map(one, keys))
+    elapsed = time.perf_counter() - t0
+    report(name, [r[0] for r in results], elapsed, sum(1 for r in results if r[1]))
+
+
+def main():
+    logging.getLogger().setLevel(logging.WARNING)
+    Logger.configure(packet_log="off")
+
+    bench_engine()
+
+    nodes = start_network()
+    keys = [f"key-{i}" for i in range(KEYS)]
+    value = os.urandom(VALUE_SIZE)
+    try:
+        run_ops("put", nodes, lambda n, k: n.put(k, value) > 0, keys)
+        run_ops("get (первое чтение)", nodes, lambda n, k: n.get(k) == value, keys)
+        run_ops("get (повторное)", nodes, lambda n, k: n.get(k) == value, keys)
+
+        # горячий ключ: каждый узел читает его впервые — поиск обрывается на копиях пути
+        hot = "hot-key"
+        nodes[0].put(hot, value)
+        run_ops("get горячего ключа", nodes, lambda n, k: n.get(k) == value, [hot] * NODES)
+
+        # часть узлов уходит: копии остаются у оставшихся из k ближайших
+        rng = random.Random(SEED)
+        gone = rng.sample(nodes[1:], int(NODES * CHURN))
+        for node in gone:
+            node.stop()
+        alive = [n for n in nodes if n not in gone]
+        for node in alive:
+            node.kv_hot = type(node.kv_hot)(node.kv_hot.max_bytes)
+        run_ops(f"get после ухода {len(gone)} узлов", alive, lambda n, k: n.get(k) == value, keys)
+        copies = sum(len(n.kv) for n in alive) / (KEYS + 1)
+        print(f"копий на ключ у оставшихся узлов: {copies:.1f}")
+    finally:
+        for node in nodes:
+            if node.running:
+                node.stop()
+
+
+if __name__ == "__main__":
+    main()
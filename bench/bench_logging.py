@@ -0,0 +1,92 @@
+import datetime
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core.transport as transport_module
+from core.transport import Transport, Logger
+
+
+DURATION = 2.0
+PAYLOAD = b"x" * 120
+PORT = 49000
+
+
+def blast(port, duration):
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    target = ("127.0.0.1", port)
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        for _ in range(256):
+            try:
+                s.sendto(PAYLOAD, target)
+            except OSError:
+                pass
+    s.close()
+
+
+def sync_recv(packet_type, size, ip, port):
+    # прежний Logger.recv: форматирование и print прямо в потоке приёма
+    ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[RECV] {ts} | {packet_type} | {size} bytes | from {ip}:{port}")
+
+
+def run(name, port):
+    received = [0]
+
+    def on_packet(data, addr):
+        received[0] += 1
+
+    transport = Transport("127.0.0.1", port, on_packet)
+    transport.start()
+
+    sender = multiprocessing.Process(target=blast, args=(port, DURATION), daemon=True)
+    cpu0 = time.process_time()
+    t0 = time.perf_counter()
+    sender.start()
+    sender.join()
+    time.sleep(0.1)
+    elapsed = time.perf_counter() - t0
+    cpu = time.process_time() - cpu0
+    transport.stop()
+    Logger.pipeline.flush()
+
+    n = received[0]
+    return f"{name:<28} {n / elapsed:>10,.0f} пак/с  CPU {cpu / max(n, 1) * 1e6:.2f} мкс/пакет"
+
+
+def main():
+    # консольный вывод лога уходит в /dev/null, результаты — в настоящий stdout
+    real_stdout = os.fdopen(os.dup(1), "w")
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+
+    modes = [
+        ("синхронный print (как было)", lambda: setattr(transport_module.Logger, "recv",
+                                                        staticmethod(sync_recv))),
+        ("лог пакетов выключен", lambda: Logger.configure(packet_log="off")),
+        ("фоновый конвейер", lambda: Logger.configure(packet_log="on")),
+        ("фоновый, 1 из 100", lambda: Logger.configure(packet_log="on", sample=100)),
+        ("фоновый, не более 500/с", lambda: Logger.configure(sample=1, rate=500)),
+    ]
+
+    original_recv = Logger.recv
+    for i, (name, setup) in enumerate(modes):
+        Logger.recv = original_recv
+        setup()
+        line = run(name, PORT + i)
+        real_stdout.write(line + "\n")
+        real_stdout.flush()
+
+    Logger.close()
+    st = Logger.pipeline.stats()
+    real_stdout.write(f"конвейер: записей {st['emitted']:,}, вытеснено из кольца {st['dropped']:,}, "
+                      f"отсеяно лимитами {st['suppressed']:,}\n")
+
+
+if __name__ == "__main__":
+    main()
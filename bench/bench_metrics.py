@@ -0,0 +1,76 @@
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.node import Node
+from core.transport import Logger
+
+
+DURATION = 2.0
+PORT = 49500
+REPEATS = 3
+
+
+def blast(port, duration):
+    packet = json.dumps({"type": "PING"}).encode("utf-8")
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    target = ("127.0.0.1", port)
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        for _ in range(128):
+            try:
+                s.sendto(packet, target)
+            except OSError:
+                pass
+        time.sleep(0.0005)
+    s.close()
+
+
+def run(metrics, port):
+    node = Node("127.0.0.1", port, metrics=metrics)
+    handled = [0]
+    on_packet = node._on_packet
+
+    def counting(data, addr):
+        handled[0] += 1
+        on_packet(data, addr)
+
+    node._on_packet = counting
+    node.start()
+
+    sender = multiprocessing.Process(target=blast, args=(port, DURATION), daemon=True)
+    cpu0 = time.process_time()
+    sender.start()
+    sender.join()
+    time.sleep(0.1)
+    cpu = time.process_time() - cpu0
+    node.stop()
+
+    return cpu / max(handled[0], 1) * 1e6, handled[0]
+
+
+def main():
+    Logger.configure(packet_log="off")
+
+    results = {True: [], False: []}
+    port = PORT
+    for _ in range(REPEATS):
+        for metrics in (False, True):
+            results[metrics].append(run(metrics, port))
+            port += 1
+
+    # лучший из повторов — меньше влияния шума планировщика
+    off = min(r[0] for r in results[False])
+    on = min(r[0] for r in results[True])
+    print(f"метрики выключены: {off:.2f} мкс CPU/пакет")
+    print(f"метрики включены:  {on:.2f} мкс CPU/пакет")
+    print(f"накладные расходы: {(on - off) / off * 100:+.1f}%")
+
+
+if __name__ == "__main__":
+    main()
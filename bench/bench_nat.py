@@ -0,0 +1,64 @@
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.sim import Simulation
+
+
+# локальный эмулятор NAT — виртуальная сеть core.sim: у узла за NAT свой внешний IP,
+# трансляция портов (cone или symmetric) и фильтрация входящих по адресу и порту
+NODES = 300
+DURATION = 60.0
+TARGET = 0.99
+SEED = 3
+
+# (название, доля узлов за NAT, доля симметричных среди них, должна ли сеть сойтись)
+SCENARIOS = (
+    ("cone 30%", 0.3, 0.0, True),
+    ("cone 60%", 0.6, 0.0, True),
+    ("+ symmetric", 0.3, 0.33, True),
+)
+
+
+def simulate(nat_fraction, symmetric_fraction):
+    logging.getLogger().setLevel(logging.WARNING)
+    with Simulation(nodes=NODES, nat_fraction=nat_fraction, symmetric_fraction=symmetric_fraction,
+                    seed=SEED) as sim:
+        return sim.run(DURATION, TARGET)
+
+
+def main():
+    print(f"{NODES} узлов, {DURATION:.0f} с виртуального времени")
+    print(f"{'сценарий':>12} {'сошлось, с':>10} {'итог':>7} {'внешний адрес':>14} "
+          f"{'symmetric':>10} {'пробито':>8} {'не пробито':>11} {'PUNCH, %':>9} {'через relay':>12} {'RELAY, %':>9}")
+    failed = []
+    for name, nat_fraction, symmetric_fraction, must_converge in SCENARIOS:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            result = pool.submit(simulate, nat_fraction, symmetric_fraction).result()
+
+        nat = result["nat"]
+        punch_packets = sum(n for t, n in result["by_type"].items() if t.startswith("PUNCH"))
+        relay_packets = result["by_type"].get("RELAY", 0)
+        at = f"{result['converged_at']:.0f}" if result["converged_at"] is not None else "—"
+        print(f"{name:>12} {at:>10} {result['final']:>7.1%} "
+              f"{nat['cone_discovered']:>6}/{nat['cone']:<7} "
+              f"{nat['symmetric_detected']:>4}/{nat['symmetric']:<5} "
+              f"{nat['punch_ok']:>8} {nat['punch_failed']:>11} "
+              f"{punch_packets / result['packets']:>9.1%} {nat['relayed']:>12} "
+              f"{relay_packets / result['packets']:>9.1%}")
+
+        if nat["cone_discovered"] < nat["cone"] * 0.95 or nat["symmetric_detected"] < nat["symmetric"]:
+            failed.append(name)
+        if must_converge and result["converged_at"] is None:
+            failed.append(name)
+
+    if failed:
+        print("РЕГРЕССИЯ:", ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.node import Node
+from core.peer import Peer, random_node_id
+from core.peer_cache import save_peers, load_peers, best_candidates
+from core.transport import Logger
+
+
+ENTRIES = 100_000
+REPEATS = 5
+PORT = 46000
+SWARM = 24
+
+
+def synthetic_peers(n):
+    now = time.time()
+    peers = []
+    for i in range(n):
+        peer = Peer((f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 1024 + i % 50000),
+                    random_node_id(), now - random.uniform(0, 86400))
+        peer.rtt = random.uniform(0.001, 0.3) if i % 4 else None
+        peer.score = random.random()
+        peers.append(peer)
+    return peers
+
+
+def bench_file(workdir):
+    path = os.path.join(workdir, "peers.cache")
+    peers = synthetic_peers(ENTRIES)
+
+    save = []
+    load = []
+    rank = []
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        save_peers(path, peers)
+        save.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        loaded = load_peers(path)
+        load.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        best_candidates(loaded)
+        rank.append(time.perf_counter() - t0)
+
+    assert len(loaded) == ENTRIES
+    print(f"{ENTRIES:,} записей, файл {os.path.getsize(path) / 1e6:.1f} МБ")
+    print(f"  сохранение:   {min(save) * 1000:8.1f} мс")
+    print(f"  загрузка:     {min(load) * 1000:8.1f} мс")
+    print(f"  ранжирование: {min(rank) * 1000:8.1f} мс")
+
+
+def wait_for(node, n, timeout=30.0):
+    t0 = time.perf_counter()
+    while len(node.dht) < n and time.perf_counter() - t0 < timeout:
+        time.sleep(0.01)
+    return time.perf_counter() - t0
+
+
+def bench_restart(workdir):
+    # рой узлов, к которому узел подключается с кэшем и без
+    swarm = [Node("127.0.0.1", PORT + i, metrics=False) for i in range(SWARM)]
+    for node in swarm:
+        node.start()
+
+    path = os.path.join(workdir, "restart.cache")
+    node = Node("127.0.0.1", PORT + 999, metrics=False, peer_cache=path)
+    node.start()
+    for peer in swarm:
+        node.send_hello((peer.host, peer.port))
+    wait_for(node, SWARM)
+    node.stop()
+
+    # прежний сокет освобождается только с выходом потока приёма — берём соседний порт
+    node = Node("127.0.0.1", PORT + 998, metrics=False, peer_cache=path)
+    node.start()
+    elapsed = wait_for(node, SWARM)
+    print(f"Перезапуск с кэшем: {len(node.dht)} пиров из {SWARM} за {elapsed:.2f} с")
+    node.stop()
+
+    for peer in swarm:
+        peer.stop()
+
+
+def main():
+    Logger.configure(packet_log="off")
+    with tempfile.TemporaryDirectory() as workdir:
+        bench_file(workdir)
+        bench_restart(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.protocol import PacketType, encode_packet, decode_packet
+from core.peer import random_node_id
+
+
+ROUNDS = 20_000
+
+
+def node_id():
+    return f"{random_node_id():040x}"
+
+
+def sample_packets():
+    peers = [[f"10.0.{i // 256}.{i % 256}", 5000 + i, node_id()] for i in range(20)]
+    return {
+        PacketType.HELLO: {
+            "type": "HELLO", "id": node_id(), "wire": 1,
+            "external": ("85.10.20.30", 5000), "local": ("192.168.1.10", 5000),
+        },
+        PacketType.MESSAGE: {"type": "MESSAGE", "text": "привет, узел! " * 4},
+        PacketType.NODE_LIST: {
+            "type": "NODE_LIST", "id": node_id(), "peers": peers, "wire": 1,
+            "external": ("85.10.20.30", 5000), "local": ("192.168.1.10", 5000),
+        },
+        PacketType.PING: {"type": "PING"},
+        PacketType.FIND_NODE: {
+            "type": "FIND_NODE", "id": node_id(), "rid": os.urandom(6).hex(), "target": node_id(),
+        },
+        PacketType.FIND_VALUE: {
+            "type": "FIND_VALUE", "id": node_id(), "rid": os.urandom(6).hex(), "key": node_id(),
+        },
+        PacketType.VALUE: {
+            "type": "VALUE", "id": node_id(), "rid": os.urandom(6).hex(), "key": node_id(),
+            "value": {"name": "file.bin", "size": 123456},
+        },
+    }
+
+
+def measure(fn, arg):
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn(arg)
+    return ROUNDS / (time.perf_counter() - t0)
+
+
+def main():
+    print(f"{'тип':<11} {'формат':<6} {'байт':>6} {'encode/с':>11} {'decode/с':>11}")
+
+    for ptype, packet in sample_packets().items():
+        for binary in (False, True):
+            data = encode_packet(packet, binary=binary)
+            # JSON превращает кортежи в списки — сравниваем после нормализации
+            assert decode_packet(data) == json.loads(json.dumps(packet))
+
+            enc = measure(lambda p: encode_packet(p, binary=binary), packet)
+            dec = measure(decode_packet, data)
+            name = "bin" if binary else "json"
+            print(f"{ptype.value:<11} {name:<6} {len(data):>6} {enc:>11,.0f} {dec:>11,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.lookup import key_to_id
+from core.pubsub import ACTIVE_VIEW
+from core.sim import Simulation
+
+
+# рассылка по теме в виртуальной сети core.sim: задержка доставки и доля
+# повторных копий — на стадии построения дерева, в установившемся режиме и после ухода узлов
+NODES = 300
+SUBSCRIBERS = 200
+MESSAGES = 40
+PUBLISH_INTERVAL = 0.5
+OVERLAY_WARMUP = 30.0       # виртуальных секунд на сборку оверлея темы
+DRAIN = 10.0                # после последней публикации — дождаться починки по IHAVE/GRAFT
+CHURN = 0.1                 # доля подписчиков, уходящих перед последней серией
+TOPIC = "bench"
+SEED = 7
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))] if ordered else 0.0
+
+
+def run():
+    logging.getLogger().setLevel(logging.WARNING)
+    with Simulation(nodes=NODES, seed=SEED) as sim:
+        sim.run(60.0)
+        rng = sim.rng
+        subscribers = rng.sample(list(sim.nodes.values()), SUBSCRIBERS)
+        arrivals = {}
+
+        for node in subscribers:
+            def on_message(data, node=node):
+                arrivals.setdefault(int(data), {})[node.node_id] = sim.clock.now
+            node.subscribe(TOPIC, on_message)
+        sim.loop.run_until(sim.clock.now + OVERLAY_WARMUP)
+
+        results = []
+        seq = 0
+
+        def series(name, live):
+            nonlocal seq
+            before = dict(sim.network.by_type)
+            stats_before = [dict(n.pubsub.stats) for n in live]
+            published = {}
+            start = sim.clock.now
+            for i in range(MESSAGES):
+                seq += 1
+                origin = rng.choice(live)
+                sim.loop.at(start + i * PUBLISH_INTERVAL, _publish, origin, seq, published, sim)
+            sim.loop.run_until(start + MESSAGES * PUBLISH_INTERVAL + DRAIN)
+
+            live_ids = {n.node_id for n in live}
+            latencies, delivered = [], 0
+            for s, t0 in published.items():
+                got = {k: v for k, v in arrivals.get(s, {}).items() if k in live_ids}
+                delivered += len(got)
+                latencies.extend(t - t0 for t in got.values())
+            expected = len(published) * (len(live) - 1)
+            sent = {t: sim.network.by_type.get(t, 0) - before.get(t, 0)
+                    for t in ("PUBLISH", "IHAVE", "GRAFT", "PRUNE")}
+            stats = {k: sum(n.pubsub.stats[k] - b[k] for n, b in zip(live, stats_before))
+                     for k in ("delivered", "duplicates", "graft")}
+            results.append({
+                "name": name,
+                "delivery": delivered / max(1, expected),
+                "p50": percentile(latencies, 0.5),
+                "p99": percentile(latencies, 0.99),
+                "redundancy": stats["duplicates"] / max(1, stats["delivered"]),
+                "publish_per_delivery": sent["PUBLISH"] / max(1, delivered),
+                "control_per_delivery": (sent["IHAVE"] + sent["GRAFT"] + sent["PRUNE"]) / max(1, delivered),
+                "grafts": stats["graft"],
+            })
+
+        series("построение дерева", subscribers)
+        series("установившийся", subscribers)
+
+        gone = rng.sample(subscribers, int(len(subscribers) * CHURN))
+        for node in gone:
+            node.stop()
+        live = [n for n in subscribers if n not in gone]
+        series(f"ушло {len(gone)} подписчиков", live)
+
+        topic_id = key_to_id(TOPIC)
+        degrees = [sum(n.pubsub.neighbours(topic_id)[:2]) for n in live]
+        return results, max(degrees), sum(degrees) / len(degrees)
+
+
+def _publish(origin, seq, published, sim):
+    if origin.running:
+        published[seq] = sim.clock.now
+        origin.publish(TOPIC, str(seq))
+
+
+def main():
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        results, max_degree, avg_degree = pool.submit(run).result()
+
+    print(f"{NODES} узлов, {SUBSCRIBERS} подписчиков, {MESSAGES} сообщений на серию, "
+          f"соседей в теме: в среднем {avg_degree:.1f}, максимум {max_degree} (предел {ACTIVE_VIEW})")
+    print(f"наивная рассылка: {SUBSCRIBERS - 1} отправок от автора на сообщение; "
+          f"заливка по оверлею: ~{avg_degree - 1:.1f} копий на доставку")
+    print(f"{'серия':>24} {'доставлено':>11} {'p50, мс':>8} {'p99, мс':>8} {'повторы':>8} "
+          f"{'PUBLISH/дост.':>14} {'служебных/дост.':>16} {'GRAFT':>6}")
+    for r in results:
+        print(f"{r['name']:>24} {r['delivery']:>11.1%} {r['p50'] * 1000:>8.0f} {r['p99'] * 1000:>8.0f} "
+              f"{r['redundancy']:>8.1%} {r['publish_per_delivery']:>14.2f} {r['control_per_delivery']:>16.2f} "
+              f"{r['grafts']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import heapq
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.protocol import encode_packet, decode_packet, PacketType
+from core.reliable import ReliableManager
+
+
+PAYLOAD = 256 * 1024
+MESSAGES = 8
+DELAY = 0.005
+JITTER = 0.003
+LOSS_RATES = (0.0, 0.01, 0.05, 0.10)
+
+
+class LossyLink:
+    # канал в памяти: задержка с разбросом (значит, и переупорядочивание) и потери
+    def __init__(self, loss, delay=DELAY, jitter=JITTER, seed=1):
+        self.loss = loss
+        self.delay = delay
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.heap = []
+        self.seq = 0
+        self.cond = threading.Condition()
+        self.running = True
+        self.endpoints = {}
+        self.sent = 0
+        self.lost = 0
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def sender(self, src):
+        def send(packet, dst):
+            data = encode_packet(packet, binary=True)
+            with self.cond:
+                self.sent += 1
+                if self.rng.random() < self.loss:
+                    self.lost += 1
+                    return
+                at = time.monotonic() + self.delay + self.rng.random() * self.jitter
+                self.seq += 1
+                heapq.heappush(self.heap, (at, self.seq, data, src, dst))
+                self.cond.notify()
+        return send
+
+    def _loop(self):
+        while self.running:
+            with self.cond:
+                while self.running and (not self.heap or self.heap[0][0] > time.monotonic()):
+                    timeout = self.heap[0][0] - time.monotonic() if self.heap else None
+                    self.cond.wait(timeout)
+                if not self.running:
+                    return
+                _, _, data, src, dst = heapq.heappop(self.heap)
+
+            packet = decode_packet(data)
+            manager = self.endpoints[dst]
+            if packet["type"] == PacketType.RDATA.value:
+                manager.on_data(packet, src)
+            else:
+                manager.on_ack(packet, src)
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+
+
+def run(loss):
+    a_addr, b_addr = ("10.0.0.1", 1), ("10.0.0.2", 2)
+    link = LossyLink(loss)
+    received = []
+    done = threading.Event()
+
+    def deliver(addr, payload):
+        received.append(len(payload))
+        if len(received) == MESSAGES:
+            done.set()
+
+    a = ReliableManager(link.sender(a_addr), lambda addr, payload: None)
+    b = ReliableManager(link.sender(b_addr), deliver)
+    link.endpoints = {a_addr: a, b_addr: b}
+    a.start()
+    b.start()
+
+    payload = os.urandom(PAYLOAD)
+    t0 = time.perf_counter()
+    futures = [a.send(b_addr, payload) for _ in range(MESSAGES)]
+    for f in futures:
+        f.result(timeout=120)
+    done.wait(timeout=10)
+    elapsed = time.perf_counter() - t0
+
+    stats = a.stats(b_addr)
+    a.stop()
+    b.stop()
+    link.stop()
+
+    ok = len(received) == MESSAGES and all(n == PAYLOAD for n in received)
+    return elapsed, stats, link, ok
+
+
+def main():
+    total = PAYLOAD * MESSAGES
+    print(f"{MESSAGES} x {PAYLOAD // 1024} КБ, задержка {DELAY * 1000:.0f}±{JITTER * 1000:.0f} мс")
+    print(f"{'потери':>7} {'время, с':>9} {'КБ/с':>9} {'перезапросов':>13} {'srtt, мс':>9} {'целостность':>12}")
+    for loss in LOSS_RATES:
+        elapsed, stats, link, ok = run(loss)
+        print(f"{loss * 100:>6.0f}% {elapsed:>9.2f} {total / elapsed / 1024:>9.0f} "
+              f"{stats.get('retransmits', 0):>13} {(stats.get('srtt') or 0) * 1000:>9.1f} "
+              f"{'да' if ok else 'НЕТ':>12}")
+
+
+if __name__ == "__main__":
+    main()
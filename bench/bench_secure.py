@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+
+from core.protocol import PacketType, encode_packet, decode_packet
+from core.peer import random_node_id
+from core.secure import Identity, SessionManager, NONCE
+
+
+ROUNDS = 20_000
+HANDSHAKES = 300
+ADDR_A = ("10.0.0.1", 5000)
+ADDR_B = ("10.0.0.2", 5000)
+
+
+def node_id():
+    return f"{random_node_id():040x}"
+
+
+def sample_packets():
+    peers = [[f"10.0.{i // 256}.{i % 256}", 5000 + i, node_id()] for i in range(20)]
+    return {
+        PacketType.PING: {"type": "PING", "nonce": 123456789, "ts": 987654321},
+        PacketType.FIND_NODE: {
+            "type": "FIND_NODE", "id": node_id(), "rid": os.urandom(6).hex(), "target": node_id(),
+        },
+        PacketType.NODE_LIST: {
+            "type": "NODE_LIST", "id": node_id(), "peers": peers, "wire": 1,
+            "external": ("85.10.20.30", 5000), "local": ("192.168.1.10", 5000),
+        },
+    }
+
+
+def handshake(a: SessionManager, b: SessionManager):
+    # HELLO hs=1 от a, ответ hs=2 от b — так же, как их разбирает Node
+    init = dict(a.hello_fields(ADDR_B), id=f"{a.identity.node_id:040x}")
+    _, reply, _, _ = b.on_hello(init, ADDR_A)
+    a.on_hello(dict(reply, id=f"{b.identity.node_id:040x}"), ADDR_B)
+
+
+def measure(fn, arg, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(ROUNDS):
+            fn(arg)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return ROUNDS / best
+
+
+def naive_seal(key):
+    # без кэша: шифр и nonce заново на каждый пакет, пакет склеивается из кусков
+    counter = [0]
+
+    def seal(data):
+        counter[0] += 1
+        header = bytes([0xA9]) + counter[0].to_bytes(8, "big")
+        return header + ChaCha20Poly1305(key).encrypt(NONCE.pack(counter[0]), data, header)
+    return seal
+
+
+def main():
+    a = SessionManager(Identity(), lambda addr: None)
+    b = SessionManager(Identity(), lambda addr: None)
+
+    t0 = time.perf_counter()
+    for _ in range(HANDSHAKES):
+        handshake(a, b)
+    hs_rate = HANDSHAKES / (time.perf_counter() - t0)
+    print(f"рукопожатие (подписи, X25519, HKDF на обеих сторонах): {hs_rate:,.0f}/с")
+
+    tx, rx = a.get(ADDR_B), b.get(ADDR_A)
+    naive = naive_seal(os.urandom(32))
+
+    print(f"{'тип':<10} {'байт':>5} {'+шифр':>5} | {'отправка, пак/с':>27} | {'приём, пак/с':>21}")
+    print(f"{'':<10} {'':>5} {'':>5} | {'открыто':>8} {'сессия':>8} {'без кэша':>9} | "
+          f"{'открыто':>10} {'сессия':>10}")
+    for ptype, packet in sample_packets().items():
+        data = encode_packet(packet, binary=True)
+        sealed = tx.seal(data)
+        assert decode_packet(rx.open(sealed)) == decode_packet(data)
+        assert rx.open(sealed) is None
+
+        send_plain = measure(lambda p: encode_packet(p, binary=True), packet)
+        send_sealed = measure(lambda p: tx.seal(encode_packet(p, binary=True)), packet)
+        send_naive = measure(lambda p: naive(encode_packet(p, binary=True)), packet)
+        recv_plain = measure(decode_packet, data)
+        # окно счётчиков не пропустит один пакет дважды — каждому замеру свои номера
+        stream = iter([tx.seal(data) for _ in range(ROUNDS * 3)])
+        recv_sealed = measure(lambda _: decode_packet(rx.open(next(stream))), None)
+
+        print(f"{ptype.value:<10} {len(data):>5} {len(sealed) - len(data):>5} | "
+              f"{send_plain:>8,.0f} {send_sealed:>8,.0f} {send_naive:>9,.0f} | "
+              f"{recv_plain:>10,.0f} {recv_sealed:>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.sim import Simulation, NEIGHBOURS
+
+
+# кривые масштабирования; большие сети — аргументами (bench_sim.py 3000 10000),
+# 10 000 узлов считаются десятки минут и занимают около 2 ГБ
+SIZES = (100, 300, 1000)
+TARGET = 0.99
+DURATION = 60.0
+SEED = 1
+
+# регрессионные сценарии: (название, параметры, предел сходимости в виртуальных секундах)
+SCENARIO_NODES = 500
+SCENARIOS = (
+    ("базовый", {}, 30.0),
+    ("потери 5%", {"loss": 0.05}, 45.0),
+    ("NAT 30%", {"nat_fraction": 0.3}, 90.0),
+    ("churn 10%/мин", {"churn": 0.10}, 60.0),
+)
+
+
+def simulate(n, options):
+    logging.getLogger().setLevel(logging.WARNING)
+    with Simulation(nodes=n, seed=SEED, **options) as sim:
+        return sim.run(DURATION, TARGET)
+
+
+def run(n, options=None):
+    # каждый прогон — в отдельном процессе: так RSS на узел не искажают
+    # остатки предыдущих симуляций в куче
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(simulate, n, options or {}).result()
+
+
+def row(name, result):
+    at = f"{result['converged_at']:.0f}" if result["converged_at"] is not None else "—"
+    print(f"{name:>14} {at:>10} {result['final']:>8.1%} {result['packets_per_node_min']:>12.0f} "
+          f"{result['bytes'] / result['nodes'] / 1024:>10.1f} {result['rss_per_node_kb']:>10.1f} "
+          f"{result['wall_s']:>8.1f}")
+
+
+def header(first):
+    print(f"{first:>14} {'сошлось, с':>10} {'итог':>8} {'пакетов/у/мин':>12} {'КБ/узел':>10} "
+          f"{'КБ RSS/у':>10} {'реально, с':>8}")
+
+
+def main():
+    sizes = SIZES + tuple(int(arg) for arg in sys.argv[1:])
+
+    print(f"Сходимость: {TARGET:.0%} живых узлов знают своих {NEIGHBOURS} ближайших по XOR")
+    header("узлов")
+    for n in sizes:
+        row(str(n), run(n))
+
+    print()
+    print(f"Сценарии на {SCENARIO_NODES} узлах")
+    header("сценарий")
+    failed = []
+    for name, options, limit in SCENARIOS:
+        result = run(SCENARIO_NODES, options)
+        row(name, result)
+        if result["converged_at"] is None or result["converged_at"] > limit:
+            failed.append(name)
+
+    if failed:
+        print("РЕГРЕССИЯ: не сошлись в срок —", ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
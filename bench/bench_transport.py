@@ -0,0 +1,94 @@
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.transport import Transport, Logger
+
+
+DURATION = 2.0
+PAYLOAD = b"x" * 120
+PORT = 47000
+
+
+def run_mode(batched: bool, port: int):
+    received = [0]
+
+    def on_packet(data, addr):
+        received[0] += 1
+
+    transport = Transport("127.0.0.1", port, on_packet, batched=batched)
+    transport.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    transport.start()
+
+    # отправитель — отдельный процесс, чтобы CPU приёма мерился отдельно
+    sent = multiprocessing.Value("q", 0)
+    sender = multiprocessing.Process(target=blast, args=(port, DURATION, sent), daemon=True)
+
+    cpu0 = time.process_time()
+    t0 = time.perf_counter()
+    sender.start()
+    sender.join()
+    time.sleep(0.1)
+    elapsed = time.perf_counter() - t0
+    cpu = time.process_time() - cpu0
+
+    transport.stop()
+
+    n = received[0]
+    name = "пакетный" if batched else "обычный"
+    print(f"{name:<9} отправлено {sent.value:>9,}  принято {n:>9,}  "
+          f"{n / elapsed:>10,.0f} пак/с  CPU приёма {cpu / max(n, 1) * 1e6:.2f} мкс/пакет")
+
+
+def blast(port, duration, sent):
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    target = ("127.0.0.1", port)
+    deadline = time.perf_counter() + duration
+    count = 0
+    while time.perf_counter() < deadline:
+        for _ in range(256):
+            try:
+                s.sendto(PAYLOAD, target)
+            except OSError:
+                pass
+        count += 256
+    s.close()
+    sent.value = count
+
+
+def run_send(batched: bool, port: int, peers: int = 2000, ticks: int = 50):
+    transport = Transport("127.0.0.1", port, lambda d, a: None, batched=batched)
+    targets = [("127.0.0.1", 50000 + i % 1000) for i in range(peers)]
+
+    cpu0 = time.process_time()
+    t0 = time.perf_counter()
+    for _ in range(ticks):
+        with transport.batch():
+            for addr in targets:
+                transport.send(PAYLOAD, addr)
+    elapsed = time.perf_counter() - t0
+    cpu = time.process_time() - cpu0
+    transport.stop()
+
+    total = peers * ticks
+    name = "пакетный" if batched else "обычный"
+    print(f"{name:<9} рассылка heartbeat: {total / elapsed:>10,.0f} пак/с  "
+          f"CPU {cpu / total * 1e6:.2f} мкс/пакет")
+
+
+def main():
+    # логирование каждого пакета здесь только мешает измерению
+    Logger.configure(packet_log="off")
+
+    run_mode(False, PORT)
+    run_mode(True, PORT + 1)
+    run_send(False, PORT + 2)
+    run_send(True, PORT + 3)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.node import Node
+from core.peer import random_node_id
+
+
+PORT = 48000
+DURATION = 3.0
+CLIENTS = 4
+SOCKETS_PER_CLIENT = 16
+WINDOW = 16
+
+
+def client(port, duration, result):
+    # FIND_NODE с разных исходных портов: ядро раскидывает их по процессам
+    target = ("127.0.0.1", port)
+    socks = []
+    for _ in range(SOCKETS_PER_CLIENT):
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.settimeout(0.2)
+        socks.append(s)
+
+    packet = json.dumps({
+        "type": "FIND_NODE", "id": f"{random_node_id():040x}",
+        "rid": "00", "target": f"{random_node_id():040x}",
+    }).encode("utf-8")
+
+    replies = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        for s in socks:
+            for _ in range(WINDOW):
+                s.sendto(packet, target)
+        for s in socks:
+            for _ in range(WINDOW):
+                try:
+                    s.recvfrom(65535)
+                    replies += 1
+                except socket.timeout:
+                    break
+    result.value = replies
+
+
+def run(workers):
+    node = Node("127.0.0.1", PORT + workers, workers=workers)
+    node.start()
+    time.sleep(1.5 if workers > 1 else 0.2)
+
+    results = [multiprocessing.Value("q", 0) for _ in range(CLIENTS)]
+    procs = [multiprocessing.Process(target=client, args=(PORT + workers, DURATION, r))
+             for r in results]
+    t0 = time.perf_counter()
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - t0
+    node.stop()
+
+    return sum(r.value for r in results) / elapsed
+
+
+def main():
+    # логи каждого пакета во всех процессах — в /dev/null
+    saved = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+
+    rates = {}
+    for workers in (1, 2, 4):
+        os.dup2(devnull, 1)
+        try:
+            rates[workers] = run(workers)
+        finally:
+            sys.stdout.flush()
+            os.dup2(saved, 1)
+        print(f"процессов: {workers}  ответов/с: {rates[workers]:>10,.0f}  "
+              f"ускорение: {rates[workers] / rates[1]:.2f}x  (ядер: {os.cpu_count()})")
+
+
+if __name__ == "__main__":
+    main()
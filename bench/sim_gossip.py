@@ -0,0 +1,134 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.dht import DHT
+from core.gossip import build_digest, parse_digest, select_delta, pages, GOSSIP_INTERVAL
+from core.peer import random_node_id
+from core.protocol import PacketType, encode_packet
+
+
+SIZES = (100, 300, 1000, 2000)
+NEIGHBOURS = 5          # узел сошёлся, когда знает своих 5 истинно ближайших
+TARGET = 0.99           # доля сошедшихся узлов
+MAX_ROUNDS = 60
+STEADY_ROUNDS = 6       # раундов после сходимости для замера фонового трафика
+SEED = 7
+
+
+class SimNode:
+    def __init__(self, i):
+        self.addr = (f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 4000)
+        self.dht = DHT(random_node_id())
+        self.node_id = self.dht.node_id
+
+
+def wire_size(packet) -> int:
+    return len(encode_packet(packet, binary=True))
+
+
+def learn(node, entries):
+    for ip, port, idhex in entries:
+        node.dht.add_peer((ip, port), int(idhex, 16))
+
+
+def exchange_delta(a, b, stats):
+    # push-pull: a шлёт дайджест, b — разницу и свой дайджест, a — ответную разницу
+    digest = {"type": PacketType.GOSSIP.value, "id": f"{a.node_id:040x}", "nonce": random.getrandbits(32)}
+    digest.update(build_digest(a.dht.all_peers()))
+    stats["bytes"] += wire_size(digest)
+    b.dht.add_peer(a.addr, a.node_id)
+
+    delta = select_delta(b.dht.all_peers(), parse_digest(digest), a.node_id)
+    for i, page in enumerate(pages(delta) or [[]]):
+        reply = {"type": PacketType.GOSSIP_REPLY.value, "id": f"{b.node_id:040x}",
+                 "nonce": digest["nonce"], "peers": page}
+        if i == 0:
+            reply.update(build_digest(b.dht.all_peers()))
+            back = parse_digest(reply)
+        stats["bytes"] += wire_size(reply)
+        learn(a, page)
+
+    delta = select_delta(a.dht.all_peers(), back, b.node_id)
+    for page in pages(delta):
+        reply = {"type": PacketType.GOSSIP_REPLY.value, "id": f"{a.node_id:040x}",
+                 "nonce": digest["nonce"], "peers": page}
+        stats["bytes"] += wire_size(reply)
+        learn(b, page)
+
+
+def exchange_full(a, b, stats):
+    # старый способ: каждый раз вся таблица целиком, страницами
+    b.dht.add_peer(a.addr, a.node_id)
+    for src, dst in ((b, a), (a, b)):
+        for page in pages(src.dht.all_peers()):
+            packet = {"type": PacketType.NODE_LIST.value, "id": f"{src.node_id:040x}", "peers": page}
+            stats["bytes"] += wire_size(packet)
+            learn(dst, page)
+
+
+def converged(nodes, truth) -> float:
+    ok = 0
+    for node in nodes:
+        if all(addr in node.dht for addr in truth[node.addr]):
+            ok += 1
+    return ok / len(nodes)
+
+
+def simulate(n, exchange):
+    rng = random.Random(SEED)
+    random.seed(SEED)
+    nodes = [SimNode(i) for i in range(n)]
+
+    truth = {}
+    for node in nodes:
+        others = sorted((o for o in nodes if o is not node), key=lambda o: o.node_id ^ node.node_id)
+        truth[node.addr] = [o.addr for o in others[:NEIGHBOURS]]
+
+    # старт: каждый знает общий bootstrap-узел и двух случайных
+    for node in nodes[1:]:
+        node.dht.add_peer(nodes[0].addr, nodes[0].node_id)
+        for other in rng.sample(nodes, 2):
+            if other is not node:
+                node.dht.add_peer(other.addr, other.node_id)
+
+    by_addr = {node.addr: node for node in nodes}
+    stats = {"bytes": 0}
+
+    def run_round():
+        for node in nodes:
+            peers = list(node.dht.peers)
+            if peers:
+                exchange(node, by_addr[rng.choice(peers)], stats)
+
+    for rounds in range(1, MAX_ROUNDS + 1):
+        run_round()
+        if converged(nodes, truth) >= TARGET:
+            break
+    converging = stats["bytes"] / n / (rounds * GOSSIP_INTERVAL / 60)
+
+    # после сходимости: сколько стоит поддержание
+    stats["bytes"] = 0
+    for _ in range(STEADY_ROUNDS):
+        run_round()
+    steady = stats["bytes"] / n / (STEADY_ROUNDS * GOSSIP_INTERVAL / 60)
+
+    return rounds, converging, steady
+
+
+def main():
+    print(f"Сходимость: {TARGET:.0%} узлов знают своих {NEIGHBOURS} ближайших; раунд = {GOSSIP_INTERVAL} с")
+    print("КБ/узел/мин: при сходимости / после неё")
+    print(f"{'узлов':>6} | {'дайджесты: раундов':>19} {'КБ/узел/мин':>14} | "
+          f"{'полные списки: раундов':>23} {'КБ/узел/мин':>14}")
+    for n in SIZES:
+        r_delta, c_delta, s_delta = simulate(n, exchange_delta)
+        r_full, c_full, s_full = simulate(n, exchange_full)
+        print(f"{n:>6} | {r_delta:>19} {c_delta / 1024:>6.1f} / {s_delta / 1024:<5.1f} | "
+              f"{r_full:>23} {c_full / 1024:>6.1f} / {s_full / 1024:<5.1f}")
+
+
+if __name__ == "__main__":
+    main()
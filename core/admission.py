@@ -0,0 +1,179 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from .protocol import PacketType, is_sealed, peek_type
+from .ratelimit import TokenBucket
+
+
+# допуск датаграмм до разбора: решение по IP отправителя и типу из заголовка
+# (peek_type), без JSON-декодирования. Таблица источников — LRU на ADMISSION_SOURCES
+# IP: флуд с подменённых адресов вытесняет старые записи, а не растит память
+ADMISSION_SOURCES = 4096
+
+# все пакеты одного IP, пакетов/с и запас
+SOURCE_RATE = 2000
+SOURCE_BURST = 4000
+
+# все непроверенные источники вместе: против флуда с множества подменённых IP,
+# каждый из которых укладывается в свою долю
+UNVERIFIED_RATE = 2000
+UNVERIFIED_BURST = 4000
+
+# дорогие для узла запросы: (пакетов/с, запас) на один IP. Ответы (NODE_LIST,
+# VALUE, CHUNK) идут пачками на наши же запросы — их ограничивает только доля
+# источника, а чужие списки пиров узел и так не берёт. STORE пишет на диск: запас
+# с учётом передачи копий пачкой по KV_HANDOFF_BATCH ключей.
+# Тип зашифрованного пакета не виден до расшифровки — только доля источника
+TYPE_LIMITS: Dict[str, Tuple[float, float]] = {
+    PacketType.HELLO.value: (2, 10),            # ответ — NODE_LIST из k пиров
+    PacketType.FIND_NODE.value: (200, 400),
+    PacketType.FIND_VALUE.value: (200, 400),
+    PacketType.GOSSIP.value: (1, 5),            # ответ — страницы пиров
+    PacketType.GOSSIP_REPLY.value: (4, 10),
+    PacketType.PUNCH_REQ.value: (2, 10),
+    PacketType.PUNCH_INTRO.value: (2, 10),      # ответ — серия PUNCH
+    PacketType.TOPIC_JOIN.value: (5, 20),
+    PacketType.STORE.value: (200, 1000),
+}
+
+# те же запросы от всех непроверенных источников вместе: флуд с множества
+# подменённых IP, каждый из которых укладывается в свою долю, упирается сюда,
+# а уже знакомые пиры этот бюджет не тратят
+UNVERIFIED_LIMITS: Dict[str, Tuple[float, float]] = {
+    PacketType.HELLO.value: (50, 200),
+    PacketType.GOSSIP.value: (20, 50),
+    PacketType.PUNCH_REQ.value: (20, 50),
+    PacketType.PUNCH_INTRO.value: (10, 20),
+    PacketType.TOPIC_JOIN.value: (50, 100),
+    PacketType.STORE.value: (50, 200),
+}
+
+# ограничение усиления: адресу, который ещё не доказал, что получает наши пакеты,
+# уходит не больше RESPONSE_RATIO байт на каждый байт от него, плюс стартовый
+# запас RESPONSE_ALLOWANCE на ответ HELLO. Пакеты до SMALL_PACKET байт не усиливают
+# трафик и проходят всегда — в том числе PING, которым адрес проверяется
+RESPONSE_RATIO = 3
+RESPONSE_ALLOWANCE = 4096
+RESPONSE_CREDIT_MAX = 64 * 1024
+SMALL_PACKET = 128
+
+# не чаще одной проверки адреса за столько секунд
+PROBE_INTERVAL = 5.0
+
+DROP_REASONS = ("source", "unverified", "type", "ratio")
+
+
+def source_key(addr):
+    # источник — IP; на loopback узлы одного хоста различаются только портом
+    ip = addr[0]
+    return addr if ip.startswith("127.") else ip
+
+
+class Source:
+    __slots__ = ("bucket", "types", "credit", "verified", "probed")
+
+    def __init__(self):
+        self.bucket = TokenBucket(SOURCE_RATE, burst=SOURCE_BURST)
+        self.types: Dict[str, TokenBucket] = {}
+        self.credit = RESPONSE_ALLOWANCE
+        # адрес проверен: мы написали ему первыми или он ответил на наш запрос
+        self.verified = False
+        self.probed = 0.0
+
+
+class Admission:
+    def __init__(self, limits: Dict[str, Tuple[float, float]] = None, sources: int = ADMISSION_SOURCES):
+        self.limits = TYPE_LIMITS if limits is None else limits
+        self.max_sources = sources
+        self._sources: "OrderedDict[object, Source]" = OrderedDict()
+        self._unverified = TokenBucket(UNVERIFIED_RATE, burst=UNVERIFIED_BURST)
+        self._unverified_types = {ptype: TokenBucket(rate, burst=burst)
+                                  for ptype, (rate, burst) in UNVERIFIED_LIMITS.items()}
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.dropped = dict.fromkeys(DROP_REASONS, 0)
+        self.evicted = 0
+        # ответ непроверенному адресу урезан — узел может проверить адрес PING'ом
+        self.on_unverified: Optional[Callable[[Tuple[str, int]], None]] = None
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    def _source(self, key) -> Source:
+        source = self._sources.get(key)
+        if source is None:
+            source = self._sources[key] = Source()
+            if len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._sources.move_to_end(key)
+        return source
+
+    def _drop(self, reason: str) -> bool:
+        self.dropped[reason] += 1
+        return False
+
+    # ---------------- ПРИЁМ ----------------
+
+    def admit(self, data, addr) -> bool:
+        # False — датаграмма отбрасывается до разбора
+        ptype = None if is_sealed(data) else peek_type(data)
+        limit = self.limits.get(ptype)
+        now = time.monotonic()
+        with self._lock:
+            source = self._source(source_key(addr))
+            # сначала доля источника: превысивший её не тратит общий бюджет
+            if not source.bucket.allow(1, now):
+                return self._drop("source")
+            if not source.verified and not self._unverified.allow(1, now):
+                return self._drop("unverified")
+            if limit is not None:
+                bucket = source.types.get(ptype)
+                if bucket is None:
+                    bucket = source.types[ptype] = TokenBucket(limit[0], burst=limit[1])
+                if not bucket.allow(1, now):
+                    return self._drop("type")
+                if not source.verified:
+                    total = self._unverified_types.get(ptype)
+                    if total is not None and not total.allow(1, now):
+                        return self._drop("type")
+            if not source.verified:
+                source.credit = min(RESPONSE_CREDIT_MAX, source.credit + RESPONSE_RATIO * len(data))
+            self.admitted += 1
+            return True
+
+    # ---------------- ОТПРАВКА ----------------
+
+    def allow_send(self, addr, size: int) -> bool:
+        probe = False
+        with self._lock:
+            source = self._sources.get(source_key(addr))
+            if source is None:
+                # первыми пишем мы: адрес выбран узлом, а не подставлен в чужой запрос
+                self._source(source_key(addr)).verified = True
+                return True
+            if source.verified or size <= SMALL_PACKET:
+                return True
+            if source.credit >= size:
+                source.credit -= size
+                return True
+            self.dropped["ratio"] += 1
+            now = time.monotonic()
+            if now - source.probed >= PROBE_INTERVAL:
+                source.probed = now
+                probe = True
+        if probe and self.on_unverified is not None:
+            self.on_unverified(addr)
+        return False
+
+    def verify(self, addr) -> None:
+        # адрес ответил на наш запрос — значит, получает наши пакеты
+        with self._lock:
+            self._source(source_key(addr)).verified = True
+
+    def is_verified(self, addr) -> bool:
+        source = self._sources.get(source_key(addr))
+        return source is not None and source.verified
@@ -0,0 +1,85 @@
+import asyncio
+import functools
+import logging
+import threading
+
+from .node import Node, SCHEDULER_TICK
+from .async_transport import AsyncTransport
+from .lookup import LOOKUP_ALPHA, QUERY_TIMEOUT
+
+
+class AsyncNode(Node):
+    transport_class = AsyncTransport
+
+    def __init__(self, host: str, port: int, panel=None, **transport_options):
+        super().__init__(host, port, panel=panel, **transport_options)
+        self.loop: asyncio.AbstractEventLoop = None
+        self._loop_thread: threading.Thread = None
+        self._heartbeat_handle: asyncio.TimerHandle = None
+
+    # ============================================================
+    #   ASYNC API
+    # ============================================================
+    async def start_async(self):
+        self._prepare_start(" (asyncio)")
+        await self.transport.start_async()
+        self._schedule_heartbeat()
+        self._finish_start()
+
+    async def stop_async(self):
+        if self._heartbeat_handle is not None:
+            self._heartbeat_handle.cancel()
+            self._heartbeat_handle = None
+        self._prepare_stop()
+        await self.transport.stop_async()
+        self._finish_stop()
+
+    async def lookup_async(self, key, alpha: int = LOOKUP_ALPHA, timeout: float = QUERY_TIMEOUT):
+        # поиск ждёт ответы блокирующе — уводим его из цикла событий
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.lookup, key, alpha, timeout))
+
+    async def lookup_value_async(self, key, alpha: int = LOOKUP_ALPHA, timeout: float = QUERY_TIMEOUT):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.lookup_value, key, alpha, timeout))
+
+    # ============================================================
+    #   HEARTBEAT (таймер цикла событий)
+    # ============================================================
+    def _schedule_heartbeat(self):
+        self._heartbeat_handle = self.transport.loop.call_later(
+            SCHEDULER_TICK, self._on_heartbeat_timer
+        )
+
+    def _on_heartbeat_timer(self):
+        if not self.running:
+            return
+        try:
+            self._heartbeat_tick()
+        except Exception as e:
+            logging.error("Ошибка heartbeat: %s", e)
+        self._schedule_heartbeat()
+
+    # ============================================================
+    #   СИНХРОННЫЙ АДАПТЕР (CLI, Qt-панель)
+    # ============================================================
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._loop_thread.start()
+        asyncio.run_coroutine_threadsafe(self.start_async(), self.loop).result()
+        self._start_workers()
+
+    def stop(self):
+        if self.loop is None:
+            return
+        self._stop_workers()
+        try:
+            asyncio.run_coroutine_threadsafe(self.stop_async(), self.loop).result(timeout=5)
+        except Exception as e:
+            logging.error("Ошибка остановки узла: %s", e)
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._loop_thread.join(timeout=5)
+        self.loop.close()
+        self.loop = None
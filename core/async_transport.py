@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import threading
+
+from .transport import Transport, Logger
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, owner: "AsyncTransport"):
+        self.owner = owner
+
+    def datagram_received(self, data, addr):
+        self.owner._on_datagram(data, addr)
+
+    def error_received(self, exc):
+        # ICMP port unreachable (WinError 10054 и т.п.) — не повод останавливаться
+        logging.debug("Ошибка UDP: %s", exc)
+
+    def connection_lost(self, exc):
+        if exc is not None:
+            logging.error("Транспорт закрыт с ошибкой: %s", exc)
+
+
+class AsyncTransport(Transport):
+    # тот же сокет и сетевой статус, что у Transport, но приём и отправка
+    # идут через цикл событий asyncio вместо потока с recvfrom
+
+    def __init__(self, host: str, port: int, on_packet_callback, panel=None, batched=False,
+                 reuse_port=False, **pipeline_options):
+        # сокет вычитывает asyncio, кольца буферов и пакетной отправки Transport здесь
+        # нет — просьбу о них не выполнить молча
+        if batched:
+            raise ValueError("пакетный приём не поддерживается транспортом asyncio")
+        super().__init__(host, port, on_packet_callback, panel=panel, reuse_port=reuse_port,
+                         **pipeline_options)
+        self.loop: asyncio.AbstractEventLoop = None
+        self._dgram: asyncio.DatagramTransport = None
+        self._dgram6: asyncio.DatagramTransport = None
+        self._loop_thread_id = None
+
+    # ---------------- ЖИЗНЕННЫЙ ЦИКЛ ----------------
+
+    async def start_async(self):
+        self.loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._dgram, _ = await self.loop.create_datagram_endpoint(
+            lambda: _DatagramProtocol(self), sock=self.socket
+        )
+        if self.socket6 is not None:
+            self._dgram6, _ = await self.loop.create_datagram_endpoint(
+                lambda: _DatagramProtocol(self), sock=self.socket6
+            )
+        self.running = True
+        if self.pipeline is not None:
+            self.pipeline.start()
+        if self.monitor is not None:
+            self.monitor.start()
+        logging.info("Асинхронный транспорт запущен на %s:%s", self.host, self.port)
+
+    async def stop_async(self):
+        self.running = False
+        if self.monitor is not None:
+            self.monitor.stop()
+        if self._dgram is not None:
+            self._dgram.close()
+            self._dgram = None
+        if self._dgram6 is not None:
+            self._dgram6.close()
+            self._dgram6 = None
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        logging.info("Транспорт остановлен")
+
+    def start(self):
+        raise RuntimeError("AsyncTransport запускается через start_async() внутри цикла событий")
+
+    def stop(self):
+        if self.loop is None or not self.loop.is_running():
+            super().stop()
+            return
+        asyncio.run_coroutine_threadsafe(self.stop_async(), self.loop).result()
+
+    # ---------------- ПРИЁМ / ОТПРАВКА ----------------
+
+    def _on_datagram(self, data, addr):
+        if len(addr) > 2:
+            addr = addr[:2]
+        Logger.recv("RAW", len(data), addr[0], addr[1])
+        self.m_rx_packets.inc()
+        self.m_rx_bytes.inc(len(data))
+        if self.admission is not None and not self.admission.admit(data, addr):
+            return
+        if self.pipeline is not None:
+            self.pipeline.submit(data, addr)
+            return
+        # обработчик — отдельным шагом цикла, чтобы приём не ждал логику узла
+        self.loop.call_soon(self._handle, data, addr)
+
+    def send(self, data, addr):
+        if self._dgram is None:
+            return
+        if threading.get_ident() != self._loop_thread_id:
+            # вызов из чужого потока (CLI, поиск) — передаём в цикл событий
+            self.loop.call_soon_threadsafe(self.send, data, addr)
+            return
+        if self.admission is not None and not self.admission.allow_send(addr, len(data)):
+            return
+        self.m_tx_packets.inc()
+        self.m_tx_bytes.inc(len(data))
+        try:
+            Logger.send("RAW", len(data), addr[0], addr[1])
+            dgram = self._dgram6 if self._dgram6 is not None and ":" in addr[0] else self._dgram
+            dgram.sendto(data, addr)
+        except Exception as e:
+            self.m_tx_errors.inc()
+            logging.error("Ошибка отправки пакета: %s", e)
@@ -0,0 +1,540 @@
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .protocol import PacketType
+
+
+PIECE_SIZE = 256 * 1024     # единица проверки хеша
+BLOCK_SIZE = 16 * 1024      # единица запроса, помещается в одну датаграмму
+HASHES_PER_PAGE = 512       # хешей в одной странице манифеста
+
+PIPELINE_DEPTH = 8          # запросов в полёте на один источник
+MAX_INFLIGHT = 8            # всего в полёте: 8 × 16 КБ укладываются в стандартный буфер сокета (~208 КБ)
+REQUEST_TIMEOUT = 1.0
+MAX_FAILURES = 5            # подряд неудачных запросов — и источник отключается
+MANIFEST_RETRIES = 4
+STATE_EVERY = 16            # сохранять состояние загрузки каждые N кусков
+TICK = 0.05
+
+STATE_SUFFIX = ".blobstate"
+
+
+def safe_name(name) -> str:
+    # имя файла из манифеста не входит в ID блоба и приходит от источника как есть:
+    # годится только простое имя без каталогов, иначе загрузка пишет под ID блоба
+    if not isinstance(name, str):
+        return ""
+    if name in ("", ".", "..") or any(c in name for c in ("/", "\\", ":", "\0")):
+        return ""
+    return os.path.basename(name)
+
+
+# ============================================================
+#   МАНИФЕСТ
+# ============================================================
+class Manifest:
+    # описание блоба: размер, размер куска и sha1 каждого куска.
+    # ID блоба — sha1 от этого описания, так что манифест проверяется по ID
+
+    def __init__(self, size: int, piece_size: int, hashes: List[bytes], name: str = ""):
+        self.size = size
+        self.piece_size = piece_size
+        self.hashes = hashes
+        self.name = name
+        digest = hashlib.sha1(f"{size}:{piece_size}:".encode("ascii") + b"".join(hashes))
+        self.blob_id = int.from_bytes(digest.digest(), "big")
+
+    @classmethod
+    def from_file(cls, path: str, piece_size: int = PIECE_SIZE) -> "Manifest":
+        size = os.path.getsize(path)
+        hashes = []
+        if size:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                for offset in range(0, size, piece_size):
+                    hashes.append(hashlib.sha1(view[offset:offset + piece_size]).digest())
+                view.release()
+        return cls(size, piece_size, hashes, os.path.basename(path))
+
+    @property
+    def pieces(self) -> int:
+        return len(self.hashes)
+
+    @property
+    def pages(self) -> int:
+        return max(1, math.ceil(len(self.hashes) / HASHES_PER_PAGE))
+
+    def piece_range(self, piece: int) -> Tuple[int, int]:
+        start = piece * self.piece_size
+        return start, min(start + self.piece_size, self.size)
+
+    def blocks_in(self, piece: int) -> int:
+        start, end = self.piece_range(piece)
+        return math.ceil((end - start) / BLOCK_SIZE)
+
+    def page(self, n: int) -> dict:
+        chunk = self.hashes[n * HASHES_PER_PAGE:(n + 1) * HASHES_PER_PAGE]
+        return {
+            "size": self.size,
+            "piece": self.piece_size,
+            "name": self.name,
+            "pages": self.pages,
+            "hashes": [h.hex() for h in chunk],
+        }
+
+    @classmethod
+    def from_pages(cls, pages: List[dict]) -> "Manifest":
+        first = pages[0]
+        hashes = [bytes.fromhex(h) for page in pages for h in page["hashes"]]
+        return cls(int(first["size"]), int(first["piece"]), hashes, safe_name(first.get("name", "")))
+
+
+# ============================================================
+#   РАЗДАЧА
+# ============================================================
+class SharedBlob:
+    # файл отображается в память: в процессе живут только запрошенные блоки
+
+    def __init__(self, path: str, manifest: Manifest):
+        self.path = path
+        self.manifest = manifest
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if manifest.size else None
+
+    def read_block(self, piece: int, block: int) -> Optional[bytes]:
+        if self._mm is None or piece >= self.manifest.pieces:
+            return None
+        start, end = self.manifest.piece_range(piece)
+        offset = start + block * BLOCK_SIZE
+        if offset >= end:
+            return None
+        return self._mm[offset:min(offset + BLOCK_SIZE, end)]
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+
+# ============================================================
+#   ЗАГРУЗКА
+# ============================================================
+class _Source:
+    __slots__ = ("addr", "outstanding", "pieces", "missing", "failures", "dead", "received", "depth")
+
+    def __init__(self, addr):
+        self.addr = addr
+        self.outstanding: Dict[Tuple[int, int], float] = {}
+        self.pieces: List[int] = []
+        self.missing = set()
+        self.failures = 0
+        self.dead = False
+        self.received = 0
+        # глубина конвейера растёт на успехах и режется вдвое на потерях
+        self.depth = 2.0
+
+
+class BlobDownload:
+    # каждый кусок закреплён за одним источником, блоки куска запрашиваются
+    # у него конвейером; источники качают разные куски параллельно.
+    # Готовые куски пишутся прямо в отображённый в память файл
+
+    def __init__(self, manifest: Manifest, dest: str, providers, send_fn: Callable):
+        self.manifest = manifest
+        self.dest = dest
+        self.state_path = dest + STATE_SUFFIX
+        self.send_fn = send_fn
+        self.sources = [_Source(tuple(addr)) for addr in providers]
+
+        self._cond = threading.Condition()
+        self._done = threading.Event()
+        self._have = bytearray(manifest.pieces)
+        self._received: Dict[int, bytearray] = {}
+        self._requested: Dict[int, set] = {}
+        self._owner: Dict[int, _Source] = {}
+        self._since_save = 0
+        self._rr = 0
+        self._closed = False
+
+        mode = "r+b" if os.path.exists(dest) else "w+b"
+        self._file = open(dest, mode)
+        self._file.truncate(manifest.size)
+        self._mm = mmap.mmap(self._file.fileno(), 0) if manifest.size else None
+
+        self._load_state()
+        self._pending = deque(i for i in range(manifest.pieces) if not self._have[i])
+        self.resumed = manifest.pieces - len(self._pending)
+
+    # ---------------- СОСТОЯНИЕ ----------------
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get("blob") != f"{self.manifest.blob_id:040x}":
+            return
+        # после обрыва записи кусок мог остаться битым — перепроверяем
+        for piece in state.get("have", []):
+            if 0 <= piece < self.manifest.pieces and self._verify(piece):
+                self._have[piece] = 1
+
+    def _save_state(self):
+        if self._mm is not None:
+            self._mm.flush()
+        state = {
+            "blob": f"{self.manifest.blob_id:040x}",
+            "have": [i for i, h in enumerate(self._have) if h],
+        }
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
+
+    def _verify(self, piece: int) -> bool:
+        start, end = self.manifest.piece_range(piece)
+        return hashlib.sha1(self._mm[start:end]).digest() == self.manifest.hashes[piece]
+
+    # ---------------- ПЛАНИРОВАНИЕ ----------------
+
+    def _inflight(self) -> int:
+        return sum(len(s.outstanding) for s in self.sources)
+
+    def _next_block(self, source: _Source):
+        for piece in source.pieces:
+            requested = self._requested[piece]
+            received = self._received[piece]
+            for block in range(len(received)):
+                if not received[block] and block not in requested:
+                    return piece, block
+
+        # новый кусок — первый ожидающий, который у источника есть
+        for i, piece in enumerate(self._pending):
+            if piece not in source.missing:
+                del self._pending[i]
+                source.pieces.append(piece)
+                self._owner[piece] = source
+                self._received[piece] = bytearray(self.manifest.blocks_in(piece))
+                self._requested[piece] = set()
+                return piece, 0
+        return None
+
+    def _fill(self) -> List[Tuple[dict, tuple]]:
+        requests = []
+        alive = [s for s in self.sources if not s.dead]
+        if not alive:
+            return requests
+
+        inflight = self._inflight()
+        now = time.monotonic()
+        self._rr = (self._rr + 1) % len(alive)
+        for source in alive[self._rr:] + alive[:self._rr]:
+            while len(source.outstanding) < int(source.depth) and inflight < MAX_INFLIGHT:
+                nxt = self._next_block(source)
+                if nxt is None:
+                    break
+                piece, block = nxt
+                self._requested[piece].add(block)
+                source.outstanding[nxt] = now
+                inflight += 1
+                requests.append(({
+                    "type": PacketType.CHUNK_GET.value,
+                    "key": f"{self.manifest.blob_id:040x}",
+                    "piece": piece,
+                    "block": block,
+                }, source.addr))
+        return requests
+
+    def _release(self, source: _Source, piece: int):
+        # кусок возвращается в очередь, полученные блоки сбрасываются
+        if piece in source.pieces:
+            source.pieces.remove(piece)
+        for key in [k for k in source.outstanding if k[0] == piece]:
+            del source.outstanding[key]
+        self._owner.pop(piece, None)
+        self._received.pop(piece, None)
+        self._requested.pop(piece, None)
+        if not self._have[piece]:
+            self._pending.appendleft(piece)
+
+    def _fail(self, source: _Source):
+        source.failures += 1
+        if source.failures >= MAX_FAILURES and not source.dead:
+            source.dead = True
+            logging.warning("Источник %s отключён после %s ошибок", source.addr, source.failures)
+            for piece in list(source.pieces):
+                self._release(source, piece)
+
+    # ---------------- ПРИЁМ ----------------
+
+    def on_block(self, piece: int, block: int, data: Optional[bytes], addr) -> List[Tuple[dict, tuple]]:
+        with self._cond:
+            source = next((s for s in self.sources if s.addr == addr), None)
+            if self._closed or source is None or source.outstanding.pop((piece, block), None) is None:
+                return []
+
+            if data is None:
+                # у источника нет этого куска — пусть его качает другой
+                source.missing.add(piece)
+                self._release(source, piece)
+                if len(source.missing) >= self.manifest.pieces:
+                    source.dead = True
+                return self._fill()
+
+            received = self._received.get(piece)
+            start, end = self.manifest.piece_range(piece)
+            offset = start + block * BLOCK_SIZE
+            if received is None or offset + len(data) != min(offset + BLOCK_SIZE, end):
+                self._fail(source)
+                return self._fill()
+
+            self._mm[offset:offset + len(data)] = data
+            received[block] = 1
+            source.failures = 0
+            source.received += len(data)
+            source.depth = min(float(PIPELINE_DEPTH), source.depth + 1.0 / source.depth)
+
+            if all(received):
+                if self._verify(piece):
+                    self._have[piece] = 1
+                    source.pieces.remove(piece)
+                    self._owner.pop(piece, None)
+                    self._received.pop(piece, None)
+                    self._requested.pop(piece, None)
+                    self._since_save += 1
+                    if self._since_save >= STATE_EVERY:
+                        self._since_save = 0
+                        self._save_state()
+                    if not self._pending and not self._owner:
+                        self._done.set()
+                else:
+                    logging.warning("Кусок %s от %s не совпал по хешу", piece, source.addr)
+                    self._release(source, piece)
+                    self._fail(source)
+
+            return self._fill()
+
+    # ---------------- ЦИКЛ ----------------
+
+    def run(self) -> bool:
+        if not self._pending:
+            self._done.set()
+
+        with self._cond:
+            requests = self._fill()
+
+        while not self._done.is_set():
+            for packet, addr in requests:
+                self.send_fn(packet, addr)
+            if self._done.wait(TICK):
+                break
+
+            now = time.monotonic()
+            with self._cond:
+                for source in self.sources:
+                    lost = 0
+                    for key, sent_at in list(source.outstanding.items()):
+                        if now - sent_at >= REQUEST_TIMEOUT and source.outstanding.pop(key, None):
+                            requested = self._requested.get(key[0])
+                            if requested is not None:
+                                requested.discard(key[1])
+                            lost += 1
+                    # пачка потерь за один проход — одна ошибка, а не N
+                    if lost:
+                        source.depth = max(1.0, source.depth / 2)
+                        self._fail(source)
+                if all(s.dead for s in self.sources):
+                    self._save_state()
+                    return False
+                requests = self._fill()
+
+        with self._cond:
+            self._save_state()
+        return True
+
+    def close(self, complete: bool):
+        with self._cond:
+            self._closed = True
+            if self._mm is not None:
+                self._mm.close()
+            self._file.close()
+        if complete:
+            try:
+                os.remove(self.state_path)
+            except OSError:
+                pass
+
+    def progress(self) -> Tuple[int, int]:
+        return sum(self._have), self.manifest.pieces
+
+
+# ============================================================
+#   ХРАНИЛИЩЕ
+# ============================================================
+class _ManifestFetch:
+    def __init__(self, providers, pages: int = 0):
+        # страницы принимаются только от опрошенных источников
+        self.providers = {tuple(p) for p in providers}
+        self.pages: Dict[int, dict] = {}
+        self.total = pages
+        self.cond = threading.Condition()
+
+
+class BlobStore:
+    def __init__(self, send_fn: Callable[[dict, Tuple[str, int]], None]):
+        self.send_fn = send_fn
+        self.shared: Dict[int, SharedBlob] = {}
+        self.downloads: Dict[int, BlobDownload] = {}
+        self._manifests: Dict[int, _ManifestFetch] = {}
+        self._lock = threading.Lock()
+
+    def share(self, path: str, manifest: Manifest = None) -> Manifest:
+        if manifest is None:
+            manifest = Manifest.from_file(path)
+        blob = SharedBlob(path, manifest)
+        with self._lock:
+            old = self.shared.pop(manifest.blob_id, None)
+            self.shared[manifest.blob_id] = blob
+        if old is not None:
+            old.close()
+        return manifest
+
+    def close(self):
+        with self._lock:
+            blobs = list(self.shared.values())
+            self.shared.clear()
+        for blob in blobs:
+            blob.close()
+
+    # ---------------- ОТВЕТЫ ИСТОЧНИКА ----------------
+
+    def handle_manifest_get(self, packet, addr):
+        key = packet.get("key")
+        blob = self.shared.get(int(key, 16)) if key else None
+        if blob is None:
+            return
+        page = int(packet.get("page", 0))
+        if page >= blob.manifest.pages:
+            return
+        self.send_fn({
+            "type": PacketType.MANIFEST.value,
+            "key": key,
+            "page": page,
+            "value": blob.manifest.page(page),
+        }, addr)
+
+    def handle_chunk_get(self, packet, addr):
+        key = packet.get("key")
+        blob = self.shared.get(int(key, 16)) if key else None
+        piece = int(packet.get("piece", 0))
+        block = int(packet.get("block", 0))
+        data = blob.read_block(piece, block) if blob is not None else None
+        reply = {
+            "type": PacketType.CHUNK.value,
+            "key": key,
+            "piece": piece,
+            "block": block,
+        }
+        if data is not None:
+            reply["data"] = data
+        self.send_fn(reply, addr)
+
+    # ---------------- ОТВЕТЫ ЗАГРУЗЧИКУ ----------------
+
+    def on_manifest(self, packet, addr):
+        key = packet.get("key")
+        fetch = self._manifests.get(int(key, 16)) if key else None
+        value = packet.get("value")
+        if fetch is None or not isinstance(value, dict) or tuple(addr) not in fetch.providers:
+            return
+        with fetch.cond:
+            fetch.pages[int(packet.get("page", 0))] = value
+            fetch.total = int(value.get("pages", 1))
+            fetch.cond.notify_all()
+
+    def on_chunk(self, packet, addr):
+        key = packet.get("key")
+        download = self.downloads.get(int(key, 16)) if key else None
+        if download is None:
+            return
+        data = packet.get("data")
+        if not isinstance(data, bytes):
+            data = None
+        requests = download.on_block(int(packet.get("piece", 0)), int(packet.get("block", 0)), data, addr)
+        for request, to in requests:
+            self.send_fn(request, to)
+
+    # ---------------- ЗАГРУЗКА ----------------
+
+    def fetch_manifest(self, blob_id: int, providers) -> Optional[Manifest]:
+        fetch = self._manifests[blob_id] = _ManifestFetch(providers)
+        key = f"{blob_id:040x}"
+        try:
+            for attempt in range(MANIFEST_RETRIES):
+                with fetch.cond:
+                    missing = [p for p in range(max(fetch.total, 1)) if p not in fetch.pages]
+                for i, page in enumerate(missing):
+                    addr = tuple(providers[(attempt + i) % len(providers)])
+                    self.send_fn({"type": PacketType.MANIFEST_GET.value, "key": key, "page": page}, addr)
+
+                deadline = time.monotonic() + REQUEST_TIMEOUT
+                with fetch.cond:
+                    while time.monotonic() < deadline:
+                        if fetch.total and len(fetch.pages) >= fetch.total:
+                            break
+                        fetch.cond.wait(deadline - time.monotonic())
+                    if not (fetch.total and len(fetch.pages) >= fetch.total):
+                        continue
+                    pages = [fetch.pages[p] for p in range(fetch.total)]
+
+                manifest = Manifest.from_pages(pages)
+                if manifest.blob_id != blob_id:
+                    logging.warning("Манифест %s не совпадает с ID блоба", key)
+                    return None
+                return manifest
+            return None
+        finally:
+            self._manifests.pop(blob_id, None)
+
+    def fetch(self, blob_id: int, dest: str, providers) -> Optional[str]:
+        if not providers:
+            return None
+
+        manifest = self.fetch_manifest(blob_id, providers)
+        if manifest is None:
+            logging.warning("Не удалось получить манифест %040x", blob_id)
+            return None
+
+        if os.path.isdir(dest):
+            dest = os.path.join(dest, safe_name(manifest.name) or f"{blob_id:040x}")
+
+        download = BlobDownload(manifest, dest, providers, self.send_fn)
+        if download.resumed:
+            logging.info("Загрузка %s продолжена: %s/%s кусков уже есть",
+                         dest, download.resumed, manifest.pieces)
+
+        self.downloads[blob_id] = download
+        complete = False
+        try:
+            complete = download.run()
+        finally:
+            self.downloads.pop(blob_id, None)
+            download.close(complete)
+
+        if not complete:
+            done, total = download.progress()
+            logging.warning("Загрузка %s прервана: %s/%s кусков", dest, done, total)
+            return None
+
+        # скачанное сразу раздаётся дальше
+        self.share(dest, manifest)
+        return dest
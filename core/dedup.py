@@ -0,0 +1,122 @@
+import math
+import threading
+import time
+from typing import Optional
+
+
+# отсев повторов: ключ пакета — хеш (адрес отправителя, ID пакета) — помнится
+# не меньше REPLAY_WINDOW секунд. Память постоянная: REPLAY_GENERATIONS фильтров
+# Блума по REPLAY_CAPACITY ключей с вероятностью ложного срабатывания REPLAY_FP
+REPLAY_WINDOW = 30.0
+REPLAY_CAPACITY = 16384
+REPLAY_FP = 1e-4
+REPLAY_GENERATIONS = 2
+
+# окно счётчиков зашифрованной сессии: насколько пакет может отстать от самого нового
+COUNTER_WINDOW = 2048
+
+
+class ReplayFilter:
+    # вращающийся фильтр Блума: новые ключи — в текущее поколение, проверка — по всем.
+    # Поколение сменяется раз в window или раньше, когда в нём capacity ключей:
+    # под флудом окно укорачивается, но доля ложных срабатываний остаётся заданной
+
+    def __init__(self, capacity: int = REPLAY_CAPACITY, fp_rate: float = REPLAY_FP,
+                 window: float = REPLAY_WINDOW, generations: int = REPLAY_GENERATIONS):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.window = window
+        # m = -n·ln p / ln²2 бит, k = m/n·ln2 хешей — оптимум для n ключей и вероятности p
+        self.bits = max(64, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._generations = [bytearray((self.bits + 7) // 8) for _ in range(generations)]
+        self._count = 0
+        self._rotate_at = time.monotonic() + window
+        self._lock = threading.Lock()
+        self.duplicates = 0
+        self.rotations = 0
+        self.early_rotations = 0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(g) for g in self._generations)
+
+    def _indexes(self, key: int):
+        # двойное хеширование: ключ уже равномерный, его половины — два независимых хеша
+        h1 = key & 0xFFFFFFFF
+        h2 = (key >> 32) | 1
+        m = self.bits
+        return [(h1 + i * h2) % m for i in range(self.hashes)]
+
+    def _contains(self, indexes) -> bool:
+        for generation in self._generations:
+            for i in indexes:
+                if not generation[i >> 3] & (1 << (i & 7)):
+                    break
+            else:
+                return True
+        return False
+
+    def __contains__(self, key: int) -> bool:
+        # проверка без запоминания
+        return self._contains(self._indexes(key & 0xFFFFFFFFFFFFFFFF))
+
+    def seen(self, key: int, now: Optional[float] = None) -> bool:
+        # True — ключ уже встречался (пакет — повтор); иначе ключ запоминается
+        key &= 0xFFFFFFFFFFFFFFFF
+        indexes = self._indexes(key)
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            if now >= self._rotate_at or self._count >= self.capacity:
+                self._rotate(now)
+            if self._contains(indexes):
+                self.duplicates += 1
+                return True
+            current = self._generations[0]
+            for i in indexes:
+                current[i >> 3] |= 1 << (i & 7)
+            self._count += 1
+            return False
+
+    def _rotate(self, now: float) -> None:
+        if now < self._rotate_at:
+            self.early_rotations += 1
+        self.rotations += 1
+        oldest = self._generations.pop()
+        oldest[:] = bytes(len(oldest))
+        self._generations.insert(0, oldest)
+        self._count = 0
+        self._rotate_at = now + self.window
+
+
+class CounterWindow:
+    # скользящее окно номеров пакетов сессии (как в IPsec/WireGuard): номер проверяется
+    # до расшифровки, а принимается — только после проверки тега
+
+    __slots__ = ("size", "top", "bitmap", "_lock")
+
+    def __init__(self, size: int = COUNTER_WINDOW):
+        self.size = size
+        self.top = 0
+        # бит i — принят номер top - i
+        self.bitmap = 0
+        self._lock = threading.Lock()
+
+    def check(self, counter: int) -> bool:
+        if counter > self.top:
+            return True
+        offset = self.top - counter
+        return offset < self.size and not self.bitmap >> offset & 1
+
+    def accept(self, counter: int) -> bool:
+        with self._lock:
+            if counter > self.top:
+                shift = counter - self.top
+                self.bitmap = ((self.bitmap << shift) | 1) & ((1 << self.size) - 1) if shift < self.size else 1
+                self.top = counter
+                return True
+            offset = self.top - counter
+            if offset >= self.size or self.bitmap >> offset & 1:
+                return False
+            self.bitmap |= 1 << offset
+            return True
@@ -1,36 +1,293 @@
+import heapq
+import threading
 import time
-from typing import List, Tuple, Set, Dict
+from collections import OrderedDict
+from typing import Callable, List, Tuple, Dict, Optional
+
+from .peer import Peer, ID_BITS, node_id_from_addr, random_node_id
+from .rtt import update_rtt, latency_cost
+
+
+K_BUCKET_SIZE = 20
+STALE_TIMEOUT = 30
+
+# вес нового исхода в скользящей оценке надёжности пира
+SCORE_ALPHA = 0.2
+
+
+class KBucket:
+    def __init__(self, k: int):
+        self.k = k
+        # node_id -> Peer, от давно виденных к недавно виденным (LRU)
+        self.peers: "OrderedDict[int, Peer]" = OrderedDict()
+        # кандидаты на место вытесненных пиров
+        self.replacements: "OrderedDict[int, Peer]" = OrderedDict()
+
+    def __len__(self):
+        return len(self.peers)
+
+    def is_full(self) -> bool:
+        return len(self.peers) >= self.k
+
+    def touch(self, peer: Peer) -> None:
+        self.peers[peer.node_id] = peer
+        self.peers.move_to_end(peer.node_id)
+
+    def oldest(self) -> Optional[Peer]:
+        for peer in self.peers.values():
+            return peer
+        return None
+
+    def add_replacement(self, peer: Peer) -> None:
+        self.replacements[peer.node_id] = peer
+        self.replacements.move_to_end(peer.node_id)
+        while len(self.replacements) > self.k:
+            self.replacements.popitem(last=False)
+
+    def remove(self, node_id: int, promote: bool = True) -> Optional[Peer]:
+        peer = self.peers.pop(node_id, None)
+        if peer is None:
+            self.replacements.pop(node_id, None)
+            return None
+
+        # на освободившееся место — самый свежий кандидат
+        if promote and self.replacements:
+            _, candidate = self.replacements.popitem(last=True)
+            self.peers[candidate.node_id] = candidate
+        return peer
 
 
 class DHT:
-    def __init__(self):
-        self.peers: Set[Tuple[str, int]] = set()
-        self.last_seen: Dict[Tuple[str, int], float] = {}
+    def __init__(self, node_id: Optional[int] = None, k: int = K_BUCKET_SIZE,
+                 stale_timeout: float = STALE_TIMEOUT):
+        self.node_id = node_id if node_id is not None else random_node_id()
+        self.k = k
+        self.stale_timeout = stale_timeout
 
-    def add_peer(self, addr: Tuple[str, int]) -> None:
-        self.peers.add(addr)
-        self.last_seen[addr] = time.time()
+        # бакеты создаются при первом обращении: заняты лишь ~log2(N) из 160
+        self.buckets: List[Optional[KBucket]] = [None] * ID_BITS
+        self._by_addr: Dict[Tuple[str, int], Peer] = {}
+        self._lock = threading.RLock()
 
-    def remove_peer(self, addr: Tuple[str, int]) -> None:
-        self.peers.discard(addr)
-        self.last_seen.pop(addr, None)
+        # подписчики на изменения: fn(event, peer), event — "add" / "seen" / "remove"
+        self._listeners: List[Callable[[str, Peer], None]] = []
 
-    def get_peers(self) -> List[Tuple[str, int]]:
-        return sorted(self.peers)
+    # ============================================================
+    #   ВСПОМОГАТЕЛЬНОЕ
+    # ============================================================
+    def _bucket_index(self, node_id: int) -> int:
+        distance = self.node_id ^ node_id
+        if distance == 0:
+            return 0
+        return distance.bit_length() - 1
+
+    def _bucket_for(self, node_id: int) -> KBucket:
+        index = self._bucket_index(node_id)
+        bucket = self.buckets[index]
+        if bucket is None:
+            bucket = self.buckets[index] = KBucket(self.k)
+        return bucket
+
+    def __contains__(self, addr) -> bool:
+        return addr in self._by_addr
+
+    def __len__(self) -> int:
+        return len(self._by_addr)
+
+    @property
+    def peers(self):
+        return self._by_addr.keys()
+
+    @property
+    def last_seen(self) -> Dict[Tuple[str, int], float]:
+        with self._lock:
+            return {addr: p.last_seen for addr, p in self._by_addr.items()}
+
+    def all_peers(self) -> List[Peer]:
+        with self._lock:
+            return list(self._by_addr.values())
+
+    def get_peer(self, addr: Tuple[str, int]) -> Optional[Peer]:
+        return self._by_addr.get(addr)
+
+    def add_listener(self, fn: Callable[[str, Peer], None]) -> None:
+        self._listeners.append(fn)
+
+    def _notify(self, event: str, peer: Peer) -> None:
+        for fn in self._listeners:
+            try:
+                fn(event, peer)
+            except Exception:
+                pass
+
+    # ============================================================
+    #   ИЗМЕНЕНИЕ ТАБЛИЦЫ
+    # ============================================================
+    def add_peer(self, addr: Tuple[str, int], node_id: Optional[int] = None,
+                 notify: bool = True, ts: Optional[float] = None) -> bool:
+        if node_id is None:
+            node_id = node_id_from_addr(addr)
+        if node_id == self.node_id:
+            return False
+
+        now = ts if ts is not None else time.time()
 
-    def mark_seen(self, addr: Tuple[str, int]) -> None:
-        self.last_seen[addr] = time.time()
+        with self._lock:
+            existing = self._by_addr.get(addr)
+            if existing is not None and existing.node_id != node_id:
+                # узел сменил ID — старую запись убираем
+                self._remove(existing, notify=notify)
+
+            bucket = self._bucket_for(node_id)
+            peer = bucket.peers.get(node_id)
+
+            if peer is not None:
+                moved = peer.addr != addr
+                if moved:
+                    self._by_addr.pop(peer.addr, None)
+                    peer.addr = addr
+                peer.last_seen = max(peer.last_seen, now)
+                bucket.touch(peer)
+                self._by_addr[addr] = peer
+                if notify and self._listeners:
+                    self._notify("add" if moved else "seen", peer)
+                return True
+
+            peer = Peer(addr, node_id, now)
+
+            if bucket.is_full():
+                oldest = bucket.oldest()
+                if oldest is not None and now - oldest.last_seen > self.stale_timeout:
+                    # LRU-вытеснение: самый старый пир давно молчит
+                    self._remove(oldest, promote=False, notify=notify)
+                else:
+                    bucket.add_replacement(peer)
+                    return False
+
+            bucket.touch(peer)
+            self._by_addr[addr] = peer
+            if notify and self._listeners:
+                self._notify("add", peer)
+            return True
+
+    def _remove(self, peer: Peer, promote: bool = True, notify: bool = True) -> None:
+        bucket = self._bucket_for(peer.node_id)
+        bucket.remove(peer.node_id, promote)
+        self._by_addr.pop(peer.addr, None)
+        if notify and self._listeners:
+            self._notify("remove", peer)
+        if not promote:
+            return
+
+        # если место занял кандидат — регистрируем его адрес
+        for candidate in bucket.peers.values():
+            if candidate.addr not in self._by_addr:
+                self._by_addr[candidate.addr] = candidate
+                if notify and self._listeners:
+                    self._notify("add", candidate)
+
+    def remove_peer(self, addr: Tuple[str, int], notify: bool = True) -> None:
+        with self._lock:
+            peer = self._by_addr.get(addr)
+            if peer is not None:
+                self._remove(peer, notify=notify)
+
+    def mark_seen(self, addr: Tuple[str, int], ts: Optional[float] = None,
+                  notify: bool = True) -> None:
+        with self._lock:
+            peer = self._by_addr.get(addr)
+            if peer is None:
+                return
+            peer.last_seen = max(peer.last_seen, ts if ts is not None else time.time())
+            self._bucket_for(peer.node_id).touch(peer)
+            if notify and self._listeners:
+                self._notify("seen", peer)
+
+    def record_result(self, addr: Tuple[str, int], ok: bool) -> None:
+        peer = self._by_addr.get(addr)
+        if peer is not None:
+            peer.score += SCORE_ALPHA * ((1.0 if ok else 0.0) - peer.score)
+
+    def record_rtt(self, addr: Tuple[str, int], rtt: float) -> None:
+        with self._lock:
+            peer = self._by_addr.get(addr)
+            if peer is not None:
+                update_rtt(peer, rtt)
 
     def cleanup(self, timeout: float) -> None:
         now = time.time()
-        to_remove = []
 
-        for peer in list(self.peers):
-            ts = self.last_seen.get(peer)
-            if ts is None:
-                continue
-            if now - ts > timeout:
-                to_remove.append(peer)
+        with self._lock:
+            to_remove = [p for p in self._by_addr.values() if now - p.last_seen > timeout]
+            for peer in to_remove:
+                self._remove(peer)
+
+    # ============================================================
+    #   ЗАПРОСЫ
+    # ============================================================
+    def get_peers(self) -> List[Tuple[str, int]]:
+        with self._lock:
+            return sorted(self._by_addr)
+
+    def find_closest(self, target: int, k: Optional[int] = None,
+                     prefer_fast: bool = False) -> List[Peer]:
+        k = k or self.k
+        if not prefer_fast:
+            return self._closest_by_distance(target, k)
+
+        # из 2k ближайших берём k: сначала по порядку расстояния (старший бит XOR),
+        # внутри одного порядка — быстрые и стабильные
+        candidates = self._closest_by_distance(target, 2 * k)
+        candidates.sort(key=lambda p: ((p.node_id ^ target).bit_length(), latency_cost(p)))
+        return candidates[:k]
+
+    def _closest_by_distance(self, target: int, k: int) -> List[Peer]:
+
+        with self._lock:
+            index = self._bucket_index(target)
+            key = lambda p: p.node_id ^ target
+
+            # 1) бакет цели — ближайшие кандидаты
+            bucket = self.buckets[index]
+            result = heapq.nsmallest(k, bucket.peers.values(), key=key) if bucket else []
+            if len(result) >= k:
+                return result
+
+            # 2) все бакеты ниже дают расстояние в одном диапазоне [2^i, 2^(i+1))
+            lower = [p for b in self.buckets[:index] if b for p in b.peers.values()]
+            result.extend(heapq.nsmallest(k - len(result), lower, key=key))
+
+            # 3) бакеты выше — каждый следующий строго дальше предыдущего
+            for bucket in self.buckets[index + 1:]:
+                if len(result) >= k:
+                    break
+                if bucket:
+                    result.extend(heapq.nsmallest(k - len(result), bucket.peers.values(), key=key))
+
+            return result
+
+
+class DHTChangeLog:
+    # копит изменения DHT между выборками: для каждого адреса хранится
+    # только последнее состояние, так что выборка стоит O(изменившихся пиров)
+
+    def __init__(self, dht: DHT):
+        self._lock = threading.Lock()
+        self._upserts: Dict[Tuple[str, int], float] = {}
+        self._removed = set()
+        dht.add_listener(self._on_change)
+
+    def _on_change(self, event: str, peer: Peer) -> None:
+        with self._lock:
+            if event == "remove":
+                self._upserts.pop(peer.addr, None)
+                self._removed.add(peer.addr)
+            else:
+                self._removed.discard(peer.addr)
+                self._upserts[peer.addr] = peer.last_seen
 
-        for peer in to_remove:
-            self.remove_peer(peer)
+    def drain(self):
+        with self._lock:
+            upserts, self._upserts = self._upserts, {}
+            removed, self._removed = self._removed, set()
+        return [(ip, port, ts) for (ip, port), ts in upserts.items()], list(removed)
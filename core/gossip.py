@@ -0,0 +1,96 @@
+import hashlib
+import heapq
+import random
+from typing import Iterable, List, Optional
+
+from .peer import Peer
+
+
+# дайджест — фильтр Блума фиксированного размера: таблица Kademlia растёт
+# как k·log N, так что 512 байт хватает с запасом и объём раунда не зависит от сети
+BLOOM_BITS = 4096
+BLOOM_HASHES = 4
+# чужой дайджест: blake2b отдаёт не больше 64 байт — 16 хешей по 4 байта
+BLOOM_MAX_HASHES = 16
+BLOOM_MAX_BYTES = BLOOM_BITS // 8
+
+GOSSIP_INTERVAL = 10
+GOSSIP_PAGE = 32            # записей на страницу: 32 × 26 байт укладываются в MTU
+GOSSIP_MAX_PAGES = 2        # страниц за раунд
+
+
+class BloomFilter:
+    def __init__(self, bits: int = BLOOM_BITS, hashes: int = BLOOM_HASHES, salt: int = 0,
+                 data: Optional[bytes] = None):
+        self.bits = bits
+        self.hashes = hashes
+        # соль меняется каждый раунд, чтобы ложные срабатывания не повторялись
+        self.salt = salt
+        self.array = bytearray(data) if data is not None else bytearray(bits // 8)
+
+    def _indexes(self, item: bytes):
+        digest = hashlib.blake2b(item, digest_size=4 * self.hashes,
+                                 key=self.salt.to_bytes(8, "big")).digest()
+        for i in range(self.hashes):
+            yield int.from_bytes(digest[4 * i:4 * i + 4], "big") % self.bits
+
+    def add(self, item: bytes) -> None:
+        for index in self._indexes(item):
+            self.array[index >> 3] |= 1 << (index & 7)
+
+    def __contains__(self, item: bytes) -> bool:
+        return all(self.array[index >> 3] & (1 << (index & 7)) for index in self._indexes(item))
+
+
+def peer_key(peer: Peer) -> bytes:
+    # адрес входит в ключ: пир с новым адресом будет разослан заново
+    return peer.node_id.to_bytes(20, "big") + f"{peer.addr[0]}:{peer.addr[1]}".encode("ascii")
+
+
+def build_digest(peers: Iterable[Peer], salt: Optional[int] = None) -> dict:
+    bloom = BloomFilter(salt=salt if salt is not None else random.getrandbits(63))
+    for peer in peers:
+        bloom.add(peer_key(peer))
+    return {
+        "salt": bloom.salt,
+        "nh": bloom.hashes,
+        "bloom": bytes(bloom.array),
+    }
+
+
+def parse_digest(packet: dict) -> Optional[BloomFilter]:
+    try:
+        data = packet["bloom"]
+        hashes, salt = int(packet["nh"]), int(packet["salt"])
+    except (KeyError, ValueError, TypeError):
+        return None
+    if not isinstance(data, bytes):
+        return None
+    # пустой фильтр — деление на ноль в _indexes, лишние хеши — ValueError в blake2b,
+    # соль шире 8 байт — OverflowError
+    if not 0 < len(data) <= BLOOM_MAX_BYTES or not 0 < hashes <= BLOOM_MAX_HASHES:
+        return None
+    if not 0 <= salt < 1 << 64:
+        return None
+    return BloomFilter(len(data) * 8, hashes, salt, data)
+
+
+def select_delta(peers: Iterable[Peer], bloom: BloomFilter, requester_id: int,
+                 limit: int = GOSSIP_PAGE * GOSSIP_MAX_PAGES) -> List[Peer]:
+    # чего нет у собеседника: половина — ближайшие к нему (его ближние бакеты
+    # важнее всего для поиска), остальное — случайная выборка
+    missing = [p for p in peers if p.node_id != requester_id and peer_key(p) not in bloom]
+    if len(missing) <= limit:
+        return missing
+
+    near = heapq.nsmallest(limit // 2, missing, key=lambda p: p.node_id ^ requester_id)
+    chosen = {p.node_id for p in near}
+    rest = [p for p in missing if p.node_id not in chosen]
+    return near + random.sample(rest, limit - len(near))
+
+
+def pages(peers: List[Peer], size: int = GOSSIP_PAGE) -> List[list]:
+    return [
+        [[p.addr[0], p.addr[1], f"{p.node_id:040x}"] for p in peers[i:i + size]]
+        for i in range(0, len(peers), size)
+    ]
@@ -0,0 +1,215 @@
+import logging
+import select
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+
+# монитор интерфейсов: состояние опрашивается в своём потоке и кэшируется,
+# панель и узел читают готовый снимок. На Linux опрос будят события netlink,
+# иначе (и страховочно) — раз в MONITOR_INTERVAL секунд
+MONITOR_INTERVAL = 30.0
+# события netlink приходят пачкой (адрес, маршрут, состояние линка) — ждём тишины
+NETLINK_SETTLE = 0.5
+
+# группы рассылки NETLINK_ROUTE: линк поднялся/упал, адреса IPv4 и IPv6
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+
+# адреса, через которые выбирается интерфейс с маршрутом наружу (пакеты не отправляются)
+ROUTE_PROBE_V4 = ("8.8.8.8", 80)
+ROUTE_PROBE_V6 = ("2001:4860:4860::8888", 80)
+
+# префикс интерфейсов ZeroTier
+ZEROTIER_PREFIX = "zt"
+
+
+def route_ip(family: int = socket.AF_INET) -> Optional[str]:
+    # адрес интерфейса, через который ядро отправило бы пакет наружу
+    probe = ROUTE_PROBE_V6 if family == socket.AF_INET6 else ROUTE_PROBE_V4
+    try:
+        s = socket.socket(family, socket.SOCK_DGRAM)
+        try:
+            s.connect(probe)
+            return s.getsockname()[0]
+        finally:
+            s.close()
+    except Exception:
+        return None
+
+
+def get_local_ip() -> str:
+    return route_ip() or "127.0.0.1"
+
+
+def is_routable(ip: str) -> bool:
+    # адрес, который имеет смысл сообщать пирам: не loopback и не link-local
+    if ":" in ip:
+        return ip != "::1" and not ip.lower().startswith("fe80")
+    return not ip.startswith("127.") and not ip.startswith("169.254.")
+
+
+def list_interfaces() -> Dict[str, Tuple[str, ...]]:
+    # имя интерфейса -> его адреса IPv4 и IPv6 (без зоны у link-local)
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+
+    if psutil is None:
+        # без psutil известны только адреса с маршрутом наружу
+        found = tuple(ip for ip in (route_ip(), route_ip(socket.AF_INET6)) if ip)
+        return {"default": found} if found else {}
+
+    result = {}
+    for name, addrs in psutil.net_if_addrs().items():
+        found = tuple(a.address.split("%", 1)[0] for a in addrs
+                      if a.family in (socket.AF_INET, socket.AF_INET6))
+        if found:
+            result[name] = found
+    return result
+
+
+def check_udp(port: int) -> bool:
+    try:
+        test_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        test_sock.settimeout(0.2)
+        test_sock.sendto(b"PING", ("127.0.0.1", port))
+        test_sock.close()
+        return True
+    except Exception:
+        return False
+
+
+class InterfaceState(NamedTuple):
+    interfaces: Dict[str, Tuple[str, ...]]
+    local_ip: str
+    zerotier_ip: str
+    udp_ok: bool
+
+    def addresses(self, ipv6: bool = True) -> List[str]:
+        # все маршрутизируемые адреса узла, без повторов
+        seen = []
+        for addrs in self.interfaces.values():
+            for ip in addrs:
+                if is_routable(ip) and (ipv6 or ":" not in ip) and ip not in seen:
+                    seen.append(ip)
+        return seen
+
+
+def diff_interfaces(old: Dict[str, Tuple[str, ...]], new: Dict[str, Tuple[str, ...]]):
+    # (добавленные, удалённые) пары (интерфейс, адрес)
+    before = {(name, ip) for name, addrs in old.items() for ip in addrs}
+    after = {(name, ip) for name, addrs in new.items() for ip in addrs}
+    return sorted(after - before), sorted(before - after)
+
+
+class InterfaceMonitor:
+    # on_change(state, added, removed) вызывается из потока монитора,
+    # только когда снимок изменился (первый снимок — тоже изменение)
+
+    def __init__(self, port: int, on_change: Callable = None, interval: float = MONITOR_INTERVAL):
+        self.port = port
+        self.on_change = on_change
+        self.interval = interval
+        self.state: Optional[InterfaceState] = None
+        self.refreshes = 0
+        self.netlink = False
+        self._running = False
+        self._thread = None
+        # будильник потока: запрос обновления из любого потока без ожидания
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self.request_refresh()
+
+    def request_refresh(self):
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            # будильник уже взведён (буфер полон) или закрыт
+            pass
+
+    def refresh(self) -> bool:
+        interfaces = list_interfaces()
+        zerotier = next((ip for name, addrs in interfaces.items() if name.startswith(ZEROTIER_PREFIX)
+                         for ip in addrs if ":" not in ip), "не найден")
+        state = InterfaceState(interfaces, route_ip() or "неизвестно", zerotier, check_udp(self.port))
+        self.refreshes += 1
+
+        old, self.state = self.state, state
+        if old == state:
+            return False
+        added, removed = diff_interfaces(old.interfaces if old else {}, state.interfaces)
+        if self.on_change is not None:
+            try:
+                self.on_change(state, added, removed)
+            except Exception as e:
+                logging.error("Ошибка в обработчике смены интерфейсов: %s", e)
+        return True
+
+    # ---------------- ПОТОК ----------------
+
+    def _open_netlink(self):
+        if not hasattr(socket, "AF_NETLINK"):
+            return None
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+            sock.setblocking(False)
+            return sock
+        except OSError as e:
+            logging.info("netlink недоступен (%s) — интерфейсы опрашиваются раз в %.0f с", e, self.interval)
+            return None
+
+    @staticmethod
+    def _drain(sock) -> bool:
+        got = False
+        while True:
+            try:
+                if not sock.recv(65535):
+                    return got
+                got = True
+            except (BlockingIOError, InterruptedError):
+                return got
+            except OSError:
+                return got
+
+    def _run(self):
+        nl = self._open_netlink()
+        self.netlink = nl is not None
+        watched = [self._wake_r] + ([nl] if nl is not None else [])
+        try:
+            self.refresh()
+            while self._running:
+                try:
+                    ready, _, _ = select.select(watched, [], [], self.interval)
+                except (OSError, ValueError):
+                    break
+                if not self._running:
+                    break
+                if nl is not None and nl in ready:
+                    # дожидаемся конца пачки событий, затем один опрос
+                    deadline = time.monotonic() + NETLINK_SETTLE
+                    while self._drain(nl) and time.monotonic() < deadline:
+                        time.sleep(NETLINK_SETTLE / 5)
+                if self._wake_r in ready:
+                    self._drain(self._wake_r)
+                self.refresh()
+        except Exception as e:
+            logging.error("Ошибка монитора интерфейсов: %s", e)
+        finally:
+            if nl is not None:
+                nl.close()
+            self._wake_r.close()
+            self._wake_w.close()
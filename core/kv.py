@@ -0,0 +1,305 @@
+import io
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+
+# журнал на диске: заголовок, затем записи подряд — crc32 остатка записи | ключ |
+# когда истекает (unix) | версия (мс от эпохи, побеждает большая) | длина значения | значение.
+# В памяти только индекс: ключ -> где лежит последняя версия; старые версии — мусор до сжатия
+KV_MAGIC = b"AKV1"
+RECORD = struct.Struct("!I20sdQI")
+
+KV_MAX_VALUE = 16 * 1024        # значение должно помещаться в одну датаграмму, как блок блоба
+KV_TTL = 3600                   # срок жизни записи по умолчанию
+KV_MAX_TTL = 7 * 24 * 3600
+KV_READ_CACHE = 4 * 1024 * 1024     # байт значений в LRU-кэше чтения над журналом
+KV_HOT_CACHE = 1024 * 1024          # байт чужих горячих ключей (кэш на пути поиска)
+KV_HOT_TTL = 60                     # копии на пути живут недолго: источник правды — реплики
+
+# квота журнала: чужие STORE не должны заполнить диск. Новые ключи сверх квоты
+# не принимаются, пока старые не истекут
+KV_MAX_KEYS = 65536
+KV_MAX_BYTES = 64 * 1024 * 1024     # живых байт записей
+
+# сжатие журнала: когда мусора больше живых данных и не меньше этого
+COMPACT_MIN_GARBAGE = 1024 * 1024
+
+# репликация: ожидание подтверждений записи и поддержание k копий при смене соседей
+KV_WRITE_QUORUM = 3         # put() возвращается после стольких подтверждений
+KV_WRITE_TIMEOUT = 2.0
+KV_REPUBLISH = 600          # полная переотправка всех ключей ближайшим, раз в столько секунд
+KV_HANDOFF_BATCH = 256      # ключей за один тик heartbeat
+KV_HANDOFF_RANK = 2         # передают копию только столько ближайших к ключу реплик, а не все k
+KV_EXPIRE_INTERVAL = 30
+
+
+class Entry:
+    __slots__ = ("offset", "size", "expires", "version", "replicas")
+
+    def __init__(self, offset: int, size: int, expires: float, version: int):
+        self.offset = offset
+        self.size = size
+        self.expires = expires
+        self.version = version
+        # ID узлов, у которых по нашим сведениям есть копия (ближайшие к ключу)
+        self.replicas: Tuple[int, ...] = ()
+
+
+# ============================================================
+#   LRU ПО ОБЪЁМУ
+# ============================================================
+class LRUCache:
+    # ключ -> (значение, версия, истекает); вытесняет давние, пока объём значений не войдёт в лимит
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._items: "OrderedDict[int, Tuple[bytes, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key: int, now: Optional[float] = None) -> Optional[Tuple[bytes, int, float]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            if item[2] <= (now if now is not None else time.time()):
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item
+
+    def put(self, key: int, value: bytes, version: int, expires: float) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.get(key)
+            if old is not None:
+                if old[1] > version:
+                    return
+                self._drop(key)
+            self._items[key] = (value, version, expires)
+            self.nbytes += len(value)
+            while self.nbytes > self.max_bytes:
+                self._drop(next(iter(self._items)))
+
+    def discard(self, key: int) -> None:
+        with self._lock:
+            if key in self._items:
+                self._drop(key)
+
+    def _drop(self, key: int) -> None:
+        value = self._items.pop(key)[0]
+        self.nbytes -= len(value)
+
+
+# ============================================================
+#   ЖУРНАЛ НА ДИСКЕ
+# ============================================================
+class LogStore:
+    # path=None — тот же журнал в памяти (симуляция, тесты производительности)
+
+    def __init__(self, path: Optional[str] = None, cache_bytes: int = KV_READ_CACHE,
+                 max_keys: int = KV_MAX_KEYS, max_bytes: int = KV_MAX_BYTES):
+        self.path = path
+        self.index: dict = {}
+        self.cache = LRUCache(cache_bytes)
+        self.max_keys = max_keys
+        self.max_bytes = max_bytes
+        self.live_bytes = 0
+        self.garbage_bytes = 0
+        self.refused = 0
+        self._lock = threading.Lock()
+        self._file = self._open()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self.index
+
+    def _open(self):
+        if self.path is None:
+            f = io.BytesIO()
+            f.write(KV_MAGIC)
+            return f
+
+        t0 = time.perf_counter()
+        f = open(self.path, "a+b")
+        f.seek(0)
+        if f.read(len(KV_MAGIC)) != KV_MAGIC:
+            f.seek(0)
+            f.truncate()
+            f.write(KV_MAGIC)
+            f.flush()
+            return f
+
+        # индекс восстанавливается проходом по журналу; обрезанный или битый
+        # хвост (узел упал посреди записи) отбрасывается
+        end = self._scan(f)
+        f.seek(0, os.SEEK_END)
+        if f.tell() != end:
+            logging.warning("Журнал %s: отброшен битый хвост, %s байт", self.path, f.tell() - end)
+            f.truncate(end)
+        logging.info("Журнал %s: %s ключей за %.1f мс", self.path, len(self.index),
+                     (time.perf_counter() - t0) * 1000)
+        return f
+
+    def _scan(self, f) -> int:
+        now = time.time()
+        pos = len(KV_MAGIC)
+        f.seek(pos)
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                return pos
+            crc, raw_key, expires, version, size = RECORD.unpack(head)
+            value = f.read(size)
+            if len(value) < size or zlib.crc32(value, zlib.crc32(head[4:])) != crc:
+                return pos
+            key = int.from_bytes(raw_key, "big")
+            self._index(key, pos, RECORD.size + size, expires, version, now)
+            pos += RECORD.size + size
+
+    def _index(self, key, offset, size, expires, version, now) -> None:
+        old = self.index.get(key)
+        if old is not None:
+            if old.version > version:
+                self.garbage_bytes += size
+                return
+            self.garbage_bytes += old.size
+            self.live_bytes -= old.size
+        if expires <= now:
+            self.index.pop(key, None)
+            self.garbage_bytes += size
+            return
+        self.index[key] = Entry(offset, size, expires, version)
+        self.live_bytes += size
+
+    # ---------- чтение / запись ----------
+
+    def get(self, key: int, now: Optional[float] = None) -> Optional[Tuple[bytes, int, float]]:
+        # (значение, версия, истекает)
+        now = now if now is not None else time.time()
+        entry = self.index.get(key)
+        if entry is None or entry.expires <= now:
+            return None
+        cached = self.cache.get(key, now)
+        if cached is not None and cached[1] == entry.version:
+            return cached
+
+        with self._lock:
+            # запись могли заменить или сжатие могло её сдвинуть — смещение берётся под блокировкой
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+            self._file.seek(entry.offset + RECORD.size)
+            value = self._file.read(entry.size - RECORD.size)
+        self.cache.put(key, value, entry.version, entry.expires)
+        return value, entry.version, entry.expires
+
+    def put(self, key: int, value: bytes, version: int, expires: float) -> bool:
+        # False — у нас версия не старее (запись не нужна) или квота журнала исчерпана
+        head = RECORD.pack(0, key.to_bytes(20, "big"), expires, version, len(value))
+        crc = zlib.crc32(value, zlib.crc32(head[4:]))
+        size = RECORD.size + len(value)
+        with self._lock:
+            old = self.index.get(key)
+            if old is not None and old.version >= version:
+                return False
+            if (old is None and len(self.index) >= self.max_keys) \
+                    or self.live_bytes - (old.size if old is not None else 0) + size > self.max_bytes:
+                self.refused += 1
+                return False
+            self._file.seek(0, os.SEEK_END)
+            offset = self._file.tell()
+            self._file.write(struct.pack("!I", crc) + head[4:] + value)
+            self._file.flush()
+            replicas = old.replicas if old is not None else ()
+            self._index(key, offset, size, expires, version, time.time())
+            entry = self.index.get(key)
+            if entry is not None:
+                entry.replicas = replicas
+        self.cache.put(key, value, version, expires)
+        return True
+
+    def entry(self, key: int) -> Optional[Entry]:
+        return self.index.get(key)
+
+    def keys(self) -> List[int]:
+        return list(self.index)
+
+    # ---------- обслуживание ----------
+
+    def expire(self, now: Optional[float] = None) -> int:
+        now = now if now is not None else time.time()
+        with self._lock:
+            dead = [k for k, e in self.index.items() if e.expires <= now]
+            for key in dead:
+                entry = self.index.pop(key)
+                self.live_bytes -= entry.size
+                self.garbage_bytes += entry.size
+                self.cache.discard(key)
+        return len(dead)
+
+    def needs_compaction(self) -> bool:
+        return self.garbage_bytes >= COMPACT_MIN_GARBAGE and self.garbage_bytes > self.live_bytes
+
+    def compact(self) -> None:
+        # живые записи — в новый файл, затем атомарная подмена
+        with self._lock:
+            if self.path is None:
+                new = io.BytesIO()
+            else:
+                new = open(self.path + ".tmp", "w+b")
+            new.write(KV_MAGIC)
+            for key, entry in self.index.items():
+                self._file.seek(entry.offset)
+                record = self._file.read(entry.size)
+                entry.offset = new.tell()
+                new.write(record)
+            new.flush()
+
+            self._file.close()
+            if self.path is not None:
+                os.fsync(new.fileno())
+                os.replace(self.path + ".tmp", self.path)
+            self._file = new
+            self.garbage_bytes = 0
+        logging.info("Журнал сжат: %s ключей, %s байт", len(self.index), self.live_bytes)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class StoreWait:
+    # put() ждёт подтверждений STORED, пока их не станет need
+    __slots__ = ("need", "acks", "event", "_lock")
+
+    def __init__(self, need: int):
+        self.need = need
+        self.acks = 0
+        self.event = threading.Event()
+        self._lock = threading.Lock()
+        if need <= 0:
+            self.event.set()
+
+    def ack(self) -> None:
+        with self._lock:
+            self.acks += 1
+            if self.acks >= self.need:
+                self.event.set()
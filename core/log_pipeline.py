@@ -0,0 +1,200 @@
+import datetime
+import json
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Set
+
+from .ratelimit import TokenBucket
+
+
+RING_CAPACITY = 65536
+FLUSH_INTERVAL = 0.05       # ~20 кадров в секунду
+MAX_BATCH = 2000            # строк в панель за один кадр
+
+PACKET_CATEGORIES = ("SEND", "RECV")
+
+
+class LogPipeline:
+    # горячий путь только кладёт кортеж в кольцо; форматирование, print,
+    # запись в файл и обновление панели — в фоновом потоке пачками.
+    # deque.append/popleft атомарны под GIL, блокировка производителю не нужна
+
+    def __init__(self, capacity: int = RING_CAPACITY, flush_interval: float = FLUSH_INTERVAL):
+        self.ring = deque(maxlen=capacity)
+        self.flush_interval = flush_interval
+
+        self.console = True
+        self.disabled: Set[str] = set()
+        self.sample: Dict[str, int] = {}
+        self.limits: Dict[str, TokenBucket] = {}
+        self._sample_counters: Dict[str, int] = {}
+
+        self.panel_getter = lambda: None
+        self.jsonl = None
+
+        self.emitted = 0
+        self.dropped = 0
+        self.suppressed = 0
+
+        self._thread: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._running = False
+        self._ts_cache = (0, "")
+
+    # ============================================================
+    #   НАСТРОЙКА
+    # ============================================================
+    def configure(self, packet_log: str = None, sample: int = None, rate: float = None,
+                  jsonl_path: str = None, console: bool = None):
+        if packet_log == "off":
+            self.disabled.update(PACKET_CATEGORIES)
+        elif packet_log == "on":
+            self.disabled.difference_update(PACKET_CATEGORIES)
+
+        for category in PACKET_CATEGORIES:
+            if sample is not None:
+                if sample > 1:
+                    self.sample[category] = sample
+                else:
+                    self.sample.pop(category, None)
+            if rate is not None:
+                if rate > 0:
+                    self.limits[category] = TokenBucket(rate)
+                else:
+                    self.limits.pop(category, None)
+
+        if jsonl_path is not None:
+            if self.jsonl is not None:
+                self.jsonl.close()
+            self.jsonl = open(jsonl_path, "a", encoding="utf-8") if jsonl_path else None
+
+        if console is not None:
+            self.console = console
+
+    def enabled(self, category: str) -> bool:
+        return category not in self.disabled
+
+    # ============================================================
+    #   ГОРЯЧИЙ ПУТЬ
+    # ============================================================
+    def emit(self, category: str, *fields) -> None:
+        if category in self.disabled:
+            return
+
+        n = self.sample.get(category)
+        if n:
+            count = self._sample_counters.get(category, 0) + 1
+            self._sample_counters[category] = count
+            if count % n:
+                self.suppressed += 1
+                return
+
+        bucket = self.limits.get(category)
+        if bucket is not None and not bucket.allow():
+            self.suppressed += 1
+            return
+
+        ring = self.ring
+        if len(ring) == ring.maxlen:
+            self.dropped += 1
+        ring.append((time.time(), category, fields))
+        self.emitted += 1
+
+        if self._thread is None:
+            self.start()
+
+    # ============================================================
+    #   ФОНОВЫЙ ПОТОК
+    # ============================================================
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="log-pipeline", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+        self.flush()
+        if self.jsonl is not None:
+            self.jsonl.close()
+            self.jsonl = None
+
+    def _run(self):
+        while self._running:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                sys.stderr.write(f"Ошибка логирования: {e}\n")
+
+    def _ts(self, ts: float) -> str:
+        second = int(ts)
+        if self._ts_cache[0] != second:
+            text = datetime.datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+            self._ts_cache = (second, text)
+        return self._ts_cache[1]
+
+    def _format(self, ts, category, fields) -> str:
+        if category == "UI":
+            return fields[0]
+        if category in PACKET_CATEGORIES:
+            ptype, size, ip, port = fields
+            direction = "to" if category == "SEND" else "from"
+            return f"[{category}] {self._ts(ts)} | {ptype} | {size} bytes | {direction} {ip}:{port}"
+        return f"[{category}] {self._ts(ts)} | {fields[0]}"
+
+    def _record(self, ts, category, fields) -> dict:
+        if category in PACKET_CATEGORIES:
+            ptype, size, ip, port = fields
+            return {"ts": ts, "cat": category, "type": ptype, "size": size, "ip": ip, "port": port}
+        return {"ts": ts, "cat": category, "msg": fields[0]}
+
+    def flush(self):
+        ring = self.ring
+        if not ring:
+            return
+
+        console, panel_lines, records = [], [], []
+        while ring:
+            try:
+                ts, category, fields = ring.popleft()
+            except IndexError:
+                break
+            line = self._format(ts, category, fields)
+            if category != "UI":
+                console.append(line)
+                if self.jsonl is not None:
+                    records.append(json.dumps(self._record(ts, category, fields), ensure_ascii=False))
+            panel_lines.append(line)
+
+        if console and self.console:
+            sys.stdout.write("\n".join(console) + "\n")
+            sys.stdout.flush()
+
+        if records:
+            self.jsonl.write("\n".join(records) + "\n")
+            self.jsonl.flush()
+
+        panel = self.panel_getter()
+        if panel is not None and panel_lines:
+            # в панель попадает только хвост кадра — всё равно её лимит строк меньше
+            if len(panel_lines) > MAX_BATCH:
+                skipped = len(panel_lines) - MAX_BATCH
+                panel_lines = [f"... пропущено строк: {skipped}"] + panel_lines[-MAX_BATCH:]
+            panel.add_logs(panel_lines)
+
+    def stats(self) -> dict:
+        return {
+            "emitted": self.emitted,
+            "dropped": self.dropped,
+            "suppressed": self.suppressed,
+            "queued": len(self.ring),
+        }
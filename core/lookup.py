@@ -0,0 +1,134 @@
+import hashlib
+import os
+import queue
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .peer import Peer
+
+
+LOOKUP_ALPHA = 3
+QUERY_TIMEOUT = 2.0
+LOOKUP_DEADLINE = 15.0
+
+
+def key_to_id(key) -> int:
+    if isinstance(key, int):
+        return key
+    if isinstance(key, str) and len(key) == 40:
+        try:
+            return int(key, 16)
+        except ValueError:
+            pass
+    if isinstance(key, str):
+        key = key.encode("utf-8")
+    return int.from_bytes(hashlib.sha1(key).digest(), "big")
+
+
+def new_request_id() -> str:
+    return os.urandom(6).hex()
+
+
+class IterativeLookup:
+    # send_query(peer, rid) отправляет FIND_NODE / FIND_VALUE;
+    # ответы приходят через deliver() из потока транспорта
+
+    def __init__(self, target: int, seeds: List[Peer],
+                 send_query: Callable[[Peer, str], None],
+                 k: int, alpha: int = LOOKUP_ALPHA,
+                 query_timeout: float = QUERY_TIMEOUT,
+                 deadline: float = LOOKUP_DEADLINE,
+                 cost: Optional[Callable[[Peer], float]] = None):
+        self.target = target
+        self.send_query = send_query
+        # цена запроса к пиру (RTT): среди равноудалённых первыми опрашиваются дешёвые
+        self.cost = cost
+        self.k = k
+        self.alpha = alpha
+        self.query_timeout = query_timeout
+        self.deadline = deadline
+
+        self.shortlist: Dict[int, Peer] = {p.node_id: p for p in seeds}
+        self.queried = set()
+        self.responded = set()
+        self.failed = set()
+        self.in_flight: Dict[str, Tuple[Peer, float, float]] = {}
+        # ответившие пиры по порядку ответов и время их ответа
+        self.path: List[Tuple[Peer, float]] = []
+
+        self.replies: "queue.Queue" = queue.Queue()
+        self.value = None
+        self.value_found = False
+        self.closest: List[Peer] = []
+
+    def _distance(self, peer: Peer) -> int:
+        return peer.node_id ^ self.target
+
+    def _closest(self) -> List[Peer]:
+        alive = [p for nid, p in self.shortlist.items() if nid not in self.failed]
+        alive.sort(key=self._distance)
+        return alive[:self.k]
+
+    def _query_order(self) -> List[Peer]:
+        closest = self._closest()
+        if self.cost is not None:
+            closest.sort(key=lambda p: (self._distance(p).bit_length(), self.cost(p)))
+        return closest
+
+    # ============================================================
+    #   ОТВЕТЫ (поток транспорта)
+    # ============================================================
+    def deliver(self, rid: str, peers: Optional[List[Peer]] = None,
+                value=None, has_value: bool = False) -> None:
+        self.replies.put((rid, peers or [], value, has_value))
+
+    # ============================================================
+    #   ОСНОВНОЙ ЦИКЛ
+    # ============================================================
+    def run(self) -> List[Peer]:
+        started = time.monotonic()
+
+        while time.monotonic() - started < self.deadline:
+            # новые запросы: ближайшие ещё не опрошенные, не больше alpha в полёте
+            for peer in self._query_order():
+                if len(self.in_flight) >= self.alpha:
+                    break
+                if peer.node_id in self.queried:
+                    continue
+                rid = new_request_id()
+                self.queried.add(peer.node_id)
+                now = time.monotonic()
+                self.in_flight[rid] = (peer, now + self.query_timeout, now)
+                self.send_query(peer, rid)
+
+            # ранняя остановка: все k ближайших опрошены и ответили
+            if not self.in_flight:
+                break
+
+            wait = min(d for _, d, _ in self.in_flight.values()) - time.monotonic()
+            try:
+                rid, peers, value, has_value = self.replies.get(timeout=max(wait, 0))
+            except queue.Empty:
+                rid = None
+
+            if rid is not None and rid in self.in_flight:
+                peer, _, sent = self.in_flight.pop(rid)
+                self.responded.add(peer.node_id)
+                self.path.append((peer, time.monotonic() - sent))
+
+                if has_value:
+                    self.value = value
+                    self.value_found = True
+                    break
+
+                for p in peers:
+                    self.shortlist.setdefault(p.node_id, p)
+
+            # просроченные запросы считаем неудачными
+            now = time.monotonic()
+            for expired_rid in [r for r, (_, d, _) in self.in_flight.items() if d <= now]:
+                peer, _, _ = self.in_flight.pop(expired_rid)
+                self.failed.add(peer.node_id)
+
+        self.closest = [p for p in self._closest() if p.node_id in self.responded]
+        return self.closest
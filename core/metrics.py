@@ -0,0 +1,241 @@
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+
+# ============================================================
+#   ИНСТРУМЕНТЫ
+# ============================================================
+# без блокировок: под GIL редкая потеря инкремента дешевле мьютекса на каждый пакет
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value", "fn")
+
+    def __init__(self, fn: Callable[[], float] = None):
+        self.value = 0
+        self.fn = fn
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def get(self) -> float:
+        return self.fn() if self.fn is not None else self.value
+
+
+class Histogram:
+    # лог-линейные корзины в духе HDR: 2^SUB_BITS корзин на каждую степень двойки,
+    # относительная погрешность ~1/2^SUB_BITS при фиксированной памяти
+    SUB_BITS = 4
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * ((2 << self.SUB_BITS) + (64 << self.SUB_BITS))
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @classmethod
+    def _index(cls, v: int) -> int:
+        sub = cls.SUB_BITS
+        if v < (2 << sub):
+            return v
+        shift = v.bit_length() - (sub + 1)
+        return (2 << sub) + ((shift - 1) << sub) + ((v >> shift) - (1 << sub))
+
+    @classmethod
+    def _value(cls, index: int) -> int:
+        sub = cls.SUB_BITS
+        if index < (2 << sub):
+            return index
+        rest = index - (2 << sub)
+        shift = (rest >> sub) + 1
+        low = ((rest & ((1 << sub) - 1)) + (1 << sub)) << shift
+        # середина корзины
+        return low + (1 << (shift - 1))
+
+    def record(self, value: float) -> None:
+        v = int(value) if value > 0 else 0
+        self.counts[self._index(v)] += 1
+        self.count += 1
+        self.total += v
+        if v > self.max:
+            self.max = v
+        if self.min is None or v < self.min:
+            self.min = v
+
+    def percentile(self, q: float) -> int:
+        if self.count == 0:
+            return 0
+        rank = max(1, int(round(q / 100.0 * self.count)))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            if n:
+                seen += n
+                if seen >= rank:
+                    return min(self._value(index), self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class _Null:
+    # заглушка для выключенных метрик
+    value = 0
+    count = 0
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def record(self, value):
+        pass
+
+    def get(self):
+        return 0
+
+
+NULL = _Null()
+
+
+# ============================================================
+#   РЕЕСТР
+# ============================================================
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def escape_label(value) -> str:
+    # текстовый формат Prometheus: в значении метки экранируются \, " и перевод строки
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True, prefix: str = "atlan"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.counters: Dict[Key, Counter] = {}
+        self.gauges: Dict[Key, Gauge] = {}
+        self.histograms: Dict[Key, Histogram] = {}
+        self._lock = threading.Lock()
+        self._last_snapshot = (time.monotonic(), {})
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> Key:
+        return name, tuple(sorted(labels.items()))
+
+    def _get(self, table, cls, name, labels, *args):
+        key = self._key(name, labels)
+        metric = table.get(key)
+        if metric is None:
+            with self._lock:
+                metric = table.get(key)
+                if metric is None:
+                    metric = table[key] = cls(*args)
+        return metric
+
+    def counter(self, name: str, **labels) -> Counter:
+        if not self.enabled:
+            return NULL
+        return self._get(self.counters, Counter, name, labels)
+
+    def gauge(self, name: str, fn: Callable[[], float] = None, **labels) -> Gauge:
+        if not self.enabled:
+            return NULL
+        return self._get(self.gauges, Gauge, name, labels, fn)
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        if not self.enabled:
+            return NULL
+        return self._get(self.histograms, Histogram, name, labels)
+
+    # ============================================================
+    #   ВЫВОД
+    # ============================================================
+    @staticmethod
+    def _label_str(labels) -> str:
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{k}="{escape_label(v)}"' for k, v in labels) + "}"
+
+    def snapshot(self) -> dict:
+        # значения счётчиков и скорость их роста с прошлого снимка
+        now = time.monotonic()
+        last_time, last_values = self._last_snapshot
+        elapsed = max(now - last_time, 1e-9)
+
+        counters = {}
+        values = {}
+        for (name, labels), c in list(self.counters.items()):
+            key = name + self._label_str(labels)
+            values[key] = c.value
+            counters[key] = (c.value, (c.value - last_values.get(key, 0)) / elapsed)
+        self._last_snapshot = (now, values)
+
+        gauges = {name + self._label_str(labels): g.get()
+                  for (name, labels), g in list(self.gauges.items())}
+
+        histograms = {}
+        for (name, labels), h in list(self.histograms.items()):
+            histograms[name + self._label_str(labels)] = {
+                "count": h.count,
+                "mean": h.mean(),
+                "p50": h.percentile(50),
+                "p90": h.percentile(90),
+                "p99": h.percentile(99),
+                "max": h.max,
+            }
+
+        return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+    def format_text(self) -> str:
+        snap = self.snapshot()
+        lines = []
+        for key, (value, rate) in sorted(snap["counters"].items()):
+            lines.append(f"{key:<48} {value:>12,}  {rate:>10,.1f}/с")
+        for key, value in sorted(snap["gauges"].items()):
+            lines.append(f"{key:<48} {value:>12,}")
+        for key, h in sorted(snap["histograms"].items()):
+            lines.append(f"{key:<48} n={h['count']:,} p50={h['p50']} p90={h['p90']} "
+                         f"p99={h['p99']} max={h['max']}")
+        return "\n".join(lines)
+
+    def prometheus_text(self) -> str:
+        p = self.prefix
+        lines = []
+        typed = set()
+
+        def type_line(family, kind):
+            if family not in typed:
+                typed.add(family)
+                lines.append(f"# TYPE {family} {kind}")
+
+        for (name, labels), c in sorted(self.counters.items(), key=lambda kv: kv[0]):
+            type_line(f"{p}_{name}_total", "counter")
+            lines.append(f"{p}_{name}_total{self._label_str(labels)} {c.value}")
+
+        for (name, labels), g in sorted(self.gauges.items(), key=lambda kv: kv[0]):
+            type_line(f"{p}_{name}", "gauge")
+            lines.append(f"{p}_{name}{self._label_str(labels)} {g.get()}")
+
+        for (name, labels), h in sorted(self.histograms.items(), key=lambda kv: kv[0]):
+            type_line(f"{p}_{name}", "summary")
+            for q in (0.5, 0.9, 0.99):
+                ql = labels + (("quantile", str(q)),)
+                lines.append(f"{p}_{name}{self._label_str(ql)} {h.percentile(q * 100)}")
+            lines.append(f"{p}_{name}_sum{self._label_str(labels)} {h.total}")
+            lines.append(f"{p}_{name}_count{self._label_str(labels)} {h.count}")
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,226 @@
+import random
+import threading
+from typing import Dict, List, Optional, Tuple
+
+Addr = Tuple[str, int]
+
+
+# пути к пиру: адрес из таблицы DHT (основной) и другие адреса того же узла,
+# объявленные в его HELLO (LAN, ZeroTier, IPv6). Каждый адрес проверяется своим
+# PING'ом: PONG с ID пира подтверждает, что по нему отвечает тот же узел.
+# Исходящие пакеты идут по пути с наименьшим сглаженным RTT, входящие с
+# подтверждённого адреса узел видит как пришедшие с основного
+PATH_CANDIDATES = 8         # адресов на пира, не считая основного
+PATH_PEERS = 1024           # пиров с несколькими адресами
+PATH_PROBE_INTERVAL = 30.0  # перемер RTT каждого пути
+PATH_PROBE_TIMEOUT = 2.0    # без PONG за это время путь считается потерянным
+PATH_SWITCH = 0.8           # другой путь берётся, только если он быстрее текущего на 20%
+PATH_ALPHA = 0.25           # вес нового замера в сглаженном RTT
+
+
+class Path:
+    __slots__ = ("addr", "srtt", "nonce", "sent", "next_probe")
+
+    def __init__(self, addr: Addr, now: float):
+        self.addr = addr
+        self.srtt: Optional[float] = None
+        self.nonce: Optional[int] = None
+        self.sent = 0.0
+        self.next_probe = now
+
+
+class PeerPaths:
+    __slots__ = ("primary", "node_id", "paths")
+
+    def __init__(self, primary: Addr, node_id: int, now: float):
+        self.primary = primary
+        self.node_id = node_id
+        self.paths: Dict[Addr, Path] = {primary: Path(primary, now)}
+
+
+class PathTable:
+    def __init__(self):
+        self._peers: Dict[Addr, PeerPaths] = {}
+        # адрес-кандидат -> основной адрес его узла
+        self._owner: Dict[Addr, Addr] = {}
+        # подтверждённый адрес -> основной: для входящих
+        self._alias: Dict[Addr, Addr] = {}
+        # основной -> лучший путь, если это не он сам: для исходящих
+        self._route: Dict[Addr, Addr] = {}
+        # nonce проверки -> (основной, адрес пути)
+        self._probes: Dict[int, Tuple[Addr, Addr]] = {}
+        self._lock = threading.Lock()
+        self.switches = 0
+
+    def __len__(self) -> int:
+        return len(self._peers)
+
+    @property
+    def rerouted(self) -> int:
+        return len(self._route)
+
+    # ---------------- НА ГОРЯЧЕМ ПУТИ ----------------
+
+    def route(self, addr: Addr) -> Addr:
+        return self._route.get(addr, addr)
+
+    def primary(self, addr: Addr) -> Addr:
+        return self._alias.get(addr, addr)
+
+    # ---------------- КАНДИДАТЫ ----------------
+
+    def advertise(self, primary: Addr, node_id: int, addrs, now: float) -> None:
+        # адреса из HELLO пира; старые кандидаты, которых нет в новом списке, забываются
+        candidates = []
+        for item in addrs[:PATH_CANDIDATES]:
+            try:
+                addr = (str(item[0]), int(item[1]))
+            except (TypeError, ValueError, IndexError):
+                continue
+            if addr != primary and addr not in candidates:
+                candidates.append(addr)
+
+        with self._lock:
+            entry = self._peers.get(primary)
+            if entry is not None and entry.node_id != node_id:
+                self._forget(entry)
+                entry = None
+            if entry is None:
+                if not candidates or len(self._peers) >= PATH_PEERS:
+                    return
+                entry = self._peers[primary] = PeerPaths(primary, node_id, now)
+
+            for addr in list(entry.paths):
+                if addr != primary and addr not in candidates:
+                    self._drop_path(entry, addr)
+            for addr in candidates:
+                owner = self._owner.get(addr)
+                if owner is not None and owner != primary:
+                    # адрес уже объявлен другим узлом — не отдаём его никому
+                    continue
+                if addr not in entry.paths:
+                    entry.paths[addr] = Path(addr, now)
+                    self._owner[addr] = primary
+            self._choose(entry)
+
+    def expedite(self, addr: Addr, node_id: Optional[int]) -> None:
+        # пир проверяет путь с этого адреса — проверяем встречный сразу
+        with self._lock:
+            entry = self._peers.get(self._owner.get(addr))
+            if entry is not None and entry.node_id == node_id:
+                path = entry.paths.get(addr)
+                if path is not None and path.srtt is None and path.nonce is None:
+                    path.next_probe = 0.0
+
+    def reprobe(self) -> None:
+        # сменились свои интерфейсы — перемерить все пути
+        with self._lock:
+            for entry in self._peers.values():
+                for path in entry.paths.values():
+                    path.next_probe = 0.0
+
+    def drop(self, primary: Addr) -> None:
+        with self._lock:
+            entry = self._peers.get(primary)
+            if entry is not None:
+                self._forget(entry)
+
+    # ---------------- ПРОВЕРКИ ----------------
+
+    def due(self, now: float) -> List[Tuple[Addr, int]]:
+        # (адрес, nonce) для PING'ов проверки; пути без ответа теряют подтверждение
+        out = []
+        with self._lock:
+            for entry in self._peers.values():
+                lost = False
+                for path in entry.paths.values():
+                    if path.nonce is not None and now - path.sent > PATH_PROBE_TIMEOUT:
+                        self._probes.pop(path.nonce, None)
+                        path.nonce = None
+                        path.srtt = None
+                        self._alias.pop(path.addr, None)
+                        lost = True
+                    if path.nonce is None and now >= path.next_probe:
+                        path.nonce = random.getrandbits(32)
+                        path.sent = now
+                        path.next_probe = now + PATH_PROBE_INTERVAL
+                        self._probes[path.nonce] = (entry.primary, path.addr)
+                        out.append((path.addr, path.nonce))
+                if lost:
+                    self._choose(entry)
+        return out
+
+    def on_pong(self, nonce, node_id: Optional[int], now: float) -> Optional[Addr]:
+        # адрес проверенного пути; None — PONG не был ответом на проверку
+        with self._lock:
+            probe = self._probes.pop(nonce, None)
+            if probe is None:
+                return None
+            primary, addr = probe
+            entry = self._peers.get(primary)
+            path = entry.paths.get(addr) if entry is not None else None
+            if path is None or path.nonce != nonce:
+                return addr
+            path.nonce = None
+
+            if addr != primary and node_id != entry.node_id:
+                # по адресу отвечает другой узел (или старый без ID в PONG)
+                self._drop_path(entry, addr)
+                self._choose(entry)
+                return addr
+
+            rtt = now - path.sent
+            path.srtt = rtt if path.srtt is None else (1 - PATH_ALPHA) * path.srtt + PATH_ALPHA * rtt
+            if addr != primary:
+                self._alias[addr] = primary
+            self._choose(entry)
+            return addr
+
+    def snapshot(self) -> List[Tuple[Addr, Addr, List[Tuple[Addr, Optional[float]]]]]:
+        # (основной, текущий путь, [(адрес, srtt)]) — для вывода
+        with self._lock:
+            return [(e.primary, self._route.get(e.primary, e.primary),
+                     [(p.addr, p.srtt) for p in e.paths.values()]) for e in self._peers.values()]
+
+    # ---------------- ВНУТРЕННЕЕ (под блокировкой) ----------------
+
+    def _choose(self, entry: PeerPaths) -> None:
+        primary = entry.primary
+        current = self._route.get(primary, primary)
+        measured = [p for p in entry.paths.values() if p.srtt is not None]
+        best = min(measured, key=lambda p: p.srtt).addr if measured else primary
+
+        now_path = entry.paths.get(current)
+        if now_path is None or now_path.srtt is None:
+            chosen = best
+        elif best != current and entry.paths[best].srtt < now_path.srtt * PATH_SWITCH:
+            chosen = best
+        else:
+            chosen = current
+
+        if chosen != current:
+            self.switches += 1
+        if chosen == primary:
+            self._route.pop(primary, None)
+        else:
+            self._route[primary] = chosen
+
+    def _drop_path(self, entry: PeerPaths, addr: Addr) -> None:
+        path = entry.paths.pop(addr, None)
+        if path is not None and path.nonce is not None:
+            self._probes.pop(path.nonce, None)
+        self._alias.pop(addr, None)
+        if self._owner.get(addr) == entry.primary:
+            del self._owner[addr]
+        if self._route.get(entry.primary) == addr:
+            del self._route[entry.primary]
+
+    def _forget(self, entry: PeerPaths) -> None:
+        for addr in list(entry.paths):
+            if addr != entry.primary:
+                self._drop_path(entry, addr)
+        primary = entry.paths.get(entry.primary)
+        if primary is not None and primary.nonce is not None:
+            self._probes.pop(primary.nonce, None)
+        self._route.pop(entry.primary, None)
+        self._peers.pop(entry.primary, None)
@@ -1,29 +1,187 @@
 import socket
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
 
+from .interfaces import route_ip
 
-def get_local_ip() -> str:
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        try:
-            s.connect(("8.8.8.8", 80))
-            ip = s.getsockname()[0]
-        finally:
-            s.close()
-        return ip
-    except Exception:
-        return "127.0.0.1"
+
+# внешний адрес принимается, когда его одинаково видят столько разных пиров
+REFLEXIVE_QUORUM = 2
+# наблюдения старше этого не учитываются: NAT мог сменить привязку
+REFLEXIVE_MAX_AGE = 300
+REFLEXIVE_REPORTERS = 64
+
+# пробивка: встречные PUNCH каждые PUNCH_INTERVAL, пока не придёт ответ или не кончатся попытки
+PUNCH_INTERVAL = 0.25
+PUNCH_ATTEMPTS = 12
+PUNCH_MAX_SESSIONS = 16
+# адрес, который пробить не удалось, до этого срока не пробуется снова — к нему идут через relay
+PUNCH_RETRY = 300
 
 
 def get_external_address(sock: socket.socket):
+    # локальный кандидат: адрес интерфейса с маршрутом наружу и порт сокета.
+    # За NAT внешний адрес другой — его сообщают пиры (ReflexiveAddress)
+    ip = route_ip()
+    if ip is None:
+        return None
     try:
-        tmp = socket.socket(socket.AF_INET, socket.SGRAM)
-        try:
-            tmp.connect(("8.8.8.8", 80))
-            ip = tmp.getsockname()[0]
-        finally:
-            tmp.close()
-
         _, port = sock.getsockname()
-        return ip, port
     except Exception:
         return None
+    return ip, port
+
+
+# ============================================================
+#   ВНЕШНИЙ АДРЕС (как ответ STUN-сервера)
+# ============================================================
+class ReflexiveAddress:
+    # каждый PONG несёт адрес, с которого пир видел наш PING; пиры работают
+    # как STUN-серверы, а решение принимается голосованием
+
+    def __init__(self, local: Optional[Tuple[str, int]] = None, quorum: int = REFLEXIVE_QUORUM,
+                 max_age: float = REFLEXIVE_MAX_AGE):
+        self.local = local
+        self.quorum = quorum
+        self.max_age = max_age
+        self.address: Optional[Tuple[str, int]] = None
+        # пир -> (что он видит, когда)
+        self._seen: Dict[Tuple[str, int], Tuple[Tuple[str, int], float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, reporter, observed, now: Optional[float] = None) -> Optional[Tuple[str, int]]:
+        # возвращает новый внешний адрес, если он изменился
+        now = now if now is not None else time.time()
+        with self._lock:
+            self._seen.pop(reporter, None)
+            self._seen[reporter] = (tuple(observed), now)
+            if len(self._seen) > REFLEXIVE_REPORTERS:
+                del self._seen[next(iter(self._seen))]
+
+            votes = self._votes(now)
+            if not votes:
+                return None
+            address, count = votes.most_common(1)[0]
+            if count < self.quorum or address == self.address:
+                return None
+            self.address = address
+            return address
+
+    def _votes(self, now) -> Counter:
+        return Counter(addr for addr, when in self._seen.values() if now - when <= self.max_age)
+
+    def nat_type(self, now: Optional[float] = None) -> str:
+        # open — снаружи виден локальный адрес; cone — одна привязка для всех пиров;
+        # symmetric — у каждого адресата свой внешний порт, пробивка почти безнадёжна
+        now = now if now is not None else time.time()
+        with self._lock:
+            votes = self._votes(now)
+        if sum(votes.values()) < self.quorum:
+            return "unknown"
+        # разные IP при одном порту — не NAT, а несколько интерфейсов (пиры в LAN и снаружи)
+        ports: Dict[str, set] = {}
+        for ip, port in votes:
+            ports.setdefault(ip, set()).add(port)
+        if any(len(p) > 1 for p in ports.values()):
+            return "symmetric"
+        return "open" if self.local in votes else "cone"
+
+
+# ============================================================
+#   ПРОБИВКА (одновременное открытие через посредника)
+# ============================================================
+class PunchSession:
+    __slots__ = ("nonce", "addr", "node_id", "left", "next_at", "done")
+
+    def __init__(self, nonce: int, addr, node_id: Optional[int], now: float, attempts: int):
+        self.nonce = nonce
+        self.addr = addr
+        self.node_id = node_id
+        self.left = attempts
+        self.next_at = now
+        self.done = False
+
+
+class HolePuncher:
+    # A просит посредника R (PUNCH_REQ), R сообщает каждой стороне внешний адрес
+    # другой (PUNCH_INTRO), и обе шлют друг другу PUNCH, пока NAT не пропустит встречный
+
+    def __init__(self, interval: float = PUNCH_INTERVAL, attempts: int = PUNCH_ATTEMPTS):
+        self.interval = interval
+        self.attempts = attempts
+        self._sessions: Dict[int, PunchSession] = {}
+        # адрес -> до какого момента не пробивать
+        self._failed: Dict[Tuple[str, int], float] = {}
+        self._lock = threading.Lock()
+        self.stats = {"ok": 0, "failed": 0}
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def busy(self, addr) -> bool:
+        with self._lock:
+            return any(s.addr == addr for s in self._sessions.values())
+
+    def failed(self, addr, now: Optional[float] = None) -> bool:
+        now = now if now is not None else time.time()
+        with self._lock:
+            until = self._failed.get(addr)
+            if until is not None and until <= now:
+                del self._failed[addr]
+                return False
+            return until is not None
+
+    def begin(self, nonce: int, addr, node_id: Optional[int] = None,
+              now: Optional[float] = None, trusted: bool = True) -> bool:
+        # trusted=False — адрес назвал незнакомый посредник: один PUNCH вместо серии,
+        # и уже идущую пробивку он не перенаправит
+        now = now if now is not None else time.time()
+        with self._lock:
+            session = self._sessions.get(nonce)
+            if session is not None:
+                # посредник прислал адрес точнее того, что был в таблице
+                if trusted and addr is not None and addr != session.addr:
+                    session.addr = addr
+                    session.next_at = now
+                return True
+            if len(self._sessions) >= PUNCH_MAX_SESSIONS:
+                return False
+            self._sessions[nonce] = PunchSession(nonce, addr, node_id, now,
+                                                 self.attempts if trusted else 1)
+            return True
+
+    def due(self, now: Optional[float] = None) -> Tuple[List[PunchSession], List[PunchSession]]:
+        # (кому слать PUNCH сейчас, какие сессии исчерпали попытки)
+        now = now if now is not None else time.time()
+        send, failed = [], []
+        with self._lock:
+            for nonce, session in list(self._sessions.items()):
+                if session.next_at > now:
+                    continue
+                if session.left <= 0:
+                    del self._sessions[nonce]
+                    if session.addr is not None:
+                        self._failed[session.addr] = now + PUNCH_RETRY
+                    self.stats["failed"] += 1
+                    failed.append(session)
+                    continue
+                session.left -= 1
+                session.next_at = now + self.interval
+                if session.addr is not None:
+                    send.append(session)
+        return send, failed
+
+    def on_punch(self, nonce, addr) -> Optional[PunchSession]:
+        # первый PUNCH с нашим nonce — NAT пропустил встречный пакет
+        with self._lock:
+            session = self._sessions.pop(nonce, None)
+            if session is None:
+                return None
+            # за симметричным NAT пакет приходит с другого порта, чем сообщил посредник
+            session.addr = addr
+            session.done = True
+            self._failed.pop(addr, None)
+            self.stats["ok"] += 1
+            return session
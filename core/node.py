@@ -1,12 +1,33 @@
+import itertools
+import random
+import struct
 import threading
 import time
 import logging
-from typing import Tuple
+from typing import Tuple, Dict, Optional
 
 from .transport import Transport, Logger
-from .protocol import PacketType, encode_packet, decode_packet
-from .dht import DHT
-from .nat_traversal import get_external_address
+from .protocol import (PacketType, encode_packet, decode_packet, is_binary, peek_type, WIRE_VERSION,
+                       UnsupportedPacket, is_relay, encode_relay, relay_header, relay_path, forward_relay,
+                       is_sealed, stamp_packet_id, peek_packet_id)
+from .dht import DHT, DHTChangeLog
+from .peer import Peer, node_id_from_addr
+from .lookup import IterativeLookup, key_to_id, new_request_id, LOOKUP_ALPHA, QUERY_TIMEOUT
+from .nat_traversal import get_external_address, ReflexiveAddress, HolePuncher
+from .timer_wheel import TimerWheel
+from .metrics import MetricsRegistry
+from .reliable import ReliableManager
+from .blob import BlobStore
+from .peer_cache import load_peers, save_peers, best_candidates, PEER_CACHE_LIMIT
+from .rtt import RttTracker, latency_cost, percentile
+from .gossip import build_digest, parse_digest, select_delta, pages, GOSSIP_INTERVAL, GOSSIP_PAGE
+from .relay import RouteCache, RelayQuota, RELAY_TTL
+from .kv import (LogStore, LRUCache, StoreWait, KV_TTL, KV_MAX_TTL, KV_MAX_VALUE, KV_HOT_CACHE, KV_HOT_TTL,
+                 KV_WRITE_QUORUM, KV_WRITE_TIMEOUT, KV_REPUBLISH, KV_HANDOFF_BATCH, KV_HANDOFF_RANK,
+                 KV_EXPIRE_INTERVAL)
+from .pubsub import PubSub
+from .dedup import ReplayFilter, REPLAY_CAPACITY, REPLAY_FP
+from .multipath import PathTable
 
 
 logging.basicConfig(
@@ -15,20 +36,206 @@ logging.basicConfig(
 )
 
 HEARTBEAT_INTERVAL = 5
+PEER_TIMEOUT = 30
+
+# сколько источников блоба хранить в записи DHT
+MAX_PROVIDERS = 50
+
+# кэш пиров: период сохранения и волны HELLO при перезапуске
+PEER_CACHE_INTERVAL = 60
+REJOIN_WAVE = 32
+REJOIN_WAVE_DELAY = 0.5
+
+# планировщик: шаг колеса и разброс интервала пингов
+SCHEDULER_TICK = 0.25
+PING_JITTER = 0.25
+
+# RTT пира перемеряется не реже этого, даже если от него и так идёт трафик
+RTT_REFRESH = 30
+
+# trace: замеров на каждый узел пути
+TRACE_PROBES = 5
+
+# NODE_LIST без rid принимается только в ответ на наш HELLO не позже этого
+HELLO_REPLY_TIMEOUT = 30
+
+# адреса из чужих списков (GOSSIP_REPLY): в таблицу — только ответившие на PING
+# тем же ID; сколько непроверенных держать сразу
+CANDIDATE_LIMIT = 256
+
+# GOSSIP_REPLY принимается только в раунде, который мы начали (или на встречный
+# фильтр, который мы отправили), не позже этого
+GOSSIP_REPLY_TIMEOUT = GOSSIP_INTERVAL
+
+# пробивка NAT: скольким посредникам сразу отправлять PUNCH_REQ
+PUNCH_RENDEZVOUS = 2
+
+# relay: маршрут до пира с такой оценкой надёжности прямых пингов (и замером RTT)
+# заголовок пришедшего конверта не переписывает
+DIRECT_SCORE = 0.5
+
+# с шифрованными сессиями открытым текстом ходят только рукопожатие и пробивка:
+# PUNCH должен пройти NAT раньше, чем сессия с этим адресом вообще возможна
+PLAINTEXT_TYPES = (PacketType.HELLO.value, PacketType.PUNCH.value)
 
 
 class Node:
-    def __init__(self, host: str, port: int, panel=None):
+    transport_class = Transport
+
+    def __init__(self, host: str, port: int, panel=None, workers: int = 1, metrics: bool = True,
+                 peer_cache: Optional[str] = None, secure: bool = False, identity: Optional[str] = None,
+                 kv_path: Optional[str] = None, replay_capacity: int = REPLAY_CAPACITY,
+                 replay_fp: float = REPLAY_FP, **transport_options):
         self.host = host
         self.port = port
         self.panel = panel
 
-        self.dht = DHT()
-        self.transport = Transport(host, port, self._safe_on_packet, panel=panel)
+        self.metrics = MetricsRegistry(enabled=metrics)
+        transport_options["metrics"] = self.metrics
+        # серии по типам заводятся заранее: тип в пакете выбирает отправитель,
+        # и все незнакомые типы делят одну серию "unknown"
+        self._type_counters = {}
+        self._type_latency = {}
+        for ptype in [t.value for t in PacketType] + [None]:
+            label = ptype if ptype is not None else "unknown"
+            self._type_counters[ptype] = self.metrics.counter("packets_by_type", type=label)
+            self._type_latency[ptype] = self.metrics.histogram("dispatch_latency_us", type=label)
+        self._last_metrics_push = 0.0
+
+        # несколько процессов на одном порту через SO_REUSEPORT
+        self.workers = max(1, workers)
+        self.worker_pool = None
+        if self.workers > 1:
+            transport_options["reuse_port"] = True
+
+        # шифрованные сессии: ID узла — хеш его ключа, а не адреса; сессии живут
+        # в одном процессе, поэтому с SO_REUSEPORT-воркерами не совмещаются
+        self.identity = None
+        self.node_id = node_id_from_addr((host, port))
+        if secure:
+            if self.workers > 1:
+                raise ValueError("шифрованные сессии не работают с несколькими процессами на порту")
+            from .secure import Identity
+            self.identity = Identity.load(identity)
+            self.node_id = self.identity.node_id
+        self.dht = DHT(self.node_id)
+        self.transport = self.transport_class(host, port, self._safe_on_packet, panel=panel,
+                                              **transport_options)
+        # ответ непроверенному адресу урезан — проверяем адрес PING'ом: PONG
+        # с нашим nonce доказывает, что адрес не подставлен в чужой запрос
+        if self.transport.admission is not None:
+            self.transport.admission.on_unverified = self.send_ping
 
         self.running = False
         self.external_addr = None
 
+        # номера исходящих датаграмм и отсев входящих повторов по ним
+        self._packet_ids = itertools.count(random.getrandbits(63))
+        self.replay = ReplayFilter(replay_capacity, replay_fp)
+
+        # rid -> активный итеративный поиск
+        self._pending_lookups: Dict[str, IterativeLookup] = {}
+        self._lookup_lock = threading.Lock()
+        self._bootstrapping = False
+
+        # локальные значения для FIND_VALUE
+        self.values: Dict[int, object] = {}
+
+        # хранилище ключ-значение: реплики — в журнале на диске, чужие горячие
+        # ключи с пути поиска — в отдельном кэше в памяти
+        self.kv = LogStore(kv_path)
+        self.kv_hot = LRUCache(KV_HOT_CACHE)
+        self._pending_stores: Dict[str, StoreWait] = {}
+        # соседи менялись — копии ключей надо довезти новым ближайшим
+        self._kv_dirty = False
+        self._kv_pass: list = []
+        self._next_kv_republish = time.time() + KV_REPUBLISH
+        self._next_kv_expire = time.time() + KV_EXPIRE_INTERVAL
+
+        # у каждого пира свой срок пинга и проверки истечения;
+        # поколение отсекает записи пиров, удалённых и добавленных заново
+        self.scheduler = TimerWheel(SCHEDULER_TICK, now=time.time())
+        self._schedule_gen: Dict[Tuple[str, int], int] = {}
+        self._last_ping: Dict[Tuple[str, int], float] = {}
+        # адрес -> когда ушёл наш HELLO: ждём от него NODE_LIST
+        self._hello_sent: Dict[Tuple[str, int], float] = {}
+        self.rtt = RttTracker()
+        # адрес -> (ID, названный тем, кто прислал адрес; он сам): ждём PONG
+        self._candidates: Dict[Tuple[str, int], tuple] = {}
+        # адрес -> [nonce раунда, начало, встречный фильтр уже получен]
+        self._gossip_rounds: Dict[Tuple[str, int], list] = {}
+        self._next_gossip = time.time() + random.uniform(0, GOSSIP_INTERVAL)
+        self.dht.add_listener(self._on_dht_change)
+
+        # панель получает только изменения таблицы, а не её целиком
+        self._panel_changes = DHTChangeLog(self.dht) if panel else None
+
+        self.metrics.gauge("dht_peers", fn=lambda: len(self.dht))
+        self.metrics.gauge("scheduled_timers", fn=lambda: len(self.scheduler))
+        self.metrics.gauge("pending_lookups", fn=lambda: len(self._pending_lookups))
+        self.metrics.gauge("replay_dropped", fn=lambda: self.replay.duplicates)
+        self.metrics.gauge("replay_rotations", fn=lambda: self.replay.rotations)
+        self.metrics.gauge("kv_keys", fn=lambda: len(self.kv))
+        self.metrics.gauge("kv_bytes", fn=lambda: self.kv.live_bytes)
+        self.metrics.gauge("kv_hot_keys", fn=lambda: len(self.kv_hot))
+        self.metrics.gauge("kv_refused", fn=lambda: self.kv.refused)
+        self.metrics.gauge("kv_cache_hits", fn=lambda: self.kv.cache.hits)
+        self.metrics.gauge("kv_cache_misses", fn=lambda: self.kv.cache.misses)
+        self.m_peer_rtt = self.metrics.histogram("peer_rtt_us")
+        self.m_gossip_sent = self.metrics.counter("gossip_entries_sent")
+        for result in ("ok", "failed"):
+            self.metrics.gauge("nat_punch", fn=lambda r=result: self.punch.stats[r], result=result)
+
+        # внешний адрес по отчётам пиров и пробивка NAT через посредника
+        self.reflexive = ReflexiveAddress()
+        self.punch = HolePuncher()
+
+        # пиры, до которых не дойти напрямую: адрес -> ID, пакеты к ним идут через relay
+        self._relayed: Dict[Tuple[str, int], int] = {}
+        self.routes = RouteCache()
+        self.relay_quota = RelayQuota()
+        self.metrics.gauge("relayed_peers", fn=lambda: len(self._relayed))
+        self.metrics.gauge("relay_routes", fn=lambda: len(self.routes))
+        self.metrics.gauge("relay_forwarded", fn=lambda: self.relay_quota.forwarded)
+        self.metrics.gauge("relay_dropped", fn=lambda: self.relay_quota.dropped)
+
+        self.sessions = None
+        if secure:
+            from .secure import SessionManager
+            self.sessions = SessionManager(self.identity, self.send_hello)
+            for name in ("sealed", "opened", "rejected", "replayed", "handshakes", "bad_hello"):
+                self.metrics.gauge("secure_packets", fn=lambda n=name: self.sessions.stats[n], event=name)
+            self.metrics.gauge("secure_sessions", fn=lambda: len(self.sessions))
+
+        # надёжная доставка: подтверждения, перезапросы, окно на каждого пира
+        self.reliable = ReliableManager(self._send, self._on_reliable_message)
+
+        # раздаваемые и загружаемые блобы
+        self.blobs = BlobStore(self._send)
+
+        # темы publish/subscribe: свой оверлей на каждую тему, рассылка деревом
+        self.pubsub = PubSub(self.node_id, self._send, self.dht.find_closest)
+        self.metrics.gauge("pubsub_topics", fn=lambda: len(self.pubsub.topics))
+        for name in ("published", "delivered", "duplicates", "ihave", "graft", "prune"):
+            self.metrics.gauge("pubsub_messages", fn=lambda n=name: self.pubsub.stats[n], event=name)
+
+        # несколько путей к пиру (LAN, ZeroTier, IPv6): пакеты идут по самому
+        # быстрому. Адреса из HELLO без подписи, поэтому только в открытом режиме;
+        # проверки путей шлёт heartbeat, которого у SO_REUSEPORT-воркеров нет
+        self.paths = PathTable()
+        self.multipath = self.sessions is None
+        self.transport.on_interfaces = self._on_interfaces
+        self._interfaces_known = False
+        self._readvertise = False
+        self.metrics.gauge("path_peers", fn=lambda: len(self.paths))
+        self.metrics.gauge("path_rerouted", fn=lambda: self.paths.rerouted)
+        self.metrics.gauge("path_switches", fn=lambda: self.paths.switches)
+
+        # таблица маршрутизации на диске: адрес -> запись из прошлого запуска
+        self.peer_cache = peer_cache
+        self._cached_peers: Dict[Tuple[str, int], Peer] = {}
+        self._last_cache_save = time.time()
+
     # ============================================================
     #   SAFE WRAPPER
     # ============================================================
@@ -42,45 +249,208 @@ class Node:
     #   START / STOP
     # ============================================================
     def start(self):
+        self._prepare_start()
+        self.transport.start()
+        threading.Thread(target=self._heartbeat_loop, daemon=True).start()
+        self._start_workers()
+        self._finish_start()
+
+    def stop(self):
+        self._stop_workers()
+        self._prepare_stop()
+        self.transport.stop()
+        self._finish_stop()
+
+    # общие шаги запуска и остановки: AsyncNode меняет только транспорт и heartbeat
+    def _prepare_start(self, mode: str = ""):
         self.running = True
-        logging.info("Узел запущен на %s:%s", self.host, self.port)
+        logging.info("Узел запущен на %s:%s%s", self.host, self.port, mode)
 
+        # до отчётов пиров внешний адрес — локальный кандидат
         self.external_addr = get_external_address(self.transport.socket)
+        self.reflexive.local = self.external_addr
         logging.info("Внешний адрес узла: %s", self.external_addr)
 
-        self.transport.start()
-        threading.Thread(target=self._heartbeat_loop, daemon=True).start()
+    def _finish_start(self):
+        # сокет уже принимает: доставка и таблица из кэша пиров
+        self.reliable.start()
+        self._restore_peers()
 
-    def stop(self):
+    def _prepare_stop(self):
         self.running = False
-        self.transport.stop()
+        self.save_peer_cache()
+        self.reliable.stop()
+
+    def _finish_stop(self):
+        # после транспорта: новых записей в хранилища уже не будет
+        self.blobs.close()
+        self.kv.close()
+
+    def _start_workers(self):
+        if self.workers > 1:
+            from .workers import WorkerPool
+            self.worker_pool = WorkerPool(self, self.workers - 1)
+            self.worker_pool.start()
+
+    def _stop_workers(self):
+        if self.worker_pool is not None:
+            self.worker_pool.stop()
+            self.worker_pool = None
 
     # ============================================================
     #   HEARTBEAT
     # ============================================================
     def _heartbeat_loop(self):
         while self.running:
-            time.sleep(HEARTBEAT_INTERVAL)
+            time.sleep(SCHEDULER_TICK)
+            self._heartbeat_tick()
 
-            for addr in self.dht.get_peers():
-                self.send_ping(addr)
+    def _heartbeat_tick(self):
+        now = time.time()
+        due = self.scheduler.advance(now)
+
+        # PING без PONG за отведённое время — промах в оценке надёжности
+        for addr in self.rtt.expire():
+            candidate = self._candidates.pop(addr, None)
+            if candidate is not None:
+                self._punch_candidate(addr, *candidate)
+            self.dht.record_result(addr, False)
+            self._maybe_punch(addr)
+
+        if self.sessions is not None:
+            self.sessions.tick(now)
+
+        send, failed = self.punch.due(now)
+        for session in send:
+            self._send({"type": PacketType.PUNCH.value, "id": f"{self.node_id:040x}",
+                        "nonce": session.nonce}, session.addr)
+        for session in failed:
+            logging.info("NAT до %s не пробит — остаётся только relay", session.addr)
+            self._use_relay(session.addr, session.node_id)
+
+        with self.transport.batch():
+            if self.multipath:
+                for addr, nonce in self.paths.due(now):
+                    self._send_path_probe(addr, nonce)
+                if self._readvertise:
+                    self._readvertise = False
+                    for addr in self.dht.get_peers():
+                        self.send_hello(addr)
+
+            for kind, addr, gen in due:
+                if self._schedule_gen.get(addr) != gen:
+                    continue
+                peer = self.dht.get_peer(addr)
+                if peer is None:
+                    self._schedule_gen.pop(addr, None)
+                    continue
+
+                if kind == "ping":
+                    # недавно был трафик от пира — пинг нужен только для замера RTT
+                    if now - peer.last_seen >= HEARTBEAT_INTERVAL \
+                            or now - self._last_ping.get(addr, 0.0) >= RTT_REFRESH:
+                        self.send_ping(addr)
+                        self._last_ping[addr] = now
+                    self.scheduler.schedule(now + self._ping_interval(), ("ping", addr, gen))
+
+                elif kind == "expire":
+                    deadline = peer.last_seen + PEER_TIMEOUT
+                    if now >= deadline:
+                        self.dht.remove_peer(addr)
+                    else:
+                        self.scheduler.schedule(deadline, ("expire", addr, gen))
+
+        if self._hello_sent:
+            self._hello_sent = {a: t for a, t in self._hello_sent.items() if now - t <= HELLO_REPLY_TIMEOUT}
 
-            self.dht.cleanup(timeout=30)
+        self._kv_tick(now)
+        self.pubsub.tick(now)
 
-            if self.panel:
-                self.update_panel_dht()
+        if now >= self._next_gossip:
+            self._next_gossip = now + GOSSIP_INTERVAL * random.uniform(1 - PING_JITTER, 1 + PING_JITTER)
+            self._gossip_round()
+
+        if self.peer_cache and now - self._last_cache_save >= PEER_CACHE_INTERVAL:
+            self._last_cache_save = now
+            self.save_peer_cache()
+
+        if self.panel:
+            self.push_panel_dht_changes()
+            if now - self._last_metrics_push >= 1.0:
+                self._last_metrics_push = now
+                self.panel.safe_update_metrics(self.metrics.format_text())
+
+    @staticmethod
+    def _ping_interval():
+        return HEARTBEAT_INTERVAL * random.uniform(1 - PING_JITTER, 1 + PING_JITTER)
+
+    def _on_dht_change(self, event, peer):
+        if len(self.kv):
+            self._kv_dirty = True
+        if event == "add" and peer.addr not in self._schedule_gen:
+            gen = self._schedule_gen[peer.addr] = random.getrandbits(32)
+            now = time.time()
+            # первый пинг — в случайный момент интервала, чтобы не было залпов
+            self.scheduler.schedule(now + random.uniform(0, HEARTBEAT_INTERVAL),
+                                    ("ping", peer.addr, gen))
+            self.scheduler.schedule(peer.last_seen + PEER_TIMEOUT, ("expire", peer.addr, gen))
+
+            # вернувшийся пир из кэша сохраняет накопленные оценки
+            cached = self._cached_peers.pop(peer.addr, None)
+            if cached is not None and cached.node_id == peer.node_id:
+                peer.score = cached.score
+                if peer.rtt is None:
+                    peer.rtt = cached.rtt
+        elif event == "remove":
+            self._schedule_gen.pop(peer.addr, None)
+            self._last_ping.pop(peer.addr, None)
+            self._relayed.pop(peer.addr, None)
+            self.routes.drop_hop(peer.addr)
+            self.pubsub.drop_peer(peer.addr)
+            self.paths.drop(peer.addr)
 
     # ============================================================
     #   PACKET HANDLING
     # ============================================================
     def _on_packet(self, data: bytes, addr: Tuple[str, int]):
+        # с подтверждённого запасного пути пир виден под основным адресом,
+        # если этот адрес сам не записан в таблице отдельным пиром
+        primary = self.paths.primary(addr)
+        if primary != addr and addr not in self.dht:
+            addr = primary
+
+        # конверт RELAY разбирается до декодирования: relay вложенный пакет не трогает
+        if is_relay(data):
+            self._on_relay(data, addr)
+            return
+
+        # в защищённом режиме открытым текстом принимаются только PLAINTEXT_TYPES,
+        # остальное — лишь то, что расшифровано ключом сессии с этим адресом
+        session = None
+        if self.sessions is not None:
+            if is_sealed(data):
+                opened = self.sessions.open(addr, data, known=addr in self.dht)
+                if opened is None:
+                    return
+                session, data = opened
+                if session.hello is not None:
+                    self._confirm_session(addr, session)
+            elif peek_type(data) not in PLAINTEXT_TYPES:
+                return
 
         # короткие пакеты → heartbeat
         if len(data) <= 4:
-            if data.strip().upper() == b"PING":
+            if bytes(data).strip().upper() == b"PING":
                 self.dht.mark_seen(addr)
                 return
 
+        # повтор той же датаграммы отсекается до разбора; у шифрованных это уже
+        # сделало окно счётчиков сессии
+        if session is None:
+            pid = peek_packet_id(data)
+            if pid is not None and self.replay.seen(hash((addr, pid))):
+                return
+
         # JSON
         try:
             packet = decode_packet(data)
@@ -90,6 +460,26 @@ class Node:
 
         ptype = packet.get("type")
 
+        # внутри сессии пир не может назваться чужим ID
+        if session is not None and packet.get("id", session.id_hex) != session.id_hex:
+            logging.warning("Чужой ID в сессии с %s", addr)
+            return
+
+        # любой разобранный пакет — признак жизни пира
+        self.dht.mark_seen(addr)
+
+        # бинарный пакет — отправитель точно понимает бинарный формат
+        if is_binary(data):
+            self._set_wire(addr, WIRE_VERSION)
+
+        key = ptype if isinstance(ptype, str) and ptype in self._type_counters else None
+        self._type_counters[key].inc()
+
+        t0 = time.perf_counter()
+        self._dispatch(ptype, packet, addr)
+        self._type_latency[key].record((time.perf_counter() - t0) * 1e6)
+
+    def _dispatch(self, ptype, packet, addr):
         if ptype == PacketType.HELLO.value:
             self._handle_hello(packet, addr)
 
@@ -100,7 +490,85 @@ class Node:
             self._handle_node_list(packet, addr)
 
         elif ptype == PacketType.PING.value:
-            pass
+            self._handle_ping(packet, addr)
+
+        elif ptype == PacketType.PONG.value:
+            self._handle_pong(packet, addr)
+
+        elif ptype == PacketType.GOSSIP.value:
+            self._handle_gossip(packet, addr)
+
+        elif ptype == PacketType.GOSSIP_REPLY.value:
+            self._handle_gossip_reply(packet, addr)
+
+        elif ptype == PacketType.PUNCH_REQ.value:
+            self._handle_punch_req(packet, addr)
+
+        elif ptype == PacketType.PUNCH_INTRO.value:
+            self._handle_punch_intro(packet, addr)
+
+        elif ptype == PacketType.PUNCH.value:
+            self._handle_punch(packet, addr)
+
+        elif ptype == PacketType.FIND_NODE.value:
+            self._handle_find_node(packet, addr)
+
+        elif ptype == PacketType.FIND_VALUE.value:
+            self._handle_find_value(packet, addr)
+
+        elif ptype == PacketType.VALUE.value:
+            self._handle_value(packet, addr)
+
+        elif ptype == PacketType.STORE.value:
+            self._handle_store(packet, addr)
+
+        elif ptype == PacketType.STORED.value:
+            self._handle_stored(packet, addr)
+
+        elif ptype == PacketType.PUBLISH.value:
+            self.pubsub.on_publish(packet, addr)
+
+        elif ptype == PacketType.IHAVE.value:
+            self.pubsub.on_ihave(packet, addr)
+
+        elif ptype == PacketType.GRAFT.value:
+            self.pubsub.on_graft(packet, addr)
+
+        elif ptype == PacketType.PRUNE.value:
+            self.pubsub.on_prune(packet, addr)
+
+        elif ptype == PacketType.TOPIC_JOIN.value:
+            self.pubsub.on_join(packet, addr)
+
+        elif ptype == PacketType.TOPIC_SHUFFLE.value:
+            self.pubsub.on_shuffle(packet, addr)
+
+        elif ptype == PacketType.TOPIC_NEIGHBORS.value:
+            self.pubsub.on_neighbors(packet, addr)
+
+        elif ptype == PacketType.TOPIC_LEAVE.value:
+            self.pubsub.on_leave(packet, addr)
+
+        elif ptype == PacketType.RDATA.value:
+            self.reliable.on_data(packet, addr)
+
+        elif ptype == PacketType.RACK.value:
+            self.reliable.on_ack(packet, addr)
+
+        elif ptype == PacketType.ANNOUNCE.value:
+            self._handle_announce(packet, addr)
+
+        elif ptype == PacketType.MANIFEST_GET.value:
+            self.blobs.handle_manifest_get(packet, addr)
+
+        elif ptype == PacketType.MANIFEST.value:
+            self.blobs.on_manifest(packet, addr)
+
+        elif ptype == PacketType.CHUNK_GET.value:
+            self.blobs.handle_chunk_get(packet, addr)
+
+        elif ptype == PacketType.CHUNK.value:
+            self.blobs.on_chunk(packet, addr)
 
         else:
             logging.warning("Неизвестный тип пакета: %s", ptype)
@@ -109,32 +577,343 @@ class Node:
     #   HELLO
     # ============================================================
     def _handle_hello(self, packet, addr):
+        if self.sessions is not None and not self._handshake(packet, addr):
+            return
+
         external = packet.get("external")
         local = packet.get("local")
+        sender_id = self._parse_node_id(packet.get("id"))
 
-        # внешний адрес
-        if isinstance(external, (list, tuple)) and len(external) == 2:
+        # внешний адрес: только заявлен отправителем — в таблицу он попадёт, если
+        # ответит на PING тем же ID (с сессиями непроверенные адреса из HELLO не
+        # берутся: в таблицу попадает только тот, с кем прошло рукопожатие)
+        if self.sessions is None and isinstance(external, (list, tuple)) and len(external) == 2:
             try:
                 ext_addr = (external[0], int(external[1]))
-                if ext_addr != (self.host, self.port):
-                    self.dht.add_peer(ext_addr)
+                if ext_addr != addr and self.paths.primary(ext_addr) == ext_addr:
+                    self._probe_candidate(ext_addr, sender_id)
             except Exception:
                 pass
 
         # локальный адрес
-        if isinstance(local, (list, tuple)) and len(local) == 2:
+        if self.sessions is None and isinstance(local, (list, tuple)) and len(local) == 2:
             try:
                 loc_addr = (local[0], int(local[1]))
-                if loc_addr != (self.host, self.port):
-                    self.dht.add_peer(loc_addr)
+                if loc_addr != addr and self.paths.primary(loc_addr) == loc_addr:
+                    self._probe_candidate(loc_addr, sender_id)
             except Exception:
                 pass
 
-        # адрес отправителя
-        if addr != (self.host, self.port):
-            self.dht.add_peer(addr)
+        # адрес отправителя (с сессиями — только после доказательства ключа,
+        # см. _confirm_session)
+        if self.sessions is None:
+            if addr != (self.host, self.port):
+                self.dht.add_peer(addr, sender_id)
+            self._advertise_paths(addr, sender_id, packet.get("addrs"))
+            self._set_wire(addr, packet.get("wire"))
+        # с сессией список уходит зашифрованным: прочтёт его только владелец ключа
+        self.send_node_list(addr, sender_id)
+
+    def _advertise_paths(self, addr, sender_id, addrs):
+        # остальные адреса отправителя — кандидаты в пути к нему
+        if self.multipath and sender_id is not None and isinstance(addrs, (list, tuple)):
+            if self.transport.socket6 is None:
+                addrs = [a for a in addrs if isinstance(a, (list, tuple)) and ":" not in str(a[0])]
+            self.paths.advertise(addr, sender_id, addrs, time.time())
+
+    def _handshake(self, packet, addr) -> bool:
+        # False — дальше HELLO не обрабатывается: подпись не сошлась или это ответ hs=2
+        result = self.sessions.on_hello(packet, addr)
+        if result is None:
+            return False
+        node_id, reply, queued, early = result
+        # ответ hs=2 подписан поверх нашего свежего эфемерного ключа — пир доказал
+        # ключ на этом адресе. Stage 1 можно повторить — с чужого адреса или старый
+        # с адреса пира: такая сессия подтверждается первым пакетом (_confirm_session)
+        session = self.sessions.get(addr)
+        confirmed = (packet.get("hs") == 2 and session is not None and session.node_id == node_id
+                     and session.hello is None)
+        if confirmed:
+            self._add_verified(addr, node_id)
+            self._set_wire(addr, packet.get("wire"))
+
+        with self.transport.batch():
+            if reply is not None:
+                self.send_hello(addr, reply)
+            for data in queued:
+                self._send_raw(data, addr)
+            for data in early:
+                self._on_packet(data, addr)
+            # инициатору нечего слать — пустой PING докажет ключ ответчику
+            if packet.get("hs") == 2 and not queued:
+                self.send_ping(addr)
+        return packet.get("hs") == 1
+
+    def _confirm_session(self, addr, session):
+        # первый пакет, открытый ключом сессии: инициатор рукопожатия действительно
+        # на этом адресе — только теперь он попадает в таблицу
+        hello, session.hello = session.hello, None
+        if addr == (self.host, self.port):
+            return
+        self._add_verified(addr, session.node_id)
+        self._advertise_paths(addr, session.node_id, hello.get("addrs"))
+        self._set_wire(addr, hello.get("wire"))
+
+    def _add_verified(self, addr, node_id: int):
+        # ID из рукопожатия подтверждён подписью: запись с другим ID по этому адресу —
+        # подделка из чужого NODE_LIST или старый узел на том же порту
+        peer = self.dht.get_peer(addr)
+        if peer is not None and peer.node_id != node_id:
+            self.dht.remove_peer(addr)
+        self.dht.add_peer(addr, node_id)
+
+    # ============================================================
+    #   PING / PONG
+    # ============================================================
+    def _handle_ping(self, packet, addr):
+        # старые узлы шлют PING без nonce и ответа не ждут
+        nonce = packet.get("nonce")
+        if nonce is None:
+            return
+        # PING с ID — проверка пути: ID в PONG подтверждает, что ответил тот же узел
+        if self.multipath and packet.get("id") is not None:
+            self.paths.expedite(addr, self._parse_node_id(packet.get("id")))
+        # observed — адрес, с которого пришёл PING: для отправителя это ответ «STUN-сервера»
+        self._send({"type": PacketType.PONG.value, "id": f"{self.node_id:040x}", "nonce": nonce,
+                    "ts": packet.get("ts"), "observed": addr}, addr)
+
+    def _handle_pong(self, packet, addr):
+        path = self.paths.on_pong(packet.get("nonce"), self._parse_node_id(packet.get("id")), time.time())
+        if path is not None:
+            self._on_path_confirmed(path)
+            return
+        rtt = self.rtt.on_pong(packet.get("nonce"), addr)
+        if rtt is None:
+            return
+        if addr in self._candidates:
+            claimed, _ = self._candidates.pop(addr, (None, None))
+            node_id = self._parse_node_id(packet.get("id"))
+            if node_id is not None and claimed in (None, node_id):
+                # узел уже в таблице по другому адресу (внешний адрес из его же HELLO):
+                # подтверждённый кандидат запись не переносит
+                known = next((p for p in self.dht.find_closest(node_id, 1) if p.node_id == node_id), None)
+                if known is None:
+                    self.dht.add_peer(addr, node_id)
+        self.dht.record_rtt(addr, rtt)
+        self.dht.record_result(addr, True)
+        self.m_peer_rtt.record(rtt * 1e6)
+        if self.transport.admission is not None:
+            self.transport.admission.verify(addr)
+
+        # отчёт принимается только в ответ на наш PING, а не от кого угодно
+        observed = packet.get("observed")
+        if isinstance(observed, (list, tuple)) and len(observed) == 2:
+            self._on_observed(addr, (observed[0], observed[1]))
+
+    def _on_observed(self, reporter, observed):
+        address = self.reflexive.observe(reporter, observed)
+        if address is not None and address != self.external_addr:
+            logging.info("Внешний адрес по отчётам пиров: %s (NAT: %s)",
+                         address, self.reflexive.nat_type())
+            self.external_addr = address
+
+    # ============================================================
+    #   NAT TRAVERSAL (пробивка через посредника)
+    # ============================================================
+    # A -> R: PUNCH_REQ; R -> A и R -> B: PUNCH_INTRO с внешним адресом другой стороны;
+    # A <-> B: PUNCH, пока встречный пакет не пройдёт NAT. Посредник подходит любой,
+    # с кем обе стороны уже общаются — их привязки в NAT держит обычный heartbeat
+    def _maybe_punch(self, addr):
+        # пир ни разу не ответил: возможно, он за NAT и наши пакеты отбрасываются
+        peer = self.dht.get_peer(addr)
+        if peer is None or peer.rtt is not None:
+            return
+        if self.punch.busy(addr) or self.punch.failed(addr):
+            return
+        # из-за симметричного NAT публичные пиры и так отвечают, а с NAT на другой
+        # стороне пробить не выйдет: такой пир сразу достаётся relay
+        if self.reflexive.nat_type() == "symmetric":
+            self._use_relay(addr, peer.node_id)
+            return
+        self.punch_peer(peer.node_id, addr)
+
+    def punch_peer(self, node_id: int, addr=None, via=None) -> bool:
+        # посредники по умолчанию — отвечавшие пиры, ближайшие к цели: цель при
+        # подключении искала свой ID и держит связь со своими соседями. Запрос идёт
+        # сразу нескольким с одним nonce: кто-то из них мог цель и не знать
+        if via is not None:
+            rendezvous = [via]
+        else:
+            rendezvous = self._rendezvous_for(node_id, exclude=addr)
+            if not rendezvous:
+                return False
+
+        nonce = random.getrandbits(32)
+        if not self.punch.begin(nonce, addr, node_id):
+            return False
+        packet = {
+            "type": PacketType.PUNCH_REQ.value,
+            "id": f"{self.node_id:040x}",
+            "target": f"{node_id:040x}",
+            "nonce": nonce,
+        }
+        with self.transport.batch():
+            for r in rendezvous:
+                self._send(packet, r)
+        return True
+
+    def _rendezvous_for(self, node_id: int, exclude=None, n: int = PUNCH_RENDEZVOUS):
+        result = []
+        for peer in self.dht.find_closest(node_id, self.dht.k):
+            if peer.addr != exclude and peer.node_id != node_id and peer.rtt is not None:
+                result.append(peer.addr)
+                if len(result) == n:
+                    break
+        return result
+
+    def _handle_punch_req(self, packet, addr):
+        requester = self._parse_node_id(packet.get("id"))
+        target = self._parse_node_id(packet.get("target"))
+        nonce = packet.get("nonce")
+        if requester is None or target is None or nonce is None:
+            return
+
+        peer = next((p for p in self.dht.find_closest(target, 1) if p.node_id == target), None)
+        if peer is None:
+            return
+
+        # каждой стороне — адрес другой в том виде, в каком его видим мы
+        intro = {"type": PacketType.PUNCH_INTRO.value, "id": f"{self.node_id:040x}", "nonce": nonce}
+        with self.transport.batch():
+            self._send(dict(intro, target=f"{requester:040x}", external=addr), peer.addr)
+            self._send(dict(intro, target=f"{target:040x}", external=peer.addr), addr)
+
+    def _handle_punch_intro(self, packet, addr):
+        external = packet.get("external")
+        nonce = packet.get("nonce")
+        if not isinstance(external, (list, tuple)) or len(external) != 2 or nonce is None:
+            return
+        try:
+            other = (external[0], int(external[1]))
+        except (TypeError, ValueError):
+            return
+        if other == (self.host, self.port):
+            return
+        # серия PUNCH — только по слову посредника из таблицы или проверенного адреса
+        # (свой PUNCH_REQ мы шлём тоже им). Иначе любой источник направлял бы её на
+        # произвольный адрес; незнакомому — один PUNCH, не больше самого PUNCH_INTRO:
+        # цель, которая этого посредника ещё не знает, всё равно откроет NAT навстречу
+        admission = self.transport.admission
+        trusted = addr in self.dht or (admission is not None and admission.is_verified(addr))
+        self.punch.begin(nonce, other, self._parse_node_id(packet.get("target")), trusted=trusted)
+
+    def _handle_punch(self, packet, addr):
+        session = self.punch.on_punch(packet.get("nonce"), addr)
+        if session is None:
+            return
+
+        # встречный пакет прошёл — отвечаем, чтобы сессия завершилась и у другой стороны
+        self._relayed.pop(addr, None)
+        self._send({"type": PacketType.PUNCH.value, "id": f"{self.node_id:040x}",
+                    "nonce": session.nonce}, addr)
+        if self.sessions is not None:
+            # открытый PUNCH ID не доказывает — пир попадёт в таблицу после рукопожатия
+            self.send_hello(addr)
+        else:
+            self.dht.add_peer(addr, self._parse_node_id(packet.get("id")))
+        self.dht.record_result(addr, True)
+        logging.info("NAT пробит: %s", addr)
+
+    # ============================================================
+    #   RELAY (пересылка через промежуточные узлы)
+    # ============================================================
+    # Маршрут выбирается по шагам: каждый узел отдаёт конверт ближайшему к получателю
+    # пиру, с которым связь прямая. Обратный путь запоминается из пришедших конвертов,
+    # так что ответы идут тем же путём без поиска
+
+    def _use_relay(self, addr, node_id: Optional[int]):
+        if node_id is None or addr is None or self.dht.get_peer(addr) is None:
+            return
+        if addr not in self._relayed:
+            self._relayed[addr] = node_id
+            logging.info("Пир %s доступен только через relay", addr)
+
+    def _own_addr(self):
+        return self.external_addr or (self.host, self.port)
+
+    def _send_relayed(self, dst: int, inner: bytes) -> bool:
+        hop = self._next_hop(dst)
+        if hop is None:
+            return False
+        try:
+            data = encode_relay(dst, self.node_id, self._own_addr(), RELAY_TTL, inner)
+        except UnsupportedPacket:
+            return False
+        self.transport.send(data, hop)
+        return True
+
+    def _next_hop(self, dst: int, exclude=(), progress: bool = False):
+        route = self.routes.get(dst)
+        if route is not None and route.next_hop not in exclude:
+            return route.next_hop
+
+        # relay принимает только шаг, который ближе к получателю, чем он сам, —
+        # иначе конверт может ходить по кругу до исчерпания TTL
+        limit = self.node_id ^ dst if progress else None
+        for peer in self.dht.find_closest(dst, self.dht.k):
+            if peer.rtt is None or peer.addr in self._relayed or peer.addr in exclude:
+                continue
+            if limit is not None and peer.node_id ^ dst >= limit:
+                break
+            self.routes.put(dst, peer.addr, [list(peer.addr)])
+            return peer.addr
+        return None
+
+    def _direct_peer(self, node_id: int) -> Optional[Peer]:
+        # пир из таблицы, который отвечает нам без посредников: есть замер RTT
+        # и пинги в последнее время скорее доходят, чем нет
+        peer = next((p for p in self.dht.find_closest(node_id, 1) if p.node_id == node_id), None)
+        if peer is None or peer.rtt is None or peer.score < DIRECT_SCORE or peer.addr in self._relayed:
+            return None
+        return peer
+
+    def _on_relay(self, data, addr):
+        try:
+            dst, src, src_addr, ttl, _ = relay_header(data)
+            path, end = relay_path(data)
+        except (struct.error, UnsupportedPacket, OSError):
+            logging.warning("Некорректный RELAY от %s", addr)
+            return
+        self.dht.mark_seen(addr)
+
+        # заголовок конверта не подписан: маршрут до пира, который отвечает нам
+        # напрямую, чужой конверт не перенаправляет
+        direct = self._direct_peer(src) if src != self.node_id else None
+
+        # обратный путь до отправителя — через того, кто передал конверт
+        if src != self.node_id and direct is None:
+            self.routes.put(src, addr, path[::-1] + [list(src_addr)])
 
-        self.send_node_list(addr)
+        if dst == self.node_id:
+            # ответ уйдёт по адресу, под которым отправитель уже есть в таблице
+            if direct is not None:
+                origin = direct.addr
+            else:
+                peer = next((p for p in self.dht.find_closest(src, 1) if p.node_id == src), None)
+                origin = peer.addr if peer is not None else src_addr
+                self._relayed[origin] = src
+            self._on_packet(data[end:], origin)
+            return
+
+        if ttl <= 1 or not self.relay_quota.allow(src, len(data)):
+            return
+        hop = self._next_hop(dst, exclude=(addr,), progress=True)
+        if hop is None:
+            return
+        try:
+            self.transport.send(forward_relay(data, self._own_addr()), hop)
+        except (UnsupportedPacket, OSError):
+            pass
 
     # ============================================================
     #   MESSAGE
@@ -143,59 +922,700 @@ class Node:
         text = packet.get("text", "")
         logging.info("Сообщение от %s: %s", addr, text)
 
+    def _on_reliable_message(self, addr, payload: bytes):
+        text = payload.decode("utf-8", errors="replace")
+        logging.info("Надёжное сообщение от %s: %s", addr, text)
+
     # ============================================================
     #   NODE_LIST
     # ============================================================
     def _handle_node_list(self, packet, addr):
-        peers = packet.get("peers", [])
+        if addr != (self.host, self.port):
+            self.dht.add_peer(addr, self._parse_node_id(packet.get("id")))
+            self._set_wire(addr, packet.get("wire"))
+
+        peers = self._parse_peer_list(packet.get("peers", []))
+
+        # ответ на FIND_NODE / FIND_VALUE
+        if packet.get("rid") is not None:
+            if not self._deliver_reply(packet, peers):
+                self._on_orphan_reply(packet, addr)
+            elif self.transport.admission is not None:
+                # rid знали только мы и адресат — ответ пришёл с настоящего адреса
+                self.transport.admission.verify(addr)
+            return
+
+        self._on_peer_list(packet, addr, peers)
 
-        for item in peers:
+    def _on_peer_list(self, packet, addr, peers):
+        # ответ на HELLO: пиров запоминаем, а сходимся к себе поиском,
+        # вместо рассылки HELLO каждому новому адресу. Без нашего HELLO список
+        # не берётся — иначе любой отправитель заполнял бы таблицу чужими адресами
+        sent = self._hello_sent.pop(addr, None)
+        if sent is None or time.time() - sent > HELLO_REPLY_TIMEOUT:
+            return
+
+        added = False
+        for peer in peers[:self.dht.k]:
+            if peer.addr not in self.dht:
+                added = self.dht.add_peer(peer.addr, peer.node_id) or added
+
+        if added:
+            self._start_bootstrap()
+
+    def _probe_candidate(self, addr, node_id=None, via=None):
+        # чужое слово об адресе не проверено: PING, а в таблицу — по PONG с этим ID
+        if addr in self.dht or addr in self._candidates or addr == (self.host, self.port):
+            return
+        if len(self._candidates) >= CANDIDATE_LIMIT:
+            return
+        self._candidates[addr] = (node_id, via)
+        self.send_ping(addr)
+
+    def _punch_candidate(self, addr, node_id, via):
+        # PING мог не пройти NAT кандидата. Посредник — тот, кто его назвал: он с ним
+        # общается. Пробитый пир попадает в таблицу в _handle_punch
+        if node_id is None or via is None or via not in self.dht:
+            return
+        if self.reflexive.nat_type() == "symmetric":
+            return
+        if self.punch.busy(addr) or self.punch.failed(addr):
+            return
+        self.punch_peer(node_id, addr, via=via)
+
+    def _parse_peer_list(self, items):
+        result = []
+        for item in items:
             try:
-                ip, port = item
-                port = int(port)
+                ip, port = item[0], int(item[1])
                 peer_addr = (ip, port)
+                peer_id = self._parse_node_id(item[2]) if len(item) > 2 else None
             except Exception:
                 logging.warning("Некорректный peer в NODE_LIST: %s", item)
                 continue
 
             if peer_addr == (self.host, self.port):
                 continue
+            peer = Peer(peer_addr, peer_id)
+            if peer.node_id == self.node_id:
+                continue
+            result.append(peer)
+        return result
 
-            if peer_addr not in self.dht.peers:
-                self.dht.add_peer(peer_addr)
-                self.send_hello(peer_addr)
+    # ============================================================
+    #   GOSSIP (обмен пирами по дайджестам)
+    # ============================================================
+    # раунд: GOSSIP с фильтром Блума своей таблицы -> GOSSIP_REPLY с тем, чего
+    # в фильтре нет, и встречным фильтром -> GOSSIP_REPLY с ответной разницей
+    def _gossip_round(self):
+        peers = list(self.dht.peers)
+        if not peers:
+            return
+        addr = random.choice(peers)
+        now = time.time()
+        for stale in [a for a, r in self._gossip_rounds.items() if now - r[1] > GOSSIP_REPLY_TIMEOUT]:
+            del self._gossip_rounds[stale]
+        nonce = random.getrandbits(32)
+        self._gossip_rounds[addr] = [nonce, now, False]
+        packet = {"type": PacketType.GOSSIP.value, "id": f"{self.node_id:040x}", "nonce": nonce}
+        packet.update(build_digest(self.dht.all_peers()))
+        self._send(packet, addr)
 
-        if addr != (self.host, self.port):
-            self.dht.add_peer(addr)
+    def _handle_gossip(self, packet, addr):
+        sender_id = self._parse_node_id(packet.get("id"))
+        self.dht.add_peer(addr, sender_id)
+        nonce = packet.get("nonce")
+        if not isinstance(nonce, int):
+            return
+        # наш встречный фильтр открывает ответную разницу под тем же nonce
+        if self._send_gossip_delta(packet, addr, sender_id, nonce, with_digest=True):
+            self._gossip_rounds[addr] = [nonce, time.time(), True]
+
+    def _handle_gossip_reply(self, packet, addr):
+        # ответ без нашего раунда не берётся: иначе любой отправитель заполнял бы
+        # таблицу чужими адресами
+        round_ = self._gossip_rounds.get(addr)
+        if (round_ is None or packet.get("nonce") != round_[0]
+                or time.time() - round_[1] > GOSSIP_REPLY_TIMEOUT):
+            return
+        sender_id = self._parse_node_id(packet.get("id"))
+        self.dht.add_peer(addr, sender_id)
+
+        for peer in self._parse_peer_list(packet.get("peers", [])[:GOSSIP_PAGE]):
+            self._probe_candidate(peer.addr, peer.node_id, via=addr)
+
+        # встречный фильтр есть только в первом ответе — на него отвечаем один раз
+        if "bloom" in packet and not round_[2]:
+            round_[2] = True
+            self._send_gossip_delta(packet, addr, sender_id, round_[0], with_digest=False)
+
+    def _send_gossip_delta(self, packet, addr, sender_id, nonce, with_digest: bool) -> bool:
+        bloom = parse_digest(packet)
+        if bloom is None:
+            return False
+        if sender_id is None:
+            sender_id = node_id_from_addr(addr)
+
+        delta = select_delta(self.dht.all_peers(), bloom, sender_id)
+        if not delta and not with_digest:
+            return False
+        self.m_gossip_sent.inc(len(delta))
+
+        with self.transport.batch():
+            for i, page in enumerate(pages(delta) or [[]]):
+                reply = {"type": PacketType.GOSSIP_REPLY.value, "id": f"{self.node_id:040x}",
+                         "nonce": nonce, "peers": page}
+                if with_digest and i == 0:
+                    reply.update(build_digest(self.dht.all_peers()))
+                self._send(reply, addr)
+        return True
+
+    # ============================================================
+    #   FIND_NODE / FIND_VALUE
+    # ============================================================
+    def _handle_find_node(self, packet, addr):
+        self.dht.add_peer(addr, self._parse_node_id(packet.get("id")))
+        target = self._parse_node_id(packet.get("target"))
+        if target is None:
+            return
+        self.send_node_list(addr, target, rid=packet.get("rid"))
+
+    def _handle_find_value(self, packet, addr):
+        self.dht.add_peer(addr, self._parse_node_id(packet.get("id")))
+        key = self._parse_node_id(packet.get("key"))
+        if key is None:
+            return
+
+        if key in self.values:
+            reply = {
+                "type": PacketType.VALUE.value,
+                "id": f"{self.node_id:040x}",
+                "rid": packet.get("rid"),
+                "key": f"{key:040x}",
+                "value": self.values[key],
+            }
+            self._send(reply, addr)
+            return
+
+        record = self.kv.get(key) or self.kv_hot.get(key)
+        if record is not None:
+            self._send(self._kv_packet(PacketType.VALUE, key, record, rid=packet.get("rid")), addr)
+        else:
+            self.send_node_list(addr, key, rid=packet.get("rid"))
+
+    def _handle_value(self, packet, addr):
+        self.dht.add_peer(addr, self._parse_node_id(packet.get("id")))
+        if not self._deliver_reply(packet):
+            self._on_orphan_reply(packet, addr)
+
+    def _deliver_reply(self, packet, peers=None) -> bool:
+        rid = packet.get("rid")
+        lookup = self._pending_lookups.get(rid)
+        if lookup is None:
+            return False
+        if packet.get("type") == PacketType.VALUE.value:
+            # значение из хранилища ключ-значение приходит полями data / ts / ttl
+            value = self._parse_kv_record(packet) if "data" in packet else packet.get("value")
+            lookup.deliver(rid, value=value, has_value=True)
+        else:
+            lookup.deliver(rid, peers)
+        return True
+
+    def _on_orphan_reply(self, packet, addr):
+        # ответ на чужой или завершившийся поиск
+        pass
+
+    def _run_lookup(self, target: int, find_value: bool, alpha: int, timeout: float):
+        ptype = PacketType.FIND_VALUE if find_value else PacketType.FIND_NODE
+        field = "key" if find_value else "target"
+        rids = []
+
+        def send_query(peer, rid):
+            with self._lookup_lock:
+                self._pending_lookups[rid] = lookup
+            rids.append(rid)
+            packet = {
+                "type": ptype.value,
+                "id": f"{self.node_id:040x}",
+                "rid": rid,
+                field: f"{target:040x}",
+            }
+            self._send(packet, peer.addr)
+
+        seeds = self.dht.find_closest(target, self.dht.k, prefer_fast=True)
+        lookup = IterativeLookup(target, seeds, send_query, self.dht.k,
+                                 alpha=alpha, query_timeout=timeout, cost=self._peer_cost)
+        try:
+            lookup.run()
+        finally:
+            with self._lookup_lock:
+                for rid in rids:
+                    self._pending_lookups.pop(rid, None)
+
+        for node_id in lookup.responded:
+            peer = lookup.shortlist.get(node_id)
+            if peer is not None:
+                self.dht.record_result(peer.addr, True)
+
+        # не ответившие пиры выпадают из таблицы
+        for node_id in lookup.failed:
+            peer = lookup.shortlist.get(node_id)
+            if peer is not None:
+                self.dht.remove_peer(peer.addr)
+
+        return lookup
+
+    def _peer_cost(self, peer):
+        # в ответах NODE_LIST приходят голые адреса — замеры берём из своей таблицы
+        known = self.dht.get_peer(peer.addr)
+        return latency_cost(known if known is not None else peer)
+
+    def lookup(self, key, alpha: int = LOOKUP_ALPHA, timeout: float = QUERY_TIMEOUT):
+        target = key_to_id(key)
+        result = self._run_lookup(target, False, alpha, timeout)
+        logging.info("LOOKUP %040x: %s ответов за %s запросов",
+                     target, len(result.responded), len(result.queried))
+        return result.closest
+
+    def lookup_value(self, key, alpha: int = LOOKUP_ALPHA, timeout: float = QUERY_TIMEOUT):
+        target = key_to_id(key)
+        if target in self.values:
+            return self.values[target]
+        result = self._run_lookup(target, True, alpha, timeout)
+        return result.value if result.value_found else None
+
+    # ============================================================
+    #   KV (реплицируемое хранилище ключ-значение)
+    # ============================================================
+    # Ключ живёт на k ближайших к нему узлах. Запись — поиск ближайших и STORE каждому;
+    # чтение — FIND_VALUE, найденное значение кэшируется у себя и у ближайшего узла пути,
+    # где его не было. При смене соседей ближайшие реплики довозят копии новым соседям
+
+    def put(self, key, value, ttl: float = KV_TTL, timeout: float = KV_WRITE_TIMEOUT) -> int:
+        # сколько копий подтверждено к возврату (ждём не больше KV_WRITE_QUORUM)
+        target = key_to_id(key)
+        data = value.encode("utf-8") if isinstance(value, str) else bytes(value)
+        if len(data) > KV_MAX_VALUE:
+            raise ValueError(f"значение больше {KV_MAX_VALUE} байт")
+        if not ttl > 0:
+            raise ValueError("TTL должен быть больше нуля")
+        now = time.time()
+        record = (data, int(now * 1000), now + min(ttl, KV_MAX_TTL))
+
+        closest = self.lookup(target)
+        stored = 0
+        if self._kv_responsible(target, closest):
+            stored = self._kv_store(target, record)
+
+        wait = StoreWait(min(KV_WRITE_QUORUM, len(closest)))
+        rid = new_request_id()
+        self._pending_stores[rid] = wait
+        packet = self._kv_packet(PacketType.STORE, target, record, rid=rid)
+        try:
+            with self.transport.batch():
+                for peer in closest:
+                    self._send(packet, peer.addr)
+            wait.event.wait(timeout)
+        finally:
+            self._pending_stores.pop(rid, None)
+        return stored + wait.acks
+
+    def get(self, key, alpha: int = LOOKUP_ALPHA, timeout: float = QUERY_TIMEOUT) -> Optional[bytes]:
+        target = key_to_id(key)
+        record = self.kv.get(target) or self.kv_hot.get(target)
+        if record is not None:
+            return record[0]
+
+        result = self._run_lookup(target, True, alpha, timeout)
+        if not result.value_found or not isinstance(result.value, tuple):
+            return None
+        data, version, expires = result.value
+        hot = (data, version, min(expires, time.time() + KV_HOT_TTL))
+        self.kv_hot.put(target, *hot)
+
+        # копия на пути: ближайший к ключу из ответивших без значения — следующий
+        # поиск того же ключа остановится на нём, не доходя до реплик
+        holder = result.path[-1][0]
+        passed = [peer for peer, _ in result.path if peer is not holder]
+        if passed:
+            nearest = min(passed, key=lambda p: p.node_id ^ target)
+            self._send(self._kv_packet(PacketType.STORE, target, hot, cache=1), nearest.addr)
+        return data
+
+    def _kv_packet(self, ptype, key: int, record, **extra) -> dict:
+        data, version, expires = record
+        packet = {
+            "type": ptype.value,
+            "id": f"{self.node_id:040x}",
+            "key": f"{key:040x}",
+            "data": data,
+            "ts": version,
+            "ttl": max(1, int(expires - time.time())),
+        }
+        packet.update(extra)
+        return packet
+
+    @staticmethod
+    def _parse_kv_record(packet):
+        # (значение, версия, истекает) или None
+        try:
+            data = packet.get("data", b"")
+            version = int(packet.get("ts"))
+            ttl = min(int(packet.get("ttl")), KV_MAX_TTL)
+        except (TypeError, ValueError):
+            return None
+        if not isinstance(data, bytes) or len(data) > KV_MAX_VALUE or version < 0 or ttl <= 0:
+            return None
+        return data, version, time.time() + ttl
+
+    def _kv_store(self, key: int, record) -> int:
+        self.kv.put(key, *record)
+        entry = self.kv.entry(key)
+        if entry is None:
+            return 0
+        # копии у нынешних ближайших считаем уже разосланными: передавать их будем,
+        # только когда этот набор изменится
+        entry.replicas = self._kv_replica_ids(key)
+        return 1
+
+    def _kv_responsible(self, key: int, closest=None) -> bool:
+        # узел среди k ближайших к ключу из тех, кого он знает
+        if closest is None:
+            closest = self.dht.find_closest(key, self.dht.k)
+        return len(closest) < self.dht.k or self.node_id ^ key < closest[-1].node_id ^ key
+
+    def _kv_replica_ids(self, key: int):
+        return tuple(sorted(p.node_id for p in self.dht.find_closest(key, self.dht.k)))
+
+    def _handle_store(self, packet, addr):
+        self.dht.add_peer(addr, self._parse_node_id(packet.get("id")))
+        key = self._parse_node_id(packet.get("key"))
+        record = self._parse_kv_record(packet)
+        if key is None or record is None:
+            return
+
+        if packet.get("cache"):
+            data, version, expires = record
+            self.kv_hot.put(key, data, version, min(expires, time.time() + KV_HOT_TTL))
+        elif not self._kv_responsible(key) or not self._kv_store(key, record):
+            # ключ не наш или квота журнала исчерпана — копии нет, подтверждать нечего
+            return
+
+        rid = packet.get("rid")
+        if rid is not None:
+            self._send({"type": PacketType.STORED.value, "id": f"{self.node_id:040x}", "rid": rid}, addr)
+
+    def _handle_stored(self, packet, addr):
+        wait = self._pending_stores.get(packet.get("rid"))
+        if wait is not None:
+            wait.ack()
+
+    def _kv_tick(self, now):
+        if now >= self._next_kv_expire:
+            self._next_kv_expire = now + KV_EXPIRE_INTERVAL
+            self.kv.expire(now)
+        # мусор от перезаписей проверяется каждый тик: журнал на диске не
+        # перерастает квоту живых данных больше чем вдвое
+        if self.kv.needs_compaction():
+            self.kv.compact()
+
+        # полная переотправка: копии могли пропасть и без заметной нам смены соседей
+        if now >= self._next_kv_republish:
+            self._next_kv_republish = now + KV_REPUBLISH
+            for key in self.kv.keys():
+                entry = self.kv.entry(key)
+                if entry is not None:
+                    entry.replicas = ()
+            self._kv_dirty = True
+
+        # проход по ключам — частями, чтобы не занимать heartbeat надолго
+        if self._kv_dirty and not self._kv_pass:
+            self._kv_dirty = False
+            self._kv_pass = self.kv.keys()
+        if not self._kv_pass:
+            return
+        batch = self._kv_pass[-KV_HANDOFF_BATCH:]
+        del self._kv_pass[-KV_HANDOFF_BATCH:]
+        with self.transport.batch():
+            for key in batch:
+                self._kv_handoff(key, now)
+
+    def _kv_handoff(self, key: int, now):
+        entry = self.kv.entry(key)
+        if entry is None:
+            return
+        closest = self.dht.find_closest(key, self.dht.k)
+        replicas = tuple(sorted(p.node_id for p in closest))
+        if replicas == entry.replicas:
+            return
+        known = set(entry.replicas)
+        entry.replicas = replicas
+
+        # копию новым соседям везут только самые близкие к ключу реплики, иначе
+        # новичок получил бы её от всех k
+        mine = self.node_id ^ key
+        if sum(1 for p in closest if p.node_id ^ key < mine) >= KV_HANDOFF_RANK:
+            return
+        record = self.kv.get(key, now)
+        if record is None:
+            return
+        packet = self._kv_packet(PacketType.STORE, key, record)
+        for peer in closest:
+            if peer.node_id not in known:
+                self._send(packet, peer.addr)
+
+    # ============================================================
+    #   PUBLISH / SUBSCRIBE
+    # ============================================================
+    def subscribe(self, topic: str, callback=None):
+        # без callback сообщения темы пишутся в лог
+        if callback is None:
+            def callback(data, topic=topic):
+                logging.info("Тема %s: %s", topic, data.decode("utf-8", errors="replace"))
+        self.pubsub.subscribe(key_to_id(topic), callback)
+
+    def unsubscribe(self, topic: str):
+        self.pubsub.unsubscribe(key_to_id(topic))
+
+    def publish(self, topic: str, data) -> int:
+        data = data.encode("utf-8") if isinstance(data, str) else bytes(data)
+        return self.pubsub.publish(key_to_id(topic), data)
+
+    # ============================================================
+    #   БЛОБЫ
+    # ============================================================
+    def _handle_announce(self, packet, addr):
+        self.dht.add_peer(addr, self._parse_node_id(packet.get("id")))
+        key = self._parse_node_id(packet.get("key"))
+        if key is not None:
+            self._add_provider(key, addr)
+
+    def _add_provider(self, key: int, addr):
+        # запись об источниках хранится как обычное значение для FIND_VALUE
+        record = self.values.get(key)
+        if not isinstance(record, dict) or "providers" not in record:
+            record = self.values[key] = {"providers": []}
+        entry = [addr[0], addr[1]]
+        if entry not in record["providers"]:
+            record["providers"].append(entry)
+            del record["providers"][:-MAX_PROVIDERS]
+
+    def share_file(self, path: str) -> str:
+        manifest = self.blobs.share(path)
+        key = manifest.blob_id
+        self._add_provider(key, (self.host, self.port))
+
+        def announce():
+            packet = {"type": PacketType.ANNOUNCE.value, "id": f"{self.node_id:040x}", "key": f"{key:040x}"}
+            for peer in self.lookup(key):
+                self._send(packet, peer.addr)
+
+        threading.Thread(target=announce, daemon=True).start()
+        logging.info("Раздаётся %s: %040x (%s байт, %s кусков)",
+                     path, key, manifest.size, manifest.pieces)
+        return f"{key:040x}"
+
+    def fetch_file(self, key, dest: str, providers=None):
+        target = key_to_id(key)
+        if providers is None:
+            record = self.lookup_value(target)
+            providers = record.get("providers", []) if isinstance(record, dict) else []
+
+        providers = [tuple(p) for p in providers if tuple(p) != (self.host, self.port)]
+        if not providers:
+            logging.warning("Нет источников для %040x", target)
+            return None
+
+        # незнакомым источникам — HELLO, чтобы договориться о бинарном формате
+        for addr in providers:
+            if addr not in self.dht:
+                self.send_hello(addr)
+
+        return self.blobs.fetch(target, dest, providers)
+
+    # ============================================================
+    #   КЭШ ПИРОВ
+    # ============================================================
+    def _restore_peers(self):
+        if not self.peer_cache:
+            return
+        t0 = time.perf_counter()
+        peers = load_peers(self.peer_cache)
+        if not peers:
+            return
+        self._cached_peers = {p.addr: p for p in peers if p.addr != (self.host, self.port)}
+        logging.info("Кэш пиров: %s записей за %.1f мс", len(self._cached_peers),
+                     (time.perf_counter() - t0) * 1000)
+        threading.Thread(target=self._rejoin, args=(best_candidates(self._cached_peers.values()),),
+                         daemon=True).start()
+
+    def _rejoin(self, candidates):
+        # HELLO волнами по лучшим кандидатам, пока таблица не наберёт k пиров
+        for i in range(0, len(candidates), REJOIN_WAVE):
+            if not self.running or len(self.dht) >= self.dht.k:
+                break
+            with self.transport.batch():
+                for peer in candidates[i:i + REJOIN_WAVE]:
+                    if peer.addr not in self.dht:
+                        self.send_hello(peer.addr)
+            time.sleep(REJOIN_WAVE_DELAY)
+        logging.info("Повторное подключение: %s пиров в DHT", len(self.dht))
+
+    def save_peer_cache(self):
+        if not self.peer_cache:
+            return
+        peers = self.dht.all_peers()
+        # не ответившие в этот раз записи тоже остаются — на случай, если сеть была недоступна
+        peers.extend(p for addr, p in list(self._cached_peers.items()) if addr not in self.dht)
+        try:
+            count = save_peers(self.peer_cache, best_candidates(peers, PEER_CACHE_LIMIT))
+            logging.debug("Кэш пиров сохранён: %s записей", count)
+        except OSError as e:
+            logging.error("Не удалось сохранить кэш пиров: %s", e)
+
+    def _start_bootstrap(self):
+        # поиск собственного ID заполняет ближние бакеты
+        if self._bootstrapping:
+            return
+        self._bootstrapping = True
+
+        def run():
+            try:
+                self.lookup(self.node_id)
+            except Exception as e:
+                logging.error("Ошибка bootstrap-поиска: %s", e)
+            finally:
+                self._bootstrapping = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    @staticmethod
+    def _parse_node_id(value):
+        if not isinstance(value, str):
+            return None
+        try:
+            return int(value, 16)
+        except ValueError:
+            return None
 
     # ============================================================
     #   SEND
     # ============================================================
-    def send_hello(self, addr):
+    def _set_wire(self, addr, version):
+        if not isinstance(version, int):
+            return
+        peer = self.dht.get_peer(addr)
+        if peer is not None:
+            peer.wire = min(version, WIRE_VERSION)
+
+    def _send(self, packet, addr):
+        # бинарный формат — только тем, кто подтвердил его в HELLO
+        peer = self.dht.get_peer(addr)
+        binary = peer is not None and peer.wire >= 1
+        data = stamp_packet_id(encode_packet(packet, binary=binary), next(self._packet_ids))
+        # с сессиями пакет шифруется, а до конца рукопожатия ждёт в очереди
+        if self.sessions is not None and packet.get("type") not in PLAINTEXT_TYPES:
+            data = self.sessions.seal(addr, data)
+            if data is None:
+                return
+        self._send_raw(data, addr)
+
+    def _send_raw(self, data, addr):
+        dst = self._relayed.get(addr)
+        if dst is not None:
+            self._send_relayed(dst, data)
+            return
+        self.transport.send(data, self.paths.route(addr))
+
+    def send_hello(self, addr, handshake=None):
         packet = {
             "type": PacketType.HELLO.value,
+            "id": f"{self.node_id:040x}",
+            "wire": WIRE_VERSION,
             "external": self.external_addr,
             "local": (self.host, self.port)
         }
-        self.transport.send(encode_packet(packet), addr)
+        if self.multipath:
+            addrs = self._advertised_addrs()
+            if addrs:
+                packet["addrs"] = addrs
+        if self.sessions is not None:
+            packet.update(handshake or self.sessions.hello_fields(addr))
+        self._hello_sent[addr] = time.time()
+        self._send(packet, addr)
 
     def send_message(self, addr, text):
         packet = {"type": PacketType.MESSAGE.value, "text": text}
-        self.transport.send(encode_packet(packet), addr)
+        self._send(packet, addr)
+
+    def send_reliable(self, addr, payload):
+        # Future: результат True, когда получатель подтвердил все фрагменты
+        return self.reliable.send(addr, payload)
 
-    def send_node_list(self, addr):
-        peers = [p for p in self.dht.get_peers() if p != addr]
+    def send_node_list(self, addr, target=None, rid=None):
+        # только k ближайших к запросившему, а не вся таблица
+        if target is None:
+            target = node_id_from_addr(addr)
+        peers = [
+            [p.addr[0], p.addr[1], f"{p.node_id:040x}"]
+            for p in self.dht.find_closest(target, self.dht.k + 1, prefer_fast=True)
+            if p.addr != addr
+        ][:self.dht.k]
         packet = {
             "type": PacketType.NODE_LIST.value,
+            "id": f"{self.node_id:040x}",
             "peers": peers,
+            "wire": WIRE_VERSION,
             "external": self.external_addr,
             "local": (self.host, self.port)
         }
-        self.transport.send(encode_packet(packet), addr)
+        if rid is not None:
+            packet["rid"] = rid
+        self._send(packet, addr)
+
+    def send_ping(self, addr, samples=None):
+        nonce, ts = self.rtt.new_probe(addr, samples)
+        packet = {"type": PacketType.PING.value, "nonce": nonce, "ts": ts}
+        self._send(packet, addr)
+
+    # ============================================================
+    #   MULTIPATH
+    # ============================================================
+    def _advertised_addrs(self):
+        # адреса своих интерфейсов на нашем порту; снимок — из кэша монитора
+        monitor = self.transport.monitor
+        if monitor is None or monitor.state is None:
+            return []
+        ipv6 = self.transport.socket6 is not None
+        return [[ip, self.port] for ip in monitor.state.addresses(ipv6=ipv6)]
+
+    def _send_path_probe(self, addr, nonce):
+        # мимо выбора пути: проверяется именно этот адрес
+        packet = {"type": PacketType.PING.value, "id": f"{self.node_id:040x}", "nonce": nonce, "ts": 0}
+        self.transport.send(stamp_packet_id(encode_packet(packet), next(self._packet_ids)), addr)
+
+    def _on_path_confirmed(self, path):
+        # запасной адрес мог попасть в таблицу отдельной записью: двойник из
+        # «local»/«external» с ID по адресу убирается, а если под этим адресом
+        # теперь сам пир — устарел основной адрес, и пути забываются до HELLO
+        primary = self.paths.primary(path)
+        peer = self.dht.get_peer(path) if primary != path else None
+        if peer is None:
+            return
+        main = self.dht.get_peer(primary)
+        if main is None or main.node_id == peer.node_id:
+            self.paths.drop(primary)
+        else:
+            self.dht.remove_peer(path)
 
-    def send_ping(self, addr):
-        packet = {"type": PacketType.PING.value}
-        self.transport.send(encode_packet(packet), addr)
+    def _on_interfaces(self, state, added, removed):
+        # из потока монитора: свои адреса сменились — пути перемеряются, а пирам
+        # ближайший heartbeat разошлёт HELLO с новым списком. Первый снимок —
+        # не смена: адреса и так уйдут в обычных HELLO
+        known, self._interfaces_known = self._interfaces_known, True
+        if self.multipath and known and (added or removed):
+            self.paths.reprobe()
+            self._readvertise = self.running
 
     # ============================================================
     #   CONNECT
@@ -219,7 +1639,7 @@ class Node:
     #   PANEL
     # ============================================================
     def get_dht_peers(self):
-        now = time.time()
+        # (ip, port, last_seen) — возраст панель считает сама при отрисовке
         result = []
 
         for peer in self.dht.get_peers():
@@ -232,21 +1652,78 @@ class Node:
             if not isinstance(port, int):
                 continue
 
-            last_seen = self.dht.last_seen.get(peer)
-            age = "нет данных" if last_seen is None else f"{int(now - last_seen)} сек назад"
+            entry = self.dht.get_peer(peer)
+            last_seen = None if entry is None else entry.last_seen
 
-            result.append((ip, port, age))
+            result.append((ip, port, last_seen))
 
         return result
 
     def update_panel_dht(self):
         if not self.panel:
             return
+        # полный снимок; накопленные изменения в него уже входят
+        if self._panel_changes is not None:
+            self._panel_changes.drain()
         peers = self.get_dht_peers()
         self.panel.safe_update_dht(peers)
 
-    def trace(self, ip, port):
-        logging.info(f"TRACE: функция пока не реализована ({ip}:{port})")
+    def push_panel_dht_changes(self):
+        if not self.panel or self._panel_changes is None:
+            return
+        upserts, removed = self._panel_changes.drain()
+        if upserts or removed:
+            self.panel.safe_apply_dht_diff(upserts, removed)
+
+    def trace(self, ip, port, probes: int = TRACE_PROBES):
+        # путь итеративного поиска к узлу (alpha = 1 — по одному шагу за раз)
+        # и замер RTT до каждого узла пути
+        addr = (ip, int(port))
+        known = self.dht.get_peer(addr)
+        target = known.node_id if known is not None else node_id_from_addr(addr)
+
+        lookup = self._run_lookup(target, False, 1, QUERY_TIMEOUT)
+        # узел пути — ответивший, который оказался ближе к цели всех предыдущих
+        path = {}
+        best = None
+        for peer, _ in lookup.path:
+            distance = peer.node_id ^ target
+            if best is None or distance < best:
+                best = distance
+                path[peer.addr] = peer.node_id
+        path.setdefault(addr, target)
+        hops = list(path)
+
+        samples = {hop: [] for hop in hops}
+        for _ in range(probes):
+            with self.transport.batch():
+                for hop in hops:
+                    self.send_ping(hop, samples[hop])
+        for hop in hops:
+            self.rtt.wait(samples[hop], probes, self.rtt.timeout)
+
+        result = []
+        logging.info("TRACE %s:%s, %s узлов на пути", ip, port, len(hops))
+        for i, hop in enumerate(hops, 1):
+            rtts = samples[hop]
+            entry = {
+                "hop": i,
+                "addr": hop,
+                "distance": (path[hop] ^ target).bit_length(),
+                "sent": probes,
+                "received": len(rtts),
+                "p50": percentile(rtts, 50),
+                "p90": percentile(rtts, 90),
+                "max": max(rtts) if rtts else None,
+            }
+            result.append(entry)
+            if rtts:
+                logging.info("  %2d  %s:%s  dist=%3d  p50=%.1f мс  p90=%.1f мс  max=%.1f мс  потери %d/%d",
+                             i, hop[0], hop[1], entry["distance"], entry["p50"] * 1000,
+                             entry["p90"] * 1000, entry["max"] * 1000, probes - len(rtts), probes)
+            else:
+                logging.info("  %2d  %s:%s  dist=%3d  нет ответа", i, hop[0], hop[1], entry["distance"])
+        return result
 
     def watch(self):
         logging.info("WATCH: функция пока не реализована")
@@ -0,0 +1,41 @@
+import hashlib
+import os
+import time
+from typing import Optional, Tuple
+
+
+ID_BITS = 160
+
+
+def node_id_from_addr(addr: Tuple[str, int]) -> int:
+    # детерминированный ID для пиров, которые не прислали свой
+    raw = f"{addr[0]}:{addr[1]}".encode("utf-8")
+    return int.from_bytes(hashlib.sha1(raw).digest(), "big")
+
+
+def random_node_id() -> int:
+    return int.from_bytes(os.urandom(ID_BITS // 8), "big")
+
+
+def xor_distance(a: int, b: int) -> int:
+    return a ^ b
+
+
+class Peer:
+    __slots__ = ("addr", "node_id", "last_seen", "wire", "rtt", "rttvar", "score")
+
+    def __init__(self, addr: Tuple[str, int], node_id: Optional[int] = None,
+                 last_seen: Optional[float] = None):
+        self.addr = addr
+        self.node_id = node_id if node_id is not None else node_id_from_addr(addr)
+        self.last_seen = last_seen if last_seen is not None else time.time()
+        # версия бинарного формата, о которой договорились в HELLO (0 — только JSON)
+        self.wire = 0
+        # сглаженное время ответа и его разброс, сек (None — ещё не измерено)
+        self.rtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+        # надёжность 0..1: скользящая доля ответов на наши запросы
+        self.score = 0.5
+
+    def __repr__(self):
+        return f"Peer({self.addr[0]}:{self.addr[1]}, {self.node_id:040x})"
@@ -0,0 +1,95 @@
+import logging
+import math
+import os
+import socket
+import struct
+import time
+import zlib
+from typing import Iterable, List, Optional
+
+from .peer import Peer
+
+
+# файл: заголовок (magic | версия | число записей | crc32 тела) + записи фиксированной длины:
+# IPv4 | порт | ID узла | last_seen | RTT, мс (NaN — не измерен) | надёжность 0..255 | версия формата
+CACHE_MAGIC = b"APC1"
+CACHE_HEADER = struct.Struct("!4sBII")
+CACHE_ENTRY = struct.Struct("!4sH20sdfBB")
+
+PEER_CACHE_LIMIT = 10000
+PEER_CACHE_MAX_AGE = 7 * 24 * 3600
+
+
+def rank_key(peer: Peer):
+    # надёжные — первыми, среди равных — быстрые, затем недавно виденные
+    rtt = peer.rtt if peer.rtt is not None else math.inf
+    return -round(peer.score, 2), rtt, -peer.last_seen
+
+
+def best_candidates(peers: Iterable[Peer], n: Optional[int] = None) -> List[Peer]:
+    ranked = sorted(peers, key=rank_key)
+    return ranked if n is None else ranked[:n]
+
+
+def save_peers(path: str, peers: Iterable[Peer]) -> int:
+    body = bytearray()
+    pack = CACHE_ENTRY.pack
+    inet_pton = socket.inet_pton
+    count = 0
+
+    for peer in peers:
+        try:
+            raw = inet_pton(socket.AF_INET, peer.addr[0])
+        except (OSError, TypeError):
+            continue
+        rtt = peer.rtt * 1000 if peer.rtt is not None else math.nan
+        score = max(0, min(255, int(round(peer.score * 255))))
+        body += pack(raw, peer.addr[1], peer.node_id.to_bytes(20, "big"),
+                     peer.last_seen, rtt, score, peer.wire)
+        count += 1
+
+    header = CACHE_HEADER.pack(CACHE_MAGIC, 1, count, zlib.crc32(body))
+
+    # запись во временный файл и атомарная подмена: оборванная запись не портит кэш
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return count
+
+
+def load_peers(path: str, max_age: float = PEER_CACHE_MAX_AGE) -> List[Peer]:
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return []
+
+    if len(data) < CACHE_HEADER.size:
+        return []
+    magic, version, count, crc = CACHE_HEADER.unpack_from(data, 0)
+    body = memoryview(data)[CACHE_HEADER.size:]
+    if magic != CACHE_MAGIC or version != 1 or len(body) != count * CACHE_ENTRY.size \
+            or zlib.crc32(body) != crc:
+        logging.warning("Кэш пиров %s повреждён — игнорируется", path)
+        return []
+
+    oldest = time.time() - max_age
+    inet_ntoa = socket.inet_ntoa
+    from_bytes = int.from_bytes
+    isnan = math.isnan
+    peers = []
+
+    for raw, port, node_id, last_seen, rtt, score, wire in CACHE_ENTRY.iter_unpack(body):
+        if last_seen < oldest:
+            continue
+        peer = Peer((inet_ntoa(raw), port), from_bytes(node_id, "big"), last_seen)
+        peer.rtt = None if isnan(rtt) else rtt / 1000
+        peer.score = score / 255
+        peer.wire = wire
+        peers.append(peer)
+
+    return peers
@@ -0,0 +1,193 @@
+import logging
+import threading
+from collections import deque, OrderedDict
+from typing import Callable, Dict
+
+from .protocol import PacketType, peek_type
+
+
+DEFAULT_QUEUE_SIZE = 4096
+DEFAULT_HANDLER_WORKERS = 2
+
+# при перегрузке эти пакеты выбрасываются последними
+PROTECTED_TYPES = {PacketType.PING.value, PacketType.HELLO.value}
+
+POLICY_DROP_OLDEST = "drop-oldest"
+POLICY_DROP_BY_TYPE = "drop-by-type"
+POLICY_FAIR = "fair"
+POLICIES = (POLICY_DROP_OLDEST, POLICY_DROP_BY_TYPE, POLICY_FAIR)
+
+
+class PacketPipeline:
+    # приёмник → ограниченная очередь → пул обработчиков.
+    # submit() никогда не блокируется: при переполнении срабатывает политика сброса
+
+    def __init__(self, handler: Callable, workers: int = DEFAULT_HANDLER_WORKERS,
+                 maxsize: int = DEFAULT_QUEUE_SIZE, policy: str = POLICY_DROP_OLDEST):
+        if policy not in POLICIES:
+            raise ValueError(f"неизвестная политика перегрузки: {policy}")
+
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self.policy = policy
+
+        self._cond = threading.Condition()
+        self._depth = 0
+
+        # drop-oldest: одна очередь; drop-by-type: защищённые + остальные;
+        # fair: очередь на каждый источник, выборка по кругу
+        self._queue = deque()
+        self._protected = deque()
+        self._sources: "OrderedDict[str, deque]" = OrderedDict()
+
+        self._running = False
+        self._threads = []
+
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.dropped_by_type: Dict[str, int] = {}
+        self.max_depth = 0
+
+    # ============================================================
+    #   ЖИЗНЕННЫЙ ЦИКЛ
+    # ============================================================
+    def start(self):
+        self._running = True
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker_loop, name=f"handler-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout=1)
+        self._threads = []
+
+    # ============================================================
+    #   ПРИЁМ (поток транспорта)
+    # ============================================================
+    def submit(self, data, addr) -> bool:
+        ptype = peek_type(data)
+        item = (data, addr, ptype)
+
+        with self._cond:
+            if self._depth >= self.maxsize and not self._make_room(item):
+                self._count_drop(ptype)
+                return False
+
+            if self.policy == POLICY_DROP_BY_TYPE and ptype in PROTECTED_TYPES:
+                self._protected.append(item)
+            elif self.policy == POLICY_FAIR:
+                source = self._sources.get(addr[0])
+                if source is None:
+                    source = self._sources[addr[0]] = deque()
+                source.append(item)
+            else:
+                self._queue.append(item)
+
+            self._depth += 1
+            self.enqueued += 1
+            if self._depth > self.max_depth:
+                self.max_depth = self._depth
+            self._cond.notify()
+        return True
+
+    def _make_room(self, item) -> bool:
+        # освобождает место под item; False — выбросить сам item
+        if self.policy == POLICY_DROP_OLDEST:
+            victim = self._queue.popleft()
+
+        elif self.policy == POLICY_DROP_BY_TYPE:
+            if self._queue:
+                victim = self._queue.popleft()
+            elif item[2] in PROTECTED_TYPES:
+                victim = self._protected.popleft()
+            else:
+                return False
+
+        else:
+            # fair: режем самый длинный источник — флудер теряет свои пакеты
+            longest = max(self._sources.values(), key=len)
+            if longest is self._sources.get(item[1][0]) or len(longest) > 1:
+                victim = longest.popleft()
+            else:
+                return False
+
+        self._depth -= 1
+        self._count_drop(victim[2])
+        return True
+
+    def _count_drop(self, ptype):
+        self.dropped += 1
+        key = ptype or "?"
+        self.dropped_by_type[key] = self.dropped_by_type.get(key, 0) + 1
+
+    # ============================================================
+    #   ОБРАБОТКА
+    # ============================================================
+    def _take(self):
+        if self.policy == POLICY_DROP_BY_TYPE and self._protected:
+            return self._protected.popleft()
+
+        if self.policy == POLICY_FAIR:
+            while self._sources:
+                ip, source = next(iter(self._sources.items()))
+                if not source:
+                    del self._sources[ip]
+                    continue
+                item = source.popleft()
+                # источник уходит в конец круга
+                self._sources.move_to_end(ip)
+                if not source:
+                    del self._sources[ip]
+                return item
+            return None
+
+        return self._queue.popleft() if self._queue else None
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while self._running and self._depth == 0:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                item = self._take()
+                if item is None:
+                    continue
+                self._depth -= 1
+
+            data, addr, _ = item
+            try:
+                self.handler(data, addr)
+            except Exception as e:
+                logging.error("Ошибка в обработчике пакета: %s", e)
+
+            with self._cond:
+                self.processed += 1
+
+    # ============================================================
+    #   СТАТИСТИКА
+    # ============================================================
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "policy": self.policy,
+                "workers": self.workers,
+                "depth": self._depth,
+                "max_depth": self.max_depth,
+                "capacity": self.maxsize,
+                "enqueued": self.enqueued,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "dropped_by_type": dict(self.dropped_by_type),
+            }
@@ -1,5 +1,10 @@
+import base64
 import json
+import re
+import socket
+import struct
 from enum import Enum
+from typing import Optional
 
 
 class PacketType(Enum):
@@ -7,11 +12,500 @@ class PacketType(Enum):
     MESSAGE = "MESSAGE"
     NODE_LIST = "NODE_LIST"
     PING = "PING"
+    FIND_NODE = "FIND_NODE"
+    FIND_VALUE = "FIND_VALUE"
+    VALUE = "VALUE"
+    RDATA = "RDATA"
+    RACK = "RACK"
+    ANNOUNCE = "ANNOUNCE"
+    MANIFEST_GET = "MANIFEST_GET"
+    MANIFEST = "MANIFEST"
+    CHUNK_GET = "CHUNK_GET"
+    CHUNK = "CHUNK"
+    PONG = "PONG"
+    GOSSIP = "GOSSIP"
+    GOSSIP_REPLY = "GOSSIP_REPLY"
+    PUNCH_REQ = "PUNCH_REQ"
+    PUNCH_INTRO = "PUNCH_INTRO"
+    PUNCH = "PUNCH"
+    RELAY = "RELAY"
+    STORE = "STORE"
+    STORED = "STORED"
+    TOPIC_JOIN = "TOPIC_JOIN"
+    TOPIC_SHUFFLE = "TOPIC_SHUFFLE"
+    TOPIC_NEIGHBORS = "TOPIC_NEIGHBORS"
+    TOPIC_LEAVE = "TOPIC_LEAVE"
+    PUBLISH = "PUBLISH"
+    IHAVE = "IHAVE"
+    GRAFT = "GRAFT"
+    PRUNE = "PRUNE"
 
 
-def encode_packet(packet: dict) -> bytes:
-    return json.dumps(packet).encode("utf-8")
+# ============================================================
+#   БИНАРНЫЙ ФОРМАТ
+# ============================================================
+# заголовок: magic | версия | код типа, дальше поля в виде TLV:
+# тег (1 байт) + значение, формат значения задаётся тегом.
+# JSON-пакет всегда начинается с "{", поэтому формат определяется по первому байту.
 
+WIRE_MAGIC = 0xA7
+WIRE_VERSION = 1
 
-def decode_packet(data: bytes) -> dict:
-    return json.loads(data.decode("utf-8"))
+HEADER = struct.Struct("!BBB")
+ADDR = struct.Struct("!4sH")
+ADDR_ID = struct.Struct("!4sH20s")
+
+TYPE_CODES = {
+    PacketType.HELLO.value: 1,
+    PacketType.MESSAGE.value: 2,
+    PacketType.NODE_LIST.value: 3,
+    PacketType.PING.value: 4,
+    PacketType.FIND_NODE.value: 5,
+    PacketType.FIND_VALUE.value: 6,
+    PacketType.VALUE.value: 7,
+    PacketType.RDATA.value: 8,
+    PacketType.RACK.value: 9,
+    PacketType.ANNOUNCE.value: 10,
+    PacketType.MANIFEST_GET.value: 11,
+    PacketType.MANIFEST.value: 12,
+    PacketType.CHUNK_GET.value: 13,
+    PacketType.CHUNK.value: 14,
+    PacketType.PONG.value: 15,
+    PacketType.GOSSIP.value: 16,
+    PacketType.GOSSIP_REPLY.value: 17,
+    PacketType.PUNCH_REQ.value: 18,
+    PacketType.PUNCH_INTRO.value: 19,
+    PacketType.PUNCH.value: 20,
+    PacketType.RELAY.value: 21,
+    PacketType.STORE.value: 22,
+    PacketType.STORED.value: 23,
+    PacketType.TOPIC_JOIN.value: 24,
+    PacketType.TOPIC_SHUFFLE.value: 25,
+    PacketType.TOPIC_NEIGHBORS.value: 26,
+    PacketType.TOPIC_LEAVE.value: 27,
+    PacketType.PUBLISH.value: 28,
+    PacketType.IHAVE.value: 29,
+    PacketType.GRAFT.value: 30,
+    PacketType.PRUNE.value: 31,
+}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+# виды значений
+F_NODEID = 1   # 20 байт, в пакете — hex-строка
+F_HEX = 2      # varint длина + сырые байты, в пакете — hex-строка
+F_ADDR = 3     # 6 байт IPv4 + порт
+F_PEERS = 4    # varint количество, флаг наличия ID, записи по 6 (+20) байт
+F_STR = 5      # varint длина + UTF-8
+F_JSON = 6     # varint длина + JSON
+F_UINT = 7     # varint
+F_B64 = 8      # varint длина + сырые байты, в пакете — bytes (в JSON — base64-строка)
+F_UINTS = 9    # varint количество + varint-ы, в пакете — список чисел
+F_U64 = 10     # 8 байт, в пакете — число
+
+FIELDS = {
+    "id": (1, F_NODEID),
+    "rid": (2, F_HEX),
+    "target": (3, F_NODEID),
+    "key": (4, F_NODEID),
+    "external": (5, F_ADDR),
+    "local": (6, F_ADDR),
+    "peers": (7, F_PEERS),
+    "text": (8, F_STR),
+    "value": (9, F_JSON),
+    "wire": (10, F_UINT),
+    "sid": (11, F_UINT),
+    "seq": (12, F_UINT),
+    "msg": (13, F_UINT),
+    "frag": (14, F_UINT),
+    "nfrag": (15, F_UINT),
+    "data": (16, F_B64),
+    "ack": (17, F_UINT),
+    "sack": (18, F_UINTS),
+    "wnd": (19, F_UINT),
+    "page": (20, F_UINT),
+    "piece": (21, F_UINT),
+    "block": (22, F_UINT),
+    "nonce": (23, F_UINT),
+    "ts": (24, F_UINT),
+    "salt": (25, F_UINT),
+    "nh": (26, F_UINT),
+    "bloom": (27, F_B64),
+    "observed": (28, F_ADDR),
+    "pub": (29, F_B64),
+    "eph": (30, F_B64),
+    "sig": (31, F_B64),
+    "hs": (32, F_UINT),
+    "ttl": (33, F_UINT),
+    "cache": (34, F_UINT),
+    "topic": (35, F_NODEID),
+    "mid": (36, F_UINT),
+    "mids": (37, F_UINTS),
+    "hops": (38, F_UINT),
+    "prio": (39, F_UINT),
+    "pid": (40, F_U64),
+    "addrs": (41, F_PEERS),
+}
+FIELD_TAGS = {tag: (name, kind) for name, (tag, kind) in FIELDS.items()}
+B64_FIELDS = tuple(name for name, (_, kind) in FIELDS.items() if kind == F_B64)
+
+
+class UnsupportedPacket(ValueError):
+    pass
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    if value < 0:
+        raise UnsupportedPacket("отрицательный varint")
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(buf, pos: int):
+    result = 0
+    shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _pack_addr(out: bytearray, addr) -> None:
+    ip, port = addr[0], int(addr[1])
+    try:
+        raw = socket.inet_pton(socket.AF_INET, ip)
+    except (OSError, TypeError):
+        raise UnsupportedPacket(f"не IPv4-адрес: {ip}")
+    out += ADDR.pack(raw, port)
+
+
+def _unpack_addr(buf, pos: int):
+    raw, port = ADDR.unpack_from(buf, pos)
+    return [socket.inet_ntoa(raw), port], pos + ADDR.size
+
+
+def _pack_node_id(out: bytearray, value) -> None:
+    if not isinstance(value, str) or len(value) != 40:
+        raise UnsupportedPacket("некорректный ID узла")
+    out += bytes.fromhex(value)
+
+
+def encode_binary(packet: dict) -> bytes:
+    code = TYPE_CODES.get(packet.get("type"))
+    if code is None:
+        raise UnsupportedPacket(f"тип без бинарного кода: {packet.get('type')}")
+
+    out = bytearray(HEADER.pack(WIRE_MAGIC, WIRE_VERSION, code))
+
+    for name, value in packet.items():
+        if name == "type" or value is None:
+            continue
+        spec = FIELDS.get(name)
+        if spec is None:
+            raise UnsupportedPacket(f"поле без бинарного тега: {name}")
+        tag, kind = spec
+        out.append(tag)
+
+        if kind == F_NODEID:
+            _pack_node_id(out, value)
+
+        elif kind == F_HEX:
+            raw = bytes.fromhex(value)
+            _write_varint(out, len(raw))
+            out += raw
+
+        elif kind == F_ADDR:
+            _pack_addr(out, value)
+
+        elif kind == F_PEERS:
+            with_ids = all(len(item) > 2 for item in value) and len(value) > 0
+            _write_varint(out, len(value))
+            out.append(1 if with_ids else 0)
+            inet_pton = socket.inet_pton
+            try:
+                if with_ids:
+                    for item in value:
+                        out += ADDR_ID.pack(inet_pton(socket.AF_INET, item[0]), int(item[1]),
+                                            bytes.fromhex(item[2]))
+                else:
+                    for item in value:
+                        out += ADDR.pack(inet_pton(socket.AF_INET, item[0]), int(item[1]))
+            except (OSError, TypeError, struct.error):
+                raise UnsupportedPacket("некорректный список пиров")
+
+        elif kind == F_STR:
+            raw = str(value).encode("utf-8")
+            _write_varint(out, len(raw))
+            out += raw
+
+        elif kind == F_JSON:
+            raw = json.dumps(value).encode("utf-8")
+            _write_varint(out, len(raw))
+            out += raw
+
+        elif kind == F_UINT:
+            _write_varint(out, int(value))
+
+        elif kind == F_B64:
+            if not isinstance(value, (bytes, bytearray, memoryview)):
+                raise UnsupportedPacket(f"поле {name} — не байты")
+            _write_varint(out, len(value))
+            out += value
+
+        elif kind == F_UINTS:
+            _write_varint(out, len(value))
+            for item in value:
+                _write_varint(out, int(item))
+
+        elif kind == F_U64:
+            out += PACKET_ID.pack(int(value))
+
+    return bytes(out)
+
+
+def decode_binary(data) -> dict:
+    # обрезанное поле (varint, адрес, число) — та же ошибка, что и обрезанный пакет
+    try:
+        return _decode_binary(data)
+    except (IndexError, struct.error):
+        raise UnsupportedPacket("обрезанный пакет")
+
+
+def _decode_binary(data) -> dict:
+    buf = memoryview(data)
+    magic, version, code = HEADER.unpack_from(buf, 0)
+    if magic != WIRE_MAGIC or version != WIRE_VERSION:
+        raise UnsupportedPacket(f"неподдерживаемая версия формата: {version}")
+
+    ptype = TYPE_NAMES.get(code)
+    if ptype is None:
+        raise UnsupportedPacket(f"неизвестный код типа: {code}")
+    if code == RELAY_CODE:
+        raise UnsupportedPacket("RELAY разбирается decode_relay")
+
+    packet = {"type": ptype}
+    pos = HEADER.size
+    end = len(buf)
+
+    while pos < end:
+        tag = buf[pos]
+        pos += 1
+        spec = FIELD_TAGS.get(tag)
+        if spec is None:
+            raise UnsupportedPacket(f"неизвестный тег поля: {tag}")
+        name, kind = spec
+
+        if kind == F_NODEID:
+            packet[name] = buf[pos:pos + 20].hex()
+            pos += 20
+
+        elif kind == F_HEX:
+            length, pos = _read_varint(buf, pos)
+            packet[name] = buf[pos:pos + length].hex()
+            pos += length
+
+        elif kind == F_ADDR:
+            packet[name], pos = _unpack_addr(buf, pos)
+
+        elif kind == F_PEERS:
+            count, pos = _read_varint(buf, pos)
+            with_ids = buf[pos]
+            pos += 1
+            entry = ADDR_ID if with_ids else ADDR
+            size = count * entry.size
+            if pos + size > end:
+                raise UnsupportedPacket("обрезанный список пиров")
+            inet_ntoa = socket.inet_ntoa
+            if with_ids:
+                packet[name] = [[inet_ntoa(raw), port, nid.hex()]
+                                for raw, port, nid in entry.iter_unpack(buf[pos:pos + size])]
+            else:
+                packet[name] = [[inet_ntoa(raw), port]
+                                for raw, port in entry.iter_unpack(buf[pos:pos + size])]
+            pos += size
+
+        elif kind == F_STR:
+            length, pos = _read_varint(buf, pos)
+            packet[name] = str(buf[pos:pos + length], "utf-8")
+            pos += length
+
+        elif kind == F_JSON:
+            length, pos = _read_varint(buf, pos)
+            packet[name] = json.loads(str(buf[pos:pos + length], "utf-8"))
+            pos += length
+
+        elif kind == F_UINT:
+            packet[name], pos = _read_varint(buf, pos)
+
+        elif kind == F_B64:
+            length, pos = _read_varint(buf, pos)
+            packet[name] = bytes(buf[pos:pos + length])
+            pos += length
+
+        elif kind == F_UINTS:
+            count, pos = _read_varint(buf, pos)
+            items = []
+            for _ in range(count):
+                item, pos = _read_varint(buf, pos)
+                items.append(item)
+            packet[name] = items
+
+        elif kind == F_U64:
+            packet[name] = PACKET_ID.unpack_from(buf, pos)[0]
+            pos += PACKET_ID.size
+
+    if pos != end:
+        raise UnsupportedPacket("обрезанный пакет")
+
+    return packet
+
+
+# ============================================================
+#   RELAY (конверт для пересылки через промежуточные узлы)
+# ============================================================
+# заголовок бинарного пакета, затем фиксированная часть:
+# ID получателя | ID отправителя | IPv4 и порт отправителя | TTL | узлов в пути,
+# адреса пройденных relay по 6 байт и вложенный пакет как есть.
+# Relay читает и меняет только заголовок, вложенный пакет не разбирается
+
+RELAY_CODE = 21
+RELAY_HEADER = struct.Struct("!20s20s4sHBB")
+RELAY_PREFIX = HEADER.size + RELAY_HEADER.size
+
+
+def is_relay(data) -> bool:
+    return len(data) >= RELAY_PREFIX and data[0] == WIRE_MAGIC and data[2] == RELAY_CODE
+
+
+def encode_relay(dst: int, src: int, src_addr, ttl: int, inner: bytes) -> bytes:
+    try:
+        raw = socket.inet_pton(socket.AF_INET, src_addr[0])
+    except (OSError, TypeError):
+        raise UnsupportedPacket(f"не IPv4-адрес: {src_addr[0]}")
+    return b"".join((
+        HEADER.pack(WIRE_MAGIC, WIRE_VERSION, RELAY_CODE),
+        RELAY_HEADER.pack(dst.to_bytes(20, "big"), src.to_bytes(20, "big"), raw, src_addr[1], ttl, 0),
+        inner,
+    ))
+
+
+def relay_header(data):
+    # (получатель, отправитель, адрес отправителя, TTL, узлов в пути)
+    dst, src, raw, port, ttl, hops = RELAY_HEADER.unpack_from(data, HEADER.size)
+    return (int.from_bytes(dst, "big"), int.from_bytes(src, "big"),
+            (socket.inet_ntoa(raw), port), ttl, hops)
+
+
+def relay_path(data):
+    hops = data[RELAY_PREFIX - 1]
+    end = RELAY_PREFIX + hops * ADDR.size
+    if len(data) < end:
+        raise UnsupportedPacket("обрезанный путь RELAY")
+    return [_unpack_addr(data, pos)[0] for pos in range(RELAY_PREFIX, end, ADDR.size)], end
+
+
+def forward_relay(data, via) -> bytes:
+    # TTL - 1 и адрес relay в конец пути; остальное копируется без разбора
+    hops = data[RELAY_PREFIX - 1]
+    path_end = RELAY_PREFIX + hops * ADDR.size
+    out = bytearray(data[:path_end])
+    out[RELAY_PREFIX - 2] -= 1
+    out[RELAY_PREFIX - 1] = hops + 1
+    _pack_addr(out, via)
+    out += data[path_end:]
+    return bytes(out)
+
+
+# ============================================================
+#   SEALED (пакет шифрованной сессии)
+# ============================================================
+# magic | счётчик (он же nonce) | шифротекст | тег Poly1305. Magic отличается и от
+# бинарного формата, и от JSON — тип пакета снаружи не виден. Шифрует core.secure
+
+SEALED_MAGIC = 0xA9
+SEALED_HEADER = struct.Struct("!BQ")
+SEALED_TAG = 16
+
+
+def is_sealed(data) -> bool:
+    return len(data) >= SEALED_HEADER.size + SEALED_TAG and data[0] == SEALED_MAGIC
+
+
+# ============================================================
+#   ID ПАКЕТА (отсев повторов до разбора)
+# ============================================================
+# отправитель дописывает к каждой датаграмме свой номер: в бинарном формате —
+# поле "pid" сразу за заголовком, в JSON — первым ключом. Повтор той же датаграммы
+# (дубль в сети, повторное воспроизведение) несёт тот же номер, а переотправка
+# верхним уровнем — новый, так что отсеиваются только настоящие повторы
+
+PID_TAG = FIELDS["pid"][0]
+PACKET_ID = struct.Struct("!Q")
+_JSON_PID = re.compile(rb'\{"pid": (\d{1,20}), ')
+
+
+def stamp_packet_id(data: bytes, pid: int) -> bytes:
+    if is_binary(data):
+        return b"".join((data[:HEADER.size], bytes((PID_TAG,)), PACKET_ID.pack(pid), data[HEADER.size:]))
+    return b'{"pid": %d, ' % pid + data[1:]
+
+
+def peek_packet_id(data) -> Optional[int]:
+    if is_binary(data):
+        if len(data) > HEADER.size + PACKET_ID.size and data[HEADER.size] == PID_TAG:
+            return PACKET_ID.unpack_from(data, HEADER.size + 1)[0]
+        return None
+    m = _JSON_PID.match(bytes(data[:32]))
+    return int(m.group(1)) if m else None
+
+
+# ============================================================
+#   ОБЩИЙ ИНТЕРФЕЙС
+# ============================================================
+def is_binary(data) -> bool:
+    return len(data) >= HEADER.size and data[0] == WIRE_MAGIC
+
+
+_JSON_TYPE = re.compile(rb'"type"\s*:\s*"([A-Z_]+)"')
+
+
+def peek_type(data):
+    # тип пакета без полного разбора — для очередей и фильтров до decode
+    if is_binary(data):
+        return TYPE_NAMES.get(data[2])
+    if len(data) <= 4:
+        return PacketType.PING.value if bytes(data).strip().upper() == b"PING" else None
+    m = _JSON_TYPE.search(bytes(data[:96]))
+    return m.group(1).decode("ascii") if m else None
+
+
+def _json_bytes(value):
+    # байтовые поля (F_B64) в JSON — base64-строкой
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+def encode_packet(packet: dict, binary: bool = False) -> bytes:
+    if binary:
+        try:
+            return encode_binary(packet)
+        except (UnsupportedPacket, ValueError, TypeError):
+            pass
+    return json.dumps(packet, default=_json_bytes).encode("utf-8")
+
+
+def decode_packet(data) -> dict:
+    if is_binary(data):
+        return decode_binary(data)
+    packet = json.loads(str(data, "utf-8"))
+    # в обоих форматах байтовые поля приходят как bytes
+    for name in B64_FIELDS:
+        value = packet.get(name)
+        if isinstance(value, str):
+            packet[name] = base64.b64decode(value, validate=True)
+    return packet
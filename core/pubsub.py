@@ -0,0 +1,471 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .protocol import PacketType
+
+
+# оверлей темы (HyParView): у каждого подписчика небольшой активный обзор —
+# симметричные связи, по которым идут сообщения, — и запасной пассивный
+ACTIVE_VIEW = 5             # предел разветвления: больше соседей в теме у узла не бывает
+PASSIVE_VIEW = 30
+SHUFFLE_SAMPLE = 8          # членов темы в ответе на TOPIC_JOIN и в обмене
+SHUFFLE_INTERVAL = 10       # обмен образцами с самым давно молчащим соседом
+ACTIVE_TIMEOUT = 60         # сосед молчит дольше — связь считается мёртвой
+JOIN_TIMEOUT = 3.0
+
+# точки встречи: столько ближайших к ID темы узлов хранят список её членов
+RENDEZVOUS = 3
+MEMBERS_LIMIT = 64
+MEMBER_TTL = 180
+TOPIC_REFRESH = 60          # подписчик напоминает о себе точкам встречи
+MAX_TOPICS = 256            # тем, для которых узел держит список членов
+
+# рассылка (Plumtree): полное сообщение — по дереву из eager-связей, по остальным
+# связям только IHAVE с ID; недополученное запрашивается GRAFT, и связь входит в дерево
+IHAVE_TIMEOUT = 0.5         # ждать полную копию после IHAVE, прежде чем просить GRAFT
+GRAFT_TIMEOUT = 1.0         # не пришло и после GRAFT — просить следующего анонсировавшего
+IHAVE_BATCH = 64            # ID сообщений в одном IHAVE
+MESSAGE_CACHE = 1024        # последних сообщений темы: отсев повторов и ответы на GRAFT
+MESSAGE_TTL = 120
+MAX_PAYLOAD = 8 * 1024
+
+Addr = Tuple[str, int]
+
+
+class Topic:
+    def __init__(self, topic_id: int, callback: Optional[Callable[[bytes], None]]):
+        self.id = topic_id
+        self.callback = callback
+        # активный обзор, разделённый на eager (дерево рассылки) и lazy (только IHAVE)
+        self.eager: Dict[Addr, int] = {}
+        self.lazy: Dict[Addr, int] = {}
+        self.passive: "OrderedDict[Addr, int]" = OrderedDict()
+        self.joining: Dict[Addr, float] = {}
+        self.heard: Dict[Addr, float] = {}
+        # ID сообщения -> (данные, число переходов, когда забыть)
+        self.seen: "OrderedDict[int, Tuple[bytes, int, float]]" = OrderedDict()
+        # ID сообщения -> [срок, кто анонсировал]: ждём полную копию
+        self.missing: Dict[int, list] = {}
+        self.ihave: Dict[Addr, List[int]] = {}
+        self.next_refresh = 0.0
+        self.next_shuffle = 0.0
+
+    def active(self) -> List[Addr]:
+        return list(self.eager) + list(self.lazy)
+
+    def is_active(self, addr) -> bool:
+        return addr in self.eager or addr in self.lazy
+
+    def add_active(self, addr, node_id: int, now: float) -> None:
+        self.lazy.pop(addr, None)
+        self.eager[addr] = node_id
+        self.heard[addr] = now
+        self.passive.pop(addr, None)
+        self.joining.pop(addr, None)
+
+    def remove_active(self, addr) -> Optional[int]:
+        self.heard.pop(addr, None)
+        self.ihave.pop(addr, None)
+        node_id = self.eager.pop(addr, None)
+        lazy_id = self.lazy.pop(addr, None)
+        return node_id if node_id is not None else lazy_id
+
+    def to_eager(self, addr) -> None:
+        if addr in self.lazy:
+            self.eager[addr] = self.lazy.pop(addr)
+
+    def to_lazy(self, addr) -> None:
+        if addr in self.eager:
+            self.lazy[addr] = self.eager.pop(addr)
+
+    def add_passive(self, addr, node_id: int) -> None:
+        if self.is_active(addr):
+            return
+        self.passive[addr] = node_id
+        self.passive.move_to_end(addr)
+        while len(self.passive) > PASSIVE_VIEW:
+            self.passive.popitem(last=False)
+
+
+class PubSub:
+    def __init__(self, node_id: int, send_fn: Callable[[dict, Addr], None],
+                 closest_fn: Callable[[int, int], list]):
+        self.node_id = node_id
+        self.id_hex = f"{node_id:040x}"
+        self._send = send_fn
+        # DHT.find_closest: точки встречи темы — ближайшие к её ID узлы таблицы
+        self._closest = closest_fn
+        self.topics: Dict[int, Topic] = {}
+        # как точка встречи: ID темы -> адрес члена -> (ID, срок)
+        self.members: "OrderedDict[int, OrderedDict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = dict.fromkeys(("published", "delivered", "duplicates", "ihave", "graft", "prune"), 0)
+
+    # ---------- подписка ----------
+
+    def subscribe(self, topic_id: int, callback: Optional[Callable[[bytes], None]] = None) -> None:
+        with self._lock:
+            topic = self.topics.get(topic_id)
+            if topic is not None:
+                topic.callback = callback
+                return
+            topic = self.topics[topic_id] = Topic(topic_id, callback)
+            self._refresh(topic, time.time())
+
+    def unsubscribe(self, topic_id: int) -> None:
+        with self._lock:
+            topic = self.topics.pop(topic_id, None)
+            if topic is None:
+                return
+            for addr in topic.active():
+                self._send(self._packet(PacketType.TOPIC_LEAVE, topic_id), addr)
+
+    def publish(self, topic_id: int, data: bytes) -> int:
+        if len(data) > MAX_PAYLOAD:
+            raise ValueError(f"сообщение больше {MAX_PAYLOAD} байт")
+        with self._lock:
+            topic = self.topics.get(topic_id)
+            if topic is None:
+                raise ValueError("узел не подписан на тему")
+            mid = random.getrandbits(63)
+            self._remember(topic, mid, data, 0, time.time())
+            self._push(topic, mid, data, 0, None)
+            self.stats["published"] += 1
+        return mid
+
+    def neighbours(self, topic_id: int) -> Tuple[int, int, int]:
+        # (eager, lazy, passive) — для info и отчётов
+        topic = self.topics.get(topic_id)
+        if topic is None:
+            return 0, 0, 0
+        return len(topic.eager), len(topic.lazy), len(topic.passive)
+
+    def drop_peer(self, addr) -> None:
+        # пир выпал из таблицы маршрутизации — ни соседом, ни кандидатом он больше не годится
+        with self._lock:
+            for topic in self.topics.values():
+                topic.remove_active(addr)
+                topic.passive.pop(addr, None)
+                topic.joining.pop(addr, None)
+
+    # ---------- пакеты ----------
+
+    def _packet(self, ptype, topic_id: int, **fields) -> dict:
+        packet = {"type": ptype.value, "topic": f"{topic_id:040x}"}
+        packet.update(fields)
+        return packet
+
+    def _membership(self, ptype, topic_id: int, **fields) -> dict:
+        # пакеты оверлея несут ID отправителя — он нужен для пассивных обзоров других узлов
+        return self._packet(ptype, topic_id, id=self.id_hex, **fields)
+
+    @staticmethod
+    def _parse_id(value) -> Optional[int]:
+        try:
+            return int(value, 16)
+        except (TypeError, ValueError):
+            return None
+
+    def _sample(self, topic_id: int, topic: Optional[Topic], exclude, now: float) -> list:
+        candidates = {}
+        registry = self.members.get(topic_id)
+        if registry is not None:
+            for addr, (node_id, expires) in registry.items():
+                if expires > now:
+                    candidates[addr] = node_id
+        if topic is not None:
+            candidates.update(topic.passive)
+            candidates.update(topic.eager)
+            candidates.update(topic.lazy)
+        candidates.pop(exclude, None)
+        chosen = random.sample(list(candidates.items()), min(SHUFFLE_SAMPLE, len(candidates)))
+        return [[addr[0], addr[1], f"{node_id:040x}"] for addr, node_id in chosen]
+
+    def _merge(self, topic: Topic, items) -> None:
+        for item in items or ():
+            try:
+                addr, node_id = (item[0], int(item[1])), int(item[2], 16)
+            except (TypeError, ValueError, IndexError):
+                continue
+            if node_id != self.node_id:
+                topic.add_passive(addr, node_id)
+
+    def _register(self, topic_id: int, addr, node_id: int, now: float) -> None:
+        registry = self.members.get(topic_id)
+        if registry is None:
+            registry = self.members[topic_id] = OrderedDict()
+            while len(self.members) > MAX_TOPICS:
+                self.members.popitem(last=False)
+        self.members.move_to_end(topic_id)
+        registry[addr] = (node_id, now + MEMBER_TTL)
+        registry.move_to_end(addr)
+        while registry and (len(registry) > MEMBERS_LIMIT or next(iter(registry.values()))[1] <= now):
+            registry.popitem(last=False)
+
+    # ---------- оверлей ----------
+
+    def on_join(self, packet, addr):
+        topic_id = self._parse_id(packet.get("topic"))
+        sender = self._parse_id(packet.get("id"))
+        if topic_id is None or sender is None:
+            return
+        now = time.time()
+        with self._lock:
+            self._register(topic_id, addr, sender, now)
+            topic = self.topics.get(topic_id)
+            ack = None
+            if topic is not None:
+                ack = self._admit(topic, addr, sender, bool(packet.get("prio")), now)
+            reply = self._membership(PacketType.TOPIC_NEIGHBORS, topic_id,
+                                     peers=self._sample(topic_id, topic, addr, now), ack=ack)
+            self._send(reply, addr)
+
+    def _admit(self, topic: Topic, addr, node_id: int, prio: bool, now: float) -> int:
+        # 1 — принят в активный обзор, 0 — член темы, но мест нет
+        if topic.is_active(addr):
+            topic.heard[addr] = now
+            return 1
+        active = topic.active()
+        if len(active) >= ACTIVE_VIEW:
+            # без соседей узел отрезан от темы: ради него вытесняется случайный сосед
+            if not prio:
+                topic.add_passive(addr, node_id)
+                return 0
+            evicted = random.choice(active)
+            evicted_id = topic.remove_active(evicted)
+            self._send(self._membership(PacketType.TOPIC_LEAVE, topic.id), evicted)
+            topic.add_passive(evicted, evicted_id)
+        topic.add_active(addr, node_id, now)
+        return 1
+
+    def on_shuffle(self, packet, addr):
+        topic_id = self._parse_id(packet.get("topic"))
+        if topic_id is None:
+            return
+        now = time.time()
+        with self._lock:
+            topic = self.topics.get(topic_id)
+            ack = None
+            if topic is not None:
+                self._merge(topic, packet.get("peers"))
+                ack = 1 if topic.is_active(addr) else 0
+                if ack:
+                    topic.heard[addr] = now
+            reply = self._membership(PacketType.TOPIC_NEIGHBORS, topic_id,
+                                     peers=self._sample(topic_id, topic, addr, now), ack=ack)
+            self._send(reply, addr)
+
+    def on_neighbors(self, packet, addr):
+        # ответ на TOPIC_JOIN или TOPIC_SHUFFLE: ack=1 — мы в активном обзоре отправителя,
+        # 0 — нет, без ack — отправитель на тему не подписан
+        topic_id = self._parse_id(packet.get("topic"))
+        sender = self._parse_id(packet.get("id"))
+        if topic_id is None or sender is None:
+            return
+        now = time.time()
+        ack = packet.get("ack")
+        with self._lock:
+            topic = self.topics.get(topic_id)
+            if topic is None:
+                if ack:
+                    self._send(self._membership(PacketType.TOPIC_LEAVE, topic_id), addr)
+                return
+            topic.joining.pop(addr, None)
+            if ack:
+                if topic.is_active(addr):
+                    topic.heard[addr] = now
+                elif len(topic.active()) < ACTIVE_VIEW:
+                    topic.add_active(addr, sender, now)
+                else:
+                    self._send(self._membership(PacketType.TOPIC_LEAVE, topic_id), addr)
+                    topic.add_passive(addr, sender)
+            elif topic.is_active(addr):
+                # связь была односторонней: отправитель нас уже вытеснил
+                topic.remove_active(addr)
+                if ack is not None:
+                    topic.add_passive(addr, sender)
+            elif ack is None:
+                topic.passive.pop(addr, None)
+            self._merge(topic, packet.get("peers"))
+
+    def on_leave(self, packet, addr):
+        topic_id = self._parse_id(packet.get("topic"))
+        with self._lock:
+            topic = self.topics.get(topic_id)
+            if topic is not None:
+                topic.remove_active(addr)
+
+    # ---------- рассылка ----------
+
+    def _remember(self, topic: Topic, mid: int, data: bytes, hops: int, now: float) -> None:
+        topic.seen[mid] = (data, hops, now + MESSAGE_TTL)
+        topic.missing.pop(mid, None)
+        while topic.seen and (len(topic.seen) > MESSAGE_CACHE or next(iter(topic.seen.values()))[2] <= now):
+            topic.seen.popitem(last=False)
+
+    def _message(self, topic_id: int, mid: int, data: bytes, hops: int) -> dict:
+        return self._packet(PacketType.PUBLISH, topic_id, mid=mid, hops=hops,
+                            data=data)
+
+    def _push(self, topic: Topic, mid: int, data: bytes, hops: int, exclude) -> None:
+        packet = self._message(topic.id, mid, data, hops)
+        for addr in topic.eager:
+            if addr != exclude:
+                self._send(packet, addr)
+        for addr in topic.lazy:
+            if addr == exclude:
+                continue
+            queue = topic.ihave.setdefault(addr, [])
+            queue.append(mid)
+            if len(queue) >= IHAVE_BATCH:
+                self._flush_ihave(topic, addr)
+
+    def _flush_ihave(self, topic: Topic, addr) -> None:
+        mids = topic.ihave.pop(addr, None)
+        if mids:
+            self.stats["ihave"] += len(mids)
+            self._send(self._packet(PacketType.IHAVE, topic.id, mids=mids), addr)
+
+    def on_publish(self, packet, addr):
+        topic_id = self._parse_id(packet.get("topic"))
+        try:
+            mid = int(packet["mid"])
+            hops = int(packet.get("hops", 0))
+            data = packet.get("data", b"")
+        except (KeyError, TypeError, ValueError):
+            return
+        if topic_id is None or not isinstance(data, bytes) or len(data) > MAX_PAYLOAD:
+            return
+        now = time.time()
+        with self._lock:
+            topic = self.topics.get(topic_id)
+            if topic is None:
+                self._send(self._membership(PacketType.TOPIC_LEAVE, topic_id), addr)
+                return
+            if topic.is_active(addr):
+                topic.heard[addr] = now
+
+            if mid in topic.seen:
+                # повтор: связь лишняя для дерева, дальше по ней только IHAVE
+                self.stats["duplicates"] += 1
+                if addr in topic.eager:
+                    topic.to_lazy(addr)
+                    self.stats["prune"] += 1
+                    self._send(self._packet(PacketType.PRUNE, topic_id), addr)
+                return
+
+            self._remember(topic, mid, data, hops, now)
+            self.stats["delivered"] += 1
+            topic.to_eager(addr)
+            self._push(topic, mid, data, hops + 1, addr)
+            callback = topic.callback
+        if callback is not None:
+            callback(data)
+
+    def on_ihave(self, packet, addr):
+        topic_id = self._parse_id(packet.get("topic"))
+        mids = packet.get("mids") or []
+        now = time.time()
+        with self._lock:
+            topic = self.topics.get(topic_id)
+            if topic is None:
+                return
+            if topic.is_active(addr):
+                topic.heard[addr] = now
+            for mid in mids:
+                if mid in topic.seen:
+                    continue
+                entry = topic.missing.get(mid)
+                if entry is None:
+                    topic.missing[mid] = [now + IHAVE_TIMEOUT, [addr]]
+                elif addr not in entry[1]:
+                    entry[1].append(addr)
+
+    def on_graft(self, packet, addr):
+        topic_id = self._parse_id(packet.get("topic"))
+        mids = packet.get("mids") or []
+        with self._lock:
+            topic = self.topics.get(topic_id)
+            if topic is None:
+                return
+            if topic.is_active(addr):
+                topic.heard[addr] = time.time()
+                topic.to_eager(addr)
+            for mid in mids:
+                entry = topic.seen.get(mid)
+                if entry is not None:
+                    self._send(self._message(topic_id, mid, entry[0], entry[1]), addr)
+
+    def on_prune(self, packet, addr):
+        topic_id = self._parse_id(packet.get("topic"))
+        with self._lock:
+            topic = self.topics.get(topic_id)
+            if topic is not None:
+                topic.to_lazy(addr)
+
+    # ---------- обслуживание ----------
+
+    def _refresh(self, topic: Topic, now: float) -> None:
+        # пока соседей нет, точки встречи опрашиваются чаще
+        topic.next_refresh = now + (TOPIC_REFRESH if topic.eager or topic.lazy else JOIN_TIMEOUT)
+        prio = None if topic.eager or topic.lazy else 1
+        for peer in self._closest(topic.id, RENDEZVOUS):
+            self._send(self._membership(PacketType.TOPIC_JOIN, topic.id, prio=prio), peer.addr)
+
+    def tick(self, now: float) -> None:
+        with self._lock:
+            for topic in self.topics.values():
+                self._tick_topic(topic, now)
+
+    def _tick_topic(self, topic: Topic, now: float) -> None:
+        if now >= topic.next_refresh:
+            self._refresh(topic, now)
+
+        for addr, deadline in list(topic.joining.items()):
+            if deadline <= now:
+                del topic.joining[addr]
+                topic.passive.pop(addr, None)
+        for addr in topic.active():
+            if now - topic.heard.get(addr, now) > ACTIVE_TIMEOUT:
+                topic.remove_active(addr)
+
+        # активный обзор — до ACTIVE_VIEW из пассивного
+        need = ACTIVE_VIEW - len(topic.eager) - len(topic.lazy) - len(topic.joining)
+        candidates = [a for a in topic.passive if a not in topic.joining]
+        if need > 0 and candidates:
+            prio = None if topic.eager or topic.lazy else 1
+            for addr in random.sample(candidates, min(need, len(candidates))):
+                topic.joining[addr] = now + JOIN_TIMEOUT
+                self._send(self._membership(PacketType.TOPIC_JOIN, topic.id, prio=prio), addr)
+
+        # обмен образцами заодно проверяет, что самый давно молчащий сосед жив
+        if now >= topic.next_shuffle and topic.heard:
+            topic.next_shuffle = now + SHUFFLE_INTERVAL
+            addr = min(topic.heard, key=topic.heard.get)
+            self._send(self._membership(PacketType.TOPIC_SHUFFLE, topic.id,
+                                        peers=self._sample(topic.id, topic, addr, now)), addr)
+
+        # IHAVE без полной копии за отведённое время — GRAFT анонсировавшему
+        grafts: Dict[Addr, List[int]] = {}
+        for mid, entry in list(topic.missing.items()):
+            if entry[0] > now:
+                continue
+            if not entry[1]:
+                del topic.missing[mid]
+                continue
+            addr = entry[1].pop(0)
+            entry[0] = now + GRAFT_TIMEOUT
+            topic.to_eager(addr)
+            grafts.setdefault(addr, []).append(mid)
+        for addr, mids in grafts.items():
+            self.stats["graft"] += len(mids)
+            self._send(self._packet(PacketType.GRAFT, topic.id, mids=mids), addr)
+
+        for addr in list(topic.ihave):
+            self._flush_ihave(topic, addr)
+
+        while topic.seen and next(iter(topic.seen.values()))[2] <= now:
+            topic.seen.popitem(last=False)
@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .ratelimit import TokenBucket
+
+
+RELAY_TTL = 6               # предел узлов на пути
+ROUTE_TTL = 120             # сколько живёт запись кэша маршрутов
+ROUTE_CACHE_SIZE = 1024
+
+# квоты пересылки, байт/с: общая и на одного отправителя — чтобы один
+# источник не выбрал весь канал relay и сам relay не стал горячей точкой
+RELAY_RATE = 512 * 1024
+RELAY_SOURCE_RATE = 64 * 1024
+RELAY_SOURCES = 256
+
+
+class Route:
+    __slots__ = ("next_hop", "path", "expires")
+
+    def __init__(self, next_hop, path, expires):
+        self.next_hop = next_hop
+        self.path = path
+        self.expires = expires
+
+
+class RouteCache:
+    # ID получателя -> следующий узел и известный путь до него (LRU со сроком жизни)
+
+    def __init__(self, size: int = ROUTE_CACHE_SIZE, ttl: float = ROUTE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._routes: "OrderedDict[int, Route]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._routes)
+
+    def get(self, dst: int, now: Optional[float] = None) -> Optional[Route]:
+        now = now if now is not None else time.time()
+        with self._lock:
+            route = self._routes.get(dst)
+            if route is None:
+                return None
+            if route.expires <= now:
+                del self._routes[dst]
+                return None
+            self._routes.move_to_end(dst)
+            return route
+
+    def put(self, dst: int, next_hop, path: List, now: Optional[float] = None) -> None:
+        now = now if now is not None else time.time()
+        with self._lock:
+            self._routes[dst] = Route(tuple(next_hop), path, now + self.ttl)
+            self._routes.move_to_end(dst)
+            if len(self._routes) > self.size:
+                self._routes.popitem(last=False)
+
+    def drop(self, dst: int) -> None:
+        with self._lock:
+            self._routes.pop(dst, None)
+
+    def drop_hop(self, addr) -> None:
+        # узел пропал — маршруты через него недействительны
+        with self._lock:
+            for dst in [d for d, r in self._routes.items() if r.next_hop == addr]:
+                del self._routes[dst]
+
+    def snapshot(self, now: Optional[float] = None) -> List[Tuple[int, Route]]:
+        now = now if now is not None else time.time()
+        with self._lock:
+            return [(dst, r) for dst, r in self._routes.items() if r.expires > now]
+
+
+class RelayQuota:
+    def __init__(self, rate: float = RELAY_RATE, per_source: float = RELAY_SOURCE_RATE):
+        self.per_source = per_source
+        self._total = TokenBucket(rate, burst=rate)
+        self._sources: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.forwarded = 0
+        self.dropped = 0
+
+    def allow(self, src: int, size: int) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._sources.get(src)
+            if bucket is None:
+                bucket = self._sources[src] = TokenBucket(self.per_source, burst=self.per_source)
+                if len(self._sources) > RELAY_SOURCES:
+                    self._sources.popitem(last=False)
+            self._sources.move_to_end(src)
+
+            # сначала доля источника: превысивший её не тратит общий бюджет
+            if not bucket.allow(size, now) or not self._total.allow(size, now):
+                self.dropped += 1
+                return False
+            self.forwarded += 1
+            return True
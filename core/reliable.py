@@ -0,0 +1,358 @@
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Tuple
+
+from .protocol import PacketType
+
+
+FRAGMENT_SIZE = 1024        # байт полезной нагрузки на фрагмент, с запасом до MTU
+RECV_WINDOW = 256           # фрагментов в буфере приёма
+INITIAL_CWND = 4
+MIN_CWND = 1
+INITIAL_RTO = 0.5
+MIN_RTO = 0.05
+MAX_RTO = 5.0
+MAX_RETRIES = 8
+DUP_THRESHOLD = 3           # столько более поздних подтверждений — и фрагмент считается потерянным
+MAX_SACK_RANGES = 16
+TIMER_TICK = 0.01
+
+
+class _Fragment:
+    __slots__ = ("seq", "msg", "frag", "nfrag", "data", "sent_at", "retries", "retransmitted")
+
+    def __init__(self, msg: int, frag: int, nfrag: int, data: bytes):
+        self.seq = -1
+        self.msg = msg
+        self.frag = frag
+        self.nfrag = nfrag
+        self.data = data
+        self.sent_at = 0.0
+        self.retries = 0
+        self.retransmitted = False
+
+
+class _Message:
+    __slots__ = ("future", "remaining")
+
+    def __init__(self, future: Future, remaining: int):
+        self.future = future
+        self.remaining = remaining
+
+
+class ReliableChannel:
+    # состояние одного направления обмена с пиром:
+    # отправка (окно, RTO, перезапросы) и приём (буфер, сборка фрагментов)
+
+    def __init__(self, addr: Tuple[str, int]):
+        self.addr = addr
+
+        # ---- отправка ----
+        self.next_seq = 0
+        self.next_msg = 0
+        self.queue: deque = deque()
+        self.inflight: "OrderedDict[int, _Fragment]" = OrderedDict()
+        self.messages: Dict[int, _Message] = {}
+        self.cwnd = float(INITIAL_CWND)
+        self.ssthresh = float(RECV_WINDOW)
+        self.peer_wnd = RECV_WINDOW
+        self.srtt = None
+        self.rttvar = None
+        self.rto = INITIAL_RTO
+        self.highest_acked = -1
+        self.recovery_until = -1
+
+        # ---- приём ----
+        self.peer_sid = None
+        self.rcv_next = 0
+        self.rcv_buf: Dict[int, Tuple[int, int, int, bytes]] = {}
+        self.assembly: Dict[int, List[bytes]] = {}
+
+        # ---- статистика ----
+        self.retransmits = 0
+        self.delivered_bytes = 0
+
+    # ============================================================
+    #   RTT (RFC 6298)
+    # ============================================================
+    def sample_rtt(self, rtt: float) -> None:
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.rto = min(MAX_RTO, max(MIN_RTO, self.srtt + 4 * self.rttvar))
+
+    def window(self) -> int:
+        return max(MIN_CWND, min(int(self.cwnd), self.peer_wnd))
+
+    def sack_ranges(self) -> List[int]:
+        # пары [начало, конец] подряд идущих принятых фрагментов сверх rcv_next
+        ranges = []
+        for seq in sorted(self.rcv_buf):
+            if ranges and ranges[-1] == seq - 1:
+                ranges[-1] = seq
+            else:
+                if len(ranges) >= 2 * MAX_SACK_RANGES:
+                    break
+                ranges.extend((seq, seq))
+        return ranges
+
+
+class ReliableManager:
+    # надёжная доставка поверх UDP: номера последовательности, выборочные
+    # подтверждения, адаптивный RTO и окно перегрузки (AIMD) на каждого пира
+
+    def __init__(self, send_fn: Callable[[dict, Tuple[str, int]], None],
+                 deliver_fn: Callable[[Tuple[str, int], bytes], None]):
+        self.send_fn = send_fn
+        self.deliver_fn = deliver_fn
+        self.sid = random.getrandbits(31)
+        self.channels: Dict[Tuple[str, int], ReliableChannel] = {}
+        self._lock = threading.RLock()
+        self._running = False
+        self._thread = None
+
+    def _channel(self, addr) -> ReliableChannel:
+        channel = self.channels.get(addr)
+        if channel is None:
+            channel = self.channels[addr] = ReliableChannel(addr)
+        return channel
+
+    # ============================================================
+    #   ЖИЗНЕННЫЙ ЦИКЛ
+    # ============================================================
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._timer_loop, name="reliable", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        with self._lock:
+            for channel in self.channels.values():
+                self._fail(channel, ConnectionAbortedError("узел остановлен"))
+
+    # ============================================================
+    #   ОТПРАВКА
+    # ============================================================
+    def send(self, addr: Tuple[str, int], payload) -> Future:
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+
+        future = Future()
+        future.set_running_or_notify_cancel()
+
+        with self._lock:
+            channel = self._channel(addr)
+            msg = channel.next_msg
+            channel.next_msg += 1
+
+            chunks = [payload[i:i + FRAGMENT_SIZE] for i in range(0, len(payload), FRAGMENT_SIZE)] or [b""]
+            channel.messages[msg] = _Message(future, len(chunks))
+            for i, chunk in enumerate(chunks):
+                channel.queue.append(_Fragment(msg, i, len(chunks), chunk))
+
+            self._pump(channel)
+
+        if not self._running:
+            self.start()
+        return future
+
+    def _pump(self, channel: ReliableChannel) -> None:
+        while channel.queue and len(channel.inflight) < channel.window():
+            frag = channel.queue.popleft()
+            frag.seq = channel.next_seq
+            channel.next_seq += 1
+            channel.inflight[frag.seq] = frag
+            self._transmit(channel, frag)
+
+    def _transmit(self, channel: ReliableChannel, frag: _Fragment) -> None:
+        frag.sent_at = time.monotonic()
+        packet = {
+            "type": PacketType.RDATA.value,
+            "sid": self.sid,
+            "seq": frag.seq,
+            "msg": frag.msg,
+            "frag": frag.frag,
+            "nfrag": frag.nfrag,
+            "data": frag.data,
+        }
+        self.send_fn(packet, channel.addr)
+
+    # ============================================================
+    #   ПОДТВЕРЖДЕНИЯ
+    # ============================================================
+    def on_ack(self, packet: dict, addr: Tuple[str, int]) -> None:
+        completed = []
+
+        with self._lock:
+            channel = self.channels.get(addr)
+            if channel is None or packet.get("sid") != self.sid:
+                return
+
+            ack = int(packet.get("ack", 0))
+            sack = packet.get("sack") or []
+            channel.peer_wnd = max(1, int(packet.get("wnd", RECV_WINDOW)))
+
+            ranges = list(zip(sack[0::2], sack[1::2]))
+            now = time.monotonic()
+            newly_acked = 0
+
+            for seq in list(channel.inflight):
+                if seq < ack or any(lo <= seq <= hi for lo, hi in ranges):
+                    frag = channel.inflight.pop(seq)
+                    newly_acked += 1
+                    if seq > channel.highest_acked:
+                        channel.highest_acked = seq
+                    # алгоритм Карна: по перепосланным RTT не меряем
+                    if not frag.retransmitted:
+                        channel.sample_rtt(now - frag.sent_at)
+                    message = channel.messages.get(frag.msg)
+                    if message is not None:
+                        message.remaining -= 1
+                        if message.remaining == 0:
+                            del channel.messages[frag.msg]
+                            completed.append(message.future)
+
+            if newly_acked:
+                if channel.cwnd < channel.ssthresh:
+                    channel.cwnd += newly_acked
+                else:
+                    channel.cwnd += newly_acked / channel.cwnd
+                channel.cwnd = min(channel.cwnd, float(RECV_WINDOW))
+
+            # быстрый перезапрос: за фрагментом подтверждено уже DUP_THRESHOLD более поздних
+            for seq, frag in list(channel.inflight.items()):
+                if seq + DUP_THRESHOLD > channel.highest_acked:
+                    break
+                if frag.retransmitted and now - frag.sent_at < channel.rto:
+                    continue
+                if seq > channel.recovery_until:
+                    channel.ssthresh = max(channel.cwnd / 2, 2.0)
+                    channel.cwnd = channel.ssthresh
+                    channel.recovery_until = channel.next_seq - 1
+                self._retransmit(channel, frag)
+
+            self._pump(channel)
+
+        for future in completed:
+            future.set_result(True)
+
+    def _retransmit(self, channel: ReliableChannel, frag: _Fragment) -> None:
+        frag.retries += 1
+        frag.retransmitted = True
+        channel.retransmits += 1
+        self._transmit(channel, frag)
+
+    # ============================================================
+    #   ПРИЁМ
+    # ============================================================
+    def on_data(self, packet: dict, addr: Tuple[str, int]) -> None:
+        delivered = []
+
+        with self._lock:
+            channel = self._channel(addr)
+
+            sid = packet.get("sid")
+            if sid != channel.peer_sid:
+                # пир перезапустился — начинаем приём заново
+                channel.peer_sid = sid
+                channel.rcv_next = 0
+                channel.rcv_buf.clear()
+                channel.assembly.clear()
+
+            try:
+                seq = int(packet["seq"])
+                data = packet.get("data", b"")
+                if not isinstance(data, bytes):
+                    raise TypeError("data")
+                item = (int(packet["msg"]), int(packet["frag"]), int(packet["nfrag"]), data)
+            except (KeyError, ValueError, TypeError):
+                logging.warning("Некорректный RDATA от %s", addr)
+                return
+
+            if channel.rcv_next <= seq < channel.rcv_next + RECV_WINDOW:
+                channel.rcv_buf.setdefault(seq, item)
+
+            while channel.rcv_next in channel.rcv_buf:
+                msg, frag, nfrag, data = channel.rcv_buf.pop(channel.rcv_next)
+                channel.rcv_next += 1
+                parts = channel.assembly.setdefault(msg, [])
+                parts.append(data)
+                if frag == nfrag - 1:
+                    payload = b"".join(channel.assembly.pop(msg))
+                    channel.delivered_bytes += len(payload)
+                    delivered.append(payload)
+
+            ack = {
+                "type": PacketType.RACK.value,
+                "sid": sid,
+                "ack": channel.rcv_next,
+                "sack": channel.sack_ranges(),
+                "wnd": RECV_WINDOW - len(channel.rcv_buf),
+            }
+            self.send_fn(ack, addr)
+
+        for payload in delivered:
+            try:
+                self.deliver_fn(addr, payload)
+            except Exception as e:
+                logging.error("Ошибка доставки надёжного сообщения: %s", e)
+
+    # ============================================================
+    #   ТАЙМЕРЫ
+    # ============================================================
+    def _timer_loop(self):
+        while self._running:
+            time.sleep(TIMER_TICK)
+            now = time.monotonic()
+            with self._lock:
+                for channel in list(self.channels.values()):
+                    if channel.inflight:
+                        self._check_timeouts(channel, now)
+
+    def _check_timeouts(self, channel: ReliableChannel, now: float) -> None:
+        timed_out = [f for f in channel.inflight.values() if now - f.sent_at >= channel.rto]
+        if not timed_out:
+            return
+
+        if any(f.retries >= MAX_RETRIES for f in timed_out):
+            self._fail(channel, TimeoutError(f"пир {channel.addr} не подтверждает доставку"))
+            return
+
+        # таймаут — сильный сигнал перегрузки: окно в минимум, RTO вдвое
+        channel.ssthresh = max(channel.cwnd / 2, 2.0)
+        channel.cwnd = float(MIN_CWND)
+        channel.rto = min(MAX_RTO, channel.rto * 2)
+        for frag in timed_out:
+            self._retransmit(channel, frag)
+
+    def _fail(self, channel: ReliableChannel, error: Exception) -> None:
+        messages = list(channel.messages.values())
+        channel.messages.clear()
+        channel.inflight.clear()
+        channel.queue.clear()
+        for message in messages:
+            if not message.future.done():
+                message.future.set_exception(error)
+
+    def stats(self, addr: Tuple[str, int]) -> dict:
+        channel = self.channels.get(addr)
+        if channel is None:
+            return {}
+        return {
+            "cwnd": round(channel.cwnd, 1),
+            "srtt": channel.srtt,
+            "rto": channel.rto,
+            "inflight": len(channel.inflight),
+            "queued": len(channel.queue),
+            "retransmits": channel.retransmits,
+        }
@@ -0,0 +1,87 @@
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+PING_TIMEOUT = 2.0
+# вес нового замера в сглаженном RTT и разбросе (как в RFC 6298)
+RTT_ALPHA = 0.125
+RTT_BETA = 0.25
+# стоимость пира с неизмеренным RTT
+RTT_UNKNOWN_COST = 0.25
+
+
+def update_rtt(peer, rtt: float) -> None:
+    if peer.rtt is None or peer.rttvar is None:
+        peer.rtt = rtt
+        peer.rttvar = rtt / 2
+    else:
+        peer.rttvar += RTT_BETA * (abs(peer.rtt - rtt) - peer.rttvar)
+        peer.rtt += RTT_ALPHA * (rtt - peer.rtt)
+
+
+def latency_cost(peer) -> float:
+    # RTT с запасом на разброс; ненадёжный пир обходится до двух раз дороже
+    if peer.rtt is None:
+        base = RTT_UNKNOWN_COST
+    else:
+        base = peer.rtt + 4 * (peer.rttvar or 0.0)
+    return base * (2.0 - peer.score)
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class RttTracker:
+    # nonce PING -> (адрес, время отправки, список для замеров trace или None)
+
+    def __init__(self, timeout: float = PING_TIMEOUT):
+        self.timeout = timeout
+        self._pending: Dict[int, Tuple[Tuple[str, int], float, Optional[list]]] = {}
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def new_probe(self, addr, samples: Optional[list] = None) -> Tuple[int, int]:
+        # возвращает nonce и метку времени отправителя в микросекундах
+        nonce = random.getrandbits(32)
+        now = time.monotonic()
+        with self._cond:
+            self._pending[nonce] = (addr, now, samples)
+        return nonce, int(now * 1e6)
+
+    def on_pong(self, nonce, addr) -> Optional[float]:
+        with self._cond:
+            entry = self._pending.get(nonce)
+            # чужой nonce или ответ не с того адреса — не наш замер
+            if entry is None or entry[0] != addr:
+                return None
+            del self._pending[nonce]
+            rtt = time.monotonic() - entry[1]
+            if entry[2] is not None:
+                entry[2].append(rtt)
+                self._cond.notify_all()
+        return rtt
+
+    def expire(self, now: Optional[float] = None) -> List[Tuple[str, int]]:
+        # адреса, не ответившие за timeout
+        now = now if now is not None else time.monotonic()
+        with self._cond:
+            expired = [n for n, (_, sent, _) in self._pending.items() if now - sent >= self.timeout]
+            return [self._pending.pop(n)[0] for n in expired]
+
+    def wait(self, samples: list, count: int, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while len(samples) < count:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return
+                self._cond.wait(left)
@@ -0,0 +1,396 @@
+import hashlib
+import itertools
+import logging
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from cryptography.exceptions import InvalidSignature, InvalidTag
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from .protocol import SEALED_MAGIC, SEALED_HEADER
+from .dedup import CounterWindow
+
+
+# nonce ChaCha20-Poly1305 — счётчик из заголовка пакета
+NONCE = struct.Struct("!4xQ")
+
+HANDSHAKE_TIMEOUT = 2.0     # HELLO без ответа за это время отправляется снова
+HANDSHAKE_RETRIES = 3
+PENDING_LIMIT = 32          # пакетов в очереди к пиру, пока идёт рукопожатие
+SESSION_LIMIT = 4096        # сессий в памяти; самые давние вытесняются
+SESSION_IDLE = 20           # сессия без входящих пакетов столько секунд считается потерянной
+SESSION_LIFETIME = 3600     # ключи сессии не живут дольше — дальше новое рукопожатие
+REKEY_AFTER = 1 << 48       # и не шифруют больше пакетов
+
+# подписи рукопожатия: инициатор подписывает свой эфемерный ключ,
+# отвечающий — свой вместе с ключом инициатора (свежесть ответа)
+SIG_INIT = b"atlan-hello-1"
+SIG_REPLY = b"atlan-hello-2"
+KDF_INFO = b"atlan-session-v1"
+
+
+def node_id_from_key(public: bytes) -> int:
+    # ID узла — хеш его открытого ключа: чужой ID не присвоить без чужого ключа
+    return int.from_bytes(hashlib.sha1(public).digest(), "big")
+
+
+def _raw(value) -> Optional[bytes]:
+    # байтовые поля HELLO приходят bytes в обоих форматах (protocol.B64_FIELDS)
+    return value if isinstance(value, bytes) else None
+
+
+# ============================================================
+#   ИДЕНТИЧНОСТЬ УЗЛА
+# ============================================================
+class Identity:
+    def __init__(self, key: Optional[Ed25519PrivateKey] = None):
+        self.key = key or Ed25519PrivateKey.generate()
+        self.public = self.key.public_key().public_bytes(serialization.Encoding.Raw,
+                                                         serialization.PublicFormat.Raw)
+        self.node_id = node_id_from_key(self.public)
+
+    def sign(self, data: bytes) -> bytes:
+        return self.key.sign(data)
+
+    @classmethod
+    def load(cls, path: Optional[str]) -> "Identity":
+        # файл — 32 байта закрытого ключа; нет файла — новый ключ, который сразу сохраняется
+        if not path:
+            return cls()
+        try:
+            with open(path, "rb") as f:
+                return cls(Ed25519PrivateKey.from_private_bytes(f.read()))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            # испорченный файл не перезаписывается: ID до перезапуска будет временным
+            logging.warning("Ключ узла %s не прочитан (%s) — ID узла временный", path, e)
+            return cls()
+
+        identity = cls()
+        raw = identity.key.private_bytes(serialization.Encoding.Raw, serialization.PrivateFormat.Raw,
+                                         serialization.NoEncryption())
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(raw)
+        except OSError as e:
+            logging.warning("Ключ узла не сохранён в %s: %s", path, e)
+        return identity
+
+
+def verify(public: bytes, signature: bytes, data: bytes) -> bool:
+    try:
+        Ed25519PublicKey.from_public_bytes(public).verify(signature, data)
+        return True
+    except (InvalidSignature, ValueError):
+        return False
+
+
+# ============================================================
+#   СЕССИЯ
+# ============================================================
+class Session:
+    # шифры с развёрнутыми ключами создаются один раз на рукопожатие; на пакет —
+    # только следующий номер счётчика (next() у count атомарен, блокировка не нужна)
+    # и сам вызов AEAD
+    __slots__ = ("node_id", "id_hex", "_tx", "_rx", "_counter", "sent",
+                 "created", "last_rx", "peer_eph", "reply", "hello", "window")
+
+    def __init__(self, node_id: int, tx_key: bytes, rx_key: bytes, now: float):
+        self.node_id = node_id
+        self.id_hex = f"{node_id:040x}"
+        self._tx = ChaCha20Poly1305(tx_key)
+        self._rx = ChaCha20Poly1305(rx_key)
+        self._counter = itertools.count(1)
+        self.sent = 0
+        self.created = now
+        self.last_rx = now
+        # эфемерный ключ пира и наш ответ на его HELLO: повтор того же HELLO
+        # получает тот же ответ, а не новую сессию
+        self.peer_eph = None
+        self.reply = None
+        # HELLO инициатора, пока он не прислал ни одного пакета этой сессии: подпись
+        # stage 1 не привязана к адресу, и перехваченный HELLO можно повторить
+        # с чужого адреса — ключом владение докажет только первый зашифрованный пакет
+        self.hello = None
+        # принятые номера пакетов пира: повтор отсекается до расшифровки
+        self.window = CounterWindow()
+
+    def seal(self, data: bytes) -> bytes:
+        counter = self.sent = next(self._counter)
+        # заголовок не шифруется, но входит в тег: счётчик не подменить
+        header = SEALED_HEADER.pack(SEALED_MAGIC, counter)
+        return header + self._tx.encrypt(NONCE.pack(counter), data, header)
+
+    def open(self, data, counter: int) -> Optional[bytes]:
+        # номер уже проверен окном (SessionManager.open) — здесь только расшифровка
+        view = memoryview(data)
+        try:
+            plain = self._rx.decrypt(NONCE.pack(counter), view[SEALED_HEADER.size:],
+                                     view[:SEALED_HEADER.size])
+        except InvalidTag:
+            return None
+        # номер принимается только с верным тегом: подделка окно не сдвинет
+        if not self.window.accept(counter):
+            return None
+        self.last_rx = time.time()
+        return plain
+
+    def worn(self, now: float) -> bool:
+        return self.sent >= REKEY_AFTER or now - self.created >= SESSION_LIFETIME
+
+
+class Handshake:
+    __slots__ = ("eph", "eph_public", "started", "tries", "queue", "early", "yielded")
+
+    def __init__(self, now: float):
+        self.eph = X25519PrivateKey.generate()
+        self.eph_public = self.eph.public_key().public_bytes(serialization.Encoding.Raw,
+                                                             serialization.PublicFormat.Raw)
+        self.started = now
+        self.tries = 1
+        self.queue: List[bytes] = []
+        # зашифрованные пакеты пира, обогнавшие его ответный HELLO
+        self.early: List[bytes] = []
+        # уступили встречному рукопожатию; ответ на наше ещё может прийти и заменит сессию
+        self.yielded = False
+
+
+def _derive(eph: X25519PrivateKey, peer_eph: bytes, init_eph: bytes, reply_eph: bytes):
+    # (ключ инициатор -> отвечающий, ключ отвечающий -> инициатор)
+    shared = eph.exchange(X25519PublicKey.from_public_bytes(peer_eph))
+    keys = HKDF(algorithm=hashes.SHA256(), length=64, salt=init_eph + reply_eph,
+                info=KDF_INFO).derive(shared)
+    return keys[:32], keys[32:]
+
+
+# ============================================================
+#   МЕНЕДЖЕР СЕССИЙ
+# ============================================================
+class SessionManager:
+    # рукопожатие — в один круг поверх HELLO: инициатор шлёт ключ узла, эфемерный
+    # X25519-ключ и подпись (hs=1), отвечающий — то же со своей стороны (hs=2).
+    # До ответа пакеты к пиру ждут в очереди и уходят сразу после него
+
+    def __init__(self, identity: Identity, send_hello: Callable):
+        self.identity = identity
+        self.send_hello = send_hello
+        self._sessions: "OrderedDict[Tuple[str, int], Session]" = OrderedDict()
+        # новая сессия отвечающего, пока у адреса есть подтверждённая: старый HELLO,
+        # повторённый с адреса пира, не должен сломать живую сессию — подменит её,
+        # только когда пир откроет её первым пакетом
+        self._pending: Dict[Tuple[str, int], Session] = {}
+        self._handshakes: Dict[Tuple[str, int], Handshake] = {}
+        self._lock = threading.Lock()
+        self.stats = {"sealed": 0, "opened": 0, "rejected": 0, "replayed": 0, "handshakes": 0, "bad_hello": 0}
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, addr) -> Optional[Session]:
+        return self._sessions.get(addr)
+
+    def drop(self, addr) -> None:
+        with self._lock:
+            self._sessions.pop(addr, None)
+            self._pending.pop(addr, None)
+
+    # ---------- отправка ----------
+
+    def seal(self, addr, data: bytes) -> Optional[bytes]:
+        # None — сессии ещё нет: пакет поставлен в очередь до конца рукопожатия
+        session = self._sessions.get(addr)
+        if session is not None:
+            self.stats["sealed"] += 1
+            return session.seal(data)
+
+        self._begin(addr, data)
+        return None
+
+    def _begin(self, addr, data: Optional[bytes] = None) -> None:
+        start = False
+        with self._lock:
+            hs = self._handshakes.get(addr)
+            if hs is None:
+                hs = self._handshakes[addr] = Handshake(time.time())
+                start = True
+            if data is not None and len(hs.queue) < PENDING_LIMIT:
+                hs.queue.append(data)
+        if start:
+            self.send_hello(addr)
+
+    def hello_fields(self, addr) -> dict:
+        # поля HELLO-инициатора; повтор HELLO идёт с тем же эфемерным ключом
+        with self._lock:
+            hs = self._handshakes.get(addr)
+            if hs is None:
+                hs = self._handshakes[addr] = Handshake(time.time())
+        return {
+            "pub": self.identity.public,
+            "eph": hs.eph_public,
+            "sig": self.identity.sign(SIG_INIT + hs.eph_public),
+            "hs": 1,
+        }
+
+    # ---------- приём ----------
+
+    def open(self, addr, data, known: bool = False) -> Optional[Tuple[Session, bytes]]:
+        session = self._sessions.get(addr)
+        pending = self._pending.get(addr)
+        if session is None and pending is None:
+            with self._lock:
+                hs = self._handshakes.get(addr)
+                if hs is not None and len(hs.early) < PENDING_LIMIT:
+                    hs.early.append(bytes(data))
+                    return None
+            self.stats["rejected"] += 1
+            # пир считает сессию живой, а мы её уже сбросили. Новое рукопожатие — только
+            # со знакомыми: иначе мусорные пакеты заставляли бы слать HELLO кому угодно
+            if known:
+                self._begin(addr)
+            return None
+        counter = SEALED_HEADER.unpack_from(data)[1]
+        replayed = False
+        for candidate in (session, pending):
+            if candidate is None:
+                continue
+            if not candidate.window.check(counter):
+                replayed = True
+                continue
+            plain = candidate.open(data, counter)
+            if plain is not None:
+                if candidate is pending:
+                    self._promote(addr, pending)
+                self.stats["opened"] += 1
+                return candidate, plain
+        self.stats["replayed" if replayed else "rejected"] += 1
+        return None
+
+    def on_hello(self, packet, addr):
+        # (проверенный ID пира, поля ответного HELLO или None, пакеты из очереди к пиру,
+        # пришедшие от него раньше ответа) или None, если HELLO не подписан ключом,
+        # из которого выведен его ID
+        public = _raw(packet.get("pub"))
+        peer_eph = _raw(packet.get("eph"))
+        signature = _raw(packet.get("sig"))
+        stage = packet.get("hs")
+        if public is None or peer_eph is None or signature is None or len(peer_eph) != 32:
+            return None
+        node_id = node_id_from_key(public)
+        if packet.get("id") != f"{node_id:040x}" or node_id == self.identity.node_id:
+            return None
+
+        now = time.time()
+        if stage == 1:
+            if not verify(public, signature, SIG_INIT + peer_eph):
+                self.stats["bad_hello"] += 1
+                return None
+            session = self._sessions.get(addr)
+            if session is not None and session.peer_eph == peer_eph:
+                return node_id, session.reply, [], []
+            pending = self._pending.get(addr)
+            if pending is not None and pending.peer_eph == peer_eph:
+                return node_id, pending.reply, [], []
+            with self._lock:
+                # встречные рукопожатия: продолжает то, что начал узел с большим ID
+                hs = self._handshakes.get(addr)
+                if hs is not None and not hs.yielded and self.identity.node_id > node_id:
+                    return node_id, None, [], []
+                if hs is not None:
+                    hs.yielded = True
+            eph = X25519PrivateKey.generate()
+            eph_public = eph.public_key().public_bytes(serialization.Encoding.Raw,
+                                                       serialization.PublicFormat.Raw)
+            i2r, r2i = _derive(eph, peer_eph, peer_eph, eph_public)
+            if session is not None and session.hello is None:
+                # подтверждённая сессия остаётся, пока новая не докажет ключ
+                session = Session(node_id, r2i, i2r, now)
+                with self._lock:
+                    self._pending[addr] = session
+                self.stats["handshakes"] += 1
+            else:
+                session = self._install(addr, node_id, r2i, i2r, now)
+            session.peer_eph = peer_eph
+            session.hello = packet
+            session.reply = {
+                "pub": self.identity.public,
+                "eph": eph_public,
+                "sig": self.identity.sign(SIG_REPLY + eph_public + peer_eph),
+                "hs": 2,
+            }
+            return node_id, session.reply, self._flush(session, hs), []
+
+        if stage == 2:
+            with self._lock:
+                hs = self._handshakes.get(addr)
+            if hs is None:
+                # повтор ответа на уже завершённое рукопожатие
+                return None
+            if not verify(public, signature, SIG_REPLY + peer_eph + hs.eph_public):
+                self.stats["bad_hello"] += 1
+                return None
+            with self._lock:
+                self._handshakes.pop(addr, None)
+            i2r, r2i = _derive(hs.eph, peer_eph, hs.eph_public, peer_eph)
+            session = self._install(addr, node_id, i2r, r2i, now)
+            early, hs.early = hs.early, []
+            return node_id, None, self._flush(session, hs), early
+
+        return None
+
+    def _install(self, addr, node_id, tx_key, rx_key, now) -> Session:
+        session = Session(node_id, tx_key, rx_key, now)
+        self._promote(addr, session)
+        self.stats["handshakes"] += 1
+        return session
+
+    def _promote(self, addr, session: Session) -> None:
+        with self._lock:
+            if self._pending.get(addr) is session:
+                del self._pending[addr]
+            self._sessions.pop(addr, None)
+            self._sessions[addr] = session
+            if len(self._sessions) > SESSION_LIMIT:
+                evicted, _ = self._sessions.popitem(last=False)
+                self._pending.pop(evicted, None)
+
+    def _flush(self, session: Session, hs: Optional[Handshake]) -> List[bytes]:
+        if hs is None:
+            return []
+        queue, hs.queue = hs.queue, []
+        self.stats["sealed"] += len(queue)
+        return [session.seal(data) for data in queue]
+
+    # ---------- таймеры ----------
+
+    def tick(self, now: Optional[float] = None) -> None:
+        # повтор HELLO без ответа, сброс безнадёжных рукопожатий и потерянных сессий:
+        # пир мог перезапуститься с новыми ключами, и наши пакеты он не расшифрует
+        now = now if now is not None else time.time()
+        retry = []
+        with self._lock:
+            for addr, hs in list(self._handshakes.items()):
+                if now - hs.started < HANDSHAKE_TIMEOUT * hs.tries:
+                    continue
+                if hs.tries >= HANDSHAKE_RETRIES or hs.yielded:
+                    del self._handshakes[addr]
+                    continue
+                hs.tries += 1
+                retry.append(addr)
+            for addr in [a for a, s in self._sessions.items()
+                         if now - s.last_rx >= SESSION_IDLE or s.worn(now)]:
+                del self._sessions[addr]
+            for addr in [a for a, s in self._pending.items()
+                         if now - s.created >= SESSION_IDLE]:
+                del self._pending[addr]
+        for addr in retry:
+            self.send_hello(addr)
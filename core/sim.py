@@ -0,0 +1,484 @@
+import bisect
+import heapq
+import importlib
+import random
+import sys
+import time
+import time as _real_time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .lookup import QUERY_TIMEOUT
+from .node import Node
+from .protocol import PacketType, peek_type
+
+
+# модули, которые берут время из time.*: на время симуляции им подставляются виртуальные часы
+CLOCKED_MODULES = ("core.node", "core.dht", "core.peer", "core.rtt", "core.nat_traversal",
+                   "core.relay", "core.ratelimit", "core.kv", "core.pubsub",
+                   "core.dedup")
+
+SIM_TICK = 1.0              # шаг heartbeat узла в виртуальном времени
+BOOT_RETRIES = 3            # попыток FIND_NODE к одному пиру при подключении
+HELLO_RETRY = 3.0           # повтор HELLO, если таблица так и осталась пустой
+NAT_TIMEOUT = 30.0          # сколько живёт «дырка» в NAT после исходящего пакета
+NAT_FIRST_PORT = 40000      # первый внешний порт, выдаваемый NAT
+SAMPLE_INTERVAL = 5.0       # как часто считать долю сошедшихся узлов
+NEIGHBOURS = 5              # узел сошёлся, когда знает своих 5 истинно ближайших
+SIM_REPLAY_CAPACITY = 1024  # узлу симуляции хватает малого фильтра повторов
+
+
+# ============================================================
+#   ВИРТУАЛЬНОЕ ВРЕМЯ
+# ============================================================
+class VirtualClock:
+    # подменяет модуль time: все часы показывают время симуляции
+
+    def __init__(self, start: float = 1_000_000.0):
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+    monotonic = time
+    perf_counter = time
+
+    def sleep(self, seconds):
+        raise RuntimeError("time.sleep внутри симуляции: поток заблокировал бы весь виртуальный мир")
+
+
+class EventLoop:
+    # дискретно-событийная очередь: (время, порядковый номер, функция, аргументы)
+
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        self._heap = []
+        self._seq = 0
+        self.processed = 0
+
+    def at(self, when: float, fn: Callable, *args) -> None:
+        self._seq += 1
+        heapq.heappush(self._heap, (when, self._seq, fn, args))
+
+    def after(self, delay: float, fn: Callable, *args) -> None:
+        self.at(self.clock.now + delay, fn, *args)
+
+    def every(self, interval: float, fn: Callable, offset: float = 0.0) -> None:
+        def tick():
+            if fn() is not False:
+                self.after(interval, tick)
+        self.after(offset, tick)
+
+    def run_until(self, deadline: float) -> None:
+        heap = self._heap
+        while heap and heap[0][0] <= deadline:
+            when, _, fn, args = heapq.heappop(heap)
+            self.clock.now = when
+            fn(*args)
+            self.processed += 1
+        self.clock.now = deadline
+
+
+# ============================================================
+#   СЕТЬ
+# ============================================================
+class SimNetwork:
+    def __init__(self, loop: EventLoop, rng: random.Random, latency=(0.005, 0.05),
+                 jitter: float = 0.005, loss: float = 0.0):
+        self.loop = loop
+        self.rng = rng
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.endpoints: Dict[Tuple[str, int], "SimTransport"] = {}
+
+        self.packets = 0
+        self.bytes = 0
+        self.lost = 0
+        self.nat_dropped = 0
+        self.by_type: Dict[str, int] = {}
+
+    def attach(self, transport: "SimTransport") -> None:
+        # задержка доступа у каждого узла своя; задержка канала — сумма двух концов
+        transport.access_delay = self.rng.uniform(*self.latency) / 2
+        if not transport.nat:
+            self.endpoints[(transport.host, transport.port)] = transport
+
+    def detach(self, transport: "SimTransport") -> None:
+        for addr in transport.public_addrs():
+            self.endpoints.pop(addr, None)
+
+    def send(self, src: "SimTransport", data: bytes, addr) -> None:
+        self.packets += 1
+        self.bytes += len(data)
+        ptype = peek_type(data) or "?"
+        self.by_type[ptype] = self.by_type.get(ptype, 0) + 1
+
+        addr = tuple(addr)
+        source = src.outbound(addr)
+        dst = self.endpoints.get(addr)
+        if dst is None:
+            return
+        if self.loss and self.rng.random() < self.loss:
+            self.lost += 1
+            return
+        delay = src.access_delay + dst.access_delay + self.rng.random() * self.jitter
+        self.loop.after(delay, dst.receive, data, source, addr)
+
+
+class SimTransport:
+    # замена Transport: вместо UDP-сокета — виртуальная сеть. Интерфейс тот же,
+    # что использует Node: send / batch / start / stop.
+    #
+    # nat — узел за NAT со своим внешним IP и трансляцией портов:
+    #   "cone"      — один внешний порт для всех адресатов (endpoint-independent mapping);
+    #   "symmetric" — новый внешний порт на каждого адресата.
+    # Фильтрация в обоих случаях по адресу и порту: входящий пакет проходит, только
+    # если узел сам писал этому адресу с этой привязки не позже NAT_TIMEOUT назад
+
+    def __init__(self, host, port, on_packet_callback, panel=None, network: SimNetwork = None,
+                 nat: Optional[str] = None, public_ip: Optional[str] = None, **options):
+        self.host = host
+        self.port = port
+        self.on_packet = on_packet_callback
+        self.network = network
+        self.socket = None
+        self.socket6 = None
+        self.pipeline = None
+        self.admission = None
+        self.monitor = None
+        self.on_interfaces = None
+        self.running = False
+        self.access_delay = 0.0
+
+        self.nat = nat
+        self.public_ip = public_ip
+        # адресат -> внешний адрес привязки; (внешний адрес, адресат) -> срок дырки
+        self._mappings: Dict[Tuple[str, int], Tuple[str, int]] = {}
+        self._holes: Dict[Tuple[Tuple[str, int], Tuple[str, int]], float] = {}
+        self._next_port = NAT_FIRST_PORT
+
+    def public_addrs(self) -> List[Tuple[str, int]]:
+        if not self.nat:
+            return [(self.host, self.port)]
+        return list(set(self._mappings.values()))
+
+    def outbound(self, addr) -> Tuple[str, int]:
+        # адрес, с которого пакет придёт к адресату, и дырка под ответ
+        if not self.nat:
+            return self.host, self.port
+        key = None if self.nat == "cone" else addr
+        public = self._mappings.get(key)
+        if public is None:
+            public = self._mappings[key] = (self.public_ip, self._next_port)
+            self._next_port += 1
+            self.network.endpoints[public] = self
+        self._holes[(public, addr)] = self.network.loop.clock.now + NAT_TIMEOUT
+        return public
+
+    def start(self):
+        self.running = True
+        self.network.attach(self)
+
+    def stop(self):
+        self.running = False
+        self.network.detach(self)
+
+    @contextmanager
+    def batch(self):
+        yield
+
+    def send(self, data, addr):
+        if not self.running:
+            return
+        self.network.send(self, data, addr)
+
+    def receive(self, data, addr, public):
+        if not self.running:
+            return
+        if self.nat and self._holes.get((public, addr), 0.0) < self.network.loop.clock.now:
+            self.network.nat_dropped += 1
+            return
+        self.on_packet(data, addr)
+
+    def update_panel_status(self):
+        pass
+
+
+# ============================================================
+#   УЗЕЛ
+# ============================================================
+class SimNode(Node):
+    # Node на виртуальной сети: без потоков, heartbeat — событие цикла,
+    # поиск при подключении — на ответах, а не блокирующий IterativeLookup
+
+    transport_class = SimTransport
+
+    def __init__(self, host, port, network: SimNetwork, nat: Optional[str] = None,
+                 public_ip: Optional[str] = None, secure: bool = False):
+        super().__init__(host, port, metrics=False, secure=secure, replay_capacity=SIM_REPLAY_CAPACITY,
+                         network=network, nat=nat, public_ip=public_ip)
+        self.network = network
+        # ID пира -> (попыток, время последнего запроса); ответившие удаляются в _answered
+        self._boot_queries: Dict[int, Tuple[int, float]] = {}
+        self._answered = set()
+        self._booting = False
+
+    def start(self):
+        self.running = True
+        self.external_addr = (self.host, self.port)
+        self.reflexive.local = self.external_addr
+        self.transport.start()
+        self.network.loop.every(SIM_TICK, self._sim_tick, offset=self.network.rng.uniform(0, SIM_TICK))
+
+    def stop(self):
+        self.running = False
+        self.transport.stop()
+
+    def _sim_tick(self):
+        if not self.running:
+            return False
+        self._heartbeat_tick()
+        if self._booting:
+            self._query_closest()
+
+    def _start_bootstrap(self):
+        # поиск своего ID: FIND_NODE k ближайшим, дальше — по ответам;
+        # без ответа за QUERY_TIMEOUT запрос повторяется, как в IterativeLookup
+        self._booting = True
+        self._query_closest()
+
+    def _query_closest(self):
+        now = self.network.loop.clock.now
+        waiting = False
+        for peer in self.dht.find_closest(self.node_id, self.dht.k):
+            if peer.node_id in self._answered:
+                continue
+            tries, sent = self._boot_queries.get(peer.node_id, (0, 0.0))
+            if tries >= BOOT_RETRIES:
+                continue
+            waiting = True
+            if now - sent < QUERY_TIMEOUT:
+                continue
+            self._boot_queries[peer.node_id] = (tries + 1, now)
+            self._send({
+                "type": PacketType.FIND_NODE.value,
+                "id": f"{self.node_id:040x}",
+                "rid": "00",
+                "target": f"{self.node_id:040x}",
+            }, peer.addr)
+        self._booting = waiting
+
+    def _on_orphan_reply(self, packet, addr):
+        sender = self._parse_node_id(packet.get("id"))
+        if sender is not None:
+            self._answered.add(sender)
+        for peer in self._parse_peer_list(packet.get("peers", [])):
+            if peer.addr not in self.dht:
+                self.dht.add_peer(peer.addr, peer.node_id)
+        self._query_closest()
+
+
+# ============================================================
+#   СИМУЛЯЦИЯ
+# ============================================================
+def true_neighbours(ids: List[int], k: int = NEIGHBOURS) -> Dict[int, List[int]]:
+    # k ближайших по XOR лежат внутри наименьшего префиксного блока из k+1 узлов,
+    # а блок в отсортированном списке — непрерывный отрезок
+    ordered = sorted(ids)
+    result = {}
+    for node_id in ordered:
+        shift = 0
+        while True:
+            lo = (node_id >> shift) << shift
+            a = bisect.bisect_left(ordered, lo)
+            b = bisect.bisect_left(ordered, lo + (1 << shift))
+            if b - a > k or (a == 0 and b == len(ordered)):
+                break
+            shift += 1
+        block = [x for x in ordered[a:b] if x != node_id]
+        result[node_id] = heapq.nsmallest(k, block, key=lambda x: x ^ node_id)
+    return result
+
+
+def rss_kb() -> int:
+    # текущий RSS; где нет /proc — пиковый, он для прогонов по возрастанию N почти тот же.
+    # Модуля resource нет в Windows — там замер недоступен (0)
+    try:
+        import resource
+    except ImportError:
+        return 0
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() // 1024
+    except (OSError, IndexError, ValueError):
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage // 1024 if sys.platform == "darwin" else usage
+
+
+class Simulation:
+    def __init__(self, nodes: int = 1000, latency=(0.005, 0.05), jitter: float = 0.005,
+                 loss: float = 0.0, nat_fraction: float = 0.0, symmetric_fraction: float = 0.0,
+                 churn: float = 0.0, join_window: float = 10.0, seed: int = 1, secure: bool = False):
+        self.size = nodes
+        self.nat_fraction = nat_fraction
+        # доля симметричных среди NAT; остальные — cone
+        self.symmetric_fraction = symmetric_fraction
+        # доля узлов, заменяемых за минуту
+        self.churn = churn
+        self.join_window = join_window
+        self.seed = seed
+        # шифрованные сессии (нужен пакет cryptography)
+        self.secure = secure
+
+        self.rng = random.Random(seed)
+        self.clock = VirtualClock()
+        self.loop = EventLoop(self.clock)
+        self.network = SimNetwork(self.loop, self.rng, latency, jitter, loss)
+
+        self.nodes: Dict[Tuple[str, int], SimNode] = {}
+        self._next_index = 0
+        self._saved_time = {}
+
+    # ---------------- ВИРТУАЛЬНОЕ ВРЕМЯ ----------------
+
+    def __enter__(self):
+        for name in CLOCKED_MODULES + (("core.secure",) if self.secure else ()):
+            module = importlib.import_module(name)
+            self._saved_time[name] = module.time
+            module.time = self.clock
+        # случайность внутри Node (джиттер пингов, соль дайджестов) — тоже от seed
+        self._saved_random = random.getstate()
+        random.seed(self.seed)
+        return self
+
+    def __exit__(self, *exc):
+        for name, original in self._saved_time.items():
+            sys.modules[name].time = original
+        random.setstate(self._saved_random)
+
+    # ---------------- УЗЛЫ ----------------
+
+    def _address(self, prefix: str = "10") -> Tuple[str, int]:
+        i = self._next_index
+        self._next_index += 1
+        return f"{prefix}.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 4000
+
+    def _join(self):
+        # первый узел — публичный: к нему подключаются остальные
+        if self.nodes and self.rng.random() < self.nat_fraction:
+            nat = "symmetric" if self.rng.random() < self.symmetric_fraction else "cone"
+            host, port = self._address("192")
+            public_ip = "100" + host[3:]
+        else:
+            nat, public_ip = None, None
+            host, port = self._address()
+        node = SimNode(host, port, self.network, nat=nat, public_ip=public_ip, secure=self.secure)
+        # bootstrap — случайный уже подключившийся узел с публичным адресом: у только что
+        # запущенного таблица пуста, а узел за NAT чужой HELLO не пропустит
+        live = [n for n in self.nodes.values() if not n.transport.nat]
+        self.nodes[(host, port)] = node
+        node.start()
+        if live:
+            self._hello(node, live)
+
+    def _hello(self, node, live):
+        if not node.running or len(node.dht):
+            return
+        for _ in range(8):
+            bootstrap = self.rng.choice(live)
+            if bootstrap.running and len(bootstrap.dht):
+                break
+        node.send_hello((bootstrap.host, bootstrap.port))
+        # HELLO или ответ на него могли потеряться
+        self.loop.after(HELLO_RETRY, self._hello, node, live)
+
+    def _leave(self):
+        if len(self.nodes) <= 1:
+            return
+        addr = self.rng.choice(list(self.nodes))
+        self.nodes.pop(addr).stop()
+
+    def _churn_tick(self):
+        # ожидаемое число замен за секунду; дробная часть — с вероятностью
+        expected = self.churn * len(self.nodes) / 60
+        count = int(expected) + (1 if self.rng.random() < expected - int(expected) else 0)
+        for _ in range(count):
+            self._leave()
+            self._join()
+
+    # ---------------- ИЗМЕРЕНИЯ ----------------
+
+    def converged_fraction(self) -> float:
+        # по ID, а не по адресу: узел за NAT известен другим по внешнему адресу
+        by_id = {node.node_id: node for node in self.nodes.values()}
+        truth = true_neighbours(list(by_id))
+        ok = 0
+        for node_id, node in by_id.items():
+            if all(self._knows(node, n) for n in truth[node_id]):
+                ok += 1
+        return ok / max(1, len(by_id))
+
+    @staticmethod
+    def _knows(node, node_id) -> bool:
+        closest = node.dht.find_closest(node_id, 1)
+        return bool(closest) and closest[0].node_id == node_id
+
+    def nat_report(self) -> dict:
+        # узлы за cone NAT должны узнать свой внешний адрес, за симметричным — тип NAT
+        cone = [n for n in self.nodes.values() if n.transport.nat == "cone"]
+        symmetric = [n for n in self.nodes.values() if n.transport.nat == "symmetric"]
+        return {
+            "cone": len(cone),
+            "cone_discovered": sum(1 for n in cone if n.external_addr in n.transport.public_addrs()),
+            "symmetric": len(symmetric),
+            "symmetric_detected": sum(1 for n in symmetric if n.reflexive.nat_type() == "symmetric"),
+            "punch_ok": sum(n.punch.stats["ok"] for n in self.nodes.values()),
+            "punch_failed": sum(n.punch.stats["failed"] for n in self.nodes.values()),
+            "relayed": sum(len(n._relayed) for n in self.nodes.values()),
+            "relay_forwarded": sum(n.relay_quota.forwarded for n in self.nodes.values()),
+            "relay_dropped": sum(n.relay_quota.dropped for n in self.nodes.values()),
+        }
+
+    def run(self, duration: float = 120.0, target: float = 0.99) -> dict:
+        rss_before = rss_kb()
+        wall = _real_time.perf_counter()
+        start = self.clock.now
+
+        for i in range(self.size):
+            self.loop.at(start + self.join_window * i / self.size, self._join)
+        if self.churn:
+            self.loop.every(1.0, self._churn_tick, offset=self.join_window)
+
+        curve = []
+        converged_at = None
+        t = start
+        while t - start < duration:
+            t += SAMPLE_INTERVAL
+            self.loop.run_until(t)
+            fraction = self.converged_fraction()
+            curve.append((t - start, fraction))
+            if converged_at is None and fraction >= target and len(self.nodes) >= self.size:
+                converged_at = t - start
+                if not self.churn:
+                    break
+
+        elapsed = self.clock.now - start
+        live = max(1, len(self.nodes))
+        return {
+            "nodes": self.size,
+            "converged_at": converged_at,
+            "final": curve[-1][1] if curve else 0.0,
+            "curve": curve,
+            "virtual_s": elapsed,
+            "wall_s": _real_time.perf_counter() - wall,
+            "events": self.loop.processed,
+            "packets": self.network.packets,
+            "bytes": self.network.bytes,
+            "packets_per_node_min": self.network.packets / live / (elapsed / 60),
+            "by_type": dict(self.network.by_type),
+            "lost": self.network.lost,
+            "nat_dropped": self.network.nat_dropped,
+            "nat": self.nat_report(),
+            "rss_per_node_kb": (rss_kb() - rss_before) / live,
+        }
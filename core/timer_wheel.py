@@ -0,0 +1,101 @@
+import math
+import threading
+from typing import Any, Dict, List, Tuple
+
+
+class TimerWheel:
+    # иерархическое колесо таймеров: уровень 0 — по слоту на тик,
+    # каждый следующий уровень — по слоту на полный оборот предыдущего.
+    # schedule — O(1), advance — O(сработавших + перенесённых с верхних уровней)
+
+    def __init__(self, tick: float = 0.1, sizes: Tuple[int, ...] = (256, 64, 64),
+                 now: float = 0.0):
+        self.tick = tick
+        self.sizes = sizes
+        # слоты — словарь номер -> список: пустые слоты не занимают память
+        self.levels: List[Dict[int, list]] = [{} for _ in sizes]
+        self.overflow: List[Tuple[int, Any]] = []
+        self.current = int(now / tick)
+        self._count = 0
+        self._lock = threading.Lock()
+
+        self._spans = []
+        span = 1
+        for n in sizes:
+            self._spans.append(span)
+            span *= n
+        self._range = span
+
+    def __len__(self):
+        return self._count
+
+    # ============================================================
+    #   ПЛАНИРОВАНИЕ
+    # ============================================================
+    def schedule(self, when: float, item: Any) -> None:
+        with self._lock:
+            t = max(math.ceil(when / self.tick), self.current + 1)
+            self._place(t, item)
+            self._count += 1
+
+    def _place(self, t: int, item: Any) -> None:
+        diff = t - self.current
+        for level, n in enumerate(self.sizes):
+            span = self._spans[level]
+            if diff < span * n:
+                slot = (t // span) % n
+                entries = self.levels[level].get(slot)
+                if entries is None:
+                    self.levels[level][slot] = [(t, item)]
+                else:
+                    entries.append((t, item))
+                return
+        self.overflow.append((t, item))
+
+    # ============================================================
+    #   ПРОДВИЖЕНИЕ
+    # ============================================================
+    def advance(self, now: float) -> List[Any]:
+        target = int(now / self.tick)
+        due = []
+
+        with self._lock:
+            while self.current < target:
+                self.current += 1
+
+                # на границе оборота спускаем слот верхнего уровня вниз
+                for level in range(1, len(self.sizes)):
+                    span = self._spans[level]
+                    if self.current % span:
+                        break
+                    slot = (self.current // span) % self.sizes[level]
+                    for t, item in self.levels[level].pop(slot, ()):
+                        self._place(t, item)
+
+                if self.overflow and self.current % self._range == 0:
+                    entries, self.overflow = self.overflow, []
+                    for t, item in entries:
+                        self._place(t, item)
+
+                slot = self.current % self.sizes[0]
+                entries = self.levels[0].pop(slot, None)
+                if not entries:
+                    continue
+                for t, item in entries:
+                    if t <= self.current:
+                        due.append(item)
+                    else:
+                        self._place(t, item)
+
+            self._count -= len(due)
+        return due
+
+    # ============================================================
+    #   ИНСПЕКЦИЯ
+    # ============================================================
+    def pending(self) -> List[Tuple[float, Any]]:
+        with self._lock:
+            entries = [e for level in self.levels for slot in level.values() for e in slot]
+            entries.extend(self.overflow)
+        entries.sort(key=lambda e: e[0])
+        return [(t * self.tick, item) for t, item in entries]
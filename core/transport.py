@@ -1,134 +1,220 @@
 import socket
+import select
 import threading
 import logging
-import datetime
+import time
+from contextlib import contextmanager
+
+from .pipeline import PacketPipeline, DEFAULT_QUEUE_SIZE, POLICY_DROP_OLDEST
+from .log_pipeline import LogPipeline
+from .metrics import MetricsRegistry
+from .admission import Admission, DROP_REASONS
+from .interfaces import InterfaceMonitor
+
+MAX_DATAGRAM = 65535
+
+# пакетный режим: сколько датаграмм вычитывать за одно пробуждение
+RECV_BATCH = 64
 
 
 class Logger:
     panel = None
 
+    # форматирование и вывод — в фоновом потоке, здесь только постановка в кольцо
+    pipeline = LogPipeline()
+    pipeline.panel_getter = lambda: Logger.panel
+
+    @staticmethod
+    def configure(**options):
+        Logger.pipeline.configure(**options)
+
     @staticmethod
-    def _ts():
-        return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def close():
+        Logger.pipeline.close()
 
     @staticmethod
     def send(packet_type, size, ip, port):
-        msg = f"[SEND] {Logger._ts()} | {packet_type} | {size} bytes | to {ip}:{port}"
-        print(msg)
-        Logger.ui(msg)
+        Logger.pipeline.emit("SEND", packet_type, size, ip, port)
 
     @staticmethod
     def recv(packet_type, size, ip, port):
-        msg = f"[RECV] {Logger._ts()} | {packet_type} | {size} bytes | from {ip}:{port}"
-        print(msg)
-        Logger.ui(msg)
+        Logger.pipeline.emit("RECV", packet_type, size, ip, port)
 
     @staticmethod
     def error(msg):
-        full = f"[ERROR] {Logger._ts()} | {msg}"
-        print(full)
-        Logger.ui(full)
+        Logger.pipeline.emit("ERROR", msg)
 
     @staticmethod
     def route(msg):
-        full = f"[ROUTE] {Logger._ts()} | {msg}"
-        print(full)
-        Logger.ui(full)
+        Logger.pipeline.emit("ROUTE", msg)
 
     @staticmethod
     def dht(msg):
-        full = f"[DHT] {Logger._ts()} | {msg}"
-        print(full)
-        Logger.ui(full)
+        Logger.pipeline.emit("DHT", msg)
 
     @staticmethod
     def ui(text):
-        if Logger.panel:
-            Logger.panel.add_log(text)
+        Logger.pipeline.emit("UI", text)
 
 
 class Transport:
-    def __init__(self, host: str, port: int, on_packet_callback, panel=None):
+    def __init__(self, host: str, port: int, on_packet_callback, panel=None, batched=False,
+                 reuse_port=False, handler_workers=0, queue_size=DEFAULT_QUEUE_SIZE,
+                 overload_policy=POLICY_DROP_OLDEST, metrics: MetricsRegistry = None, admission=True,
+                 ipv6=False, monitor=True):
         self.panel = panel
         self.host = host
         self.port = port
         self.on_packet = on_packet_callback
 
+        if reuse_port and not hasattr(socket, "SO_REUSEPORT"):
+            raise OSError("SO_REUSEPORT не поддерживается этой платформой")
+
+        # IPv4 на всех интерфейсах (LAN, ZeroTier) — один сокет, ядро само
+        # выбирает интерфейс по адресату; IPv6 — отдельный сокет на том же порту
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if reuse_port:
+            # несколько процессов на одном порту, ядро делит датаграммы между ними
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.socket.bind(("", port))
 
+        self.socket6 = None
+        if ipv6:
+            self.socket6 = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+            self.socket6.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
+            if reuse_port:
+                self.socket6.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            self.socket6.bind(("::", port))
+
         self.running = False
 
-    # ---------------- СЕТЕВОЙ СТАТУС ----------------
+        # состояние интерфейсов опрашивается в фоне, панель получает только изменения
+        self.monitor = InterfaceMonitor(port, self._on_interfaces) if monitor else None
+        # узел подписывается, чтобы перепроверить пути к пирам
+        self.on_interfaces = None
 
-    def get_local_ip(self):
-        try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect(("8.8.8.8", 80))
-            ip = s.getsockname()[0]
-            s.close()
-            return ip
-        except Exception:
-            return "неизвестно"
-
-    def get_zerotier_ip(self):
-        try:
-            import psutil
-            for iface, addrs in psutil.net_if_addrs().items():
-                if iface.startswith("zt"):
-                    for a in addrs:
-                        if a.family == socket.AF_INET:
-                            return a.address
-            return "не найден"
-        except Exception:
-            return "неизвестно"
-
-    def check_udp(self):
-        try:
-            test_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            test_sock.settimeout(0.2)
-            test_sock.sendto(b"PING", ("127.0.0.1", self.port))
-            test_sock.close()
-            return True
-        except Exception:
-            return False
+        # пакетный режим: кольцо заранее выделенных буферов приёма
+        # и накопление исходящих пакетов внутри batch()
+        self.batched = batched
+        self._ring = [bytearray(MAX_DATAGRAM) for _ in range(RECV_BATCH)] if batched else []
+        self._ring_views = [memoryview(b) for b in self._ring]
+        self._send_queue = []
+        self._batch_depth = 0
+        self._send_lock = threading.Lock()
+
+        # очередь с пулом обработчиков: приёмник не ждёт логику узла
+        self.pipeline = None
+        if handler_workers > 0:
+            self.pipeline = PacketPipeline(self._handle, handler_workers, queue_size, overload_policy)
+
+        # допуск до разбора: доли источников и типов, ограничение усиления ответов
+        self.admission = Admission() if admission else None
+
+        # инструменты создаются один раз — на горячем пути только инкременты
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.m_rx_packets = self.metrics.counter("packets_received")
+        self.m_rx_bytes = self.metrics.counter("bytes_received")
+        self.m_tx_packets = self.metrics.counter("packets_sent")
+        self.m_tx_bytes = self.metrics.counter("bytes_sent")
+        self.m_tx_errors = self.metrics.counter("send_errors")
+        self.m_handler_us = self.metrics.histogram("handler_latency_us")
+        if self.pipeline is not None:
+            pipeline = self.pipeline
+            self.metrics.gauge("queue_depth", fn=lambda: pipeline.depth)
+            self.metrics.gauge("queue_dropped", fn=lambda: pipeline.dropped)
+        if self.admission is not None:
+            admission = self.admission
+            self.metrics.gauge("admission_sources", fn=lambda: len(admission))
+            for reason in DROP_REASONS:
+                self.metrics.gauge("admission_dropped", fn=lambda r=reason: admission.dropped[r], reason=reason)
+
+    # ---------------- СЕТЕВОЙ СТАТУС ----------------
 
     def update_panel_status(self):
-        if not self.panel:
+        # без опроса интерфейсов в вызывающем потоке: панель получает снимок
+        # из кэша, а свежий опрос монитор сделает у себя и пришлёт изменения
+        if self.monitor is None:
             return
+        self.monitor.request_refresh()
+        if self.monitor.state is not None:
+            self._push_status(self.monitor.state)
 
-        local_ip = self.get_local_ip()
-        zt_ip = self.get_zerotier_ip()
-        udp_ok = self.check_udp()
-        port = self.port
+    def _push_status(self, state):
+        if self.panel:
+            self.panel.safe_update_status(state.local_ip, state.zerotier_ip, state.udp_ok, self.port)
 
-        self.panel.safe_update_status(local_ip, zt_ip, udp_ok, port)
+    def _on_interfaces(self, state, added, removed):
+        self._push_status(state)
+        changes = [f"+{name} {ip}" for name, ip in added] + [f"-{name} {ip}" for name, ip in removed]
+        if changes:
+            logging.info("Интерфейсы: %s", ", ".join(changes))
+            if self.panel:
+                Logger.ui("Интерфейсы: " + ", ".join(changes))
+        if self.on_interfaces is not None:
+            self.on_interfaces(state, added, removed)
+
+    def _socket_for(self, addr):
+        if self.socket6 is not None and ":" in addr[0]:
+            return self.socket6
+        return self.socket
 
     # ---------------- ЖИЗНЕННЫЙ ЦИКЛ ----------------
 
     def start(self):
         self.running = True
-        threading.Thread(target=self._listen_loop, daemon=True).start()
-        logging.info("Транспорт запущен на %s:%s", self.host, self.port)
+        if self.pipeline is not None:
+            self.pipeline.start()
+        if self.monitor is not None:
+            self.monitor.start()
+        loop = self._batched_listen_loop if self.batched else self._listen_loop
+        for sock in (self.socket, self.socket6):
+            if sock is not None:
+                threading.Thread(target=loop, args=(sock,), daemon=True).start()
+        logging.info("Транспорт запущен на %s:%s%s", self.host, self.port, " (+IPv6)" if self.socket6 else "")
 
     def stop(self):
         self.running = False
-        try:
-            self.socket.close()
-        except Exception:
-            pass
+        if self.monitor is not None:
+            self.monitor.stop()
+        for sock in (self.socket, self.socket6):
+            if sock is None:
+                continue
+            try:
+                sock.close()
+            except Exception:
+                pass
+        if self.pipeline is not None:
+            self.pipeline.stop()
         logging.info("Транспорт остановлен")
 
-    def _listen_loop(self):
+    def _deliver(self, data, addr):
+        self.m_rx_packets.inc()
+        self.m_rx_bytes.inc(len(data))
+        if self.admission is not None and not self.admission.admit(data, addr):
+            return
+        if self.pipeline is not None:
+            # буфер приёма переиспользуется — в очередь кладём копию
+            self.pipeline.submit(bytes(data), addr)
+        else:
+            self._handle(data, addr)
+
+    def _handle(self, data, addr):
+        t0 = time.perf_counter()
+        try:
+            self.on_packet(data, addr)
+        except Exception as handler_err:
+            logging.error("Ошибка в обработчике пакета: %s", handler_err)
+        self.m_handler_us.record((time.perf_counter() - t0) * 1e6)
+
+    def _listen_loop(self, sock):
         while self.running:
             try:
-                data, addr = self.socket.recvfrom(65535)
+                data, addr = sock.recvfrom(65535)
+                if len(addr) > 2:
+                    # IPv6: (адрес, порт, flowinfo, scope_id) — узлу нужны адрес и порт
+                    addr = addr[:2]
                 Logger.recv("RAW", len(data), addr[0], addr[1])
-
-                try:
-                    self.on_packet(data, addr)
-                except Exception as handler_err:
-                    logging.error("Ошибка в обработчике пакета: %s", handler_err)
+                self._deliver(data, addr)
 
             except Exception as e:
                 msg = str(e)
@@ -139,9 +225,90 @@ class Transport:
 
                 logging.error("Ошибка в listen_loop: %s", e)
 
+    def _batched_listen_loop(self, sock):
+        # один select на пачку датаграмм: сокет вычитывается до EAGAIN
+        # в кольцо буферов, без выделения 64 КиБ на каждый пакет.
+        # on_packet получает memoryview, действительный только на время вызова
+        sock.setblocking(False)
+        views = self._ring_views
+        if sock is not self.socket:
+            # у каждого сокета своё кольцо: потоки приёма работают параллельно
+            views = [memoryview(bytearray(MAX_DATAGRAM)) for _ in range(RECV_BATCH)]
+
+        while self.running:
+            try:
+                readable, _, _ = select.select([sock], [], [], 0.5)
+                if not readable:
+                    continue
+
+                batch = []
+                for view in views:
+                    try:
+                        n, addr = sock.recvfrom_into(view)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    except ConnectionResetError:
+                        # WinError 10054: ICMP port unreachable от прошлой отправки
+                        continue
+                    batch.append((view[:n], addr[:2]))
+
+                for data, addr in batch:
+                    Logger.recv("RAW", len(data), addr[0], addr[1])
+                    self._deliver(data, addr)
+
+            except Exception as e:
+                if not self.running:
+                    break
+                logging.error("Ошибка в listen_loop: %s", e)
+
+    @contextmanager
+    def batch(self):
+        # отправки внутри блока копятся и уходят одной пачкой на выходе
+        with self._send_lock:
+            self._batch_depth += 1
+        try:
+            yield
+        finally:
+            with self._send_lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    queue, self._send_queue = self._send_queue, []
+                else:
+                    queue = []
+            self._flush(queue)
+
+    def _flush(self, queue):
+        for data, addr in queue:
+            sock = self._socket_for(addr)
+            try:
+                sock.sendto(data, addr)
+            except BlockingIOError:
+                # буфер сокета полон — ждём и пробуем ещё раз
+                select.select([], [sock], [], 0.05)
+                try:
+                    sock.sendto(data, addr)
+                except Exception as e:
+                    self.m_tx_errors.inc()
+                    logging.error("Ошибка отправки пакета: %s", e)
+            except Exception as e:
+                self.m_tx_errors.inc()
+                logging.error("Ошибка отправки пакета: %s", e)
+
     def send(self, data, addr):
+        if self.admission is not None and not self.admission.allow_send(addr, len(data)):
+            return
+        self.m_tx_packets.inc()
+        self.m_tx_bytes.inc(len(data))
         try:
             Logger.send("RAW", len(data), addr[0], addr[1])
-            self.socket.sendto(data, addr)
+            if self.batched and self._batch_depth:
+                with self._send_lock:
+                    if self._batch_depth:
+                        self._send_queue.append((data, addr))
+                        return
+            self._socket_for(addr).sendto(data, addr)
+        except BlockingIOError:
+            self._flush([(data, addr)])
         except Exception as e:
+            self.m_tx_errors.inc()
             logging.error("Ошибка отправки пакета: %s", e)
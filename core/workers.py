@@ -0,0 +1,249 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from typing import List
+
+from .node import Node
+from .peer import Peer
+from .protocol import PacketType
+
+
+SYNC_INTERVAL = 0.5
+STOP_TIMEOUT = 5
+
+# ответы на отправленное ведущим процессом: окна доставки и ожидания живут только
+# у него, а SO_REUSEPORT раздаёт датаграммы по хешу адреса отправителя.
+# Раунды gossip и кандидаты из GOSSIP_REPLY (ждут PONG), загрузки блобов — тоже у ведущего.
+# Сессии пробивки NAT рассылает heartbeat ведущего: и вступление, и встречный PUNCH — к нему
+LEADER_TYPES = frozenset({PacketType.RACK.value, PacketType.PONG.value, PacketType.STORED.value,
+                          PacketType.GOSSIP.value, PacketType.GOSSIP_REPLY.value,
+                          PacketType.MANIFEST.value, PacketType.CHUNK.value,
+                          PacketType.PUNCH_REQ.value, PacketType.PUNCH_INTRO.value,
+                          PacketType.PUNCH.value})
+
+
+# ============================================================
+#   СИНХРОНИЗАЦИЯ ТАБЛИЦЫ МАРШРУТИЗАЦИИ
+# ============================================================
+class DHTSync:
+    # копит изменения локальной DHT и раз в SYNC_INTERVAL отдаёт их пачкой;
+    # "seen" схлопываются до одной записи на адрес
+
+    def __init__(self, dht, send_batch):
+        self.dht = dht
+        self.send_batch = send_batch
+        self._events = []
+        self._seen = {}
+        self._lock = threading.Lock()
+        self._running = False
+        dht.add_listener(self._on_change)
+
+    def _on_change(self, event, peer: Peer):
+        with self._lock:
+            if event == "seen":
+                self._seen[peer.addr] = peer.last_seen
+            elif event == "add":
+                self._events.append(("add", peer.addr[0], peer.addr[1],
+                                     f"{peer.node_id:040x}", peer.last_seen))
+            else:
+                self._seen.pop(peer.addr, None)
+                self._events.append(("remove", peer.addr[0], peer.addr[1]))
+
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def stop(self):
+        self._running = False
+        self.flush()
+
+    def _flush_loop(self):
+        while self._running:
+            time.sleep(SYNC_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            events, self._events = self._events, []
+            seen, self._seen = self._seen, {}
+        events.extend(("seen", ip, port, ts) for (ip, port), ts in seen.items())
+        if events:
+            try:
+                self.send_batch(events)
+            except Exception as e:
+                logging.error("Ошибка синхронизации DHT: %s", e)
+
+    def apply(self, events):
+        # чужие изменения применяются без повторного оповещения
+        for event in events:
+            kind, addr = event[0], (event[1], event[2])
+            if kind == "add":
+                self.dht.add_peer(addr, int(event[3], 16), notify=False, ts=event[4])
+            elif kind == "seen":
+                self.dht.mark_seen(addr, ts=event[3], notify=False)
+            elif kind == "remove":
+                self.dht.remove_peer(addr, notify=False)
+
+
+# ============================================================
+#   РАБОЧИЙ ПРОЦЕСС
+# ============================================================
+class WorkerNode(Node):
+    # принимает свою долю датаграмм с общего порта; heartbeat и bootstrap
+    # ведёт только ведущий процесс, ответы на чужие поиски уходят ему
+
+    def __init__(self, host, port, index, up, inbox, **transport_options):
+        super().__init__(host, port, panel=None, **transport_options)
+        self.index = index
+        self.up = up
+        self.inbox = inbox
+        self.sync = DHTSync(self.dht, lambda events: self.up.put(("events", self.index, events)))
+        # пути к пирам проверяет heartbeat ведущего процесса
+        self.multipath = False
+
+    def start(self):
+        self.running = True
+        self.transport.start()
+        self.sync.start()
+        threading.Thread(target=self._inbox_loop, daemon=True).start()
+        logging.info("Рабочий процесс %s запущен на порту %s", self.index, self.port)
+
+    def stop(self):
+        self.running = False
+        self.sync.stop()
+        self.reliable.stop()
+        self.transport.stop()
+
+    def _inbox_loop(self):
+        while self.running:
+            try:
+                events = self.inbox.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            self.sync.apply(events)
+
+    def _start_bootstrap(self):
+        pass
+
+    def _on_dht_change(self, event, peer):
+        # пинги и истечение планирует ведущий процесс
+        pass
+
+    def _on_orphan_reply(self, packet, addr):
+        self.up.put(("reply", packet, addr))
+
+    def _on_peer_list(self, packet, addr, peers):
+        # HELLO отправлял ведущий процесс — ему и решать, ждал ли он этот список
+        self.up.put(("list", packet, addr))
+
+    def _dispatch(self, ptype, packet, addr):
+        if ptype in LEADER_TYPES:
+            self.up.put(("packet", packet, addr))
+            return
+        super()._dispatch(ptype, packet, addr)
+
+
+def _worker_main(host, port, index, up, inbox, stop_event, transport_options):
+    node = WorkerNode(host, port, index, up, inbox, **transport_options)
+    node.start()
+    try:
+        stop_event.wait()
+    except KeyboardInterrupt:
+        pass
+    node.stop()
+
+
+# ============================================================
+#   ПУЛ (ведущий процесс)
+# ============================================================
+class WorkerPool:
+    def __init__(self, node: Node, count: int):
+        self.node = node
+        self.count = count
+        # spawn: ведущий процесс уже многопоточный, fork здесь небезопасен
+        self.ctx = multiprocessing.get_context("spawn")
+        self.up = self.ctx.Queue()
+        self.inboxes = [self.ctx.Queue() for _ in range(count)]
+        self.stop_event = self.ctx.Event()
+        self.processes: List[multiprocessing.Process] = []
+        self.sync = DHTSync(node.dht, lambda events: self._broadcast(events, origin=None))
+        self._running = False
+
+    def start(self):
+        transport = self.node.transport
+        options = {"reuse_port": True, "batched": transport.batched,
+                   "admission": transport.admission is not None,
+                   "ipv6": transport.socket6 is not None, "monitor": False}
+        if transport.pipeline is not None:
+            options.update(handler_workers=transport.pipeline.workers,
+                           queue_size=transport.pipeline.maxsize,
+                           overload_policy=transport.pipeline.policy)
+        for index in range(self.count):
+            proc = self.ctx.Process(
+                target=_worker_main,
+                args=(self.node.host, self.node.port, index, self.up,
+                      self.inboxes[index], self.stop_event, options),
+                daemon=True,
+            )
+            proc.start()
+            self.processes.append(proc)
+
+        self._running = True
+        self.sync.start()
+        threading.Thread(target=self._router_loop, daemon=True).start()
+
+        # новые процессы получают текущую таблицу целиком
+        snapshot = [("add", p.addr[0], p.addr[1], f"{p.node_id:040x}", p.last_seen)
+                    for p in (self.node.dht.get_peer(a) for a in self.node.dht.get_peers()) if p]
+        if snapshot:
+            self._broadcast(snapshot, origin=None)
+
+        logging.info("Запущено рабочих процессов: %s (порт %s, SO_REUSEPORT)",
+                     self.count, self.node.port)
+
+    def stop(self):
+        self._running = False
+        self.sync.stop()
+        self.stop_event.set()
+        for proc in self.processes:
+            proc.join(timeout=STOP_TIMEOUT)
+            if proc.is_alive():
+                proc.terminate()
+        self.processes = []
+
+    def _broadcast(self, events, origin):
+        for index, inbox in enumerate(self.inboxes):
+            if index != origin:
+                inbox.put(events)
+
+    def _router_loop(self):
+        while self._running:
+            try:
+                item = self.up.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            kind = item[0]
+            if kind == "events":
+                _, origin, events = item
+                self.sync.apply(events)
+                self._broadcast(events, origin)
+            elif kind == "reply":
+                _, packet, addr = item
+                peers = self.node._parse_peer_list(packet.get("peers", []))
+                self.node._deliver_reply(packet, peers)
+            elif kind == "list":
+                _, packet, addr = item
+                self.node._on_peer_list(packet, addr, self.node._parse_peer_list(packet.get("peers", [])))
+            elif kind == "packet":
+                _, packet, addr = item
+                self.node._dispatch(packet.get("type"), packet, addr)
+
+    def alive(self) -> int:
+        return sum(1 for p in self.processes if p.is_alive())
@@ -1,8 +1,12 @@
-from core.nat_traversal import get_local_ip
+from core.interfaces import get_local_ip
 from core.node import Node
+from core.async_node import AsyncNode
 from PySide6.QtWidgets import QApplication
 from ui.diagnostics_panel import DiagnosticsPanel
 from core.transport import Logger
+from core.pipeline import POLICIES, POLICY_DROP_OLDEST, DEFAULT_QUEUE_SIZE
+from core.metrics_http import MetricsServer
+from core.kv import KV_TTL
 import sys
 import traceback
 import requests 
@@ -10,6 +14,8 @@ import sys
 import subprocess 
 import time 
 import os
+import argparse
+import threading
 
 APP_VERSION = "1.0.0"
 UPDATE_URL = "https://github.com/ImprezzzV/Atlan.git"
@@ -45,21 +51,94 @@ def excepthook(type, value, tb):
 sys.excepthook = excepthook
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="P2P-узел Atlan")
+    parser.add_argument("port", nargs="?", type=int, help="порт узла")
+    parser.add_argument("--asyncio", action="store_true",
+                        help="транспорт и таймеры на цикле событий asyncio")
+    parser.add_argument("--batched-io", action="store_true",
+                        help="пакетный приём в кольцо буферов и пакетная отправка heartbeat")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="число процессов на порту узла (SO_REUSEPORT, только Linux/BSD)")
+    parser.add_argument("--handler-workers", type=int, default=0,
+                        help="потоков-обработчиков за очередью приёма (0 — обработка в потоке приёма)")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="ёмкость очереди приёма")
+    parser.add_argument("--overload-policy", choices=POLICIES, default=POLICY_DROP_OLDEST,
+                        help="что выбрасывать при переполнении очереди")
+    parser.add_argument("--packet-log", choices=("on", "off"), default="on",
+                        help="логировать каждый отправленный / принятый пакет")
+    parser.add_argument("--log-sample", type=int, default=1,
+                        help="логировать каждый N-й пакет")
+    parser.add_argument("--log-rate", type=float, default=0,
+                        help="не больше N строк в секунду на SEND / RECV (0 — без лимита)")
+    parser.add_argument("--log-jsonl", default=None,
+                        help="дополнительно писать лог в JSONL-файл")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="отдавать метрики в формате Prometheus на 127.0.0.1:PORT/metrics")
+    parser.add_argument("--peer-cache", default=None,
+                        help="файл кэша пиров (по умолчанию peers_PORT.cache рядом с run.py)")
+    parser.add_argument("--no-peer-cache", action="store_true",
+                        help="не сохранять и не загружать кэш пиров")
+    parser.add_argument("--secure", action="store_true",
+                        help="шифрованные сессии: ID узла — хеш его ключа (нужен пакет cryptography)")
+    parser.add_argument("--identity", default=None,
+                        help="файл ключа узла (по умолчанию node_PORT.key рядом с run.py)")
+    parser.add_argument("--kv-store", default=None,
+                        help="журнал хранилища ключей (по умолчанию kv_PORT.db рядом с run.py)")
+    parser.add_argument("--no-admission", action="store_true",
+                        help="не ограничивать входящие пакеты по источникам и типам")
+    parser.add_argument("--ipv6", action="store_true",
+                        help="слушать порт и на IPv6 и объявлять пирам IPv6-адреса")
+    args = parser.parse_args()
+    if args.asyncio and args.batched_io:
+        parser.error("--batched-io не совместим с --asyncio")
+    return args
+
+
 def main(panel):
     check_for_updates()
-    try:
-        port = int(input("Введите порт узла: "))
-    except Exception:
-        print("Некорректный порт")
-        return
+    args = parse_args()
+
+    port = args.port
+    if port is None:
+        try:
+            port = int(input("Введите порт узла: "))
+        except Exception:
+            print("Некорректный порт")
+            return
 
     host = get_local_ip()
 
-    node = Node(host, port, panel=panel)
+    Logger.configure(packet_log=args.packet_log, sample=args.log_sample,
+                     rate=args.log_rate, jsonl_path=args.log_jsonl)
+
+    peer_cache = None
+    if not args.no_peer_cache:
+        peer_cache = args.peer_cache or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                     f"peers_{port}.cache")
+
+    identity = None
+    if args.secure:
+        identity = args.identity or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                  f"node_{port}.key")
+
+    kv_path = args.kv_store or os.path.join(os.path.dirname(os.path.abspath(__file__)), f"kv_{port}.db")
+
+    node_class = AsyncNode if args.asyncio else Node
+    node = node_class(host, port, panel=panel, workers=args.workers, batched=args.batched_io,
+                      peer_cache=peer_cache, secure=args.secure, identity=identity,
+                      kv_path=kv_path, handler_workers=args.handler_workers, queue_size=args.queue_size,
+                      overload_policy=args.overload_policy, admission=not args.no_admission, ipv6=args.ipv6)
     Logger.panel = panel
 
     node.start()
 
+    metrics_server = None
+    if args.metrics_port:
+        metrics_server = MetricsServer(node.metrics, args.metrics_port)
+        metrics_server.start()
+
     panel.btn_refresh.clicked.connect(lambda: node.transport.update_panel_status())
     panel.btn_refresh.clicked.connect(lambda: node.update_panel_dht())
 
@@ -67,10 +146,22 @@ def main(panel):
     node.update_panel_dht()
 
     print("  connect ip         - попытаться подключиться к узлу")
+    print("  rmsg ip port text  - сообщение с подтверждением доставки")
     print("  trace ip port      - проверить доступность узла")
+    print("  find key           - итеративный поиск ключа / ID узла в DHT")
+    print("  send-file path     - раздать файл, вывести его ID")
+    print("  get id [path]      - скачать файл по ID")
+    print("  kv-put key value [--ttl s] - сохранить значение в DHT с репликацией")
+    print("  kv-get key         - прочитать значение из DHT")
+    print("  sub topic          - подписаться на тему")
+    print("  unsub topic        - отписаться от темы")
+    print("  pub topic text     - опубликовать сообщение в теме")
     print("  watch              - мониторинг сети")
     print("  peers              - список известных пиров")
+    print("  stats              - счётчики, скорости и задержки")
     print("  info               - информация об узле")
+    print("  route              - кэш маршрутов через relay")
+    print("  paths              - пути к пирам с несколькими адресами")
     print("  exit               - выход")
 
     while True:
@@ -98,15 +189,59 @@ def main(panel):
             text = " ".join(parts[3:])
             node.send_message((ip, port), text)
 
+        elif parts[0] == "rmsg" and len(parts) >= 4:
+            addr = (parts[1], int(parts[2]))
+            text = " ".join(parts[3:])
+            future = node.send_reliable(addr, text)
+            future.add_done_callback(
+                lambda f, addr=addr: print("Доставлено:" if f.exception() is None else "Не доставлено:",
+                                           addr, f.exception() or "")
+            )
+
         elif cmd == "peers":
             print("Известные пиры:")
             for p in node.dht.get_peers():
                 print("  ", p)
 
+        elif cmd == "stats":
+            print(node.metrics.format_text())
+
         elif cmd == "info":
             print("Локальный адрес:", node.host, node.port)
             print("Внешний адрес:", node.external_addr)
+            print("NAT:", node.reflexive.nat_type())
+            if node.sessions is not None:
+                print(f"ID узла: {node.node_id:040x} (ключ), шифрованных сессий: {len(node.sessions)}")
             print("Пиров в DHT:", len(node.dht.get_peers()))
+            if node.pubsub.topics:
+                print("Подписок на темы:", len(node.pubsub.topics))
+            if node.worker_pool is not None:
+                print("Рабочих процессов:", node.worker_pool.alive() + 1)
+            if node.transport.pipeline is not None:
+                st = node.transport.pipeline.stats()
+                print(f"Очередь приёма: {st['depth']}/{st['capacity']} (макс. {st['max_depth']}), "
+                      f"обработано {st['processed']}, сброшено {st['dropped']} {st['dropped_by_type']}")
+
+        elif cmd == "route":
+            now = time.time()
+            routes = node.routes.snapshot(now)
+            print(f"Через relay: {len(node._relayed)} пиров, маршрутов в кэше: {len(routes)}")
+            for dst, r in routes:
+                path = " -> ".join(f"{ip}:{port}" for ip, port in r.path)
+                print(f"   {dst:040x} через {r.next_hop[0]}:{r.next_hop[1]} [{path}] ещё {r.expires - now:.0f} с")
+            print(f"Переслано: {node.relay_quota.forwarded}, отброшено по квоте: {node.relay_quota.dropped}")
+
+        elif cmd == "paths":
+            monitor = node.transport.monitor
+            if monitor is not None and monitor.state is not None:
+                print("Свои адреса:", ", ".join(monitor.state.addresses(ipv6=node.transport.socket6 is not None)))
+            print(f"Пиров с несколькими путями: {len(node.paths)}, не по основному адресу: "
+                  f"{node.paths.rerouted}, переключений: {node.paths.switches}")
+            for primary, current, paths in node.paths.snapshot():
+                print(f"   {primary[0]}:{primary[1]} -> {current[0]}:{current[1]}")
+                for addr, srtt in paths:
+                    rtt = f"{srtt * 1000:.1f} мс" if srtt is not None else "не подтверждён"
+                    print(f"      {addr[0]}:{addr[1]} {rtt}")
 
         elif parts[0] == "connect" and len(parts) == 2:
             ip = parts[1]
@@ -117,6 +252,80 @@ def main(panel):
             port = int(parts[2])
             node.trace(ip, port)  # если у тебя нет trace, временно закомментируй эту строку
 
+        elif parts[0] == "find" and len(parts) >= 2:
+            key = " ".join(parts[1:])
+            value = node.lookup_value(key)
+            if value is not None:
+                print("Значение:", value)
+            else:
+                print("Ближайшие узлы:")
+                for p in node.lookup(key):
+                    print("  ", p.addr, f"{p.node_id:040x}")
+
+        elif parts[0] == "send-file" and len(parts) >= 2:
+            path = " ".join(parts[1:])
+            try:
+                print("ID файла:", node.share_file(path))
+            except OSError as e:
+                print("Ошибка:", e)
+
+        elif parts[0] == "get" and len(parts) in (2, 3):
+            key = parts[1]
+            dest = parts[2] if len(parts) == 3 else "."
+
+            def fetch(key=key, dest=dest):
+                t0 = time.time()
+                path = node.fetch_file(key, dest)
+                if path is None:
+                    print("Не удалось скачать", key)
+                else:
+                    size = os.path.getsize(path)
+                    elapsed = max(time.time() - t0, 1e-9)
+                    print(f"Скачано: {path} ({size} байт, {size / elapsed / 1e6:.1f} МБ/с)")
+
+            threading.Thread(target=fetch, daemon=True).start()
+
+        elif parts[0] == "kv-put" and len(parts) >= 3:
+            # значение — всё после ключа; срок жизни — только явным --ttl в конце
+            key, words, ttl = parts[1], parts[2:], KV_TTL
+            if len(words) >= 3 and words[-2] == "--ttl":
+                try:
+                    ttl = float(words[-1])
+                except ValueError:
+                    print("Ошибка: TTL должен быть числом")
+                    continue
+                words = words[:-2]
+            value = " ".join(words).encode()
+
+            def put(key=key, value=value, ttl=ttl):
+                try:
+                    acks = node.put(key, value, ttl)
+                except ValueError as e:
+                    print("Ошибка:", e)
+                    return
+                print(f"Сохранено {key}: подтверждений {acks}")
+
+            threading.Thread(target=put, daemon=True).start()
+
+        elif parts[0] == "kv-get" and len(parts) == 2:
+            def get(key=parts[1]):
+                value = node.get(key)
+                print(f"{key} =", value.decode(errors="replace") if value is not None else "не найдено")
+
+            threading.Thread(target=get, daemon=True).start()
+
+        elif parts[0] == "sub" and len(parts) == 2:
+            node.subscribe(parts[1])
+
+        elif parts[0] == "unsub" and len(parts) == 2:
+            node.unsubscribe(parts[1])
+
+        elif parts[0] == "pub" and len(parts) >= 3:
+            try:
+                node.publish(parts[1], " ".join(parts[2:]))
+            except ValueError as e:
+                print("Ошибка:", e)
+
         elif parts[0] == "watch":
             node.watch()  # если нет watch, тоже закомментируй
 
@@ -125,6 +334,9 @@ def main(panel):
 
     print("Остановка узла...")
     node.stop()
+    if metrics_server is not None:
+        metrics_server.stop()
+    Logger.close()
 
 
 if __name__ == "__main__":
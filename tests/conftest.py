@@ -0,0 +1,39 @@
+import os
+import random
+import sys
+
+import pytest
+
+# тесты запускаются из корня репозитория: пакет core — рядом
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.node import Node  # noqa: E402
+from core.sim import EventLoop, SimNetwork, SimTransport, VirtualClock  # noqa: E402
+
+
+class IsolatedNode(Node):
+    # узел на виртуальной сети симулятора: сокет не открывается, тесты не делят порты
+    transport_class = SimTransport
+
+
+def isolated_node(secure=False):
+    network = SimNetwork(EventLoop(VirtualClock()), random.Random(1))
+    node = IsolatedNode("127.0.0.1", 5000, metrics=False, secure=secure, network=network)
+    # отправленное узлом копится здесь, а не уходит в сеть
+    node.sent = []
+    node._send = lambda packet, addr: node.sent.append((packet, addr))
+    return node
+
+
+@pytest.fixture
+def node():
+    node = isolated_node()
+    yield node
+    node.stop()
+
+
+@pytest.fixture
+def secure_node():
+    node = isolated_node(secure=True)
+    yield node
+    node.stop()
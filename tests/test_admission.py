@@ -0,0 +1,94 @@
+from core.admission import (RESPONSE_ALLOWANCE, RESPONSE_RATIO, SMALL_PACKET, SOURCE_BURST,
+                            TYPE_LIMITS, UNVERIFIED_LIMITS, Admission)
+from core.protocol import PacketType, encode_packet
+from core.ratelimit import TokenBucket
+
+
+def test_bucket_spends_burst_then_refills():
+    bucket = TokenBucket(10, burst=5)
+    start = bucket.stamp
+    assert all(bucket.allow(now=start) for _ in range(5))
+    assert not bucket.allow(now=start)
+    assert bucket.allow(now=start + 0.15)
+    assert not bucket.allow(now=start + 0.15)
+    # запас не копится сверх burst
+    assert sum(bucket.allow(now=start + 100) for _ in range(10)) == 5
+
+
+def test_bucket_cost():
+    bucket = TokenBucket(1, burst=10)
+    assert bucket.allow(7, now=bucket.stamp)
+    assert not bucket.allow(7, now=bucket.stamp)
+
+
+def packet(ptype, **fields):
+    return encode_packet(dict(type=ptype.value, id=f"{1:040x}", **fields))
+
+
+def admitted(admission, data, addr, count):
+    return sum(admission.admit(data, addr) for _ in range(count))
+
+
+def test_type_limit_is_per_source():
+    admission = Admission()
+    hello = packet(PacketType.HELLO)
+    burst = TYPE_LIMITS[PacketType.HELLO.value][1]
+    assert admitted(admission, hello, ("10.0.0.1", 5000), burst * 2) == burst
+    assert admission.dropped["type"] == burst
+    # другой IP — своя доля
+    assert admission.admit(hello, ("10.0.0.2", 5000))
+    # порт другой, IP тот же — та же доля
+    assert not admission.admit(hello, ("10.0.0.1", 5001))
+
+
+def test_unverified_sources_share_type_budget():
+    admission = Admission()
+    intro = packet(PacketType.PUNCH_INTRO)
+    total = UNVERIFIED_LIMITS[PacketType.PUNCH_INTRO.value][1]
+    passed = sum(admission.admit(intro, (f"10.1.{i // 256}.{i % 256}", 5000)) for i in range(total * 2))
+    assert passed == total
+    # проверенный источник общий бюджет непроверенных не тратит
+    admission.verify(("10.2.0.1", 5000))
+    assert admission.admit(intro, ("10.2.0.1", 5000))
+
+
+def test_source_rate_caps_everything():
+    admission = Admission()
+    ping = packet(PacketType.PING)
+    admission.verify(("10.0.0.1", 5000))
+    # за время цикла ведро успевает немного пополниться
+    passed = admitted(admission, ping, ("10.0.0.1", 5000), SOURCE_BURST * 2)
+    assert SOURCE_BURST <= passed < SOURCE_BURST * 1.1
+    assert admission.dropped["source"] == SOURCE_BURST * 2 - passed
+
+
+def test_response_ratio_limits_unverified_address():
+    admission = Admission()
+    probes = []
+    admission.on_unverified = probes.append
+    addr = ("10.0.0.1", 5000)
+    request = packet(PacketType.HELLO)
+    assert admission.admit(request, addr)
+    credit = RESPONSE_ALLOWANCE + RESPONSE_RATIO * len(request)
+    assert admission.allow_send(addr, credit)
+    assert not admission.allow_send(addr, SMALL_PACKET + 1)
+    # мелкие пакеты (PING проверки) проходят всегда
+    assert admission.allow_send(addr, SMALL_PACKET)
+    assert probes == [addr] and admission.dropped["ratio"] == 1
+    admission.verify(addr)
+    assert admission.allow_send(addr, 10 * credit)
+
+
+def test_we_write_first_means_verified():
+    admission = Admission()
+    addr = ("10.0.0.1", 5000)
+    assert admission.allow_send(addr, 60000)
+    assert admission.is_verified(addr)
+
+
+def test_source_table_is_bounded():
+    admission = Admission(sources=8)
+    ping = packet(PacketType.PING)
+    for i in range(20):
+        admission.admit(ping, (f"10.0.0.{i}", 5000))
+    assert len(admission) == 8 and admission.evicted == 12
@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from core.blob import BlobStore, Manifest, safe_name
+from core.protocol import PacketType
+
+SEEDER = ("10.0.0.1", 5000)
+LEECHER = ("10.0.0.2", 5000)
+STRANGER = ("10.6.6.6", 5000)
+
+
+class Wire:
+    # два хранилища, пакеты доставляются сразу в вызывающем потоке;
+    # rename подменяет имя в страницах манифеста, как это сделал бы чужой источник
+    def __init__(self, rename=None):
+        self.rename = rename
+        self.seeder = BlobStore(lambda packet, addr: self.deliver(packet, SEEDER, addr))
+        self.leecher = BlobStore(lambda packet, addr: self.deliver(packet, LEECHER, addr))
+
+    def deliver(self, packet, src, dst):
+        store = self.seeder if dst == SEEDER else self.leecher
+        ptype = packet["type"]
+        if ptype == PacketType.MANIFEST_GET.value:
+            store.handle_manifest_get(packet, src)
+        elif ptype == PacketType.MANIFEST.value:
+            if self.rename is not None:
+                packet = dict(packet, value=dict(packet["value"], name=self.rename))
+            store.on_manifest(packet, src)
+        elif ptype == PacketType.CHUNK_GET.value:
+            store.handle_chunk_get(packet, src)
+        elif ptype == PacketType.CHUNK.value:
+            store.on_chunk(packet, src)
+
+
+def shared_file(wire, tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    path = src / "data.bin"
+    path.write_bytes(os.urandom(40000))
+    return wire.seeder.share(str(path)), path.read_bytes()
+
+
+def test_fetch_writes_into_dest_dir(tmp_path):
+    wire = Wire()
+    manifest, data = shared_file(wire, tmp_path)
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    out = wire.leecher.fetch(manifest.blob_id, str(dest), [SEEDER])
+    assert out == str(dest / "data.bin")
+    assert open(out, "rb").read() == data
+    wire.seeder.close()
+    wire.leecher.close()
+
+
+@pytest.mark.parametrize("name", ["../escape.bin", "/tmp/escape.bin", "..", "sub/escape.bin"])
+def test_forged_name_stays_inside_dest_dir(tmp_path, name):
+    wire = Wire(rename=name)
+    manifest, _ = shared_file(wire, tmp_path)
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    out = wire.leecher.fetch(manifest.blob_id, str(dest), [SEEDER])
+    assert out == str(dest / f"{manifest.blob_id:040x}")
+    wire.seeder.close()
+    wire.leecher.close()
+
+
+def test_manifest_from_unqueried_address_is_ignored(tmp_path, monkeypatch):
+    monkeypatch.setattr("core.blob.REQUEST_TIMEOUT", 0.05)
+    wire = Wire()
+    manifest, _ = shared_file(wire, tmp_path)
+    # источник молчит, страницу присылает посторонний
+    wire.leecher.send_fn = lambda packet, addr: wire.leecher.on_manifest(
+        {"type": PacketType.MANIFEST.value, "key": packet["key"], "page": 0,
+         "value": manifest.page(0)}, STRANGER)
+    assert wire.leecher.fetch_manifest(manifest.blob_id, [SEEDER]) is None
+    wire.seeder.close()
+
+
+def test_safe_name():
+    assert safe_name("data.bin") == "data.bin"
+    for name in ("", ".", "..", "../x", "a/b", "a\\b", "C:x", "x\0y", None, 5):
+        assert safe_name(name) == ""
+    page = Manifest(1, 1, [b"\0" * 20], "../x").page(0)
+    assert Manifest.from_pages([page]).name == ""
@@ -0,0 +1,67 @@
+import random
+
+from core.dedup import CounterWindow, ReplayFilter
+
+
+def keys(n, seed=1):
+    rng = random.Random(seed)
+    return [rng.getrandbits(64) for _ in range(n)]
+
+
+def test_second_sighting_is_a_duplicate():
+    replay = ReplayFilter(capacity=1000, window=30.0)
+    key = keys(1)[0]
+    assert not replay.seen(key, now=0.0)
+    assert replay.seen(key, now=1.0)
+    assert key in replay
+    assert replay.duplicates == 1
+
+
+def test_key_survives_one_rotation_and_expires_after_all():
+    replay = ReplayFilter(capacity=1000, window=10.0, generations=2)
+    start = replay._rotate_at - 10.0
+    key, other, third = keys(3)
+    replay.seen(key, now=start)
+    # одна смена поколения — ключ ещё в прежнем фильтре
+    replay.seen(other, now=start + 11)
+    assert key in replay
+    replay.seen(third, now=start + 22)
+    assert key not in replay
+    assert replay.rotations == 2
+
+
+def test_full_generation_rotates_early():
+    replay = ReplayFilter(capacity=100, window=1e9)
+    for key in keys(250):
+        replay.seen(key, now=0.0)
+    assert replay.rotations == 2 and replay.early_rotations == 2
+
+
+def test_false_positive_rate_stays_near_target():
+    replay = ReplayFilter(capacity=5000, fp_rate=1e-3, window=1e9)
+    for key in keys(5000):
+        replay.seen(key, now=0.0)
+    fresh = keys(20000, seed=7)
+    false = sum(key in replay for key in fresh)
+    assert false / len(fresh) < 5e-3
+
+
+def test_counter_window_rejects_replays():
+    window = CounterWindow(size=64)
+    assert window.check(5) and window.accept(5)
+    assert not window.check(5) and not window.accept(5)
+    # отставший, но ещё не принятый номер проходит один раз
+    assert window.accept(100)
+    assert window.accept(70)
+    assert not window.accept(70)
+
+
+def test_counter_window_rejects_too_old():
+    window = CounterWindow(size=64)
+    window.accept(1000)
+    assert not window.check(1000 - 64)
+    assert window.check(1000 - 63)
+    # прыжок дальше окна забывает всё прежнее
+    window.accept(5000)
+    assert not window.check(1000)
+    assert window.check(4999)
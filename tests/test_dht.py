@@ -0,0 +1,75 @@
+import random
+
+from core.dht import DHT
+
+
+def addr(i):
+    return ("10.0.0.1", 5000 + i)
+
+
+def test_bucket_index_is_xor_distance_order():
+    dht = DHT(node_id=0, k=4)
+    dht.add_peer(addr(1), 0b1)
+    dht.add_peer(addr(2), 0b110)
+    assert dht.buckets[0] is not None and 0b1 in dht.buckets[0].peers
+    assert dht.buckets[2] is not None and 0b110 in dht.buckets[2].peers
+
+
+def test_bucket_keeps_lru_order():
+    dht = DHT(node_id=0, k=4)
+    ids = [0b1000, 0b1001, 0b1010]
+    for i, node_id in enumerate(ids):
+        dht.add_peer(addr(i), node_id, ts=100.0 + i)
+    bucket = dht.buckets[3]
+    assert list(bucket.peers) == ids
+
+    # повторно виденный пир уходит в конец, самый старый — первым
+    dht.mark_seen(addr(0), ts=200.0)
+    assert list(bucket.peers) == [0b1001, 0b1010, 0b1000]
+    assert bucket.oldest().node_id == 0b1001
+
+
+def test_full_bucket_puts_newcomer_into_replacements():
+    dht = DHT(node_id=0, k=2, stale_timeout=1e9)
+    assert dht.add_peer(addr(0), 0b100)
+    assert dht.add_peer(addr(1), 0b101)
+    assert not dht.add_peer(addr(2), 0b110)
+    bucket = dht.buckets[2]
+    assert list(bucket.peers) == [0b100, 0b101]
+    assert list(bucket.replacements) == [0b110]
+    assert addr(2) not in dht
+
+    # ушедший пир уступает место кандидату
+    dht.remove_peer(addr(0))
+    assert list(bucket.peers) == [0b101, 0b110]
+    assert addr(2) in dht
+
+
+def test_full_bucket_evicts_stale_oldest():
+    dht = DHT(node_id=0, k=2, stale_timeout=10)
+    dht.add_peer(addr(0), 0b100, ts=0.0)
+    dht.add_peer(addr(1), 0b101, ts=1e12)
+    assert dht.add_peer(addr(2), 0b110, ts=1e12)
+    assert addr(0) not in dht
+    assert list(dht.buckets[2].peers) == [0b101, 0b110]
+
+
+def test_same_id_at_new_address_moves_peer():
+    dht = DHT(node_id=0, k=4)
+    dht.add_peer(addr(0), 0b100)
+    dht.add_peer(addr(1), 0b100)
+    assert addr(0) not in dht and addr(1) in dht
+    assert len(dht) == 1
+
+
+def test_find_closest_matches_brute_force():
+    rng = random.Random(1)
+    dht = DHT(node_id=rng.getrandbits(160), k=8)
+    ids = [rng.getrandbits(160) for _ in range(300)]
+    for i, node_id in enumerate(ids):
+        dht.add_peer(("10.0.%d.%d" % (i // 256, i % 256), 5000), node_id)
+    known = [p.node_id for p in dht.all_peers()]
+    for _ in range(50):
+        target = rng.getrandbits(160)
+        got = [p.node_id for p in dht.find_closest(target, 8)]
+        assert got == sorted(known, key=lambda n: n ^ target)[:8]
@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+from core.gossip import (BLOOM_BITS, BLOOM_MAX_HASHES, BloomFilter, build_digest, pages, parse_digest,
+                         peer_key, select_delta)
+from core.peer import Peer
+from core.protocol import PacketType, decode_packet, encode_packet
+
+
+def peers(n, seed=1):
+    rng = random.Random(seed)
+    return [Peer((f"10.0.{i // 256}.{i % 256}", 5000), rng.getrandbits(160)) for i in range(n)]
+
+
+def test_digest_survives_the_wire():
+    known = peers(50)
+    digest = dict(build_digest(known, salt=7), type=PacketType.GOSSIP.value)
+    bloom = parse_digest(decode_packet(encode_packet(digest, binary=True)))
+    assert bloom is not None and bloom.bits == BLOOM_BITS
+    assert all(peer_key(p) in bloom for p in known)
+
+
+def test_delta_holds_only_missing_peers():
+    mine, theirs = peers(100), peers(100)[:60]
+    bloom = parse_digest(build_digest(theirs, salt=3))
+    delta = select_delta(mine, bloom, requester_id=1, limit=100)
+    # фильтр Блума может дать ложное «есть», но не ложное «нет»
+    assert {p.node_id for p in delta} <= {p.node_id for p in mine[60:]}
+    assert len(delta) >= 35
+    assert sum(len(page) for page in pages(delta)) == len(delta)
+
+
+@pytest.mark.parametrize("packet", [
+    {"bloom": b"", "nh": 4, "salt": 1},                         # пустой фильтр
+    {"bloom": bytes(BLOOM_BITS // 8 + 1), "nh": 4, "salt": 1},  # больше нашего
+    {"bloom": bytes(8), "nh": 0, "salt": 1},
+    {"bloom": bytes(8), "nh": BLOOM_MAX_HASHES + 1, "salt": 1},
+    {"bloom": bytes(8), "nh": 4, "salt": -1},
+    {"bloom": bytes(8), "nh": 4, "salt": 1 << 64},
+    {"bloom": "AAAA", "nh": 4, "salt": 1},                      # не байты
+    {"bloom": bytes(8), "nh": "x", "salt": 1},
+    {"nh": 4, "salt": 1},
+])
+def test_bad_digest_is_rejected(packet):
+    assert parse_digest(packet) is None
+
+
+def test_largest_valid_digest_is_usable():
+    bloom = parse_digest({"bloom": bytes(BLOOM_BITS // 8), "nh": BLOOM_MAX_HASHES, "salt": (1 << 64) - 1})
+    assert isinstance(bloom, BloomFilter)
+    assert b"x" not in bloom
+
+
+# ---------- узел: GOSSIP_REPLY только на свой раунд ----------
+
+
+def reply(nonce, entries):
+    return {"type": PacketType.GOSSIP_REPLY.value, "id": f"{7:040x}", "nonce": nonce,
+            "peers": [[ip, port, f"{node_id:040x}"] for ip, port, node_id in entries]}
+
+
+def test_unsolicited_reply_is_ignored(node):
+    node._handle_gossip_reply(reply(1, [("10.9.9.9", 5000, 99)]), ("10.0.0.7", 5000))
+    assert len(node.dht) == 0 and node.sent == []
+
+
+def test_reply_peers_join_only_after_pong(node):
+    partner = ("10.0.0.7", 5000)
+    node.dht.add_peer(partner, 7)
+    node._gossip_round()
+    digest, to = node.sent.pop()
+    assert to == partner and digest["type"] == PacketType.GOSSIP.value
+
+    # чужой nonce не принимается, свой — пиры только пингуются
+    node._handle_gossip_reply(reply(digest["nonce"] + 1, [("10.9.9.9", 5000, 99)]), partner)
+    assert node.sent == []
+    node._handle_gossip_reply(reply(digest["nonce"], [("10.9.9.9", 5000, 99), ("10.9.9.8", 5000, 98)]),
+                              partner)
+    assert ("10.9.9.9", 5000) not in node.dht
+    pings = {addr: packet for packet, addr in node.sent if packet["type"] == PacketType.PING.value}
+    assert set(pings) == {("10.9.9.9", 5000), ("10.9.9.8", 5000)}
+
+    # PONG с названным ID — в таблицу; с другим ID — нет
+    for addr, node_id in ((("10.9.9.9", 5000), 99), (("10.9.9.8", 5000), 55)):
+        node._handle_pong({"type": PacketType.PONG.value, "id": f"{node_id:040x}",
+                           "nonce": pings[addr]["nonce"]}, addr)
+    assert ("10.9.9.9", 5000) in node.dht
+    assert ("10.9.9.8", 5000) not in node.dht
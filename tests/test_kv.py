@@ -0,0 +1,133 @@
+import os
+import time
+
+from core.kv import LRUCache, LogStore
+
+FAR = 4e9
+
+
+def test_log_recovers_after_reopen(tmp_path):
+    path = str(tmp_path / "kv.db")
+    store = LogStore(path)
+    assert store.put(1, b"one", 1, FAR)
+    assert store.put(2, b"two", 1, FAR)
+    assert store.put(1, b"uno", 2, FAR)
+    store.close()
+
+    store = LogStore(path)
+    assert len(store) == 2
+    assert store.get(1) == (b"uno", 2, FAR)
+    assert store.get(2)[0] == b"two"
+    # старая версия первого ключа — мусор, а не живые байты
+    assert store.garbage_bytes > 0
+    store.close()
+
+
+def test_truncated_tail_is_dropped(tmp_path):
+    path = str(tmp_path / "kv.db")
+    store = LogStore(path)
+    store.put(1, b"kept", 1, FAR)
+    store.put(2, b"torn" * 10, 1, FAR)
+    store.close()
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 5)
+
+    store = LogStore(path)
+    assert store.get(1)[0] == b"kept"
+    assert store.get(2) is None
+    # после обрезки журнал снова пишется с целой записи
+    assert store.put(3, b"next", 1, FAR)
+    store.close()
+    assert LogStore(path).get(3)[0] == b"next"
+
+
+def test_corrupted_record_ends_scan(tmp_path):
+    path = str(tmp_path / "kv.db")
+    store = LogStore(path)
+    store.put(1, b"first", 1, FAR)
+    store.put(2, b"second", 1, FAR)
+    store.close()
+    with open(path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b"X")
+    assert LogStore(path).get(2) is None
+
+
+def test_foreign_file_is_reset(tmp_path):
+    path = tmp_path / "kv.db"
+    path.write_bytes(b"not a log")
+    store = LogStore(str(path))
+    assert len(store) == 0
+    assert store.put(1, b"v", 1, FAR)
+
+
+def test_older_version_is_not_written():
+    store = LogStore()
+    assert store.put(1, b"new", 5, FAR)
+    assert not store.put(1, b"old", 4, FAR)
+    assert not store.put(1, b"same", 5, FAR)
+    assert store.get(1)[0] == b"new"
+
+
+def test_quota_refuses_new_keys():
+    store = LogStore(max_keys=2)
+    assert store.put(1, b"a", 1, FAR)
+    assert store.put(2, b"b", 1, FAR)
+    assert not store.put(3, b"c", 1, FAR)
+    # новая версия существующего ключа в квоту укладывается
+    assert store.put(2, b"bb", 2, FAR)
+    assert store.refused == 1
+
+
+def test_quota_refuses_bytes():
+    store = LogStore(max_bytes=200)
+    assert store.put(1, b"x" * 100, 1, FAR)
+    assert not store.put(2, b"y" * 100, 1, FAR)
+    assert store.get(2) is None
+
+
+def test_expired_entries_are_dropped():
+    now = time.time()
+    store = LogStore()
+    store.put(1, b"short", 1, now + 100)
+    store.put(2, b"long", 1, FAR)
+    assert store.get(1)[0] == b"short"
+    assert store.get(1, now=now + 150) is None
+    assert store.expire(now=now + 200) == 1
+    assert store.keys() == [2]
+
+
+def test_compaction_keeps_live_records(tmp_path):
+    path = str(tmp_path / "kv.db")
+    store = LogStore(path)
+    for version in range(1, 20):
+        store.put(1, b"v%d" % version, version, FAR)
+    store.put(2, b"other", 1, FAR)
+    size = os.path.getsize(path)
+    store.compact()
+    assert os.path.getsize(path) < size
+    assert store.garbage_bytes == 0
+    store.cache = LRUCache(0)
+    assert store.get(1)[0] == b"v19"
+    store.close()
+    assert LogStore(path).get(2)[0] == b"other"
+
+
+def test_lru_cache_evicts_by_bytes():
+    cache = LRUCache(10)
+    cache.put(1, b"aaaa", 1, FAR)
+    cache.put(2, b"bbbb", 1, FAR)
+    cache.get(1)
+    cache.put(3, b"cccc", 1, FAR)
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
+    assert cache.nbytes == 8
+
+
+def test_lru_cache_keeps_newer_version():
+    cache = LRUCache(100)
+    cache.put(1, b"new", 3, FAR)
+    cache.put(1, b"old", 2, FAR)
+    assert cache.get(1)[0] == b"new"
+    cache.put(1, b"big" * 50, 4, FAR)
+    assert cache.get(1)[0] == b"new"
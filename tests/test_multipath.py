@@ -0,0 +1,90 @@
+from core.multipath import PATH_CANDIDATES, PATH_PROBE_TIMEOUT, PathTable
+
+PRIMARY = ("10.0.0.1", 5000)
+ALT = ("192.168.0.1", 5000)
+PEER_ID = 7
+
+
+def probe(table, now, rtts, node_id=PEER_ID):
+    # ответить на все проверки пути: адрес -> RTT (None — ответа нет)
+    for addr, nonce in table.due(now):
+        rtt = rtts.get(addr)
+        if rtt is not None:
+            assert table.on_pong(nonce, node_id, now + rtt) == addr
+
+
+def test_faster_path_takes_traffic():
+    table = PathTable()
+    table.advertise(PRIMARY, PEER_ID, [list(ALT)], 0.0)
+    assert table.route(PRIMARY) == PRIMARY
+    probe(table, 0.0, {PRIMARY: 0.050, ALT: 0.005})
+    assert table.route(PRIMARY) == ALT
+    # входящие с запасного пути видны под основным адресом
+    assert table.primary(ALT) == PRIMARY
+    assert table.switches == 1
+
+
+def test_small_gain_does_not_switch():
+    table = PathTable()
+    table.advertise(PRIMARY, PEER_ID, [list(ALT)], 0.0)
+    probe(table, 0.0, {PRIMARY: 0.010})
+    probe(table, 0.0, {ALT: 0.009})
+    assert table.route(PRIMARY) == PRIMARY
+
+
+def test_path_from_another_node_is_dropped():
+    table = PathTable()
+    table.advertise(PRIMARY, PEER_ID, [list(ALT)], 0.0)
+    probe(table, 0.0, {PRIMARY: 0.050, ALT: 0.005}, node_id=99)
+    assert table.route(PRIMARY) == PRIMARY
+    assert table.primary(ALT) == ALT
+    assert [[addr for addr, _ in paths] for _, _, paths in table.snapshot()] == [[PRIMARY]]
+
+
+def test_lost_path_falls_back_to_primary():
+    table = PathTable()
+    table.advertise(PRIMARY, PEER_ID, [list(ALT)], 0.0)
+    probe(table, 0.0, {PRIMARY: 0.050, ALT: 0.005})
+    # следующая проверка запасного пути остаётся без ответа
+    for path in table._peers[PRIMARY].paths.values():
+        path.next_probe = 1.0
+    probe(table, 1.0, {PRIMARY: 0.050})
+    table.due(1.0 + PATH_PROBE_TIMEOUT + 0.1)
+    assert table.route(PRIMARY) == PRIMARY
+    assert table.primary(ALT) == ALT
+
+
+def test_unknown_pong_is_not_a_probe():
+    table = PathTable()
+    table.advertise(PRIMARY, PEER_ID, [list(ALT)], 0.0)
+    assert table.on_pong(12345, PEER_ID, 1.0) is None
+
+
+def test_candidates_are_validated_and_bounded():
+    table = PathTable()
+    addrs = [["10.1.0.%d" % i, 5000] for i in range(PATH_CANDIDATES + 4)]
+    table.advertise(PRIMARY, PEER_ID, [None, ["x"], ["h", "port"], list(PRIMARY)] + addrs, 0.0)
+    (_, _, paths), = table.snapshot()
+    assert len(paths) == 1 + PATH_CANDIDATES - 4
+    # без кандидатов запись не заводится
+    table.advertise(("10.0.0.2", 5000), 8, [], 0.0)
+    assert len(table) == 1
+
+
+def test_address_belongs_to_first_owner():
+    table = PathTable()
+    table.advertise(PRIMARY, PEER_ID, [list(ALT)], 0.0)
+    table.advertise(("10.0.0.2", 5000), 8, [list(ALT)], 0.0)
+    paths = {primary: [addr for addr, _ in p] for primary, _, p in table.snapshot()}
+    assert paths[("10.0.0.2", 5000)] == [("10.0.0.2", 5000)]
+    assert ALT in paths[PRIMARY]
+
+
+def test_new_id_or_drop_forgets_paths():
+    table = PathTable()
+    table.advertise(PRIMARY, PEER_ID, [list(ALT)], 0.0)
+    probe(table, 0.0, {PRIMARY: 0.050, ALT: 0.005})
+    table.advertise(PRIMARY, 8, [list(ALT)], 1.0)
+    assert table.route(PRIMARY) == PRIMARY and table.primary(ALT) == ALT
+    table.drop(PRIMARY)
+    assert len(table) == 0 and table.rerouted == 0
@@ -0,0 +1,68 @@
+import pytest
+
+from core.nat_traversal import PUNCH_ATTEMPTS, HolePuncher, ReflexiveAddress
+from core.protocol import PacketType
+
+
+def drain(puncher, start=1000.0):
+    # сколько PUNCH уйдёт за всю сессию
+    sent = []
+    for step in range(PUNCH_ATTEMPTS * 2):
+        send, _ = puncher.due(start + step)
+        sent += [s.addr for s in send]
+    return sent
+
+
+def test_trusted_intro_gets_full_burst():
+    puncher = HolePuncher()
+    assert puncher.begin(1, ("10.0.0.1", 5000), now=1000.0)
+    assert drain(puncher) == [("10.0.0.1", 5000)] * PUNCH_ATTEMPTS
+
+
+def test_untrusted_intro_gets_one_punch_and_cannot_redirect():
+    puncher = HolePuncher()
+    assert puncher.begin(1, ("10.0.0.1", 5000), now=1000.0, trusted=False)
+    assert drain(puncher) == [("10.0.0.1", 5000)]
+
+    # своя пробивка идёт по адресу из таблицы — незнакомый посредник её не уведёт
+    puncher.begin(2, ("10.0.0.2", 5000), now=2000.0)
+    puncher.begin(2, ("10.6.6.6", 5000), now=2000.0, trusted=False)
+    assert set(drain(puncher, 2000.0)) == {("10.0.0.2", 5000)}
+
+
+def test_reflexive_address_needs_quorum():
+    reflexive = ReflexiveAddress(local=("192.168.1.2", 5000))
+    assert reflexive.observe(("10.0.0.1", 1), ("85.1.1.1", 4000), now=1.0) is None
+    assert reflexive.observe(("10.0.0.2", 1), ("85.1.1.1", 4000), now=2.0) == ("85.1.1.1", 4000)
+    assert reflexive.nat_type(now=3.0) == "cone"
+    reflexive.observe(("10.0.0.3", 1), ("85.1.1.1", 4001), now=3.0)
+    assert reflexive.nat_type(now=4.0) == "symmetric"
+
+
+# ---------- узел: PUNCH_INTRO от незнакомого источника ----------
+
+
+def intro(nonce, external):
+    return {"type": PacketType.PUNCH_INTRO.value, "id": f"{5:040x}", "nonce": nonce,
+            "target": f"{9:040x}", "external": list(external)}
+
+
+def test_intro_from_unknown_source_is_not_amplified(node):
+    node._handle_punch_intro(intro(1, ("10.1.1.1", 9999)), ("10.6.6.6", 5000))
+    assert drain(node.punch, 1e12) == [("10.1.1.1", 9999)]
+
+
+def test_intro_from_table_peer_starts_punch(node):
+    node.dht.add_peer(("10.0.0.5", 5000), 5)
+    node._handle_punch_intro(intro(2, ("10.1.1.2", 9999)), ("10.0.0.5", 5000))
+    assert drain(node.punch, 1e12) == [("10.1.1.2", 9999)] * PUNCH_ATTEMPTS
+
+
+@pytest.mark.parametrize("external", [None, ["10.1.1.1"], ["10.1.1.1", "port"], "own"])
+def test_malformed_intro_is_ignored(node, external):
+    node.dht.add_peer(("10.0.0.5", 5000), 5)
+    packet = intro(3, ("0.0.0.0", 0))
+    # свой адрес узла — тоже не цель для пробивки
+    packet["external"] = [node.host, node.port] if external == "own" else external
+    node._handle_punch_intro(packet, ("10.0.0.5", 5000))
+    assert len(node.punch) == 0
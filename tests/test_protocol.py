@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from core.protocol import (PacketType, UnsupportedPacket, decode_packet, encode_packet, is_binary,
+                           peek_packet_id, peek_type, stamp_packet_id)
+
+
+ID = "0123456789abcdef0123456789abcdef01234567"
+
+PACKETS = [
+    {"type": "HELLO", "id": ID, "wire": 1, "external": ["85.10.20.30", 5000], "local": ["192.168.1.10", 5000],
+     "addrs": [["10.0.0.2", 5000]], "pub": b"\x01" * 32, "eph": b"\x02" * 32, "sig": b"\x03" * 64, "hs": 1},
+    {"type": "NODE_LIST", "id": ID, "peers": [["10.0.0.1", 5001, ID], ["10.0.0.2", 5002, ID]], "rid": "a1b2c3"},
+    {"type": "MESSAGE", "text": "привет, узел!"},
+    {"type": "VALUE", "id": ID, "key": ID, "value": {"name": "file.bin", "size": 123456}},
+    {"type": "RDATA", "sid": 7, "seq": 1 << 40, "msg": 3, "frag": 0, "nfrag": 1, "data": b"\x00\xff" * 300},
+    {"type": "RACK", "sid": 7, "ack": 12, "sack": [14, 15, 300], "wnd": 64},
+    {"type": "GOSSIP", "id": ID, "nonce": 5, "salt": (1 << 63) - 1, "nh": 4, "bloom": bytes(512)},
+    {"type": "PING", "nonce": 1, "ts": 123456789},
+]
+
+
+@pytest.mark.parametrize("packet", PACKETS, ids=[p["type"] for p in PACKETS])
+@pytest.mark.parametrize("binary", [False, True], ids=["json", "bin"])
+def test_round_trip(packet, binary):
+    data = encode_packet(packet, binary=binary)
+    assert is_binary(data) == binary
+    assert peek_type(data) == packet["type"]
+    assert decode_packet(data) == packet
+
+
+def test_bytes_fields_are_bytes_in_both_formats():
+    packet = {"type": "CHUNK", "key": ID, "piece": 1, "block": 2, "data": b"raw"}
+    for binary in (False, True):
+        assert decode_packet(encode_packet(packet, binary=binary))["data"] == b"raw"
+
+
+def test_unencodable_packet_falls_back_to_json():
+    # IPv6 в поле адреса и поле без тега бинарный формат не передаёт
+    for packet in ({"type": "HELLO", "id": ID, "external": ["::1", 5000]},
+                   {"type": "PING", "extra": 1},
+                   {"type": "RDATA", "data": "не байты"}):
+        data = encode_packet(packet, binary=True)
+        assert not is_binary(data)
+        assert json.loads(data) == packet
+
+
+def test_packet_id_stamp():
+    for binary in (False, True):
+        data = stamp_packet_id(encode_packet({"type": "PING", "nonce": 1}, binary=binary), 42)
+        assert peek_packet_id(data) == 42
+        assert decode_packet(data)["pid"] == 42
+
+
+def test_truncated_binary_is_rejected():
+    # обрыв посреди поля: ID, адрес, подпись в конце
+    data = encode_packet(PACKETS[0], binary=True)
+    for end in (4, 10, 3 + 21 + 2 + 1 + 3, len(data) - 30, len(data) - 1):
+        with pytest.raises(UnsupportedPacket):
+            decode_packet(data[:end])
+
+
+@pytest.mark.parametrize("data", [
+    bytes([0xA7, 99, 4]),                   # чужая версия
+    bytes([0xA7, 1, 200]),                  # неизвестный тип
+    bytes([0xA7, 1, 4, 250, 0]),            # неизвестный тег
+    bytes([0xA7, 1, 4, 23, 0x80, 0x80]),    # varint без конца
+    bytes([0xA7, 1, 3, 7, 5, 1]) + bytes(6),  # список пиров короче заявленного
+    bytes([0xA7, 1, 21]) + bytes(60),       # RELAY — не через decode_packet
+])
+def test_malformed_binary_is_rejected(data):
+    with pytest.raises(UnsupportedPacket):
+        decode_packet(data)
+
+
+def test_malformed_json_base64_is_rejected():
+    with pytest.raises(ValueError):
+        decode_packet(b'{"type": "RDATA", "data": "***"}')
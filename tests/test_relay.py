@@ -0,0 +1,51 @@
+from core.protocol import PacketType, encode_packet, encode_relay
+from core.relay import RouteCache
+
+
+def test_route_cache_expires_and_evicts():
+    routes = RouteCache(size=2, ttl=10)
+    routes.put(1, ("10.0.0.1", 1), [], now=100.0)
+    routes.put(2, ("10.0.0.2", 1), [], now=100.0)
+    assert routes.get(1, now=105.0).next_hop == ("10.0.0.1", 1)
+    routes.put(3, ("10.0.0.3", 1), [], now=105.0)
+    # вытеснен самый давний по обращению
+    assert routes.get(2, now=105.0) is None
+    assert routes.get(1, now=111.0) is None
+    routes.drop_hop(("10.0.0.3", 1))
+    assert routes.get(3, now=106.0) is None
+
+
+# ---------- узел: конверт RELAY с чужим заголовком ----------
+
+SRC = 7
+DIRECT = ("10.0.0.7", 5000)
+FORGED = ("10.9.9.9", 1)
+HOP = ("10.6.6.6", 7)
+
+
+def envelope(node, src_addr=FORGED):
+    inner = encode_packet({"type": PacketType.MESSAGE.value, "text": "x"})
+    return encode_relay(node.node_id, SRC, src_addr, 4, inner)
+
+
+def test_forged_envelope_does_not_reroute_direct_peer(node):
+    node.dht.add_peer(DIRECT, SRC)
+    node.dht.record_rtt(DIRECT, 0.01)
+    node.dht.record_result(DIRECT, True)
+    node._on_relay(envelope(node), HOP)
+    assert node.routes.get(SRC) is None
+    assert FORGED not in node._relayed
+
+
+def test_envelope_from_unknown_sender_learns_route(node):
+    node._on_relay(envelope(node), HOP)
+    assert node.routes.get(SRC).next_hop == HOP
+    assert node._relayed[FORGED] == SRC
+
+
+def test_truncated_envelope_is_ignored(node):
+    data = envelope(node)
+    for cut in (3, 20, 50):
+        node._on_relay(data[:cut], HOP)
+    assert node.routes.get(SRC) is None
+    assert not node._relayed
@@ -0,0 +1,131 @@
+import time
+
+import pytest
+
+from core.protocol import decode_packet, encode_packet
+from core.reliable import FRAGMENT_SIZE, INITIAL_CWND, MAX_RETRIES, ReliableManager
+
+
+A = ("10.0.0.1", 5000)
+B = ("10.0.0.2", 5000)
+
+
+class Link:
+    # два менеджера и сеть между ними: пакеты копятся в очереди и проходят через
+    # бинарный формат; drop решает, какой пакет потерять
+    def __init__(self, drop=None):
+        self.queue = []
+        self.drop = drop or (lambda packet: False)
+        self.delivered = []
+        self.a = ReliableManager(lambda p, to: self._send(p, A, to), lambda src, data: None)
+        self.b = ReliableManager(lambda p, to: self._send(p, B, to),
+                                 lambda src, data: self.delivered.append(data))
+        # без таймерного потока: таймауты тест проверяет сам
+        self.a._running = self.b._running = True
+
+    def _send(self, packet, src, dst):
+        if not self.drop(packet):
+            self.queue.append((encode_packet(packet, binary=True), src, dst))
+
+    def run(self, only=None):
+        # only — доставить лишь то, что уже в очереди к этому адресу
+        while self.queue:
+            pending = [item for item in self.queue if only is None or item[2] == only]
+            self.queue = [item for item in self.queue if only is not None and item[2] != only]
+            for data, src, dst in pending:
+                packet = decode_packet(data)
+                manager = self.a if dst == A else self.b
+                if packet["type"] == "RDATA":
+                    manager.on_data(packet, src)
+                else:
+                    manager.on_ack(packet, src)
+            if only is not None:
+                return
+
+    def expire(self):
+        channel = self.a.channels[B]
+        self.a._check_timeouts(channel, time.monotonic() + channel.rto + 1)
+
+
+def test_message_is_fragmented_and_delivered():
+    link = Link()
+    payload = bytes(range(256)) * 20
+    future = link.a.send(B, payload)
+    link.run()
+    assert link.delivered == [payload]
+    assert future.result(timeout=0) is True
+    assert not link.a.channels[B].inflight
+
+
+def test_lost_fragment_is_retransmitted_on_timeout():
+    lost = []
+
+    def drop(packet):
+        if packet["type"] == "RDATA" and packet["seq"] == 0 and not lost:
+            lost.append(packet)
+            return True
+        return False
+
+    link = Link(drop)
+    future = link.a.send(B, b"x" * 10)
+    link.run()
+    assert link.delivered == [] and not future.done()
+
+    link.expire()
+    link.run()
+    assert link.delivered == [b"x" * 10]
+    assert future.result(timeout=0) is True
+    assert link.a.channels[B].retransmits == 1
+
+
+def test_out_of_order_fragments_are_delivered_in_order():
+    held = []
+    link = Link(lambda p: p["type"] == "RDATA" and p["seq"] == 0 and not held and not held.append(p))
+    payload = b"".join(bytes([i]) * FRAGMENT_SIZE for i in range(INITIAL_CWND))
+    link.a.send(B, payload)
+    link.run(only=B)
+    # без первого фрагмента сборка ждёт, а RACK подтверждает остальные выборочно
+    assert link.delivered == []
+    channel = link.b.channels[A]
+    assert channel.rcv_next == 0 and sorted(channel.rcv_buf) == [1, 2, 3]
+    assert channel.sack_ranges() == [1, 3]
+
+    # три более поздних подтверждения — быстрый перезапрос без таймаута
+    link.run(only=A)
+    assert link.a.channels[B].retransmits == 1
+    link.run()
+    assert link.delivered == [payload]
+
+
+def test_duplicate_fragment_is_delivered_once():
+    link = Link()
+    link.a.send(B, b"once")
+    data, src, dst = link.queue[0]
+    link.queue.append((data, src, dst))
+    link.run()
+    assert link.delivered == [b"once"]
+
+
+def test_ack_from_another_session_is_ignored():
+    link = Link(lambda p: p["type"] == "RACK")
+    future = link.a.send(B, b"data")
+    link.run()
+    link.a.on_ack({"type": "RACK", "sid": link.a.sid + 1, "ack": 1, "sack": [], "wnd": 64}, B)
+    assert not future.done()
+    assert link.a.channels[B].inflight
+
+
+def test_peer_that_never_acks_fails_the_future():
+    link = Link(lambda p: True)
+    future = link.a.send(B, b"data")
+    for _ in range(MAX_RETRIES + 1):
+        link.expire()
+    with pytest.raises(TimeoutError):
+        future.result(timeout=0)
+
+
+def test_malformed_rdata_is_ignored():
+    link = Link()
+    link.b.on_data({"type": "RDATA", "sid": 1, "seq": 0, "msg": 0, "frag": 0, "nfrag": 1, "data": "str"}, A)
+    link.b.on_data({"type": "RDATA", "sid": 1, "msg": 0, "frag": 0, "nfrag": 1, "data": b""}, A)
+    assert link.delivered == [] and link.queue == []
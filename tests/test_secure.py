@@ -0,0 +1,136 @@
+import pytest
+
+from core.protocol import PacketType, encode_packet
+from core.secure import SIG_INIT, Identity, SessionManager
+
+ADDR_A = ("10.0.0.1", 5000)
+ADDR_B = ("10.0.0.2", 5000)
+EVIL = ("10.6.6.6", 5000)
+
+
+def manager():
+    return SessionManager(Identity(), lambda addr: None)
+
+
+def init_hello(a, addr):
+    return dict(a.hello_fields(addr), id=f"{a.identity.node_id:040x}")
+
+
+def handshake(a, b):
+    node_id, reply, _, _ = b.on_hello(init_hello(a, ADDR_B), ADDR_A)
+    assert node_id == a.identity.node_id
+    result = a.on_hello(dict(reply, id=f"{b.identity.node_id:040x}"), ADDR_B)
+    assert result[0] == b.identity.node_id
+
+
+def test_handshake_gives_matching_keys():
+    a, b = manager(), manager()
+    handshake(a, b)
+    session, plain = b.open(ADDR_A, a.seal(ADDR_B, b"hello"))
+    assert plain == b"hello" and session.node_id == a.identity.node_id
+    assert a.open(ADDR_B, b.seal(ADDR_A, b"back"))[1] == b"back"
+
+
+def test_sealed_packet_is_accepted_once():
+    a, b = manager(), manager()
+    handshake(a, b)
+    sealed = a.seal(ADDR_B, b"once")
+    assert b.open(ADDR_A, sealed) is not None
+    assert b.open(ADDR_A, sealed) is None
+    assert b.stats["replayed"] == 1
+
+
+def test_tampered_packet_is_rejected():
+    a, b = manager(), manager()
+    handshake(a, b)
+    sealed = bytearray(a.seal(ADDR_B, b"data"))
+    sealed[-1] ^= 1
+    assert b.open(ADDR_A, bytes(sealed)) is None
+    assert b.stats["rejected"] == 1
+
+
+def test_hello_with_foreign_signature_is_rejected():
+    a, b, c = manager(), manager(), manager()
+    hello = init_hello(a, ADDR_B)
+    hello["sig"] = c.identity.sign(SIG_INIT + hello["eph"])
+    assert b.on_hello(hello, ADDR_A) is None
+    assert b.stats["bad_hello"] == 1
+
+
+def test_hello_with_wrong_id_is_rejected():
+    a, b = manager(), manager()
+    hello = dict(init_hello(a, ADDR_B), id=f"{5:040x}")
+    assert b.on_hello(hello, ADDR_A) is None
+
+
+def test_replayed_hello_stays_unconfirmed():
+    a, b = manager(), manager()
+    hello = init_hello(a, ADDR_B)
+    b.on_hello(dict(hello), ADDR_A)
+    b.on_hello(dict(hello), EVIL)
+    # ключ сессии с чужого адреса никто не докажет
+    assert b.get(EVIL).hello is not None
+
+
+# ---------- узел: таблица пополняется только после доказательства ключа ----------
+
+PEER = ("10.0.0.9", 5000)
+
+
+@pytest.fixture
+def node(secure_node):
+    return secure_node
+
+
+def node_hello(peer, node):
+    own = (node.host, node.port)
+    return dict(init_hello(peer, own), type=PacketType.HELLO.value)
+
+
+def test_replayed_hello_does_not_add_peer(node):
+    peer = manager()
+    node._handle_hello(node_hello(peer, node), EVIL)
+    assert EVIL not in node.dht
+    assert node.sessions.get(EVIL).hello is not None
+
+
+def sealed_ping(peer, node):
+    own = (node.host, node.port)
+    ping = encode_packet({"type": PacketType.PING.value, "id": f"{peer.identity.node_id:040x}"})
+    return peer.seal(own, ping)
+
+
+def answer(peer, node, hello):
+    # HELLO пира узлу, ответ hs=2 — пиру; возвращает его первый зашифрованный пакет
+    node.sent.clear()
+    node._handle_hello(hello, PEER)
+    reply = next(p for p, addr in node.sent if p["type"] == PacketType.HELLO.value and addr == PEER)
+    peer.on_hello(reply, (node.host, node.port))
+    return sealed_ping(peer, node)
+
+
+def test_first_sealed_packet_confirms_peer(node):
+    peer = manager()
+    ping = answer(peer, node, node_hello(peer, node))
+    assert PEER not in node.dht
+    node._on_packet(ping, PEER)
+    assert node.dht.get_peer(PEER).node_id == peer.identity.node_id
+    assert node.sessions.get(PEER).hello is None
+
+
+def test_stale_hello_does_not_replace_live_session(node):
+    peer = manager()
+    stale = node_hello(peer, node)
+    node._on_packet(answer(peer, node, dict(stale)), PEER)
+
+    # пир переподключается с новым ключом: новая сессия сменяет старую с первым пакетом
+    peer.drop((node.host, node.port))
+    node._on_packet(answer(peer, node, node_hello(peer, node)), PEER)
+    live = node.sessions.get(PEER)
+    assert live.hello is None
+
+    # старый HELLO с адреса пира живую сессию не подменяет
+    node._handle_hello(dict(stale), PEER)
+    assert node.sessions.get(PEER) is live
+    assert node.sessions.open(PEER, sealed_ping(peer, node)) is not None
+    assert peer.open((node.host, node.port), live.seal(b"back"))[1] == b"back"
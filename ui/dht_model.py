@@ -0,0 +1,105 @@
+import time
+
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+# роль для сортировки: числа вместо строк отображения
+SORT_ROLE = Qt.UserRole + 1
+
+
+class DhtTableModel(QAbstractTableModel):
+    HEADERS = ["IP", "Port", "Last seen"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # строки: [ip, port, last_seen]; порядок строк не важен — сортирует прокси
+        self._rows = []
+        self._index = {}
+
+    # ---------------- ИНТЕРФЕЙС МОДЕЛИ ----------------
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        ip, port, last_seen = self._rows[index.row()]
+        col = index.column()
+
+        if role == Qt.DisplayRole:
+            if col == 0:
+                return ip
+            if col == 1:
+                return str(port)
+            # возраст считается в момент отрисовки, а не при каждом обновлении
+            if last_seen is None:
+                return "нет данных"
+            return f"{int(time.time() - last_seen)} сек назад"
+
+        if role == SORT_ROLE:
+            if col == 0:
+                return tuple(int(x) if x.isdigit() else 0 for x in ip.split("."))
+            if col == 1:
+                return port
+            # сортировка по возрасту: свежие сверху
+            return -(last_seen or 0.0)
+
+        return None
+
+    # ---------------- ОБНОВЛЕНИЕ ----------------
+
+    def reset(self, peers):
+        self.beginResetModel()
+        self._rows = [[ip, port, last_seen] for ip, port, last_seen in peers]
+        self._index = {(row[0], row[1]): i for i, row in enumerate(self._rows)}
+        self.endResetModel()
+
+    def apply_diff(self, upserts, removed):
+        # стоимость — O(изменившихся строк)
+        for addr in removed:
+            self._remove_row(tuple(addr))
+
+        new_rows = []
+        for ip, port, last_seen in upserts:
+            row = self._index.get((ip, port))
+            if row is None:
+                new_rows.append([ip, port, last_seen])
+                continue
+            self._rows[row][2] = last_seen
+            cell = self.index(row, 2)
+            self.dataChanged.emit(cell, cell)
+
+        if new_rows:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(new_rows) - 1)
+            for i, row in enumerate(new_rows):
+                self._index[(row[0], row[1])] = first + i
+                self._rows.append(row)
+            self.endInsertRows()
+
+    def _remove_row(self, addr):
+        row = self._index.pop(addr, None)
+        if row is None:
+            return
+
+        # последняя строка переезжает на место удалённой — без сдвига остальных
+        last = len(self._rows) - 1
+        if row != last:
+            moved = self._rows[last]
+            self._rows[row] = moved
+            self._index[(moved[0], moved[1])] = row
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+
+        self.beginRemoveRows(QModelIndex(), last, last)
+        self._rows.pop()
+        self.endRemoveRows()
@@ -4,17 +4,28 @@ from PySide6.QtWidgets import (
     QLabel,
     QPushButton,
     QTextEdit,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QHeaderView,
+    QLineEdit,
 )
-from PySide6.QtCore import Qt, QMetaObject, Q_ARG, Signal
+from PySide6.QtCore import Qt, QMetaObject, Q_ARG, Signal, QSortFilterProxyModel, QTimer
+from PySide6.QtGui import QFontDatabase
+
+from .dht_model import DhtTableModel, SORT_ROLE
+
+# как часто перерисовывать столбец возраста
+AGE_REFRESH_MS = 1000
+
+# сколько строк лога хранить в виджете
+MAX_LOG_LINES = 5000
 
 
 class DiagnosticsPanel(QWidget):
     # сигналы для безопасного обновления из других потоков
     status_update_requested = Signal(str, str, bool, int)
     dht_update_requested = Signal(list)
+    dht_diff_requested = Signal(list, list)
+    metrics_update_requested = Signal(str)
 
     def __init__(self):
         super().__init__()
@@ -26,6 +37,7 @@ class DiagnosticsPanel(QWidget):
         # Логи
         self.log_view = QTextEdit()
         self.log_view.setReadOnly(True)
+        self.log_view.document().setMaximumBlockCount(MAX_LOG_LINES)
         layout.addWidget(QLabel("Логи (реальное время):"))
         layout.addWidget(self.log_view)
 
@@ -38,13 +50,33 @@ class DiagnosticsPanel(QWidget):
         layout.addWidget(self.btn_save)
         layout.addWidget(self.btn_refresh)
 
-        # DHT таблица
+        # DHT таблица: модель обновляется изменениями, прокси сортирует и фильтрует
         layout.addWidget(QLabel("DHT-соседи:"))
-        self.dht_table = QTableWidget(0, 3)
-        self.dht_table.setHorizontalHeaderLabels(["IP", "Port", "Last seen"])
+        self.dht_filter = QLineEdit()
+        self.dht_filter.setPlaceholderText("Фильтр по IP / порту")
+        layout.addWidget(self.dht_filter)
+
+        self.dht_model = DhtTableModel(self)
+        self.dht_proxy = QSortFilterProxyModel(self)
+        self.dht_proxy.setSourceModel(self.dht_model)
+        self.dht_proxy.setSortRole(SORT_ROLE)
+        self.dht_proxy.setFilterKeyColumn(-1)
+        self.dht_proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.dht_proxy.setDynamicSortFilter(True)
+
+        self.dht_table = QTableView()
+        self.dht_table.setModel(self.dht_proxy)
+        self.dht_table.setSortingEnabled(True)
         self.dht_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         layout.addWidget(self.dht_table)
 
+        self.dht_filter.textChanged.connect(self.dht_proxy.setFilterFixedString)
+
+        # возраст пиров меняется сам по себе — достаточно перерисовать видимые строки
+        self.age_timer = QTimer(self)
+        self.age_timer.timeout.connect(self.dht_table.viewport().update)
+        self.age_timer.start(AGE_REFRESH_MS)
+
         # Статус сети
         layout.addWidget(QLabel("Сетевой статус:"))
         self.label_local_ip = QLabel("Локальный IP: -")
@@ -57,12 +89,21 @@ class DiagnosticsPanel(QWidget):
         layout.addWidget(self.label_udp)
         layout.addWidget(self.label_port)
 
+        # Метрики
+        layout.addWidget(QLabel("Метрики:"))
+        self.metrics_view = QLabel("-")
+        self.metrics_view.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.metrics_view.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        layout.addWidget(self.metrics_view)
+
         # Кнопки
         self.btn_clear.clicked.connect(self.clear_log)
 
         # сигналы → слоты
         self.status_update_requested.connect(self._update_status)
         self.dht_update_requested.connect(self._update_dht)
+        self.dht_diff_requested.connect(self._apply_dht_diff)
+        self.metrics_update_requested.connect(self.metrics_view.setText)
 
     # ---------------- ЛОГИ ----------------
 
@@ -75,6 +116,10 @@ class DiagnosticsPanel(QWidget):
             Q_ARG(str, text),
         )
 
+    def add_logs(self, lines):
+        # одна вставка на кадр вместо вызова на каждую строку
+        self.add_log("\n".join(lines))
+
     def clear_log(self):
         self.log_view.clear()
 
@@ -90,18 +135,23 @@ class DiagnosticsPanel(QWidget):
         self.label_udp.setText(f"UDP доступность: {'да' if udp_ok else 'нет'}")
         self.label_port.setText(f"Порт: {port}")
 
+    # ---------------- МЕТРИКИ ----------------
+
+    def safe_update_metrics(self, text):
+        self.metrics_update_requested.emit(str(text))
+
     # ---------------- DHT ----------------
 
     def safe_update_dht(self, peers):
-        # peers — список (ip, port, last_seen_str)
+        # peers — список (ip, port, last_seen_timestamp), полный снимок
         self.dht_update_requested.emit(list(peers))
 
+    def safe_apply_dht_diff(self, upserts, removed):
+        # upserts — (ip, port, last_seen_timestamp), removed — (ip, port)
+        self.dht_diff_requested.emit(list(upserts), list(removed))
+
     def _update_dht(self, peers):
-        self.dht_table.setRowCount(0)
-
-        for ip, port, last_seen in peers:
-            row = self.dht_table.rowCount()
-            self.dht_table.insertRow(row)
-            self.dht_table.setItem(row, 0, QTableWidgetItem(str(ip)))
-            self.dht_table.setItem(row, 1, QTableWidgetItem(str(port)))
-            self.dht_table.setItem(row, 2, QTableWidgetItem(str(last_seen)))
+        self.dht_model.reset(peers)
+
+    def _apply_dht_diff(self, upserts, removed):
+        self.dht_model.apply_diff(upserts, removed)